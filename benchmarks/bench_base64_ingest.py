@@ -0,0 +1,129 @@
+"""
+Compares the peak memory of ingesting a base64 JSON upload the buffered way
+(join the body, parse the JSON, validate the model, `base64.b64decode`) and
+through the streaming decoder used by `/identify_base64`.
+
+The body is built once and written to a temporary file. Each mode runs in a fresh
+process that reads it, receives it in 64 KiB chunks like the ASGI server delivers
+it, and reports the growth of its peak RSS and the peak of traced Python
+allocations while handling one upload.
+
+Linux only (peak RSS is read from /proc).
+
+Usage:
+    python -m benchmarks.bench_base64_ingest --megabytes 10
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_body(megabytes: float) -> bytes:
+    # Random pixels do not compress, so the PNG is about as large as the raw pixels
+    side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=0)
+    return json.dumps({"image_base64": base64.b64encode(buffer.getvalue()).decode()}).encode()
+
+
+async def body_chunks(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+async def ingest_buffered(body: bytes) -> int:
+    from src.api.routes import decode_image_base64
+    from src.models.image_request import ImageUploadRequest
+
+    raw = b"".join([chunk async for chunk in body_chunks(body)])
+    image_request = ImageUploadRequest.model_validate(json.loads(raw))
+    return len(decode_image_base64(image_request.image_base64))
+
+
+async def ingest_streaming(body: bytes) -> int:
+    from src.core.base64_ingest import read_base64_json
+    from src.core.image_processor import validate_image_buffer
+
+    _, image_data = await read_base64_json(body_chunks(body), "image_base64", len(body), content_length=len(body))
+    validate_image_buffer(image_data)
+    return len(image_data)
+
+
+def memory_status(field: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise KeyError(field)
+
+
+def reset_peak_rss():
+    # Linux only: resets VmHWM to the current RSS
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def run_mode(mode: str, body_path: str):
+    ingest = ingest_streaming if mode == "streaming" else ingest_buffered
+    # Import everything before measuring
+    asyncio.run(ingest(build_body(0.01)))
+    with open(body_path, "rb") as body_file:
+        body = body_file.read()
+
+    reset_peak_rss()
+    rss_before = memory_status("VmRSS")
+    tracemalloc.start()
+    size = asyncio.run(ingest(body))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = memory_status("VmHWM") - rss_before
+    print(json.dumps({
+        "mode": mode,
+        "body_bytes": len(body),
+        "image_bytes": size,
+        "rss_growth": rss_growth,
+        "traced_peak": traced_peak,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=10)
+    parser.add_argument("--mode", choices=("buffered", "streaming"))
+    parser.add_argument("--body")
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.body)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".json") as body_file:
+        body_file.write(build_body(args.megabytes))
+        body_file.flush()
+        print(f"{'mode':<12}{'image MiB':>10}{'peak RSS growth MiB':>22}{'traced peak MiB':>18}{'x image':>9}")
+        for mode in ("buffered", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_base64_ingest", "--mode", mode, "--body", body_file.name],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            mib = 1024 * 1024
+            print(
+                f"{mode:<12}{result['image_bytes'] / mib:>10.1f}{result['rss_growth'] / mib:>22.1f}"
+                f"{result['traced_peak'] / mib:>18.1f}{result['traced_peak'] / result['image_bytes']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
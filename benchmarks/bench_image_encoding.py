@@ -0,0 +1,78 @@
+"""
+Compares CPU time and output size of the image encoding modes of `process_image`.
+
+The sample photo is 1152x1536, outside ASPECT_RATIO_RANGE, so it is center-cropped to a
+square first. A 2x upscaled copy is also measured to show the effect of JPEG draft decoding.
+
+Usage:
+    python -m benchmarks.bench_image_encoding [--repeat N]
+"""
+import argparse
+import io
+import time
+from unittest.mock import patch
+from PIL import Image
+from src.core.image_processor import process_image
+
+SAMPLE_IMAGE = "tests/ficus_lyrata_1152x1536.jpg"
+
+MODES = [
+    # name, output format, overridden settings
+    ("png-optimize (legacy)", "PNG", {"image_png_optimize": True, "image_jpeg_draft": False}),
+    ("png", "PNG", {}),
+    ("jpeg", "JPEG", {}),
+    ("jpeg-no-draft", "JPEG", {"image_jpeg_draft": False}),
+    ("webp", "WEBP", {}),
+    ("passthrough", "JPEG", {"image_passthrough": True}),
+]
+
+
+def load_inputs() -> dict:
+    image = Image.open(SAMPLE_IMAGE)
+    side = min(image.size)
+    left = (image.width - side) // 2
+    top = (image.height - side) // 2
+    square = image.crop((left, top, left + side, top + side))
+
+    inputs = {}
+    for label, candidate in [
+        (f"{side}x{side}", square),
+        (f"{side * 2}x{side * 2}", square.resize((side * 2, side * 2), Image.LANCZOS)),
+    ]:
+        buffer = io.BytesIO()
+        candidate.save(buffer, format="JPEG", quality=92)
+        inputs[label] = buffer.getvalue()
+    return inputs
+
+
+def run_mode(file_contents: bytes, output_format: str, overrides: dict, repeat: int):
+    patches = [patch(f"src.core.image_processor.settings.{name}", value) for name, value in overrides.items()]
+    for active in patches:
+        active.start()
+    try:
+        output = process_image(file_contents, output_format=output_format)
+        started = time.process_time()
+        for _ in range(repeat):
+            process_image(file_contents, output_format=output_format)
+        cpu_ms = (time.process_time() - started) * 1000 / repeat
+    finally:
+        for active in patches:
+            active.stop()
+    return cpu_ms, len(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per mode (default: 5)")
+    args = parser.parse_args()
+
+    for label, file_contents in load_inputs().items():
+        print(f"\nInput {label} JPEG, {len(file_contents) / 1024:.0f} KiB")
+        print(f"{'mode':<24}{'cpu ms':>10}{'output KiB':>14}")
+        for name, output_format, overrides in MODES:
+            cpu_ms, size = run_mode(file_contents, output_format, overrides, args.repeat)
+            print(f"{name:<24}{cpu_ms:>10.1f}{size / 1024:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
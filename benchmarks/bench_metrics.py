@@ -0,0 +1,100 @@
+"""
+Measures the cost of recording metrics on the hot path.
+
+Times each recording primitive of `src.core.metrics` in a tight loop, single
+threaded and with `--threads` threads recording into the same series, and the
+rendering of the registry once every series has been populated. The per-request
+cost of the HTTP middleware is one in-flight increment and decrement, two
+`perf_counter` calls and one histogram observation.
+
+Usage:
+    python -m benchmarks.bench_metrics --iterations 1000000 --threads 8
+"""
+import argparse
+import threading
+import time
+from src.core.metrics import Gauge, Histogram, registry
+
+
+def per_call_ns(function, iterations: int) -> float:
+    started = time.perf_counter()
+    function(iterations)
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def baseline(iterations: int):
+    for _ in range(iterations):
+        pass
+
+
+def build_cases():
+    histogram = Histogram("bench_seconds", "Benchmark.", ("method", "route", "status"))
+    gauge = Gauge("bench_in_flight", "Benchmark.")
+
+    def observe(iterations: int):
+        for _ in range(iterations):
+            histogram.observe(0.012, "POST", "/identify", "200")
+
+    def timer(iterations: int):
+        for _ in range(iterations):
+            with histogram.time("POST", "/identify", "200"):
+                pass
+
+    def track(iterations: int):
+        for _ in range(iterations):
+            with gauge.track():
+                pass
+
+    def middleware(iterations: int):
+        for _ in range(iterations):
+            started = time.perf_counter()
+            gauge.inc()
+            gauge.dec()
+            histogram.observe(time.perf_counter() - started, "POST", "/identify", "200")
+
+    return {"observe": observe, "timer": timer, "gauge track": track, "middleware": middleware}
+
+
+def threaded_ns(function, iterations: int, threads: int) -> float:
+    """
+    Returns the wall time per recorded value with `threads` threads sharing the work.
+    """
+    workers = [threading.Thread(target=function, args=(iterations // threads,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    loop = per_call_ns(baseline, args.iterations)
+    print(f"{'operation':<14}{'ns/op':>10}{f'ns/op ({args.threads} threads)':>24}")
+    for name, function in build_cases().items():
+        single = per_call_ns(function, args.iterations) - loop
+        threaded = threaded_ns(function, args.iterations, args.threads) - loop
+        print(f"{name:<14}{single:>10.0f}{threaded:>24.0f}")
+
+    # Populate every registered series with a few label combinations before rendering
+    for metric in registry.metrics:
+        for index in range(10):
+            labels = tuple(f"value{index}" for _ in metric.labelnames)
+            if isinstance(metric, Histogram):
+                metric.observe(0.01 * index, *labels)
+            else:
+                metric.set(index, *labels)
+    renders = 1000
+    started = time.perf_counter()
+    for _ in range(renders):
+        body = registry.render()
+    print(f"render: {(time.perf_counter() - started) / renders * 1e6:.0f} us for {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    main()
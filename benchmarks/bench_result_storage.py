@@ -0,0 +1,110 @@
+"""
+Compares storage size and read throughput of full and compact identification results
+against a local mongod.
+
+Seeds `--records` completed identifications of `--species` species in the full
+`result` shape in a scratch database, reports the collection size and the read
+throughput of listing pages, converts them with `migrate_results` and reports
+the same figures again.
+
+Usage:
+    mongod --dbpath /tmp/mongo-bench &
+    python -m benchmarks.bench_result_storage --mongo-url mongodb://localhost:27017 \\
+        --records 200000 --species 500
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from pymongo import DESCENDING, MongoClient
+from src.db.migrate_results import migrate_results
+from src.db.result_codec import TaxonCache, decode_identification, referenced_taxa
+
+TAXONOMY_RANKS = ("kingdom", "phylum", "class", "order", "family", "genus")
+
+
+def species_result(index: int) -> dict:
+    return {
+        "plant_name": f"Genus{index % 97} species{index}",
+        "common_names": [f"Common name {index}", f"Other name {index}", f"Regional name {index}"],
+        "taxonomy": {rank: f"{rank.title()}{index % 13}" for rank in TAXONOMY_RANKS},
+    }
+
+
+def seed(db, records: int, species: int):
+    db.identifications.drop()
+    db.taxa.drop()
+    results = [species_result(index) for index in range(species)]
+    batch = []
+    for index in range(records):
+        result = dict(random.choice(results))
+        result.update({
+            "probability": random.random(),
+            "identification_id": f"{random.getrandbits(64):016x}",
+            "is_plant": True,
+            "created": datetime.now(timezone.utc).isoformat(),
+        })
+        batch.append({"status": "Completed", "created_at": datetime.now(timezone.utc), "result": result})
+        if len(batch) == 10_000:
+            db.identifications.insert_many(batch)
+            batch = []
+    if batch:
+        db.identifications.insert_many(batch)
+
+
+def storage(db) -> dict:
+    stats = db.command("collStats", "identifications")
+    taxa = db.command("collStats", "taxa") if "taxa" in db.list_collection_names() else {"size": 0}
+    return {"size": stats["size"] + taxa["size"], "avg_obj_size": stats.get("avgObjSize", 0)}
+
+
+def read_pages(db, page_size: int) -> float:
+    """
+    Reads the whole collection page by page like the listing endpoint and returns documents per second.
+    """
+    taxa = TaxonCache(100_000)
+    started = time.perf_counter()
+    read = 0
+    query = {}
+    while True:
+        page = list(db.identifications.find(query).sort("_id", DESCENDING).limit(page_size))
+        if not page:
+            break
+        missing = taxa.missing(referenced_taxa(page))
+        if missing:
+            for taxon in db.taxa.find({"_id": {"$in": missing}}):
+                taxa.put(taxon)
+        for identification in page:
+            decode_identification(identification, taxa)
+        read += len(page)
+        query = {"_id": {"$lt": page[-1]["_id"]}}
+    return read / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="zelara_bench")
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--species", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_url)
+    db = client[args.database]
+    try:
+        seed(db, args.records, args.species)
+        print(f"{'schema':<10}{'data bytes':>14}{'avg doc bytes':>16}{'docs read/s':>14}")
+        for schema in ("full", "compact"):
+            if schema == "compact":
+                migrate_results(db)
+            size = storage(db)
+            throughput = read_pages(db, args.page_size)
+            print(f"{schema:<10}{size['size']:>14}{size['avg_obj_size']:>16}{throughput:>14.0f}")
+    finally:
+        client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
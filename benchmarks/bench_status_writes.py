@@ -0,0 +1,107 @@
+"""
+Compares immediate and buffered identification status updates against a local mongod.
+
+Creates `--records` identification records in a scratch database, completes them from
+`--threads` threads once with one `update_one` each (status_write_mode="sync") and once
+through the StatusWriteBuffer (status_write_mode="buffered"), and reports throughput
+and the number of write commands sent to the server.
+
+Usage:
+    mongod --dbpath /tmp/mongo-bench &
+    python -m benchmarks.bench_status_writes --mongo-url mongodb://localhost:27017 \\
+        --records 20000 --threads 16
+"""
+import argparse
+import threading
+import time
+from bson.objectid import ObjectId
+from pymongo import MongoClient, monitoring
+from src.db.write_buffer import StatusWriteBuffer
+
+RESULT = {"plant_name": "Ficus lyrata", "probability": 0.95, "is_plant": True}
+WRITE_COMMANDS = ("update", "delete", "insert")
+
+
+class WriteCommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            with self.lock:
+                self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, records: int) -> list:
+    db.identifications.drop()
+    ids = [ObjectId() for _ in range(records)]
+    db.identifications.insert_many([{"_id": _id, "status": "Processing"} for _id in ids])
+    return ids
+
+
+def complete_in_threads(ids: list, threads: int, complete):
+    chunks = [ids[index::threads] for index in range(threads)]
+    workers = [threading.Thread(target=lambda chunk=chunk: [complete(_id) for _id in chunk]) for chunk in chunks]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def run_sync(db, ids: list, threads: int):
+    complete_in_threads(
+        ids,
+        threads,
+        lambda _id: db.identifications.update_one({"_id": _id}, {"$set": {"status": "Completed", "result": RESULT}}),
+    )
+
+
+def run_buffered(db, ids: list, threads: int, batch_size: int, flush_interval: float):
+    buffer = StatusWriteBuffer(db, max_batch=batch_size, flush_interval=flush_interval)
+    buffer.start()
+    complete_in_threads(
+        ids, threads, lambda _id: buffer.update_identification(str(_id), {"status": "Completed", "result": RESULT})
+    )
+    buffer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="zelara_bench")
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.2)
+    args = parser.parse_args()
+
+    counter = WriteCommandCounter()
+    client = MongoClient(args.mongo_url, event_listeners=[counter])
+    db = client[args.database]
+    try:
+        print(f"{'mode':<10}{'records/s':>12}{'write commands':>16}{'completed':>12}")
+        for mode in ("sync", "buffered"):
+            ids = seed(db, args.records)
+            counter.count = 0
+            started = time.perf_counter()
+            if mode == "sync":
+                run_sync(db, ids, args.threads)
+            else:
+                run_buffered(db, ids, args.threads, args.batch_size, args.flush_interval)
+            elapsed = time.perf_counter() - started
+            completed = db.identifications.count_documents({"status": "Completed"})
+            print(f"{mode:<10}{args.records / elapsed:>12.0f}{counter.count:>16}{completed:>12}")
+    finally:
+        client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
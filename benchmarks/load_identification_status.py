@@ -0,0 +1,74 @@
+"""
+Load test of GET /identifications/{id}, the endpoint clients poll for results.
+
+Runs a fixed number of concurrent pollers against a running API and reports the
+latency distribution. Run it once against a build using the blocking
+DatabaseService in the routes and once against the AsyncDatabaseService build,
+with the same single uvicorn worker, to compare p99 latency.
+
+Usage:
+    uvicorn src.main:app --workers 1 &
+    python -m benchmarks.load_identification_status --url http://localhost:8000 \\
+        --id <identification_id> --concurrency 500 --requests 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+async def poll(client: httpx.AsyncClient, path: str, remaining: list, latencies: list, errors: list):
+    while remaining:
+        remaining.pop()
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run(url: str, identification_id: str, concurrency: int, requests: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        if identification_id is None:
+            identification_id = (await client.get("/identifications")).json()[0]["_id"]
+        path = f"/identifications/{identification_id}"
+
+        remaining = list(range(requests))
+        latencies, errors = [], []
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            poll(client, path, remaining, latencies, errors) for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  concurrency: {concurrency}")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(
+        f"latency ms  mean {statistics.fmean(latencies):.1f}  p50 {percentile(latencies, 0.50):.1f}  "
+        f"p95 {percentile(latencies, 0.95):.1f}  p99 {percentile(latencies, 0.99):.1f}  max {latencies[-1]:.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--id", dest="identification_id", help="Identification to poll (default: the first one listed)")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.identification_id, args.concurrency, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,149 +1,655 @@
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
+    Depends,
     UploadFile,
     File,
+    Form,
+    Header,
     HTTPException,
+    Query,
     Request,
+    Response,
 )
-from typing import List
-from src.core.task_manager import identify_plant_task
-from src.models.plant_model import PlantIdentificationResponse, PlantIdentificationResult
-from src.models.image_request import ImageUploadRequest
-from src.db.db_service import DatabaseService
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from bson.objectid import ObjectId
+from collections import Counter
+from pydantic import ValidationError
+from datetime import datetime
+from typing import List, Optional
+from src.core.base64_ingest import ImageTooLargeError, read_base64_json
+from src.core.image_processor import validate_image_buffer, validate_image_header, validate_base64_image_header
+from src.core.ndjson_export import stream_ndjson
+from src.core.notification_hub import notification_hub
+from src.core.webhooks import UnsafeCallbackError, is_valid_callback_url, resolve_callback_url
+from src.core.job_keys import KeySealError, check_api_key
+from src.core.job_queue import AsyncJobQueue, QueueFullError
+from src.core.kindwise_session import kindwise_breaker, kindwise_retry_budget, kindwise_sessions
+from src.core.metrics import CONTENT_TYPE, observe_queue_depth, registry, upload_read_seconds
+from src.core.record_cache import record_cache
+from src.core.result_cache import identification_cache
+from src.core.single_flight import upload_key_async
+from src.core.tracing import tracer
+from src.core.upload_spool import SpooledUpload, SpoolFullError, upload_spool
+from src.models.plant_model import (
+    BatchIdentificationResponse,
+    BatchStatusResult,
+    PlantIdentificationResponse,
+    PlantIdentificationResult,
+    PlantResult,
+)
+from src.models.image_request import BatchImageUploadRequest, ImageUploadRequest
+from src.db.async_db_service import AsyncDatabaseService, get_async_pool_stats
+from src.db.db_service import get_pool_stats, get_status_write_buffer
 from src.config import settings, get_api_key_from_headers
+import asyncio
 import base64
+import binascii
 
 router = APIRouter()
 
+# Fields that can be requested through the `fields` parameter of GET /identifications.
+IDENTIFICATION_FIELDS = {"result", "error_message"} | {
+    f"result.{name}" for name in PlantResult.model_fields
+}
+
+def get_db_service() -> AsyncDatabaseService:
+    """
+    Dependency providing an AsyncDatabaseService bound to the shared AsyncMongoClient.
+
+    Returns:
+        AsyncDatabaseService: The async database service.
+    """
+    return AsyncDatabaseService()
+
+def get_request_api_key(request: Request) -> str:
+    """
+    Returns the Kindwise API key to use for a request.
+
+    The key is taken from the request headers in the PRODUCTION environment and
+    from the settings otherwise.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: The API key.
+
+    Raises:
+        HTTPException: 401 if the key is missing from the headers, 500 if it cannot
+            be stored encrypted in the identification jobs.
+    """
+    if settings.environment != "PRODUCTION":
+        return settings.kindwise_api_key
+    try:
+        api_key = get_api_key_from_headers(request.headers)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    try:
+        check_api_key(api_key)
+    except KeySealError as e:
+        print(f"Error queueing identification: {e}")
+        raise HTTPException(status_code=500, detail="The server cannot accept caller API keys.")
+    return api_key
+
+async def read_image_upload(file: UploadFile):
+    """
+    Validates the image header of an uploaded file, then reads the whole file.
+
+    Files of at least `upload_spool_threshold_bytes` are copied to the upload spool
+    instead of being read into memory.
+
+    Args:
+        file (UploadFile): The uploaded image file.
+
+    Returns:
+        bytes | SpooledUpload: The file contents, or the spooled upload.
+
+    Raises:
+        ValueError: If the file is empty or not a valid image.
+        SpoolFullError: If the upload spool is full.
+    """
+    if not file.size:
+        raise ValueError("Empty file.")
+
+    # Validate the image header before buffering the whole upload
+    validate_image_header(file.file)
+    if upload_spool.should_spool(file.size):
+        return await asyncio.to_thread(upload_spool.write_stream, file.file)
+    await file.seek(0)
+    return await file.read()
+
+async def spool_image(image_data):
+    """
+    Writes a decoded upload of at least `upload_spool_threshold_bytes` to the upload spool.
+
+    Args:
+        image_data (bytes | memoryview): The decoded image data.
+
+    Returns:
+        bytes | memoryview | SpooledUpload: The image data, or the spooled upload.
+
+    Raises:
+        SpoolFullError: If the upload spool is full.
+    """
+    if upload_spool.should_spool(len(image_data)):
+        return await asyncio.to_thread(upload_spool.write_buffer, image_data)
+    return image_data
+
+def discard_uploads(images: list):
+    """
+    Deletes the spooled uploads among `images`, e.g. when their jobs could not be queued.
+    """
+    for image in images:
+        if isinstance(image, SpooledUpload):
+            upload_spool.remove(image)
+
+def spool_full_error(error: SpoolFullError) -> HTTPException:
+    """
+    Returns the 503 response of an upload rejected because the upload spool is full.
+    """
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(settings.queue_retry_after_seconds)},
+    )
+
+def decode_image_base64(image_base64: str) -> bytes:
+    """
+    Validates the image header of a base64-encoded image, then decodes the whole image.
+
+    Args:
+        image_base64 (str): The base64-encoded image.
+
+    Returns:
+        bytes: The decoded image data.
+
+    Raises:
+        ValueError: If the data is empty, not valid base64 or not a valid image.
+    """
+    if not image_base64:
+        raise ValueError("Empty image data.")
+
+    # Validate the image header before decoding the whole payload
+    try:
+        validate_base64_image_header(image_base64)
+        return base64.b64decode(image_base64)
+    except binascii.Error:
+        raise ValueError("Invalid base64-encoded image.")
+
+async def check_callback_url(callback_url: Optional[str]):
+    """
+    Verifies that a callback URL, when given, can receive webhooks.
+
+    Args:
+        callback_url (str): The callback URL supplied by the client.
+
+    Raises:
+        HTTPException: 400 if the URL is not an absolute http(s) URL, or its host
+            cannot be resolved or does not resolve to a public address.
+    """
+    if callback_url is None:
+        return
+    if not is_valid_callback_url(callback_url):
+        raise HTTPException(status_code=400, detail="Invalid callback URL.")
+    try:
+        await asyncio.to_thread(resolve_callback_url, callback_url)
+    except (UnsafeCallbackError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid callback URL.")
+
+def check_batch_size(count: int):
+    """
+    Verifies that a batch contains an acceptable number of images.
+
+    Args:
+        count (int): The number of images in the batch.
+
+    Raises:
+        HTTPException: 400 if the batch is empty or too large.
+    """
+    if not 0 < count <= settings.batch_max_images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must contain between 1 and {settings.batch_max_images} images.",
+        )
+
 @router.post("/identify", response_model=PlantIdentificationResponse)
 async def identify_plant(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    callback_url: Optional[str] = Form(None),
     request: Request = None,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
 ):
     """
     Endpoint to upload an image for plant identification.
 
     Args:
-        background_tasks (BackgroundTasks): FastAPI background tasks.
         file (UploadFile): The uploaded image file.
+        callback_url (str): Optional URL receiving a webhook when the identification finishes.
         request (Request): The incoming request.
+        db_service (AsyncDatabaseService): The async database service.
 
     Returns:
         PlantIdentificationResponse: The response containing the task ID.
 
     Raises:
-        HTTPException: If the uploaded file is not an image or authentication fails.
+        HTTPException: If the uploaded file is not a valid image, authentication fails or the queue or upload spool is full.
     """
     if not file.content_type.startswith("image/"):
         raise HTTPException(
             status_code=400, detail="Invalid file format. Please upload an image."
         )
 
-    # Extract API key from headers if in PRODUCTION environment
-    api_key = settings.kindwise_api_key
-    if settings.environment == "PRODUCTION":
-        try:
-            api_key = get_api_key_from_headers(request.headers)
-        except ValueError as e:
-            raise HTTPException(status_code=401, detail=str(e))
+    api_key = get_request_api_key(request)
+    await check_callback_url(callback_url)
 
-    # Read the file contents
-    file_contents = await file.read()
-    if not file_contents:
-        raise HTTPException(status_code=400, detail="Empty file.")
+    try:
+        with upload_read_seconds.time("multipart"):
+            file_contents = await read_image_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SpoolFullError as e:
+        raise spool_full_error(e)
 
     # Start the identification task
-    return await start_identification_task(background_tasks, file_contents, api_key)
+    return await start_identification_task(file_contents, api_key, db_service, callback_url)
 
-@router.post("/identify_base64", response_model=PlantIdentificationResponse)
+@router.post(
+    "/identify_base64",
+    response_model=PlantIdentificationResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ImageUploadRequest.model_json_schema()}},
+        }
+    },
+)
 async def identify_plant_base64(
-    background_tasks: BackgroundTasks,
-    image_request: ImageUploadRequest,
-    request: Request = None,
+    request: Request,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
 ):
     """
     Endpoint to upload a base64-encoded image for plant identification.
 
+    The body (an ImageUploadRequest) is read incrementally: `image_base64` is decoded
+    chunk by chunk into a single buffer of at most `upload_max_bytes`, so the encoded
+    payload is never held in memory as a whole.
+
     Args:
-        background_tasks (BackgroundTasks): FastAPI background tasks.
-        image_request (ImageUploadRequest): The request containing the base64 image.
-        request (Request): The incoming request.
+        request (Request): The incoming request carrying the ImageUploadRequest body.
+        db_service (AsyncDatabaseService): The async database service.
 
     Returns:
         PlantIdentificationResponse: The response containing the task ID.
 
     Raises:
-        HTTPException: If the base64-encoded image is invalid or authentication fails.
+        HTTPException: If the base64-encoded image is invalid or too large, authentication fails or the queue or upload spool is full.
+        RequestValidationError: If the body does not match ImageUploadRequest.
     """
-    # Extract API key from headers if in PRODUCTION environment
-    api_key = settings.kindwise_api_key
-    if settings.environment == "PRODUCTION":
-        try:
-            api_key = get_api_key_from_headers(request.headers)
-        except ValueError as e:
-            raise HTTPException(status_code=401, detail=str(e))
+    api_key = get_request_api_key(request)
 
-    # Decode the base64-encoded image
+    content_length = request.headers.get("content-length")
     try:
-        image_data = base64.b64decode(image_request.image_base64)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail="Invalid base64-encoded image.")
+        with upload_read_seconds.time("base64"):
+            fields, image_data = await read_base64_json(
+                request.stream(),
+                "image_base64",
+                max_bytes=settings.upload_max_bytes,
+                content_length=int(content_length) if content_length and content_length.isdigit() else None,
+            )
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        image_request = ImageUploadRequest.model_validate(fields)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False), body=fields)
+    await check_callback_url(image_request.callback_url)
 
-    if not image_data:
-        raise HTTPException(status_code=400, detail="Empty image data.")
+    try:
+        if not image_data:
+            raise ValueError("Empty image data.")
+        validate_image_buffer(image_data)
+        image_data = await spool_image(image_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SpoolFullError as e:
+        raise spool_full_error(e)
 
     # Start the identification task
-    return await start_identification_task(background_tasks, image_data, api_key)
+    return await start_identification_task(image_data, api_key, db_service, image_request.callback_url)
 
-async def start_identification_task(background_tasks: BackgroundTasks, image_data: bytes, api_key: str):
+async def start_identification_task(
+    image_data, api_key: str, db_service: AsyncDatabaseService, callback_url: str = None
+):
     """
-    Helper function to start the plant identification background task.
+    Helper function to queue a plant identification job.
+
+    A spooled upload is deleted again if the job cannot be queued.
 
     Args:
-        background_tasks (BackgroundTasks): FastAPI background tasks.
-        image_data (bytes): The image data.
+        image_data (bytes | memoryview | SpooledUpload): The image data.
         api_key (str): The API key for Kindwise.
+        db_service (AsyncDatabaseService): The async database service.
+        callback_url (str): Optional URL receiving a webhook when the identification finishes.
 
     Returns:
         PlantIdentificationResponse: The response containing the task ID.
+
+    Raises:
+        HTTPException: 503 if the identification queue is full.
     """
-    # Initialize database service
-    db_service = DatabaseService()
+    job_queue = AsyncJobQueue(db_service)
 
-    # Create a new identification entry in the database with status 'Processing'
-    identification_id = db_service.create_identification_record(status="Processing")
+    try:
+        with tracer.start_span("start_identification_task") as span:
+            # Reject before creating a record so a full queue leaves no orphaned entries
+            try:
+                await job_queue.check_capacity()
+            except QueueFullError as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(e),
+                    headers={"Retry-After": str(settings.queue_retry_after_seconds)},
+                )
 
-    # Submit the background task with the appropriate API key and identification ID
-    background_tasks.add_task(
-        identify_plant_task, image_data, api_key, identification_id
-    )
+            # Create a new identification entry in the database with status 'Processing'
+            identification_id = await db_service.create_identification_record(
+                status="Processing", content_hash=await upload_key_async(image_data)
+            )
+            span.set_attribute("identification.id", identification_id)
+
+            # Persist the job with the appropriate API key and identification ID
+            await job_queue.enqueue(identification_id, image_data, api_key, callback_url=callback_url)
+    except BaseException:
+        discard_uploads([image_data])
+        raise
 
     return PlantIdentificationResponse(
         message="Plant identification is in progress.",
         identification_id=str(identification_id),
     )
 
+@router.post("/identify_batch", response_model=BatchIdentificationResponse)
+async def identify_plant_batch(
+    files: List[UploadFile] = File(...),
+    request: Request = None,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
+    """
+    Endpoint to upload several images for plant identification in one request.
+
+    Args:
+        files (List[UploadFile]): The uploaded image files.
+        request (Request): The incoming request.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        BatchIdentificationResponse: The response containing the batch ID.
+
+    Raises:
+        HTTPException: If any uploaded file is not a valid image, authentication fails or the queue or upload spool is full.
+    """
+    api_key = get_request_api_key(request)
+    check_batch_size(len(files))
+
+    # Validate every image before creating any record
+    images = []
+    try:
+        for index, file in enumerate(files):
+            try:
+                if not file.content_type.startswith("image/"):
+                    raise ValueError("Invalid file format. Please upload an image.")
+                images.append(await read_image_upload(file))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Image {index}: {e}")
+            except SpoolFullError as e:
+                raise spool_full_error(e)
+    except BaseException:
+        discard_uploads(images)
+        raise
+
+    return await start_batch_identification(images, api_key, db_service)
+
+@router.post("/identify_batch_base64", response_model=BatchIdentificationResponse)
+async def identify_plant_batch_base64(
+    batch_request: BatchImageUploadRequest,
+    request: Request = None,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
+    """
+    Endpoint to upload several base64-encoded images for plant identification in one request.
+
+    Args:
+        batch_request (BatchImageUploadRequest): The request containing the base64 images.
+        request (Request): The incoming request.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        BatchIdentificationResponse: The response containing the batch ID.
+
+    Raises:
+        HTTPException: If any image is invalid, authentication fails or the queue or upload spool is full.
+    """
+    api_key = get_request_api_key(request)
+    check_batch_size(len(batch_request.images_base64))
+
+    # Validate every image before creating any record
+    images = []
+    try:
+        for index, image_base64 in enumerate(batch_request.images_base64):
+            try:
+                images.append(await spool_image(decode_image_base64(image_base64)))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Image {index}: {e}")
+            except SpoolFullError as e:
+                raise spool_full_error(e)
+    except BaseException:
+        discard_uploads(images)
+        raise
+
+    return await start_batch_identification(images, api_key, db_service)
+
+async def start_batch_identification(images: list, api_key: str, db_service: AsyncDatabaseService):
+    """
+    Helper function to queue the identification jobs of a batch.
+
+    Records and jobs are each created with a single `insert_many`. At most
+    `batch_max_parallelism` jobs of the batch are processed at once. Spooled
+    uploads are deleted again if the jobs cannot be queued.
+
+    Args:
+        images (list): The image data or spooled upload of every image in the batch.
+        api_key (str): The API key for Kindwise.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        BatchIdentificationResponse: The response containing the batch and task IDs.
+
+    Raises:
+        HTTPException: 503 if the identification queue cannot hold the batch.
+    """
+    job_queue = AsyncJobQueue(db_service)
+
+    try:
+        with tracer.start_span("start_batch_identification", attributes={"batch.size": len(images)}) as span:
+            try:
+                await job_queue.check_capacity(len(images))
+            except QueueFullError as e:
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(e),
+                    headers={"Retry-After": str(settings.queue_retry_after_seconds)},
+                )
+
+            batch_id = str(ObjectId())
+            span.set_attribute("batch.id", batch_id)
+            content_hashes = [await upload_key_async(image) for image in images]
+            identification_ids = await db_service.create_identification_records(
+                len(images), batch_id, status="Processing", content_hashes=content_hashes
+            )
+            await job_queue.enqueue_batch(
+                batch_id, identification_ids, images, api_key, settings.batch_max_parallelism
+            )
+    except BaseException:
+        discard_uploads(images)
+        raise
+
+    return BatchIdentificationResponse(
+        message="Plant identification is in progress.",
+        batch_id=batch_id,
+        identification_ids=identification_ids,
+    )
+
+@router.get("/batches/{batch_id}", response_model=BatchStatusResult)
+async def get_batch_status(batch_id: str, db_service: AsyncDatabaseService = Depends(get_db_service)):
+    """
+    Endpoint to retrieve the status of every identification of a batch.
+
+    Args:
+        batch_id (str): The ID of the batch.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        BatchStatusResult: The per-status counts and the identifications of the batch.
+
+    Raises:
+        HTTPException: If the batch is not found.
+    """
+    identifications = await db_service.get_batch_identifications(batch_id)
+    if not identifications:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return BatchStatusResult(
+        batch_id=batch_id,
+        total=len(identifications),
+        status_counts=Counter(identification["status"] for identification in identifications),
+        identifications=identifications,
+    )
+
 @router.get("/identifications", response_model=List[PlantIdentificationResult])
-async def get_all_identifications():
+async def get_all_identifications(
+    response: Response,
+    limit: int = Query(settings.identifications_page_size, ge=1, le=settings.identifications_max_page_size),
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    plant_name: Optional[str] = None,
+    content_hash: Optional[str] = None,
+    fields: Optional[str] = None,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
     """
-    Endpoint to retrieve all past plant identifications from the database.
+    Endpoint to retrieve past plant identifications from the database, newest first.
+
+    Results are paginated: when a full page is returned, the `X-Next-Cursor` response
+    header holds the value to pass as `after` to fetch the next page.
+
+    Args:
+        response (Response): The outgoing response, used to set the cursor header.
+        limit (int): Maximum number of identifications to return.
+        after (str): Cursor returned by the previous page.
+        status (str): Only return identifications with this status.
+        created_after (datetime): Only return identifications created at or after this time.
+        created_before (datetime): Only return identifications created before this time.
+        plant_name (str): Only return identifications of this plant.
+        content_hash (str): Only return identifications of uploads with this SHA-256 hex digest.
+        fields (str): Comma-separated fields to return besides `_id` and `status`.
+        db_service (AsyncDatabaseService): The async database service.
 
     Returns:
         List[PlantIdentificationResult]: List of identification results.
+
+    Raises:
+        HTTPException: If the cursor or the requested fields are invalid.
     """
-    db_service = DatabaseService()
-    identifications = db_service.get_identifications()
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    projection = None
+    if fields:
+        projection = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = sorted(set(projection) - IDENTIFICATION_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}.")
+
+    identifications = await db_service.get_identifications(
+        limit=limit,
+        after=after,
+        status=status,
+        created_after=created_after,
+        created_before=created_before,
+        fields=projection,
+        plant_name=plant_name,
+        content_hash=content_hash,
+    )
+    if len(identifications) == limit:
+        response.headers["X-Next-Cursor"] = identifications[-1]["_id"]
     return identifications
 
+@router.get("/identifications/export")
+async def export_identifications(
+    after: Optional[str] = None,
+    status: Optional[str] = None,
+    gzip: bool = False,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
+    """
+    Endpoint streaming the identification history as NDJSON, oldest first.
+
+    Documents are streamed straight from a MongoDB cursor, so memory use stays flat
+    regardless of the collection size. An interrupted export is resumed by passing
+    the `_id` of the last received line as `after`.
+
+    Args:
+        after (str): Only export identifications newer than this ID.
+        status (str): Only export identifications with this status.
+        gzip (bool): Whether to gzip the response body.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        StreamingResponse: One JSON identification document per line.
+
+    Raises:
+        HTTPException: If the resume ID is invalid.
+    """
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    documents = db_service.iter_identifications(
+        after=after, status=status, batch_size=settings.export_batch_size
+    )
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(
+        stream_ndjson(documents, compress=gzip, chunk_size=settings.export_chunk_bytes),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
 @router.get("/identifications/{id}", response_model=PlantIdentificationResult)
-async def get_identification_by_id(id: str):
+async def get_identification_by_id(
+    id: str,
+    wait: float = Query(0, ge=0, le=settings.notify_max_wait_seconds),
+    if_none_match: Optional[str] = Header(None),
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
     """
     Endpoint to retrieve a specific plant identification result by ID.
 
+    With `wait`, the request is held open until the identification leaves the
+    `Processing` status or `wait` seconds have passed (long-poll).
+
+    Finished identifications never change, so they are served from the record cache
+    with an ETag; a matching `If-None-Match` is answered with `304 Not Modified`
+    without reading MongoDB.
+
     Args:
         id (str): The identification ID.
+        wait (float): Maximum number of seconds to wait for the result.
+        if_none_match (str): ETags of the representations the client already has.
+        db_service (AsyncDatabaseService): The async database service.
 
     Returns:
         PlantIdentificationResult: The identification result.
@@ -151,8 +657,246 @@ async def get_identification_by_id(id: str):
     Raises:
         HTTPException: If the identification is not found.
     """
-    db_service = DatabaseService()
-    identification = db_service.get_identification_by_id(id)
+    entry = await record_cache.get_async(id)
+    if entry is None:
+        if wait:
+            identification = await wait_for_identification(db_service, id, wait)
+        else:
+            identification = await db_service.get_identification_by_id(id)
+        if identification is None:
+            raise HTTPException(status_code=404, detail="Identification not found.")
+        entry = await record_cache.put_async(identification)
+        if entry is None:
+            return identification
+
+    body, etag = entry
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks an `If-None-Match` header against an ETag, using the weak comparison of RFC 9110.
+
+    Args:
+        if_none_match (str): The header value.
+        etag (str): The current ETag.
+
+    Returns:
+        bool: Whether the client's representation is current.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+@router.get("/identifications/{id}/events")
+async def stream_identification_events(
+    id: str,
+    request: Request,
+    db_service: AsyncDatabaseService = Depends(get_db_service),
+):
+    """
+    Endpoint streaming the status transitions of an identification as server-sent events.
+
+    A `status` event carrying the identification is sent immediately and on every
+    status change; the stream ends once the identification leaves `Processing`.
+
+    Args:
+        id (str): The identification ID.
+        request (Request): The incoming request, used to detect disconnected clients.
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` response.
+
+    Raises:
+        HTTPException: If the identification is not found.
+    """
+    identification = await db_service.get_identification_by_id(id)
     if identification is None:
         raise HTTPException(status_code=404, detail="Identification not found.")
-    return identification
+
+    return StreamingResponse(
+        identification_events(db_service, id, identification, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+async def wait_for_identification(db_service: AsyncDatabaseService, id: str, timeout: float):
+    """
+    Reads an identification, waiting up to `timeout` seconds for it to leave `Processing`.
+
+    Args:
+        db_service (AsyncDatabaseService): The async database service.
+        id (str): The identification ID.
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        dict: The identification document, or None if it does not exist.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Subscribe before reading so an update between the read and the wait is not missed
+    with notification_hub.subscribe(id) as updated:
+        while True:
+            updated.clear()
+            identification = await db_service.get_identification_by_id(id)
+            remaining = deadline - loop.time()
+            if identification is None or identification["status"] != "Processing" or remaining <= 0:
+                return identification
+            interval = notification_hub.poll_interval
+            try:
+                await asyncio.wait_for(updated.wait(), min(remaining, interval or remaining))
+            except asyncio.TimeoutError:
+                pass
+
+async def identification_events(db_service: AsyncDatabaseService, id: str, identification: dict, request: Request):
+    """
+    Yields server-sent events for the status transitions of an identification.
+
+    Args:
+        db_service (AsyncDatabaseService): The async database service.
+        id (str): The identification ID.
+        identification (dict): The identification as first read.
+        request (Request): The incoming request, used to detect disconnected clients.
+
+    Yields:
+        str: The next `status` event or keep-alive comment.
+    """
+    with notification_hub.subscribe(id) as updated:
+        status = None
+        while True:
+            if identification is not None and identification["status"] != status:
+                status = identification["status"]
+                data = PlantIdentificationResult.model_validate(identification).model_dump_json(by_alias=True)
+                yield f"event: status\ndata: {data}\n\n"
+            if identification is None or status != "Processing":
+                return
+
+            interval = notification_hub.poll_interval
+            timeout = min(settings.sse_heartbeat_seconds, interval or settings.sse_heartbeat_seconds)
+            try:
+                await asyncio.wait_for(updated.wait(), timeout)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+            updated.clear()
+            identification = await db_service.get_identification_by_id(id)
+
+@router.get("/metrics")
+async def get_metrics(db_service: AsyncDatabaseService = Depends(get_db_service)):
+    """
+    Endpoint exposing the metrics of this process in the Prometheus text format.
+
+    Args:
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        Response: Latency histograms, in-flight gauges and the queue depth.
+    """
+    try:
+        observe_queue_depth(await AsyncJobQueue(db_service).stats())
+    except Exception as e:
+        print(f"Error reading queue depth: {e}")
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    """
+    Endpoint to retrieve the identification result cache counters.
+
+    Returns:
+        dict: Hit and miss counters of the result cache.
+    """
+    return identification_cache.stats()
+
+@router.get("/stats/cache/records")
+async def get_record_cache_stats():
+    """
+    Endpoint to retrieve the counters of the cache of finished identifications.
+
+    Returns:
+        dict: Cached records and hit and miss counters of each tier.
+    """
+    return record_cache.stats()
+
+@router.get("/stats/uploads/spool")
+async def get_upload_spool_stats():
+    """
+    Endpoint to retrieve the disk usage of the upload spool.
+
+    Returns:
+        dict: The spool configuration, the size of the spooled uploads and the counters of this process.
+    """
+    return await asyncio.to_thread(upload_spool.stats)
+
+@router.get("/stats/tracing")
+async def get_tracing_stats():
+    """
+    Endpoint to retrieve the sampling rate and the span export counters of this process.
+
+    Returns:
+        dict: The tracing configuration and the exported, dropped and queued spans.
+    """
+    return tracer.stats()
+
+@router.get("/stats/queue")
+async def get_queue_stats(db_service: AsyncDatabaseService = Depends(get_db_service)):
+    """
+    Endpoint to retrieve the identification queue depth.
+
+    Args:
+        db_service (AsyncDatabaseService): The async database service.
+
+    Returns:
+        dict: The number of queued and running jobs.
+    """
+    return await AsyncJobQueue(db_service).stats()
+
+@router.get("/stats/kindwise")
+async def get_kindwise_stats():
+    """
+    Endpoint to retrieve Kindwise session statistics of this process.
+
+    Returns:
+        dict: Request counts, handshakes, connection reuse and latency per API key.
+    """
+    return kindwise_sessions.stats()
+
+@router.get("/stats/kindwise/circuit")
+async def get_kindwise_circuit_stats():
+    """
+    Endpoint to retrieve the Kindwise circuit breaker state of this process.
+
+    Returns:
+        dict: The breaker state with its sliding-window statistics, and the retry budget.
+    """
+    return {
+        "enabled": settings.kindwise_breaker_enabled,
+        "breaker": kindwise_breaker.snapshot(),
+        "retry_budget": kindwise_retry_budget.snapshot(),
+    }
+
+@router.get("/stats/db")
+async def get_db_stats():
+    """
+    Endpoint to retrieve MongoDB connection pool statistics.
+
+    Returns:
+        dict: Pool configuration and connection counters of the sync and async clients.
+    """
+    return {"sync": get_pool_stats(), "async": get_async_pool_stats()}
+
+@router.get("/stats/db/writes")
+async def get_db_write_stats():
+    """
+    Endpoint to retrieve the status write buffer statistics of this process.
+
+    Returns:
+        dict: The write mode and, while buffering, the pending writes and flush counters.
+    """
+    buffer = get_status_write_buffer()
+    if buffer is None:
+        return {"mode": "sync"}
+    return {"mode": "buffered", **buffer.stats()}
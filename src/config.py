@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,6 +6,162 @@ class Settings(BaseSettings):
     mongo_url: str
     kindwise_api_key: str = None
 
+    # MongoDB connection pool
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: Optional[int] = None
+    mongo_connect_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_wait_queue_timeout_ms: Optional[int] = None
+
+    # Identification listing
+    identifications_page_size: int = 100
+    identifications_max_page_size: int = 1000
+    export_batch_size: int = 1000
+    export_chunk_bytes: int = 64 * 1024
+
+    # Result delivery (long-poll and server-sent events)
+    notify_max_wait_seconds: float = 30.0
+    notify_poll_interval_seconds: float = 2.0
+    notify_change_streams: bool = True
+    sse_heartbeat_seconds: float = 15.0
+
+    # Kindwise API client
+    kindwise_host: Optional[str] = None
+    kindwise_timeout_seconds: float = 60.0
+    kindwise_connect_timeout_seconds: float = 5.0
+    kindwise_max_connections: int = 20
+    kindwise_max_keepalive_connections: int = 10
+    kindwise_keepalive_expiry_seconds: float = 60.0
+    kindwise_session_registry_size: int = 64
+    kindwise_max_concurrency_per_key: int = 32
+    kindwise_rate_per_second: float = 10.0
+    kindwise_rate_burst: int = 20
+    # Circuit breaker and retries around Kindwise calls
+    kindwise_breaker_enabled: bool = True
+    kindwise_breaker_window_seconds: float = 60.0
+    kindwise_breaker_min_calls: int = 20
+    kindwise_breaker_failure_rate: float = 0.5
+    kindwise_breaker_slow_call_seconds: float = 30.0
+    kindwise_breaker_slow_call_rate: float = 0.8
+    kindwise_breaker_open_seconds: float = 30.0
+    kindwise_breaker_half_open_probes: int = 1
+    kindwise_retry_max_attempts: int = 3
+    kindwise_retry_backoff_base_seconds: float = 0.5
+    kindwise_retry_backoff_max_seconds: float = 8.0
+    kindwise_retry_budget_ratio: float = 0.2
+    kindwise_retry_budget_max_tokens: float = 10.0
+
+    # Identification result cache
+    result_cache_enabled: bool = True
+    result_cache_max_size: int = 1024
+    result_cache_ttl_seconds: int = 7 * 24 * 3600
+
+    # Read-through cache of finished identifications served by GET /identifications/{id}
+    record_cache_max_entries: int = 50_000
+    # Optional Redis-compatible tier shared by all processes (needs the redis package)
+    record_cache_redis_url: Optional[str] = None
+    record_cache_redis_ttl_seconds: int = 7 * 24 * 3600
+    record_cache_redis_timeout_seconds: float = 0.05
+
+    # Perceptual-hash near-duplicate lookup
+    phash_enabled: bool = True
+    phash_max_distance: int = 6
+    phash_min_probability: float = 0.8
+    phash_index_max_entries: int = 100_000
+    phash_index_refresh_seconds: int = 60
+
+    # Identification records
+    # Records still processing after this long are removed by a TTL index
+    identification_processing_ttl_seconds: int = 24 * 3600
+    # Taxa (common names and taxonomy of a species) cached per process
+    taxon_cache_max_entries: int = 10_000
+
+    # Identification status writes
+    # "sync" writes every status update immediately; "buffered" makes workers collect
+    # updates and completed jobs and write them with one bulk_write per batch
+    status_write_mode: str = "sync"
+    status_write_batch_size: int = 500
+    status_write_flush_interval_seconds: float = 0.2
+
+    # Identification job queue
+    queue_max_depth: int = 10_000
+    queue_visibility_timeout_seconds: int = 300
+    queue_max_attempts: int = 3
+    queue_retry_after_seconds: int = 5
+    # Worker threads run inside the API process, so a single deployed image processes
+    # its own queue; set to 0 when standalone `python -m src.worker` processes run
+    queue_embedded_workers: int = 2
+    # Fernet key encrypting caller-supplied Kindwise API keys in job documents (needs the
+    # cryptography package); jobs using `kindwise_api_key` only store a reference to it
+    job_key_secret: Optional[str] = None
+    worker_concurrency: int = 4
+    worker_poll_interval_seconds: float = 1.0
+    # "async" runs identifications as coroutines waiting on Kindwise without holding a thread
+    worker_mode: str = "threads"
+    worker_async_concurrency: int = 256
+
+    # Webhook callbacks
+    webhook_enabled: bool = True
+    webhook_concurrency: int = 16
+    webhook_host_rate_per_second: float = 5.0
+    webhook_host_burst: int = 10
+    webhook_batch_max: int = 100
+    webhook_coalesce_seconds: float = 1.0
+    webhook_max_attempts: int = 8
+    webhook_backoff_base_seconds: float = 2.0
+    webhook_backoff_max_seconds: float = 600.0
+    webhook_timeout_seconds: float = 10.0
+    webhook_lease_seconds: int = 60
+    webhook_poll_interval_seconds: float = 1.0
+    # Callback hosts accepted without the public address check (e.g. ["hooks.internal"]);
+    # when set, callbacks to any other host are refused
+    webhook_allowed_hosts: list = []
+    # Maximum number of hosts whose rate limit is tracked; the least recently used are dropped
+    webhook_rate_limited_hosts: int = 10_000
+
+    # Batch identification
+    batch_max_images: int = 200
+    batch_max_parallelism: int = 8
+
+    # Uploads
+    # Maximum decoded size of an uploaded image; larger uploads are rejected with 413
+    upload_max_bytes: int = 20 * 1024 * 1024
+    # Uploads of at least `upload_spool_threshold_bytes` are written to `upload_spool_dir`
+    # and jobs reference the file; API and workers must share the directory (None disables it)
+    upload_spool_dir: Optional[str] = None
+    upload_spool_threshold_bytes: int = 1024 * 1024
+    upload_spool_quota_bytes: int = 2 * 1024 * 1024 * 1024
+    upload_spool_max_age_seconds: int = 24 * 3600
+
+    # Metrics
+    # Port of the `/metrics` endpoint of the standalone worker (the API serves it on its own port)
+    worker_metrics_port: Optional[int] = None
+
+    # Tracing
+    # Fraction of new requests whose trace is recorded (0 disables tracing); traces
+    # continued from a `traceparent` header keep the caller's decision
+    tracing_sample_rate: float = 0.0
+    # Spans are appended as OTLP/JSON lines; `{pid}` is replaced by the process ID
+    tracing_export_path: Optional[str] = "traces-{pid}.jsonl"
+    tracing_export_queue_size: int = 10_000
+    tracing_service_name: str = "zelara-api"
+
+    # Image encoding
+    # The defaults produce the same bytes as before these settings existed, so result
+    # cache keys stay valid; "JPEG" or "WEBP" without PNG optimization is much faster
+    image_output_format: str = "PNG"
+    image_quality: Optional[int] = None
+    image_png_optimize: bool = True
+    image_jpeg_draft: bool = False
+    image_passthrough: bool = False
+    image_max_pixels: int = 40_000_000
+
+    # Image preprocessing process pool (0 workers runs preprocessing inline)
+    preprocess_workers: Optional[int] = None
+    preprocess_max_in_flight: Optional[int] = None
+    preprocess_worker_nice: int = 5
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,261 @@
+import binascii
+import json
+from typing import AsyncIterable, Optional, Tuple
+
+# JSON escapes that may appear inside a base64 value: an escaped slash and line breaks
+BASE64_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b""}
+# Maximum size of the JSON body outside the image value
+MAX_FIELDS_BYTES = 64 * 1024
+# Largest decode buffer allocated before any data arrived
+INITIAL_CAPACITY = 1024 * 1024
+
+
+class ImageTooLargeError(ValueError):
+    def __init__(self, max_bytes: int):
+        """
+        Raised when a decoded upload exceeds the configured maximum size.
+
+        Args:
+            max_bytes (int): The maximum size in bytes.
+        """
+        super().__init__(f"Image is too large. The maximum size is {max_bytes} bytes.")
+        self.max_bytes = max_bytes
+
+
+class Base64Decoder:
+    def __init__(self, max_bytes: int, size_hint: int = None):
+        """
+        Initializes an incremental base64 decoder writing into a single buffer.
+
+        Decoding never holds the encoded payload and a second decoded copy at the
+        same time. The buffer starts at no more than INITIAL_CAPACITY and grows
+        geometrically as data arrives, up to the size implied by `size_hint` (e.g.
+        the request Content-Length), so a client announcing a large body cannot make
+        the server allocate memory it never sends.
+
+        Args:
+            max_bytes (int): Maximum number of decoded bytes.
+            size_hint (int): Upper bound of the encoded size, if known.
+        """
+        self.max_bytes = max_bytes
+        self._capacity_limit = max_bytes + 3
+        if size_hint:
+            self._capacity_limit = min((size_hint * 3) // 4 + 3, self._capacity_limit)
+        self.buffer = bytearray(min(INITIAL_CAPACITY, self._capacity_limit))
+        self.size = 0
+        self._pending = b""
+        self._padded = False
+
+    def feed(self, data: bytes):
+        """
+        Decodes the next part of the base64 text.
+
+        Args:
+            data (bytes): Base64 characters, without whitespace.
+
+        Raises:
+            ValueError: If the data is not valid base64.
+            ImageTooLargeError: If the decoded data exceeds `max_bytes`.
+        """
+        if not data:
+            return
+        if self._padded:
+            raise ValueError("Invalid base64-encoded image.")
+        data = self._pending + data
+        complete = len(data) - len(data) % 4
+        self._pending = data[complete:]
+        if complete:
+            self._decode(data[:complete])
+
+    def finish(self) -> memoryview:
+        """
+        Decodes the remaining characters and returns the decoded data.
+
+        Returns:
+            memoryview: The decoded bytes, a view on the buffer.
+
+        Raises:
+            ValueError: If the base64 text was truncated.
+        """
+        if self._pending:
+            raise ValueError("Invalid base64-encoded image.")
+        return memoryview(self.buffer)[: self.size]
+
+    def _decode(self, quads: bytes):
+        try:
+            decoded = binascii.a2b_base64(quads, strict_mode=True)
+        except binascii.Error:
+            raise ValueError("Invalid base64-encoded image.")
+        self._padded = quads.endswith(b"=")
+
+        end = self.size + len(decoded)
+        if end > self.max_bytes:
+            raise ImageTooLargeError(self.max_bytes)
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end, min(2 * len(self.buffer), self._capacity_limit)) - len(self.buffer)))
+        self.buffer[self.size:end] = decoded
+        self.size = end
+
+
+class Base64FieldScanner:
+    def __init__(self, field: str, decoder: Base64Decoder):
+        """
+        Initializes a scanner extracting one base64 string field from a streamed JSON object.
+
+        The value of the top-level `field` is decoded as it arrives and replaced by an
+        empty string in the rest of the document, which stays small and is parsed
+        with `json` once complete.
+
+        Args:
+            field (str): The name of the base64 field.
+            decoder (Base64Decoder): The decoder receiving the field value.
+        """
+        self.key = json.dumps(field).encode("utf-8")
+        self.decoder = decoder
+        self.fields = bytearray()
+        self.found = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_key = None
+        self._awaiting_value = False
+        self._in_value = False
+        self._value_escaped = False
+
+    def feed(self, chunk: bytes):
+        """
+        Scans the next chunk of the request body.
+
+        Raises:
+            ValueError: If the body outside the field is too large, or the field is not valid base64.
+        """
+        position = 0
+        while position < len(chunk):
+            if self._in_value:
+                position = self._scan_value(chunk, position)
+            else:
+                position = self._scan_fields(chunk, position)
+
+    def finish(self) -> Tuple[dict, Optional[memoryview]]:
+        """
+        Parses the rest of the document.
+
+        Returns:
+            tuple: The JSON document with the field set to "", and the decoded field
+                value or None if the field was not a string.
+
+        Raises:
+            ValueError: If the document is not valid JSON or the field value is truncated.
+        """
+        if self._in_value:
+            raise ValueError("Invalid JSON body.")
+        try:
+            document = json.loads(self.fields)
+        except ValueError:
+            raise ValueError("Invalid JSON body.")
+        if not isinstance(document, dict):
+            raise ValueError("Invalid JSON body.")
+        return document, self.decoder.finish() if self.found else None
+
+    def _scan_value(self, chunk: bytes, position: int) -> int:
+        if self._value_escaped:
+            self._value_escaped = False
+            replacement = BASE64_ESCAPES.get(chunk[position])
+            if replacement is None:
+                raise ValueError("Invalid base64-encoded image.")
+            self.decoder.feed(replacement)
+            return position + 1
+
+        quote = chunk.find(b'"', position)
+        backslash = chunk.find(b"\\", position, quote if quote >= 0 else len(chunk))
+        end = backslash if backslash >= 0 else quote if quote >= 0 else len(chunk)
+        self.decoder.feed(chunk[position:end])
+        if end == backslash:
+            self._value_escaped = True
+            return end + 1
+        if end == quote:
+            self._in_value = False
+            self._append(b'"')
+            return end + 1
+        return end
+
+    def _scan_fields(self, chunk: bytes, position: int) -> int:
+        start = position
+        while position < len(chunk):
+            byte = chunk[position]
+            position += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif byte == 0x5C:  # backslash
+                    self._escaped = True
+                elif byte == 0x22:  # quote
+                    self._in_string = False
+                    self._append(chunk[start:position])
+                    start = position
+                    self._last_key = bytes(self.fields[self._string_start:])
+                continue
+
+            if byte == 0x22:
+                if self._awaiting_value and self._depth == 1 and not self.found:
+                    # The value of the base64 field: stream it to the decoder
+                    self._append(chunk[start:position])
+                    self._awaiting_value = False
+                    self._in_value = True
+                    self.found = True
+                    return position
+                self._append(chunk[start:position - 1])
+                start = position - 1
+                self._string_start = len(self.fields)
+                self._in_string = True
+                self._awaiting_value = False
+            elif byte in b"{[":
+                self._depth += 1
+                self._awaiting_value = False
+            elif byte in b"}]":
+                self._depth -= 1
+                self._awaiting_value = False
+            elif byte == 0x3A:  # colon
+                self._awaiting_value = self._depth == 1 and self._last_key == self.key
+            elif byte not in b" \t\r\n":
+                self._awaiting_value = False
+        self._append(chunk[start:position])
+        return position
+
+    def _append(self, data: bytes):
+        self.fields += data
+        if len(self.fields) > MAX_FIELDS_BYTES:
+            raise ValueError("Invalid JSON body.")
+
+
+async def read_base64_json(
+    chunks: AsyncIterable, field: str, max_bytes: int, content_length: int = None
+) -> Tuple[dict, Optional[memoryview]]:
+    """
+    Reads a JSON request body incrementally, decoding one base64 field into a single buffer.
+
+    Peak memory is about the decoded size plus one network chunk, instead of the raw
+    body, the parsed string and the decoded copy held at the same time.
+
+    Args:
+        chunks (AsyncIterable): The request body chunks, e.g. `request.stream()`.
+        field (str): The name of the top-level base64 string field.
+        max_bytes (int): Maximum number of decoded bytes.
+        content_length (int): The request Content-Length, if known.
+
+    Returns:
+        tuple: The JSON document with the field set to "", and the decoded field value
+            (None if the field was missing or not a string).
+
+    Raises:
+        ImageTooLargeError: If the request or the decoded value is too large.
+        ValueError: If the body is not valid JSON or the field is not valid base64.
+    """
+    if content_length is not None and content_length > (max_bytes // 3 + 1) * 4 + MAX_FIELDS_BYTES:
+        raise ImageTooLargeError(max_bytes)
+
+    scanner = Base64FieldScanner(field, Base64Decoder(max_bytes, size_hint=content_length))
+    async for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.finish()
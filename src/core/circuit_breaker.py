@@ -0,0 +1,266 @@
+import random
+import threading
+import time
+from collections import deque
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        """
+        Raised instead of calling a dependency whose circuit breaker is open.
+
+        Args:
+            name (str): The name of the dependency.
+            retry_after (float): Seconds until the breaker lets a probe call through.
+        """
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f} seconds.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        half_open_probes: int = 1,
+    ):
+        """
+        Initializes a circuit breaker tracking failures and latency over a sliding window.
+
+        The breaker opens when at least `min_calls` calls finished in the last
+        `window_seconds` and either the share of failed calls reaches `failure_rate`
+        or the share of calls slower than `slow_call_seconds` reaches `slow_call_rate`.
+        While open, calls are rejected with CircuitOpenError. After `open_seconds`
+        the breaker is half-open and lets `half_open_probes` calls through; the
+        first probe to succeed closes it, a failed probe opens it again.
+
+        Safe to use from several threads and event loops.
+
+        Args:
+            name (str): The name of the dependency, used in messages.
+            window_seconds (float): Length of the sliding window.
+            min_calls (int): Minimum number of calls in the window before the breaker can open.
+            failure_rate (float): Share of failed calls that opens the breaker.
+            slow_call_seconds (float): Latency above which a call counts as slow.
+            slow_call_rate (float): Share of slow calls that opens the breaker.
+            open_seconds (float): Seconds the breaker stays open before probing.
+            half_open_probes (int): Maximum number of probe calls in flight while half-open.
+        """
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._state = CIRCUIT_CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._rejected = 0
+        self._transitions = {CIRCUIT_OPEN: 0, CIRCUIT_HALF_OPEN: 0, CIRCUIT_CLOSED: 0}
+
+    @property
+    def state(self) -> str:
+        """
+        Returns the current state, moving from open to half-open once `open_seconds` passed.
+        """
+        with self._lock:
+            self._refresh_state(time.monotonic())
+            return self._state
+
+    def before_call(self):
+        """
+        Admits a call or rejects it while the breaker is open.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with all probes in flight.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_state(now)
+            if self._state == CIRCUIT_CLOSED:
+                return
+            if self._state == CIRCUIT_HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return
+            self._rejected += 1
+            raise CircuitOpenError(self.name, self._retry_after(now))
+
+    def record(self, latency_seconds: float, failed: bool):
+        """
+        Records the outcome of an admitted call.
+
+        Args:
+            latency_seconds (float): The call latency.
+            failed (bool): Whether the call failed in a way that indicates the dependency is unhealthy.
+        """
+        now = time.monotonic()
+        slow = latency_seconds >= self.slow_call_seconds
+        with self._lock:
+            self._refresh_state(now)
+            if self._state == CIRCUIT_HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._transition(CIRCUIT_OPEN, now)
+                else:
+                    self._transition(CIRCUIT_CLOSED, now)
+                return
+
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+            if self._state == CIRCUIT_CLOSED and self._should_open():
+                self._transition(CIRCUIT_OPEN, now)
+
+    def release(self):
+        """
+        Releases an admitted call that ended without an outcome, e.g. because it was cancelled.
+        """
+        with self._lock:
+            if self._state == CIRCUIT_HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def retry_after(self) -> float:
+        """
+        Returns the seconds until the breaker lets a probe through, or 0 if it is not open.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_state(now)
+            return self._retry_after(now)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the breaker state and the statistics of the current window.
+
+        Returns:
+            dict: State, window call, failure and slow-call counts and rates, rejected
+                calls and the number of transitions into each state.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refresh_state(now)
+            self._prune(now)
+            calls = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, slow in self._calls if slow)
+            return {
+                "state": self._state,
+                "retry_after_seconds": self._retry_after(now),
+                "window_calls": calls,
+                "window_failures": failures,
+                "window_slow_calls": slow_calls,
+                "failure_rate": failures / calls if calls else 0.0,
+                "slow_call_rate": slow_calls / calls if calls else 0.0,
+                "rejected": self._rejected,
+                "transitions": dict(self._transitions),
+            }
+
+    def _should_open(self) -> bool:
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return False
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        return failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate
+
+    def _refresh_state(self, now: float):
+        if self._state == CIRCUIT_OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(CIRCUIT_HALF_OPEN, now)
+
+    def _transition(self, state: str, now: float):
+        self._state = state
+        self._transitions[state] += 1
+        if state == CIRCUIT_OPEN:
+            self._opened_at = now
+            self._probes = 0
+            print(f"{self.name} circuit breaker opened for {self.open_seconds} seconds.")
+        elif state == CIRCUIT_CLOSED:
+            # Calls from before the outage must not reopen the breaker
+            self._calls.clear()
+            print(f"{self.name} circuit breaker closed.")
+
+    def _retry_after(self, now: float) -> float:
+        if self._state != CIRCUIT_OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (now - self._opened_at))
+
+    def _prune(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+
+class RetryBudget:
+    def __init__(self, ratio: float, max_tokens: float):
+        """
+        Initializes a budget limiting retries to a share of the calls.
+
+        Every first attempt deposits `ratio` tokens and every retry spends one, so
+        retries add at most `ratio` extra load to a struggling dependency instead
+        of multiplying it.
+
+        Args:
+            ratio (float): Retries allowed per first attempt.
+            max_tokens (float): Maximum number of tokens saved up, which bounds retry bursts.
+        """
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        """
+        Records a first attempt.
+        """
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Takes a token for a retry.
+
+        Returns:
+            bool: Whether the retry is within budget.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                self.exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def snapshot(self) -> dict:
+        """
+        Returns the available tokens and retry counters.
+        """
+        with self._lock:
+            return {"tokens": self._tokens, "retries": self.retries, "exhausted": self.exhausted}
+
+
+def retry_backoff_seconds(attempt: int, base: float, maximum: float) -> float:
+    """
+    Returns the "full jitter" delay before retry number `attempt` (starting at 1).
+
+    Args:
+        attempt (int): The number of the retry.
+        base (float): The delay bound of the first retry.
+        maximum (float): The maximum delay bound.
+
+    Returns:
+        float: A random delay between 0 and the exponentially growing bound.
+    """
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
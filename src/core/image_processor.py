@@ -1,62 +1,372 @@
 from PIL import Image, UnidentifiedImageError
+from typing import BinaryIO, Optional, Tuple
+from src.config import settings
+import base64
 import io
+import os
+import time
 
 # Configure logging
 SUPPORTED_FORMATS = ["JPEG", "PNG", "GIF"]
+OUTPUT_FORMATS = ["JPEG", "WEBP", "PNG"]
+PASSTHROUGH_FORMATS = ["JPEG", "PNG"]
 MAX_SIZE = (1500, 1500)
 JPEG_QUALITY = 85
+# Pillow's default quality, which the Kindwise SDK uploaded with
+UPLOAD_JPEG_QUALITY = 75
+WEBP_METHOD = 4
 ASPECT_RATIO_RANGE = (0.8, 1.2)
+PERCEPTUAL_HASH_SIZE = 8
+HEADER_PROBE_SIZES = (64 * 1024, 1024 * 1024)
 
-def process_image(file_contents: bytes) -> bytes:
+def process_image(file_contents, output_format: str = None, timings: dict = None) -> bytes:
     """
-    Processes the uploaded image by validating aspect ratio, resizing, and applying lossless compression.
+    Processes the uploaded image by validating aspect ratio, resizing, and re-encoding it.
+
+    JPEG inputs are decoded in draft mode so the decoder downscales in the DCT domain
+    before the final LANCZOS resize. With `image_passthrough` enabled, JPEG and PNG
+    inputs already within MAX_SIZE are returned unchanged. Spooled uploads are opened
+    from their file, so Pillow reads (or memory-maps) only what it decodes.
 
     Args:
-        file_contents (bytes): The uploaded image data.
+        file_contents (bytes | memoryview | os.PathLike): The uploaded image data, or the
+            path of the spooled upload.
+        output_format (str): JPEG, WEBP or PNG. Defaults to `settings.image_output_format`.
+        timings (dict): Optional dict receiving the seconds spent in the "decode",
+            "resize" and "encode" stages of a re-encoded image.
 
     Returns:
-        bytes: The processed image data in PNG format.
+        bytes: The processed image data.
 
     Raises:
         ValueError: If the image cannot be processed or fails validation.
     """
+    output_format = (output_format or settings.image_output_format).upper()
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}.")
+
+    spooled = isinstance(file_contents, (str, os.PathLike))
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
     try:
-        # Load an image from the provided bytes.
-        image = Image.open(io.BytesIO(file_contents))
-
-        # Validate the image format.
-        if image.format not in SUPPORTED_FORMATS:
-            raise ValueError(
-                f"Unsupported image format: {image.format}. Please upload a JPEG, PNG, or GIF image."
-            )
-
-        # Validate aspect ratio
-        width, height = image.size
-        aspect_ratio = width / height
-        if not (ASPECT_RATIO_RANGE[0] <= aspect_ratio <= ASPECT_RATIO_RANGE[1]):
-            raise ValueError(
-                f"Invalid aspect ratio: {aspect_ratio:.2f}. "
-                f"Please upload an image with an aspect ratio between {ASPECT_RATIO_RANGE[0]} and {ASPECT_RATIO_RANGE[1]}."
-            )
-
-        # Convert image to RGB if not already
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-
-        # Resize the image while maintaining aspect ratio
-        image.thumbnail(MAX_SIZE, Image.LANCZOS)
-
-        # Save the processed image to a bytes object using lossless compression (PNG)
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG", optimize=True)
-        buffer.seek(0)
-
-        return buffer.getvalue()
+        # Load an image from the provided bytes or spooled file.
+        with Image.open(file_contents if spooled else io.BytesIO(file_contents)) as image:
 
-    except UnidentifiedImageError as e:
+            # Validate the image format, dimensions and aspect ratio.
+            validate_image(image)
+
+            # Skip re-encoding when the upload is already small enough and widely supported
+            if settings.image_passthrough and can_pass_through(image):
+                if spooled:
+                    with open(file_contents, "rb") as file:
+                        return file.read()
+                return bytes(file_contents)
+
+            decode_image(image)
+            decoded = time.perf_counter()
+            timings["decode"] = decoded - started
+
+            image = resize_image(image)
+            resized = time.perf_counter()
+            timings["resize"] = resized - decoded
+
+            processed_image = encode_image(image, output_format)
+            timings["encode"] = time.perf_counter() - resized
+            return processed_image
+
+    except FileNotFoundError:
+        raise ValueError("The spooled upload is no longer available.")
+    except (UnidentifiedImageError, Image.DecompressionBombError) as e:
         raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
     except ValueError as ve:
         raise ve
     except Exception as e:
         print(f"Error processing image: {e}")
         raise ValueError("Error processing image.")
+
+def validate_image(image: Image.Image):
+    """
+    Validates the format, pixel count and aspect ratio of an opened image.
+
+    Only header fields are used, so this is cheap on a lazily opened image.
+
+    Args:
+        image (Image.Image): The opened image.
+
+    Raises:
+        ValueError: If the image fails validation.
+    """
+    # Validate the image format.
+    if image.format not in SUPPORTED_FORMATS:
+        raise ValueError(
+            f"Unsupported image format: {image.format}. Please upload a JPEG, PNG, or GIF image."
+        )
+
+    # Reject decompression bombs before any pixel data is decoded
+    width, height = image.size
+    if width * height > settings.image_max_pixels:
+        raise ValueError(
+            f"Image is too large: {width}x{height} pixels. "
+            f"Please upload an image with at most {settings.image_max_pixels} pixels."
+        )
+
+    # Validate aspect ratio
+    aspect_ratio = width / height
+    if not (ASPECT_RATIO_RANGE[0] <= aspect_ratio <= ASPECT_RATIO_RANGE[1]):
+        raise ValueError(
+            f"Invalid aspect ratio: {aspect_ratio:.2f}. "
+            f"Please upload an image with an aspect ratio between {ASPECT_RATIO_RANGE[0]} and {ASPECT_RATIO_RANGE[1]}."
+        )
+
+def validate_image_header(stream: BinaryIO) -> Tuple[str, Tuple[int, int]]:
+    """
+    Validates an upload by parsing only its header.
+
+    Pillow opens images lazily, so only the bytes up to the size information are
+    read from the stream. The stream position is undefined afterwards.
+
+    Args:
+        stream (BinaryIO): A seekable binary stream positioned at the start of the image.
+
+    Returns:
+        tuple: The image format and its (width, height).
+
+    Raises:
+        ValueError: If the header is not a valid image header or fails validation.
+    """
+    try:
+        image = Image.open(stream)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
+    validate_image(image)
+    return image.format, image.size
+
+def validate_base64_image_header(image_base64: str) -> Tuple[str, Tuple[int, int]]:
+    """
+    Validates a base64-encoded upload by decoding only a prefix large enough for its header.
+
+    Prefixes of HEADER_PROBE_SIZES decoded bytes are tried in turn, so the full
+    payload is only decoded when the header is not found within them. Whitespace,
+    e.g. the line breaks of MIME-wrapped base64, is skipped like `b64decode` does.
+
+    Args:
+        image_base64 (str): The base64-encoded image.
+
+    Returns:
+        tuple: The image format and its (width, height).
+
+    Raises:
+        binascii.Error: If the probed prefix is not valid base64.
+        ValueError: If the header is not a valid image header or fails validation.
+    """
+    for probe_size in HEADER_PROBE_SIZES:
+        length = (probe_size // 3) * 4
+        # Leaves room for the line breaks of wrapped base64 (76 characters per line for MIME)
+        window = image_base64[: length + length // 8]
+        if len(window) >= len(image_base64):
+            break
+        encoded = "".join(window.split())[:length]
+        encoded = encoded[: len(encoded) - len(encoded) % 4]
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(encoded)))
+        except OSError:
+            # Unidentified or truncated: the header may extend beyond the probed prefix
+            continue
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
+        validate_image(image)
+        return image.format, image.size
+
+    return validate_image_header(io.BytesIO(base64.b64decode(image_base64)))
+
+def validate_image_buffer(image_data) -> Tuple[str, Tuple[int, int]]:
+    """
+    Validates an upload held in memory by parsing only a prefix large enough for its header.
+
+    Prefixes of HEADER_PROBE_SIZES bytes are tried in turn, so a `memoryview` upload
+    is only copied in full when the header is not found within them.
+
+    Args:
+        image_data (bytes | memoryview): The uploaded image data.
+
+    Returns:
+        tuple: The image format and its (width, height).
+
+    Raises:
+        ValueError: If the header is not a valid image header or fails validation.
+    """
+    for probe_size in HEADER_PROBE_SIZES:
+        if probe_size >= len(image_data):
+            break
+        try:
+            image = Image.open(io.BytesIO(image_data[:probe_size]))
+        except OSError:
+            # Unidentified or truncated: the header may extend beyond the probed prefix
+            continue
+        except Image.DecompressionBombError as e:
+            raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
+        validate_image(image)
+        return image.format, image.size
+
+    return validate_image_header(io.BytesIO(image_data))
+
+def can_pass_through(image: Image.Image) -> bool:
+    """
+    Checks whether an opened upload can be sent to Kindwise without re-encoding.
+
+    Args:
+        image (Image.Image): The lazily opened upload.
+
+    Returns:
+        bool: True if the format is JPEG or PNG and the image fits within MAX_SIZE.
+    """
+    width, height = image.size
+    return (
+        image.format in PASSTHROUGH_FORMATS
+        and width <= MAX_SIZE[0]
+        and height <= MAX_SIZE[1]
+    )
+
+def decode_image(image: Image.Image):
+    """
+    Decodes the pixels of a lazily opened image.
+
+    Args:
+        image (Image.Image): The lazily opened upload.
+    """
+    # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+    if image.format == "JPEG" and settings.image_jpeg_draft:
+        image.draft("RGB", MAX_SIZE)
+    image.load()
+
+def resize_image(image: Image.Image) -> Image.Image:
+    """
+    Converts a decoded image into RGB and shrinks it to fit within MAX_SIZE.
+
+    Args:
+        image (Image.Image): The decoded upload.
+
+    Returns:
+        Image.Image: The resized RGB image.
+    """
+    # Convert image to RGB if not already
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # Resize the image while maintaining aspect ratio
+    image.thumbnail(MAX_SIZE, Image.LANCZOS)
+    return image
+
+def encode_image(image: Image.Image, output_format: str) -> bytes:
+    """
+    Encodes a processed image in the requested output format.
+
+    Args:
+        image (Image.Image): The decoded RGB image.
+        output_format (str): JPEG, WEBP or PNG.
+
+    Returns:
+        bytes: The encoded image data.
+    """
+    quality = settings.image_quality or JPEG_QUALITY
+    buffer = io.BytesIO()
+    if output_format == "JPEG":
+        image.save(buffer, format="JPEG", quality=quality)
+    elif output_format == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=WEBP_METHOD)
+    else:
+        image.save(buffer, format="PNG", optimize=settings.image_png_optimize)
+    return buffer.getvalue()
+
+def encode_upload(image_data: bytes) -> bytes:
+    """
+    Encodes a processed image the way the Kindwise SDK uploaded images: as a JPEG
+    fitting within MAX_SIZE.
+
+    The processed image keeps `image_output_format`, so result cache keys and
+    perceptual hashes do not change; only the bytes sent to Kindwise are JPEG.
+    JPEGs within MAX_SIZE are returned unchanged instead of being compressed twice.
+
+    Args:
+        image_data (bytes): The image data, typically the output of `process_image`.
+
+    Returns:
+        bytes: The JPEG data to upload.
+
+    Raises:
+        ValueError: If the image cannot be decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            if image.format == "JPEG" and can_pass_through(image):
+                return bytes(image_data)
+            image = resize_image(image)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=UPLOAD_JPEG_QUALITY)
+            return buffer.getvalue()
+    except UnidentifiedImageError as e:
+        raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
+
+def compute_perceptual_hash(image_data: bytes) -> str:
+    """
+    Computes a 64-bit difference hash (dHash) of an image.
+
+    The image is reduced to a 9x8 grayscale thumbnail and each bit records whether
+    a pixel is brighter than its right-hand neighbour. Re-encoded or slightly
+    re-cropped shots of the same subject produce hashes a few bits apart.
+
+    Args:
+        image_data (bytes): The image data, typically the output of `process_image`.
+
+    Returns:
+        str: The hash as a 16-character hex string.
+
+    Raises:
+        ValueError: If the image cannot be decoded.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+        image.draft("L", (PERCEPTUAL_HASH_SIZE * 4, PERCEPTUAL_HASH_SIZE * 4))
+        image = image.convert("L").resize(
+            (PERCEPTUAL_HASH_SIZE + 1, PERCEPTUAL_HASH_SIZE), Image.BILINEAR
+        )
+    except UnidentifiedImageError as e:
+        raise ValueError(f"Uploaded file is not a valid image or is corrupted. {str(e)}")
+
+    # One byte per pixel in "L" mode, row by row
+    pixels = image.tobytes()
+    row_length = PERCEPTUAL_HASH_SIZE + 1
+    value = 0
+    for row in range(PERCEPTUAL_HASH_SIZE):
+        offset = row * row_length
+        for column in range(PERCEPTUAL_HASH_SIZE):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return f"{value:016x}"
+
+
+def preprocess_image(
+    file_contents, with_perceptual_hash: bool = True, timings: dict = None
+) -> Tuple[bytes, Optional[str]]:
+    """
+    Runs the full CPU-bound preprocessing of an upload.
+
+    Args:
+        file_contents (bytes | os.PathLike): The uploaded image data, or the path of the spooled upload.
+        with_perceptual_hash (bool): Whether to compute the perceptual hash of the result.
+        timings (dict): Optional dict receiving the seconds spent per stage, see `process_image`,
+            and in "perceptual_hash".
+
+    Returns:
+        tuple: The processed image data and its perceptual hash (or None).
+
+    Raises:
+        ValueError: If the image cannot be processed or fails validation.
+    """
+    timings = {} if timings is None else timings
+    processed_image = process_image(file_contents, timings=timings)
+    perceptual_hash = None
+    if with_perceptual_hash:
+        started = time.perf_counter()
+        perceptual_hash = compute_perceptual_hash(processed_image)
+        timings["perceptual_hash"] = time.perf_counter() - started
+    return processed_image, perceptual_hash
@@ -0,0 +1,95 @@
+from functools import lru_cache
+from src.config import settings
+
+# Reference to the Kindwise API key configured on the worker
+DEFAULT_KEY_REFERENCE = {"kind": "default"}
+
+
+class KeySealError(Exception):
+    """
+    Raised when a caller's API key cannot be stored in a job because no encryption secret is configured.
+    """
+
+
+@lru_cache(maxsize=1)
+def _fernet():
+    if not settings.job_key_secret:
+        return None
+    try:
+        from cryptography.fernet import Fernet
+    except ImportError:
+        print("job_key_secret is set but the cryptography package is not installed.")
+        return None
+    try:
+        return Fernet(settings.job_key_secret.encode("utf-8"))
+    except ValueError as e:
+        print(f"job_key_secret is not a valid Fernet key: {e}")
+        return None
+
+
+def ensure_key_sealing():
+    """
+    Checks at startup that a PRODUCTION process can encrypt and decrypt caller API keys.
+
+    In PRODUCTION every request brings its own Kindwise key, so without a usable
+    `job_key_secret` no identification could be queued.
+
+    Raises:
+        KeySealError: If the environment is PRODUCTION and the secret or the cryptography package is missing.
+    """
+    if settings.environment == "PRODUCTION" and _fernet() is None:
+        raise KeySealError("PRODUCTION requires a valid job_key_secret and the cryptography package.")
+
+
+def check_api_key(api_key: str):
+    """
+    Checks that a job can store a reference to `api_key`, before any record is created.
+
+    Raises:
+        KeySealError: If the key is not the configured key and cannot be encrypted.
+    """
+    if api_key and api_key != settings.kindwise_api_key and _fernet() is None:
+        raise KeySealError("Caller API keys require job_key_secret and the cryptography package.")
+
+
+def seal_api_key(api_key: str) -> dict:
+    """
+    Returns the job field referencing an API key, so the key is never stored in plaintext.
+
+    The key configured in the settings is referenced by name and resolved by the
+    worker; any other key is encrypted with `job_key_secret` (Fernet).
+
+    Args:
+        api_key (str): The API key to use for Kindwise.
+
+    Returns:
+        dict: The key reference.
+
+    Raises:
+        KeySealError: If the key cannot be encrypted.
+    """
+    if not api_key or api_key == settings.kindwise_api_key:
+        return DEFAULT_KEY_REFERENCE
+    check_api_key(api_key)
+    return {"kind": "sealed", "token": _fernet().encrypt(api_key.encode("utf-8")).decode("ascii")}
+
+
+def open_api_key(reference: dict) -> str:
+    """
+    Resolves a key reference written by `seal_api_key`.
+
+    Args:
+        reference (dict): The key reference.
+
+    Returns:
+        str: The API key.
+
+    Raises:
+        KeySealError: If the key is encrypted and no matching secret is configured.
+    """
+    if reference["kind"] == "default":
+        return settings.kindwise_api_key
+    fernet = _fernet()
+    if fernet is None:
+        raise KeySealError("The job API key is encrypted but job_key_secret is not configured.")
+    return fernet.decrypt(reference["token"].encode("ascii")).decode("utf-8")
@@ -0,0 +1,390 @@
+from datetime import datetime, timedelta, timezone
+from bson.binary import Binary
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from src.config import settings
+from src.core.job_keys import open_api_key, seal_api_key
+from src.core.tracing import current_traceparent
+from src.core.upload_spool import SpooledUpload
+from src.db.db_service import DatabaseService, get_status_write_buffer
+
+JOB_WAITING = "waiting"
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the identification queue has reached its maximum depth.
+    """
+
+
+def build_job(
+    identification_id: str,
+    image_data: bytes,
+    api_key: str,
+    batch_id: str = None,
+    waiting: bool = False,
+    callback_url: str = None,
+) -> dict:
+    """
+    Builds a new queued job document.
+
+    Args:
+        identification_id (str): The identification record to complete.
+        image_data (bytes | memoryview | SpooledUpload): The uploaded image data, or a
+            reference to the spooled upload, which the job stores instead of the data.
+        api_key (str): The API key to use for Kindwise; the job stores a reference
+            to it or an encrypted copy, see `seal_api_key`.
+        batch_id (str): The batch the job belongs to, if any.
+        waiting (bool): Whether the job waits for another job of its batch to finish
+            before it can be claimed.
+        callback_url (str): URL notified when the identification finishes, if any.
+
+    Returns:
+        dict: The job document.
+    """
+    now = datetime.now(timezone.utc)
+    job = {
+        "identification_id": identification_id,
+        "api_key_ref": seal_api_key(api_key),
+        "status": JOB_QUEUED,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    }
+    if isinstance(image_data, SpooledUpload):
+        job["image_file"] = image_data.to_document()
+    else:
+        job["image"] = Binary(image_data)
+    if batch_id is not None:
+        job["batch_id"] = batch_id
+    if callback_url is not None:
+        job["callback_url"] = callback_url
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        # Lets the worker continue the trace of the request that queued the job
+        job["traceparent"] = traceparent
+    if waiting:
+        # Without `available_at` the job is invisible to `claim` until promoted
+        job["status"] = JOB_WAITING
+        del job["available_at"]
+    return job
+
+
+def job_api_key(job: dict) -> str:
+    """
+    Returns the Kindwise API key of a claimed job.
+
+    Args:
+        job (dict): The job document.
+
+    Returns:
+        str: The API key.
+
+    Raises:
+        KeySealError: If the key is encrypted and cannot be decrypted.
+    """
+    if "api_key" in job:
+        # Jobs queued before keys were stored as references
+        return job["api_key"]
+    return open_api_key(job["api_key_ref"])
+
+
+def job_image(job: dict):
+    """
+    Returns the image of a claimed job.
+
+    Args:
+        job (dict): The job document.
+
+    Returns:
+        bytes | SpooledUpload: The image data, or the reference to the spooled upload.
+    """
+    if "image_file" in job:
+        return SpooledUpload.from_document(job["image_file"])
+    return bytes(job["image"])
+
+
+def build_batch_jobs(batch_id: str, identification_ids: list, images: list, api_key: str, parallelism: int) -> list:
+    """
+    Builds the job documents of a batch.
+
+    Only the first `parallelism` jobs are queued; the others wait until a job of the
+    same batch completes, so one large batch cannot occupy every worker.
+
+    Args:
+        batch_id (str): The ID of the batch.
+        identification_ids (list): The identification records to complete, one per image.
+        images (list): The uploaded image data or spooled uploads.
+        api_key (str): The API key to use for Kindwise.
+        parallelism (int): Maximum number of jobs of the batch processed at once.
+
+    Returns:
+        list: The job documents.
+    """
+    return [
+        build_job(identification_id, image_data, api_key, batch_id=batch_id, waiting=index >= parallelism)
+        for index, (identification_id, image_data) in enumerate(zip(identification_ids, images))
+    ]
+
+
+def summarize_status_counts(rows) -> dict:
+    """
+    Turns `$group` rows of job counts per status into queue depth statistics.
+    """
+    counts = {JOB_WAITING: 0, JOB_QUEUED: 0, JOB_RUNNING: 0}
+    for row in rows:
+        counts[row["_id"]] = row["count"]
+    return {
+        "depth": counts[JOB_WAITING] + counts[JOB_QUEUED] + counts[JOB_RUNNING],
+        "waiting": counts[JOB_WAITING],
+        "queued": counts[JOB_QUEUED],
+        "running": counts[JOB_RUNNING],
+        "max_depth": settings.queue_max_depth,
+    }
+
+
+STATUS_COUNTS_PIPELINE = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+
+
+class JobQueue:
+    def __init__(self, db_service: DatabaseService = None):
+        """
+        Initializes the persistent identification job queue.
+
+        Jobs live in the Mongo `jobs` collection until a worker completes them.
+        A claimed job is hidden from other workers until its visibility timeout
+        expires, after which it is handed out again.
+
+        Args:
+            db_service (DatabaseService): The database service owning the connection.
+        """
+        db_service = db_service or DatabaseService()
+        self.collection = db_service.db.jobs
+
+    def ensure_indexes(self):
+        """
+        Creates the indexes used to claim the next available job, to promote
+        waiting jobs of a batch and to find the jobs of spooled uploads.
+        """
+        self.collection.create_index([("available_at", ASCENDING)])
+        self.collection.create_index(
+            [("batch_id", ASCENDING), ("status", ASCENDING)],
+            partialFilterExpression={"batch_id": {"$exists": True}},
+        )
+        self.collection.create_index(
+            [("image_file.path", ASCENDING)],
+            partialFilterExpression={"image_file": {"$exists": True}},
+        )
+
+    def spooled_paths(self, paths: list) -> set:
+        """
+        Finds which spooled uploads are still referenced by a job in the queue.
+
+        Args:
+            paths (list): Paths of spooled uploads.
+
+        Returns:
+            set: The paths referenced by a queued, claimed, deferred or waiting job.
+        """
+        jobs = self.collection.find(
+            {"image_file": {"$exists": True}, "image_file.path": {"$in": paths}}, {"image_file.path": True}
+        )
+        return {job["image_file"]["path"] for job in jobs}
+
+    def check_capacity(self, count: int = 1):
+        """
+        Verifies that `count` more jobs fit in the queue.
+
+        Args:
+            count (int): The number of jobs about to be enqueued.
+
+        Raises:
+            QueueFullError: If the queue would exceed `queue_max_depth`.
+        """
+        if self.collection.estimated_document_count() + count > settings.queue_max_depth:
+            raise QueueFullError("Identification queue is full. Please retry later.")
+
+    def enqueue(self, identification_id: str, image_data: bytes, api_key: str) -> str:
+        """
+        Persists a new identification job.
+
+        Args:
+            identification_id (str): The identification record to complete.
+            image_data (bytes | memoryview | SpooledUpload): The uploaded image data.
+            api_key (str): The API key to use for Kindwise.
+
+        Returns:
+            str: The ID of the new job.
+        """
+        result = self.collection.insert_one(build_job(identification_id, image_data, api_key))
+        return str(result.inserted_id)
+
+    def claim(self, worker_id: str):
+        """
+        Atomically claims the next available job.
+
+        A job is available when it is queued, or when it is running but its
+        previous worker let the visibility timeout expire.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+
+        Returns:
+            dict: The claimed job document, or None if the queue is empty.
+        """
+        now = datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            {"available_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "worker_id": worker_id,
+                    "available_at": now + timedelta(seconds=settings.queue_visibility_timeout_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def complete(self, job_id, on_removed=None):
+        """
+        Removes a finished job from the queue.
+
+        With a status write buffer running, the removal is buffered until the
+        identification updates buffered before it were written.
+
+        Args:
+            job_id (ObjectId | str): The ID of the job.
+            on_removed (callable): Called without arguments once the removal was written.
+        """
+        buffer = get_status_write_buffer()
+        if buffer is not None:
+            buffer.complete_job(job_id, on_removed)
+            return
+        self.collection.delete_one({"_id": ObjectId(job_id)})
+        if on_removed is not None:
+            on_removed()
+
+    def promote_waiting(self, batch_id: str):
+        """
+        Queues the oldest waiting job of a batch, keeping the batch at its parallelism.
+
+        Args:
+            batch_id (str): The ID of the batch.
+
+        Returns:
+            dict: The promoted job document, or None if no job of the batch is waiting.
+        """
+        return self.collection.find_one_and_update(
+            {"batch_id": batch_id, "status": JOB_WAITING},
+            {"$set": {"status": JOB_QUEUED, "available_at": datetime.now(timezone.utc)}},
+            sort=[("_id", ASCENDING)],
+            projection={"image": False, "image_file": False},
+        )
+
+    def release(self, job_id, delay_seconds: float = 0, refund_attempt: bool = False):
+        """
+        Returns a claimed job to the queue, optionally delaying its next attempt.
+
+        Args:
+            job_id (ObjectId | str): The ID of the job.
+            delay_seconds (float): Seconds before the job becomes available again.
+            refund_attempt (bool): Whether the claim should not count towards `queue_max_attempts`,
+                e.g. because the job was deferred without being run.
+        """
+        update = {
+            "$set": {
+                "status": JOB_QUEUED,
+                "available_at": datetime.now(timezone.utc) + timedelta(seconds=delay_seconds),
+            },
+            "$unset": {"worker_id": ""},
+        }
+        if refund_attempt:
+            update["$inc"] = {"attempts": -1}
+        self.collection.update_one({"_id": ObjectId(job_id)}, update)
+
+    def stats(self) -> dict:
+        """
+        Returns the queue depth broken down by job status.
+
+        Returns:
+            dict: The number of queued and running jobs and the configured limit.
+        """
+        return summarize_status_counts(self.collection.aggregate(STATUS_COUNTS_PIPELINE))
+
+
+class AsyncJobQueue:
+    def __init__(self, db_service):
+        """
+        Initializes the producer side of the job queue for the async API routes.
+
+        Args:
+            db_service (AsyncDatabaseService): The async database service owning the connection.
+        """
+        self.collection = db_service.db.jobs
+
+    async def check_capacity(self, count: int = 1):
+        """
+        Verifies that `count` more jobs fit in the queue.
+
+        Args:
+            count (int): The number of jobs about to be enqueued.
+
+        Raises:
+            QueueFullError: If the queue would exceed `queue_max_depth`.
+        """
+        if await self.collection.estimated_document_count() + count > settings.queue_max_depth:
+            raise QueueFullError("Identification queue is full. Please retry later.")
+
+    async def enqueue(
+        self, identification_id: str, image_data: bytes, api_key: str, callback_url: str = None
+    ) -> str:
+        """
+        Persists a new identification job.
+
+        Args:
+            identification_id (str): The identification record to complete.
+            image_data (bytes | memoryview | SpooledUpload): The uploaded image data.
+            api_key (str): The API key to use for Kindwise.
+            callback_url (str): URL notified when the identification finishes, if any.
+
+        Returns:
+            str: The ID of the new job.
+        """
+        result = await self.collection.insert_one(
+            build_job(identification_id, image_data, api_key, callback_url=callback_url)
+        )
+        return str(result.inserted_id)
+
+    async def enqueue_batch(
+        self, batch_id: str, identification_ids: list, images: list, api_key: str, parallelism: int
+    ) -> list:
+        """
+        Persists the jobs of a batch with a single `insert_many`.
+
+        Args:
+            batch_id (str): The ID of the batch.
+            identification_ids (list): The identification records to complete, one per image.
+            images (list): The uploaded image data or spooled uploads.
+            api_key (str): The API key to use for Kindwise.
+            parallelism (int): Maximum number of jobs of the batch processed at once.
+
+        Returns:
+            list: The IDs of the new jobs.
+        """
+        jobs = build_batch_jobs(batch_id, identification_ids, images, api_key, parallelism)
+        result = await self.collection.insert_many(jobs)
+        return [str(job_id) for job_id in result.inserted_ids]
+
+    async def stats(self) -> dict:
+        """
+        Returns the queue depth broken down by job status.
+
+        Returns:
+            dict: The number of queued and running jobs and the configured limit.
+        """
+        cursor = await self.collection.aggregate(STATUS_COUNTS_PIPELINE)
+        return summarize_status_counts([row async for row in cursor])
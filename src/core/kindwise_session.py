@@ -0,0 +1,524 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+from src.config import settings
+from src.core.circuit_breaker import CIRCUIT_OPEN, CircuitBreaker, RetryBudget, retry_backoff_seconds
+from src.core.rate_limit import TokenBucket
+
+# Upper bounds (in milliseconds) of the Kindwise latency histogram buckets.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Responses worth retrying: rate limiting and server-side failures.
+TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+kindwise_breaker = CircuitBreaker(
+    "Kindwise",
+    window_seconds=settings.kindwise_breaker_window_seconds,
+    min_calls=settings.kindwise_breaker_min_calls,
+    failure_rate=settings.kindwise_breaker_failure_rate,
+    slow_call_seconds=settings.kindwise_breaker_slow_call_seconds,
+    slow_call_rate=settings.kindwise_breaker_slow_call_rate,
+    open_seconds=settings.kindwise_breaker_open_seconds,
+    half_open_probes=settings.kindwise_breaker_half_open_probes,
+)
+kindwise_retry_budget = RetryBudget(settings.kindwise_retry_budget_ratio, settings.kindwise_retry_budget_max_tokens)
+
+
+def describe_api_key(api_key: str) -> str:
+    """
+    Returns a label identifying an API key in statistics without revealing it.
+    """
+    return "key-" + hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+
+
+def kindwise_limits() -> httpx.Limits:
+    """
+    Returns the connection pool limits of Kindwise sessions.
+    """
+    return httpx.Limits(
+        max_connections=settings.kindwise_max_connections,
+        max_keepalive_connections=settings.kindwise_max_keepalive_connections,
+        keepalive_expiry=settings.kindwise_keepalive_expiry_seconds,
+    )
+
+
+def kindwise_timeout(timeout: float = None) -> httpx.Timeout:
+    """
+    Returns the timeouts of a Kindwise request.
+
+    Args:
+        timeout (float): The read timeout in seconds. Defaults to `kindwise_timeout_seconds`.
+    """
+    return httpx.Timeout(timeout or settings.kindwise_timeout_seconds, connect=settings.kindwise_connect_timeout_seconds)
+
+
+def admit_kindwise_call():
+    """
+    Checks the Kindwise circuit breaker before a request is sent.
+
+    Raises:
+        CircuitOpenError: If the breaker is open.
+    """
+    if settings.kindwise_breaker_enabled:
+        kindwise_breaker.before_call()
+
+
+def record_kindwise_call(latency_seconds: float, response: httpx.Response = None, error: Exception = None):
+    """
+    Reports the outcome of a Kindwise request to the circuit breaker.
+
+    Only transport errors and 5xx responses count as failures; client errors such
+    as an invalid API key or an exhausted quota say nothing about Kindwise's health.
+
+    Args:
+        latency_seconds (float): The request latency.
+        response (httpx.Response): The response, if one was received.
+        error (Exception): The transport error, if no response was received.
+    """
+    if settings.kindwise_breaker_enabled:
+        failed = isinstance(error, httpx.TransportError) or (response is not None and response.status_code >= 500)
+        kindwise_breaker.record(latency_seconds, failed)
+
+
+def release_kindwise_call():
+    """
+    Returns the circuit breaker slot of a Kindwise request that ended without an outcome.
+    """
+    if settings.kindwise_breaker_enabled:
+        kindwise_breaker.release()
+
+
+def kindwise_retry_delay(attempt: int, response: httpx.Response = None, error: Exception = None):
+    """
+    Decides whether a failed Kindwise request is retried.
+
+    Transient failures are retried up to `kindwise_retry_max_attempts` attempts with
+    jittered exponential backoff, as long as the retry budget allows it and the
+    circuit breaker did not open in the meantime.
+
+    Args:
+        attempt (int): The number of the attempt that just finished, starting at 1.
+        response (httpx.Response): The response, if one was received.
+        error (Exception): The transport error, if no response was received.
+
+    Returns:
+        float: Seconds to wait before the next attempt, or None to give up.
+    """
+    transient = isinstance(error, httpx.TransportError) or (
+        response is not None and response.status_code in TRANSIENT_STATUS_CODES
+    )
+    if not transient or attempt >= settings.kindwise_retry_max_attempts:
+        return None
+    if settings.kindwise_breaker_enabled and kindwise_breaker.state == CIRCUIT_OPEN:
+        return None
+    if not kindwise_retry_budget.try_spend():
+        return None
+    return retry_backoff_seconds(
+        attempt, settings.kindwise_retry_backoff_base_seconds, settings.kindwise_retry_backoff_max_seconds
+    )
+
+
+class KindwiseSessionStats:
+    def __init__(self):
+        """
+        Initializes the request, connection and latency counters of one session.
+        """
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.latency_total_ms = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record_connection(self):
+        """
+        Counts a newly opened connection, i.e. a TCP (and TLS) handshake.
+        """
+        with self._lock:
+            self.connections += 1
+
+    def record_request(self, latency_ms: float, error: bool = False):
+        """
+        Counts a finished request.
+
+        Args:
+            latency_ms (float): The request latency in milliseconds.
+            error (bool): Whether the request failed.
+        """
+        bucket = next(
+            (index for index, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound),
+            len(LATENCY_BUCKETS_MS),
+        )
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.latency_total_ms += latency_ms
+            self.latency_buckets[bucket] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current counters.
+
+        Returns:
+            dict: Request and handshake counts, the connection reuse ratio and the
+                latency histogram keyed by bucket upper bound.
+        """
+        with self._lock:
+            labels = [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["le_inf"]
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "handshakes": self.connections,
+                "reuse_ratio": 1 - self.connections / self.requests if self.requests else 0.0,
+                "latency_mean_ms": self.latency_total_ms / self.requests if self.requests else 0.0,
+                "latency_ms": dict(zip(labels, self.latency_buckets)),
+            }
+
+
+class KindwiseSession:
+    def __init__(self):
+        """
+        Initializes a keep-alive HTTP session to the Kindwise API.
+
+        Connections are pooled and reused across identifications, so only the
+        first request on each connection pays for the TCP and TLS handshakes.
+        """
+        self.stats = KindwiseSessionStats()
+        self.client = httpx.Client(limits=kindwise_limits())
+        # Maintained by KindwiseSessionRegistry
+        self.leases = 0
+        self.evicted = False
+
+    def request(self, method: str, url: str, json: dict = None, headers: dict = None, timeout: float = None):
+        """
+        Sends a request over the pooled connections, retrying transient failures.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The request URL.
+            json (dict): The JSON body.
+            headers (dict): The request headers.
+            timeout (float): The read timeout in seconds. Defaults to `kindwise_timeout_seconds`.
+
+        Returns:
+            httpx.Response: The response of the last attempt.
+
+        Raises:
+            CircuitOpenError: If the Kindwise circuit breaker is open.
+            httpx.HTTPError: If the last attempt failed without a response.
+        """
+        kindwise_retry_budget.deposit()
+        attempt = 1
+        while True:
+            admit_kindwise_call()
+            response, error = self._send(method, url, json, headers, timeout)
+            delay = kindwise_retry_delay(attempt, response, error)
+            if delay is None:
+                break
+            print(f"Retrying Kindwise request in {delay:.2f} seconds (attempt {attempt} failed).")
+            time.sleep(delay)
+            attempt += 1
+
+        if error is not None:
+            raise error
+        return response
+
+    def _send(self, method: str, url: str, json: dict, headers: dict, timeout: float):
+        started = time.perf_counter()
+        try:
+            response = self.client.request(
+                method,
+                url,
+                json=json,
+                headers=headers,
+                timeout=kindwise_timeout(timeout),
+                extensions={"trace": self._trace},
+            )
+        except httpx.HTTPError as e:
+            latency = time.perf_counter() - started
+            self.stats.record_request(latency * 1000, error=True)
+            record_kindwise_call(latency, error=e)
+            return None, e
+        except BaseException:
+            release_kindwise_call()
+            raise
+        latency = time.perf_counter() - started
+        self.stats.record_request(latency * 1000, error=response.is_error)
+        record_kindwise_call(latency, response=response)
+        return response, None
+
+    def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.record_connection()
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self.client.close()
+
+
+class KindwiseSessionRegistry:
+    def __init__(self, max_size: int):
+        """
+        Initializes the registry of Kindwise sessions keyed by API key.
+
+        At most `max_size` sessions are kept; the least recently used one is
+        dropped when another key needs a session, and closed once the last
+        identification using it released it.
+
+        Args:
+            max_size (int): Maximum number of sessions kept open.
+        """
+        self.max_size = max_size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self, api_key: str):
+        """
+        Lends the session of an API key, creating it on first use.
+
+        Args:
+            api_key (str): The Kindwise API key.
+
+        Yields:
+            KindwiseSession: The shared session, open until the block exits.
+        """
+        session = self.acquire(api_key)
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def acquire(self, api_key: str) -> KindwiseSession:
+        """
+        Returns the session of an API key and keeps it open until `release` is called.
+
+        Args:
+            api_key (str): The Kindwise API key.
+
+        Returns:
+            KindwiseSession: The shared session.
+        """
+        evicted = None
+        with self._lock:
+            session = self._sessions.get(api_key)
+            if session is not None:
+                self._sessions.move_to_end(api_key)
+            else:
+                session = self._sessions[api_key] = KindwiseSession()
+                if len(self._sessions) > self.max_size:
+                    _, evicted = self._sessions.popitem(last=False)
+                    evicted.evicted = True
+                    if evicted.leases:
+                        evicted = None
+            session.leases += 1
+        if evicted is not None:
+            evicted.close()
+        return session
+
+    def release(self, session: KindwiseSession):
+        """
+        Releases a session returned by `acquire`, closing it if it was evicted in the meantime.
+
+        Args:
+            session (KindwiseSession): The session.
+        """
+        with self._lock:
+            session.leases -= 1
+            idle = session.evicted and not session.leases
+        if idle:
+            session.close()
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of every open session.
+
+        Returns:
+            dict: Session statistics keyed by a label derived from the API key.
+        """
+        with self._lock:
+            sessions = list(self._sessions.items())
+        return {describe_api_key(api_key): session.stats.snapshot() for api_key, session in sessions}
+
+    def close(self):
+        """
+        Closes every session.
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+class AsyncKindwiseSession:
+    def __init__(self):
+        """
+        Initializes an asyncio keep-alive HTTP session to the Kindwise API.
+
+        Requests of one API key are limited to `kindwise_max_concurrency_per_key`
+        in flight and `kindwise_rate_per_second` started per second, so hundreds of
+        identifications can wait on Kindwise without exceeding the key's quota.
+        Must only be used from the event loop that created it.
+        """
+        self.stats = KindwiseSessionStats()
+        self.client = httpx.AsyncClient(limits=kindwise_limits())
+        # Maintained by AsyncKindwiseSessionRegistry
+        self.leases = 0
+        self.evicted = False
+        self.rate_limiter = TokenBucket(settings.kindwise_rate_per_second, settings.kindwise_rate_burst)
+        self._slots = asyncio.Semaphore(settings.kindwise_max_concurrency_per_key)
+
+    async def request(self, method: str, url: str, json: dict = None, headers: dict = None, timeout: float = None):
+        """
+        Sends a request over the pooled connections once the key's limits allow it.
+
+        Transient failures are retried like in `KindwiseSession.request`; the key's
+        concurrency slot is released while waiting for the next attempt.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The request URL.
+            json (dict): The JSON body.
+            headers (dict): The request headers.
+            timeout (float): The read timeout in seconds. Defaults to `kindwise_timeout_seconds`.
+
+        Returns:
+            httpx.Response: The response of the last attempt.
+
+        Raises:
+            CircuitOpenError: If the Kindwise circuit breaker is open.
+            httpx.HTTPError: If the last attempt failed without a response.
+        """
+        kindwise_retry_budget.deposit()
+        attempt = 1
+        while True:
+            admit_kindwise_call()
+            async with self._slots:
+                await self.rate_limiter.acquire()
+                response, error = await self._send(method, url, json, headers, timeout)
+            delay = kindwise_retry_delay(attempt, response, error)
+            if delay is None:
+                break
+            print(f"Retrying Kindwise request in {delay:.2f} seconds (attempt {attempt} failed).")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if error is not None:
+            raise error
+        return response
+
+    async def _send(self, method: str, url: str, json: dict, headers: dict, timeout: float):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method,
+                url,
+                json=json,
+                headers=headers,
+                timeout=kindwise_timeout(timeout),
+                extensions={"trace": self._trace},
+            )
+        except httpx.HTTPError as e:
+            latency = time.perf_counter() - started
+            self.stats.record_request(latency * 1000, error=True)
+            record_kindwise_call(latency, error=e)
+            return None, e
+        except BaseException:
+            release_kindwise_call()
+            raise
+        latency = time.perf_counter() - started
+        self.stats.record_request(latency * 1000, error=response.is_error)
+        record_kindwise_call(latency, response=response)
+        return response, None
+
+    async def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.record_connection()
+
+    async def aclose(self):
+        """
+        Closes the pooled connections.
+        """
+        await self.client.aclose()
+
+
+class AsyncKindwiseSessionRegistry:
+    def __init__(self, max_size: int):
+        """
+        Initializes the registry of asyncio Kindwise sessions keyed by API key.
+
+        Must only be used from a single event loop. The least recently used session
+        is dropped when more than `max_size` keys are in use, and closed once the
+        last identification using it released it.
+
+        Args:
+            max_size (int): Maximum number of sessions kept open.
+        """
+        self.max_size = max_size
+        self._sessions = OrderedDict()
+
+    @asynccontextmanager
+    async def lease(self, api_key: str):
+        """
+        Lends the session of an API key, creating it on first use.
+
+        Args:
+            api_key (str): The Kindwise API key.
+
+        Yields:
+            AsyncKindwiseSession: The shared session, open until the block exits.
+        """
+        session, evicted = self._acquire(api_key)
+        if evicted is not None:
+            await evicted.aclose()
+        try:
+            yield session
+        finally:
+            session.leases -= 1
+            if session.evicted and not session.leases:
+                await session.aclose()
+
+    def _acquire(self, api_key: str):
+        session = self._sessions.get(api_key)
+        evicted = None
+        if session is not None:
+            self._sessions.move_to_end(api_key)
+        else:
+            session = self._sessions[api_key] = AsyncKindwiseSession()
+            if len(self._sessions) > self.max_size:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.evicted = True
+                if evicted.leases:
+                    evicted = None
+        session.leases += 1
+        return session, evicted
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of every open session.
+
+        Returns:
+            dict: Session statistics keyed by a label derived from the API key.
+        """
+        return {describe_api_key(api_key): session.stats.snapshot() for api_key, session in list(self._sessions.items())}
+
+    async def aclose(self):
+        """
+        Closes every session.
+        """
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.aclose()
+
+
+kindwise_sessions = KindwiseSessionRegistry(settings.kindwise_session_registry_size)
+async_kindwise_sessions = AsyncKindwiseSessionRegistry(settings.kindwise_session_registry_size)
@@ -1,20 +1,94 @@
-from kindwise.plant import PlantApi, PlantIdentification
+import asyncio
+import base64
+import time
+from kindwise.plant import PlantIdentification
 from src.config import settings
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.image_processor import encode_upload
+from src.core.kindwise_session import async_kindwise_sessions, kindwise_sessions
+from src.core.metrics import kindwise_request_seconds, kindwise_requests_in_flight
+from src.core.tracing import SPAN_KIND_CLIENT, tracer
 
+IDENTIFICATION_DETAILS = ["common_names", "taxonomy", "classification"]
+
+# Default Kindwise plant.id host, overridden by `kindwise_host`
+KINDWISE_HOST = "https://plant.id"
+
+
+def request_outcome(error: Exception = None) -> str:
+    """
+    Returns the `outcome` label of a Kindwise call for the latency histogram.
+    """
+    if error is None:
+        return "success"
+    # Rejected by the circuit breaker without reaching Kindwise
+    return "circuit_open" if isinstance(error, CircuitOpenError) else "error"
+
+def end_request_span(span, error: Exception = None):
+    """
+    Ends the span of a Kindwise call, recording its outcome.
+    """
+    span.set_attribute("kindwise.outcome", request_outcome(error))
+    if error is not None:
+        span.record_error(error)
+    span.end()
+
+def identification_request(api_key: str, image_data: bytes, details: list) -> dict:
+    """
+    Builds a call to the documented `POST /api/v3/identification` endpoint of Kindwise.
+
+    Requests are built here instead of through the SDK's private `_make_api_call`,
+    so they go over the pooled sessions without depending on SDK internals.
+
+    Args:
+        api_key (str): The Kindwise API key.
+        image_data (bytes): The image data to send, see `encode_upload`.
+        details (list): The Kindwise details to request.
+
+    Returns:
+        dict: The keyword arguments of `KindwiseSession.request`.
+    """
+    return {
+        "method": "POST",
+        "url": f"{settings.kindwise_host or KINDWISE_HOST}/api/v3/identification?details={','.join(details)}",
+        "json": {"images": [base64.b64encode(image_data).decode("ascii")], "similar_images": True},
+        "headers": {"Content-Type": "application/json", "Api-Key": api_key},
+    }
+
+def parse_identification(response) -> PlantIdentification:
+    """
+    Parses the response of an identification request.
+
+    Args:
+        response (httpx.Response): The Kindwise response.
+
+    Returns:
+        PlantIdentification: The identification.
+
+    Raises:
+        ValueError: If Kindwise returned an error.
+    """
+    if response.is_error:
+        raise ValueError(f"Error while making an API call: {response.status_code=} {response.text=}")
+    return PlantIdentification.from_dict(response.json())
 
 class KindwiseClient:
     def __init__(self, api_key=None):
         """
         Initializes the Kindwise API client.
+
+        - Reuses the pooled session of the API key from `kindwise_sessions`, so
+          consecutive identifications share keep-alive connections.
         """
-        self.api = PlantApi(api_key=api_key or settings.kindwise_api_key)
+        self.api_key = api_key or settings.kindwise_api_key
 
-    def identify_plant(self, image_data: bytes):
+    def identify_plant(self, image_data: bytes, details: list = None):
         """
         Identifies the plant using the Kindwise API.
 
         Args:
-            image_data (bytes): The processed image data.
+            image_data (bytes): The processed image data, uploaded as JPEG (see `encode_upload`).
+            details (list): The Kindwise details to request. Defaults to IDENTIFICATION_DETAILS.
 
         Returns:
             dict: The simplified identification result.
@@ -22,12 +96,15 @@ class KindwiseClient:
         Raises:
             Exception: If identification fails.
         """
+        started = time.perf_counter()
+        error = None
+        span = tracer.start_span("kindwise.identify_plant", kind=SPAN_KIND_CLIENT)
+        kindwise_requests_in_flight.inc()
         try:
-            # Call the identify method of the Kindwise API
-            result: PlantIdentification = self.api.identify(
-                image=[image_data],
-                details=["common_names", "taxonomy", "classification"],
-            )
+            upload = encode_upload(image_data)
+            request = identification_request(self.api_key, upload, details or IDENTIFICATION_DETAILS)
+            with kindwise_sessions.lease(self.api_key) as session:
+                result = parse_identification(session.request(**request))
 
             # Extract relevant data
             simplified_result = self._simplify_result(result)
@@ -35,8 +112,13 @@ class KindwiseClient:
 
         except Exception as e:
             # Handle exceptions
+            error = e
             print(f"Error identifying plant: {e}")
             raise e
+        finally:
+            kindwise_requests_in_flight.dec()
+            kindwise_request_seconds.observe(time.perf_counter() - started, request_outcome(error))
+            end_request_span(span, error)
 
     def _simplify_result(self, result: PlantIdentification) -> dict:
         """
@@ -64,8 +146,57 @@ class KindwiseClient:
             "probability": suggestions[0]["probability"] if suggestions else None,
             "taxonomy": suggestions[0]["taxonomy"] if suggestions else {},
             "identification_id": result.access_token,
+            "species_id": suggestions[0]["id"] if suggestions else None,
             "is_plant": result.result.is_plant.binary,
             "created": result.created.isoformat(),
         }
 
         return simplified_result
+
+
+class AsyncKindwiseClient(KindwiseClient):
+    def __init__(self, api_key=None):
+        """
+        Initializes the asyncio Kindwise API client.
+
+        - Sends the same request as KindwiseClient over the pooled async session of
+          the API key, which enforces the key's concurrency and rate limits.
+        - The SDK's own `kindwise.async_api` is not used: it opens a new HTTP client
+          for every call and has no public way to send over a shared session, so it
+          would lose connection reuse, the per-key limits and the retries.
+        """
+        self.api_key = api_key or settings.kindwise_api_key
+
+    async def identify_plant(self, image_data: bytes, details: list = None):
+        """
+        Identifies the plant using the Kindwise API without blocking the event loop.
+
+        Args:
+            image_data (bytes): The processed image data, uploaded as JPEG (see `encode_upload`).
+            details (list): The Kindwise details to request. Defaults to IDENTIFICATION_DETAILS.
+
+        Returns:
+            dict: The simplified identification result.
+
+        Raises:
+            Exception: If identification fails.
+        """
+        started = time.perf_counter()
+        error = None
+        span = tracer.start_span("kindwise.identify_plant", kind=SPAN_KIND_CLIENT)
+        kindwise_requests_in_flight.inc()
+        try:
+            upload = await asyncio.to_thread(encode_upload, image_data)
+            request = identification_request(self.api_key, upload, details or IDENTIFICATION_DETAILS)
+            async with async_kindwise_sessions.lease(self.api_key) as session:
+                response = await session.request(**request)
+            return self._simplify_result(parse_identification(response))
+
+        except Exception as e:
+            error = e
+            print(f"Error identifying plant: {e}")
+            raise e
+        finally:
+            kindwise_requests_in_flight.dec()
+            kindwise_request_seconds.observe(time.perf_counter() - started, request_outcome(error))
+            end_request_span(span, error)
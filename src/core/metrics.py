@@ -0,0 +1,299 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Latency buckets in seconds, from a cached lookup to a slow Kindwise call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        """
+        Initializes a metric with a value per combination of label values.
+
+        Label values are passed positionally, in the order of `labelnames`, so
+        recording a value is a dict lookup and an update under a lock.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple): The names of the labels.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list:
+        """
+        Returns the metric in the Prometheus text exposition format, one line per item.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            # Histogram series are lists updated in place
+            series = sorted((labelvalues, value[:] if isinstance(value, list) else value)
+                            for labelvalues, value in self._values.items())
+        for labelvalues, value in series:
+            lines.extend(self._render_series(self._labels(labelvalues), value))
+        return lines
+
+    def _render_series(self, labels: str, value) -> list:
+        return [f"{self.name}{labels} {format_value(value)}"]
+
+    def _labels(self, labelvalues: tuple) -> str:
+        pairs = [f'{name}="{escape_label_value(str(value))}"' for name, value in zip(self.labelnames, labelvalues)]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1.0):
+        self.inc(*labelvalues, amount=-amount)
+
+    def track(self, *labelvalues) -> "InFlight":
+        """
+        Returns a context manager counting the block as in flight while it runs.
+        """
+        return InFlight(self, labelvalues)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initializes a histogram of observed values, e.g. durations in seconds.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The HELP text.
+            labelnames (tuple): The names of the labels.
+            buckets (tuple): The sorted upper bounds of the buckets; +Inf is added.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                # Counts per bucket (the last one is +Inf), then the sum
+                series = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labelvalues) -> "Timer":
+        """
+        Returns a context manager observing the duration of the block, even if it raises.
+        """
+        return Timer(self, labelvalues)
+
+    def snapshot(self, *labelvalues) -> dict:
+        """
+        Returns the observation count and sum of a series.
+        """
+        with self._lock:
+            series = self._values.get(labelvalues)
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def _render_series(self, labels: str, series: list) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+            cumulative += count
+            bucket_labels = self._merge_labels(labels, f'le="{format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{self.name}_sum{labels} {format_value(series[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    @staticmethod
+    def _merge_labels(labels: str, extra: str) -> str:
+        return "{" + (labels[1:-1] + "," if labels else "") + extra + "}"
+
+
+class Timer:
+    __slots__ = ("histogram", "labelvalues", "started")
+
+    def __init__(self, histogram: Histogram, labelvalues: tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+class InFlight:
+    __slots__ = ("gauge", "labelvalues")
+
+    def __init__(self, gauge: Gauge, labelvalues: tuple):
+        self.gauge = gauge
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.gauge.inc(*self.labelvalues)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.gauge.dec(*self.labelvalues)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Initializes the collection of metrics exposed by this process.
+        """
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = MetricsRegistry()
+
+upload_read_seconds = registry.register(Histogram(
+    "zelara_upload_read_seconds", "Time spent reading and validating an upload.", ("format",)
+))
+image_processing_seconds = registry.register(Histogram(
+    "zelara_image_processing_seconds", "Time spent preprocessing an upload, per stage.", ("stage",)
+))
+kindwise_request_seconds = registry.register(Histogram(
+    "zelara_kindwise_request_seconds", "Duration of Kindwise identification calls.", ("outcome",)
+))
+db_write_seconds = registry.register(Histogram(
+    "zelara_db_write_seconds", "Duration of identification writes to MongoDB.", ("operation",)
+))
+http_request_seconds = registry.register(Histogram(
+    "zelara_http_request_duration_seconds",
+    "Time until the response headers of an HTTP request were ready.",
+    ("method", "route", "status"),
+))
+http_requests_in_flight = registry.register(Gauge(
+    "zelara_http_requests_in_flight", "HTTP requests being handled."
+))
+identifications_in_flight = registry.register(Gauge(
+    "zelara_identifications_in_flight", "Identification jobs being processed by this process."
+))
+preprocessing_in_flight = registry.register(Gauge(
+    "zelara_preprocessing_in_flight", "Uploads being preprocessed by this process."
+))
+kindwise_requests_in_flight = registry.register(Gauge(
+    "zelara_kindwise_requests_in_flight", "Kindwise identification calls in flight."
+))
+queue_jobs = registry.register(Gauge(
+    "zelara_queue_jobs", "Jobs in the identification queue, by status, when last scraped.", ("status",)
+))
+
+
+def observe_queue_depth(stats: dict):
+    """
+    Sets the queue gauges from the output of `JobQueue.stats`.
+    """
+    for status in ("waiting", "queued", "running"):
+        queue_jobs.set(stats[status], status)
+
+
+def observe_image_timings(timings: dict):
+    """
+    Records the stage durations reported by `preprocess_image`.
+    """
+    for stage, seconds in timings.items():
+        image_processing_seconds.observe(seconds, stage)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    on_scrape = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        if self.on_scrape is not None:
+            try:
+                self.on_scrape()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, on_scrape=None) -> ThreadingHTTPServer:
+    """
+    Serves `GET /metrics` from a background thread, for processes without the API.
+
+    Args:
+        port (int): The port to listen on.
+        on_scrape (callable): Called before each scrape, e.g. to refresh the queue gauges.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call `shutdown()` to stop it.
+    """
+    handler = type("ScrapeHandler", (MetricsHandler,), {"on_scrape": staticmethod(on_scrape) if on_scrape else None})
+    server = ThreadingHTTPServer(("", port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Serving metrics on port {port}.")
+    return server
@@ -0,0 +1,53 @@
+import json
+import zlib
+from typing import AsyncIterable, AsyncIterator
+
+# wbits=31 makes zlib write a gzip header and trailer instead of a raw zlib stream.
+GZIP_WBITS = 31
+
+
+def encode_document(document: dict) -> bytes:
+    """
+    Encodes a single document as one NDJSON line.
+
+    Args:
+        document (dict): The document to encode.
+
+    Returns:
+        bytes: The compact JSON encoding followed by a newline.
+    """
+    return json.dumps(document, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+
+
+async def stream_ndjson(
+    documents: AsyncIterable, compress: bool = False, chunk_size: int = 64 * 1024
+) -> AsyncIterator[bytes]:
+    """
+    Encodes documents as NDJSON and yields the output in chunks of about `chunk_size` bytes.
+
+    Only the current chunk is held in memory, so memory use does not depend on the
+    number of documents.
+
+    Args:
+        documents (AsyncIterable): The documents to export.
+        compress (bool): Whether to gzip the output.
+        chunk_size (int): Number of bytes buffered before a chunk is yielded.
+
+    Yields:
+        bytes: The next chunk of the (optionally compressed) NDJSON stream.
+    """
+    compressor = zlib.compressobj(wbits=GZIP_WBITS) if compress else None
+    buffer = bytearray()
+
+    async for document in documents:
+        buffer += encode_document(document)
+        if len(buffer) >= chunk_size:
+            chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+            buffer.clear()
+            if chunk:
+                yield chunk
+
+    if compressor:
+        yield compressor.compress(bytes(buffer)) + compressor.flush()
+    elif buffer:
+        yield bytes(buffer)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+from pymongo.errors import OperationFailure, PyMongoError
+
+from src.config import settings
+
+# Error code returned by standalone servers, which do not support change streams.
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+STATUS_CHANGES_PIPELINE = [
+    {
+        "$match": {
+            "operationType": "update",
+            "updateDescription.updatedFields.status": {"$exists": True},
+        }
+    }
+]
+
+
+class NotificationHub:
+    def __init__(self):
+        """
+        Initializes the in-process hub waking up requests waiting for an identification.
+
+        Identification tasks running in this process publish to the hub directly.
+        Updates made by other processes reach it through a MongoDB change stream
+        (see `watch`); while no change stream is active, waiters fall back to
+        re-reading the record every `notify_poll_interval_seconds`.
+        """
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.watching = False
+
+    @property
+    def poll_interval(self):
+        """
+        Returns the interval at which waiters should re-read the record, or None
+        when every update is delivered by the change stream.
+        """
+        return None if self.watching else settings.notify_poll_interval_seconds
+
+    @contextmanager
+    def subscribe(self, identification_id: str):
+        """
+        Registers the calling coroutine for updates of an identification.
+
+        Must be called from a running event loop. The yielded event is set whenever
+        the identification is published; clear it before re-reading the record.
+
+        Args:
+            identification_id (str): The ID of the identification.
+
+        Yields:
+            asyncio.Event: The event set on every update.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.setdefault(identification_id, set()).add(waiter)
+        try:
+            yield waiter[1]
+        finally:
+            with self._lock:
+                waiters = self._subscribers.get(identification_id)
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._subscribers[identification_id]
+
+    def publish(self, identification_id: str):
+        """
+        Wakes up every request waiting for an identification. Safe to call from any thread.
+
+        Args:
+            identification_id (str): The ID of the updated identification.
+        """
+        with self._lock:
+            waiters = list(self._subscribers.get(identification_id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's event loop is already closed
+                pass
+
+    async def watch(self, collection):
+        """
+        Publishes status changes of identifications made by other processes.
+
+        Runs until cancelled. Returns early when the server does not support change
+        streams, leaving waiters on the polling fallback.
+
+        Args:
+            collection (AsyncCollection): The identifications collection.
+        """
+        while True:
+            try:
+                async with await collection.watch(STATUS_CHANGES_PIPELINE) as stream:
+                    self.watching = True
+                    async for change in stream:
+                        self.publish(str(change["documentKey"]["_id"]))
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    print("Change streams are not supported, falling back to polling.")
+                    return
+                print(f"Error watching identifications: {e}")
+            except PyMongoError as e:
+                print(f"Error watching identifications: {e}")
+            finally:
+                self.watching = False
+            await asyncio.sleep(settings.notify_poll_interval_seconds)
+
+
+notification_hub = NotificationHub()
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from src.config import settings
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    Counts the differing bits between two hashes.
+    """
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    def __init__(self):
+        """
+        Initializes an empty BK-tree over integer hashes with Hamming distance.
+
+        Each node is a list of `[hash, identification_ids, children]`, where
+        `children` maps an edge distance to the child node.
+        """
+        self._root = None
+        self.size = 0
+
+    def add(self, value: int, identification_id: str):
+        """
+        Inserts a hash, attaching the identification ID to an existing node if the
+        same hash is already present.
+
+        Args:
+            value (int): The perceptual hash.
+            identification_id (str): The identification the hash belongs to.
+        """
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [identification_id], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(identification_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [identification_id], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> list:
+        """
+        Finds every stored hash within `max_distance` of `value`.
+
+        Args:
+            value (int): The perceptual hash to look up.
+            max_distance (int): The maximum Hamming distance.
+
+        Returns:
+            list: `(distance, identification_id)` tuples sorted by distance.
+        """
+        matches = []
+        if self._root is None:
+            return matches
+
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, ident) for ident in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            for edge, child in node[2].items():
+                if low <= edge <= high:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+# Hashes are re-read from this long before the newest one loaded, so writes stamped
+# shortly before it but committed after the previous refresh are not missed
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class PerceptualHashIndex:
+    def __init__(self, max_entries: int, refresh_seconds: int):
+        """
+        Initializes the near-duplicate index of completed identifications.
+
+        The index is loaded lazily from Mongo on first use and then refreshed
+        with records completed by other processes every `refresh_seconds`, paging
+        on the server time each hash was written, so records created long before
+        they complete are picked up too.
+
+        Args:
+            max_entries (int): Maximum number of hashes kept in memory. The oldest
+                quarter is dropped once the limit is reached.
+            refresh_seconds (int): Interval between incremental reloads from Mongo.
+        """
+        self.max_entries = max_entries
+        self.refresh_seconds = refresh_seconds
+        self._entries = deque()
+        self._ids = set()
+        self._tree = BKTree()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_refresh = 0.0
+        # Server time of the newest hash loaded
+        self._hashed_until = None
+
+    def add(self, perceptual_hash: str, identification_id: str):
+        """
+        Adds a completed identification to the index.
+
+        Args:
+            perceptual_hash (str): The hex hash from `compute_perceptual_hash`.
+            identification_id (str): The identification ID.
+        """
+        with self._lock:
+            self._add(int(perceptual_hash, 16), identification_id)
+
+    def find_matches(self, perceptual_hash: str, max_distance: int, db_service=None) -> list:
+        """
+        Finds indexed identifications close to a hash.
+
+        Args:
+            perceptual_hash (str): The hex hash from `compute_perceptual_hash`.
+            max_distance (int): The maximum Hamming distance for a match.
+            db_service (DatabaseService): Optional service used to load and refresh
+                the index from completed records.
+
+        Returns:
+            list: `(identification_id, distance)` tuples, closest first.
+        """
+        if db_service is not None:
+            self._refresh(db_service)
+
+        with self._lock:
+            matches = self._tree.search(int(perceptual_hash, 16), max_distance)
+        return [(identification_id, distance) for distance, identification_id in matches]
+
+    def _refresh(self, db_service):
+        now = time.monotonic()
+        if self._loaded and now - self._last_refresh < self.refresh_seconds:
+            return
+
+        with self._lock:
+            if self._loaded and now - self._last_refresh < self.refresh_seconds:
+                return
+            self._last_refresh = now
+            hashed_since = None
+            if self._loaded:
+                hashed_since = datetime.fromtimestamp(0, timezone.utc)
+                if self._hashed_until is not None:
+                    hashed_since = self._hashed_until - REFRESH_OVERLAP
+            self._loaded = True
+
+        try:
+            records = db_service.get_perceptual_hashes(hashed_since=hashed_since, limit=self.max_entries)
+        except Exception as e:
+            print(f"Error loading perceptual hash index: {e}")
+            return
+
+        with self._lock:
+            for identification_id, perceptual_hash, hashed_at in records:
+                self._add(int(perceptual_hash, 16), identification_id)
+                if hashed_at is not None and (self._hashed_until is None or hashed_at > self._hashed_until):
+                    self._hashed_until = hashed_at
+
+    def _add(self, value: int, identification_id: str):
+        if identification_id in self._ids:
+            return
+        self._ids.add(identification_id)
+        self._entries.append((value, identification_id))
+        self._tree.add(value, identification_id)
+        if len(self._entries) > self.max_entries:
+            for _ in range(max(1, self.max_entries // 4)):
+                self._ids.discard(self._entries.popleft()[1])
+            self._tree = BKTree()
+            for entry_value, entry_id in self._entries:
+                self._tree.add(entry_value, entry_id)
+
+
+perceptual_hash_index = PerceptualHashIndex(
+    max_entries=settings.phash_index_max_entries,
+    refresh_seconds=settings.phash_index_refresh_seconds,
+)
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from src.config import settings
+from src.core.image_processor import preprocess_image
+from src.core.metrics import observe_image_timings, preprocessing_in_flight
+from src.core.tracing import tracer
+
+
+def _warm_worker(nice: int):
+    """
+    Initializer of the preprocessing processes.
+
+    Loads every Pillow plugin up front so the first job does not pay for it, and
+    lowers the process priority so request handling on the same host wins the CPU.
+    """
+    from PIL import Image
+
+    Image.init()
+    if nice:
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _noop():
+    return None
+
+
+def _preprocess_timed(file_contents, with_perceptual_hash: bool) -> Tuple[Tuple[bytes, Optional[str]], dict]:
+    """
+    Runs `preprocess_image` and returns its result with the seconds spent per stage,
+    so the stage latencies measured in a worker process reach the caller's metrics.
+    """
+    timings = {}
+    return preprocess_image(file_contents, with_perceptual_hash, timings), timings
+
+
+class PreprocessPool:
+    def __init__(self, max_workers: Optional[int] = None, max_in_flight: Optional[int] = None):
+        """
+        Initializes the process pool running `preprocess_image` outside the GIL.
+
+        Args:
+            max_workers (int): Number of worker processes. Defaults to the CPU count;
+                0 runs preprocessing inline in the calling thread.
+            max_in_flight (int): Maximum number of uploads submitted at once. Callers
+                block once the limit is reached. Defaults to twice the worker count.
+        """
+        self.max_workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+        self.max_in_flight = max_in_flight or max(1, 2 * self.max_workers)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the worker processes and waits until each one is warm.
+        """
+        if self.max_workers == 0:
+            return
+        executor = self._get_executor()
+        for future in [executor.submit(_noop) for _ in range(self.max_workers)]:
+            future.result()
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, file_contents, with_perceptual_hash: bool = True) -> Tuple[bytes, Optional[str]]:
+        """
+        Preprocesses an upload in the pool and waits for the result.
+
+        A SpooledUpload is sent to the worker process as its path, and the process
+        reads the file itself instead of receiving a pickled copy of the image.
+
+        Args:
+            file_contents (bytes | SpooledUpload): The uploaded image data.
+            with_perceptual_hash (bool): Whether to compute the perceptual hash.
+
+        Returns:
+            tuple: The processed image data and its perceptual hash (or None).
+
+        Raises:
+            ValueError: If the image cannot be processed or fails validation.
+        """
+        with tracer.start_span("process_image", attributes={"image.size": len(file_contents)}) as span:
+            with preprocessing_in_flight.track():
+                if self.max_workers == 0:
+                    result, timings = _preprocess_timed(file_contents, with_perceptual_hash)
+                else:
+                    result, timings = self._submit(file_contents, with_perceptual_hash)
+            # Stages run in the pool process, so they are attributes instead of child spans
+            for stage, seconds in timings.items():
+                span.set_attribute(f"image.{stage}_seconds", seconds)
+        observe_image_timings(timings)
+        return result
+
+    def _submit(self, file_contents, with_perceptual_hash: bool) -> tuple:
+        with self._slots:
+            executor = self._get_executor()
+            try:
+                return executor.submit(_preprocess_timed, file_contents, with_perceptual_hash).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge image); replace the pool and retry once.
+                print("Preprocessing pool is broken, restarting it.")
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                return executor.submit(_preprocess_timed, file_contents, with_perceptual_hash).result()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                    initargs=(settings.preprocess_worker_nice,),
+                )
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+preprocess_pool = PreprocessPool(
+    max_workers=settings.preprocess_workers,
+    max_in_flight=settings.preprocess_max_in_flight,
+)
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        Initializes a token bucket rate limiter for coroutines of one event loop.
+
+        Args:
+            rate (float): Requests per second allowed.
+            burst (int): Requests allowed at once after a quiet period.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """
+        Waits until a request is allowed.
+        """
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class KeyedRateLimiter:
+    def __init__(self, rate: float, burst: int, max_keys: int = 10_000):
+        """
+        Initializes a token bucket rate limiter per key, e.g. per destination host.
+
+        Only the `max_keys` most recently used keys are tracked; a key dropped
+        from the limiter starts again with a full bucket.
+
+        Args:
+            rate (float): Requests per second allowed for each key.
+            burst (int): Requests allowed at once for each key after a quiet period.
+            max_keys (int): Maximum number of keys tracked.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def acquire(self, key: str):
+        """
+        Waits until a request for `key` is allowed.
+
+        Args:
+            key (str): The rate-limited key.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        await bucket.acquire()
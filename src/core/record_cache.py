@@ -0,0 +1,285 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from src.config import settings
+from src.models.plant_model import PlantIdentificationResult
+
+TERMINAL_STATUSES = ("Completed", "Error")
+
+
+def serialize_identification(identification: dict) -> tuple:
+    """
+    Serializes an identification the way `GET /identifications/{id}` returns it.
+
+    Args:
+        identification (dict): The identification document.
+
+    Returns:
+        tuple: The JSON body and its strong ETag.
+    """
+    body = PlantIdentificationResult.model_validate(identification).model_dump_json(by_alias=True).encode("utf-8")
+    return body, etag_of(body)
+
+
+def etag_of(body: bytes) -> str:
+    """
+    Returns the strong ETag of a response body.
+    """
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+class SharedRecordTier:
+    def __init__(self, client, ttl_seconds: int, prefix: str = "identification:"):
+        """
+        Initializes the shared tier of the record cache on a Redis-compatible server.
+
+        Only `get`, `set` with `ex` and `delete` are used, so any server speaking the
+        Redis protocol (or an object with the same methods) can stand in. Errors are
+        logged and treated as misses, so an unavailable server only costs the lookup.
+
+        Args:
+            client: A synchronous Redis-compatible client, e.g. `redis.Redis`.
+            ttl_seconds (int): Lifetime of a shared entry.
+            prefix (str): Prefix of the keys.
+        """
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, identification_id: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + identification_id)
+        except Exception as e:
+            print(f"Error reading shared record cache: {e}")
+            return None
+
+    def set(self, identification_id: str, body: bytes):
+        try:
+            self.client.set(self.prefix + identification_id, body, ex=self.ttl_seconds)
+        except Exception as e:
+            print(f"Error writing shared record cache: {e}")
+
+    def delete(self, identification_id: str):
+        try:
+            self.client.delete(self.prefix + identification_id)
+        except Exception as e:
+            print(f"Error invalidating shared record cache: {e}")
+
+
+class RecordCache:
+    def __init__(self, max_entries: int, shared: SharedRecordTier = None):
+        """
+        Initializes the read-through cache of serialized terminal identifications.
+
+        Identifications never change once `Completed` or `Error`, so their JSON body
+        and ETag are kept in an in-process LRU and, optionally, a shared tier reached
+        by every API and worker process. Records still `Processing` are never cached.
+
+        Args:
+            max_entries (int): Maximum number of records kept in memory.
+            shared (SharedRecordTier): Optional tier shared between processes.
+        """
+        self.max_entries = max_entries
+        self.shared = shared
+        # Set by the API process, whose requests read the in-process tier
+        self.serves_reads = False
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, identification_id: str) -> Optional[tuple]:
+        """
+        Looks up a record, in memory first, then in the shared tier.
+
+        Blocks on the shared tier; use `get_async` on the event loop.
+
+        Args:
+            identification_id (str): The identification ID.
+
+        Returns:
+            tuple: The JSON body and ETag, or None on a miss.
+        """
+        entry = self._get_local(identification_id)
+        if entry is None and self.shared is not None:
+            entry = self._get_shared(identification_id)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+        return entry
+
+    async def get_async(self, identification_id: str) -> Optional[tuple]:
+        """
+        Looks up a record without blocking the event loop on the shared tier.
+        """
+        entry = self._get_local(identification_id)
+        if entry is None and self.shared is not None:
+            entry = await asyncio.to_thread(self._get_shared, identification_id)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+        return entry
+
+    def put(self, identification: dict) -> Optional[tuple]:
+        """
+        Caches a terminal identification.
+
+        Blocks on the shared tier; use `put_async` on the event loop.
+
+        Args:
+            identification (dict): The identification document, with a string `_id`.
+
+        Returns:
+            tuple: The JSON body and ETag, or None if the identification is not terminal.
+        """
+        entry = self._put_local(identification)
+        if entry is not None and self.shared is not None:
+            self.shared.set(identification["_id"], entry[0])
+        return entry
+
+    async def put_async(self, identification: dict) -> Optional[tuple]:
+        """
+        Caches a terminal identification without blocking the event loop on the shared tier.
+        """
+        entry = self._put_local(identification)
+        if entry is not None and self.shared is not None:
+            await asyncio.to_thread(self.shared.set, identification["_id"], entry[0])
+        return entry
+
+    @property
+    def tracks_updates(self) -> bool:
+        """
+        Whether identification writes of this process should update the cache.
+
+        The shared tier is read by every process, but the in-process tier only by the
+        API of this process, so workers without a shared tier leave the cache alone.
+        """
+        return self.shared is not None or self.serves_reads
+
+    def invalidate(self, identification_id: str):
+        """
+        Removes a record from both tiers.
+
+        Args:
+            identification_id (str): The identification ID.
+        """
+        with self._lock:
+            self._entries.pop(identification_id, None)
+        if self.shared is not None:
+            self.shared.delete(identification_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the number of cached records and the hit and miss counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "shared": self.shared is not None,
+            }
+
+    def _get_local(self, identification_id: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(identification_id)
+            if entry is not None:
+                self._entries.move_to_end(identification_id)
+                self.memory_hits += 1
+            return entry
+
+    def _get_shared(self, identification_id: str) -> Optional[tuple]:
+        body = self.shared.get(identification_id)
+        if body is None:
+            return None
+        entry = (body, etag_of(body))
+        with self._lock:
+            self.shared_hits += 1
+            self._store(identification_id, entry)
+        return entry
+
+    def _put_local(self, identification: dict) -> Optional[tuple]:
+        if identification.get("status") not in TERMINAL_STATUSES:
+            return None
+        entry = serialize_identification(identification)
+        with self._lock:
+            self._store(identification["_id"], entry)
+        return entry
+
+    def _store(self, identification_id: str, entry: tuple):
+        self._entries[identification_id] = entry
+        self._entries.move_to_end(identification_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def cache_updates(identifications: list):
+    """
+    Caches identifications this process just wrote, when `tracks_updates` allows it.
+
+    Args:
+        identifications (list): The terminal identifications, with string `_id`s.
+    """
+    if record_cache.tracks_updates:
+        for identification in identifications:
+            record_cache.put(identification)
+
+
+async def cache_updates_async(identifications: list):
+    """
+    Coroutine version of `cache_updates`.
+    """
+    if record_cache.tracks_updates:
+        for identification in identifications:
+            await record_cache.put_async(identification)
+
+
+def invalidate_updates(identification_ids: list):
+    """
+    Removes identifications whose write failed or is buffered, when `tracks_updates` allows it.
+
+    Args:
+        identification_ids (list): The identification IDs.
+    """
+    if record_cache.tracks_updates:
+        for identification_id in identification_ids:
+            record_cache.invalidate(identification_id)
+
+
+def create_record_cache() -> RecordCache:
+    """
+    Creates the record cache configured in the settings.
+
+    The shared tier needs the optional `redis` package and `record_cache_redis_url`;
+    without them only the in-process tier is used.
+
+    Returns:
+        RecordCache: The record cache.
+    """
+    shared = None
+    if settings.record_cache_redis_url:
+        try:
+            import redis
+        except ImportError:
+            print("record_cache_redis_url is set but the redis package is not installed, using the in-process cache only.")
+        else:
+            shared = SharedRecordTier(
+                redis.Redis.from_url(settings.record_cache_redis_url, socket_timeout=settings.record_cache_redis_timeout_seconds),
+                ttl_seconds=settings.record_cache_redis_ttl_seconds,
+            )
+    return RecordCache(settings.record_cache_max_entries, shared)
+
+
+record_cache = create_record_cache()
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.config import settings
+
+
+def build_cache_key(image_data: bytes, details: list) -> str:
+    """
+    Builds a content-addressed cache key for an identification request.
+
+    Args:
+        image_data (bytes): The processed image data sent to Kindwise.
+        details (list): The Kindwise details requested for the identification.
+
+    Returns:
+        str: The hex SHA-256 digest of the image bytes and the sorted details.
+    """
+    digest = hashlib.sha256(image_data)
+    digest.update(b"\0")
+    digest.update(",".join(sorted(details)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_size: int, ttl_seconds: int):
+        """
+        Initializes the two-tier identification result cache.
+
+        The first tier is an in-process LRU bounded by size and entry age. The
+        second tier is the Mongo `identification_cache` collection, reached
+        through the DatabaseService passed to `get` and `set`.
+
+        Args:
+            max_size (int): Maximum number of entries kept in memory.
+            ttl_seconds (int): Maximum age of an entry before it is evicted.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, cache_key: str, db_service=None) -> Optional[dict]:
+        """
+        Looks up a cached identification result.
+
+        Args:
+            cache_key (str): The key built by `build_cache_key`.
+            db_service (DatabaseService): Optional service for the Mongo tier.
+
+        Returns:
+            dict: A copy of the cached result, or None on a miss.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                stored_at, data = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(cache_key)
+                    self.memory_hits += 1
+                    return dict(data)
+                del self._entries[cache_key]
+
+        data = None
+        if db_service is not None:
+            data = db_service.get_cached_result(cache_key, self.ttl_seconds)
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._store(cache_key, data, now)
+        return dict(data)
+
+    def set(self, cache_key: str, data: dict, db_service=None):
+        """
+        Stores an identification result in both cache tiers.
+
+        Args:
+            cache_key (str): The key built by `build_cache_key`.
+            data (dict): The simplified identification result.
+            db_service (DatabaseService): Optional service for the Mongo tier.
+        """
+        with self._lock:
+            self._store(cache_key, dict(data), time.monotonic())
+        if db_service is not None:
+            db_service.store_cached_result(cache_key, data)
+
+    def clear(self):
+        """
+        Drops every in-memory entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.db_hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Returns the cache hit/miss counters.
+
+        Returns:
+            dict: Hit and miss counts, the hit ratio and the in-memory size.
+        """
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def _store(self, cache_key: str, data: dict, stored_at: float):
+        self._entries[cache_key] = (stored_at, data)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+identification_cache = ResultCache(
+    max_size=settings.result_cache_max_size,
+    ttl_seconds=settings.result_cache_ttl_seconds,
+)
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import threading
+from src.core.upload_spool import SpooledUpload
+
+
+class FlightAbortedError(Exception):
+    """
+    Raised to followers whose leader stopped without producing an outcome.
+    """
+
+
+def upload_key(file_contents: bytes) -> str:
+    """
+    Returns the single-flight key of an upload.
+
+    Args:
+        file_contents (bytes | memoryview | SpooledUpload): The uploaded image data.
+
+    Returns:
+        str: The SHA-256 digest of the upload.
+    """
+    if isinstance(file_contents, SpooledUpload):
+        # Computed while the upload was written to the spool
+        return file_contents.content_hash
+    return hashlib.sha256(file_contents).hexdigest()
+
+
+async def upload_key_async(file_contents: bytes) -> str:
+    """
+    Coroutine version of `upload_key`, hashing in-memory uploads in a thread so
+    large images do not block the event loop.
+
+    Args:
+        file_contents (bytes | memoryview | SpooledUpload): The uploaded image data.
+
+    Returns:
+        str: The SHA-256 digest of the upload.
+    """
+    if isinstance(file_contents, SpooledUpload):
+        return file_contents.content_hash
+    return await asyncio.to_thread(upload_key, file_contents)
+
+
+class Flight:
+    def __init__(self, key: str, member: str):
+        """
+        Initializes an in-flight computation shared by every member that joined it.
+
+        Args:
+            key (str): The key of the computation.
+            member (str): The member starting the computation, i.e. its leader.
+        """
+        self.key = key
+        self.members = [member]
+        self.outcome = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._waiters = []
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def resolve(self, outcome=None, error: BaseException = None):
+        """
+        Publishes the outcome of the computation and wakes up every follower.
+
+        Args:
+            outcome: The outcome handed to the followers.
+            error (BaseException): The error raised to the followers instead.
+        """
+        with self._lock:
+            self.outcome = outcome
+            self.error = error
+            self._done.set()
+            waiters, self._waiters = self._waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The follower's event loop is already closed
+                pass
+
+    def wait(self):
+        """
+        Blocks until the leader resolves the flight.
+
+        Returns:
+            The outcome of the computation.
+
+        Raises:
+            Exception: The error the leader resolved the flight with.
+        """
+        self._done.wait()
+        return self._result()
+
+    async def wait_async(self):
+        """
+        Waits on the running event loop until the leader resolves the flight.
+
+        Returns:
+            The outcome of the computation.
+
+        Raises:
+            Exception: The error the leader resolved the flight with.
+        """
+        event = asyncio.Event()
+        with self._lock:
+            if self._done.is_set():
+                event.set()
+            else:
+                self._waiters.append((asyncio.get_running_loop(), event))
+        await event.wait()
+        return self._result()
+
+    def _result(self):
+        if self.error is not None:
+            raise self.error
+        return self.outcome
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Initializes the registry deduplicating concurrent computations of the same key.
+
+        The first member to join a key leads the computation; members joining while
+        it is in flight attach to it and wait for its outcome. Safe to use from
+        several threads and event loops.
+        """
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0
+
+    def join(self, key: str, member: str):
+        """
+        Joins the in-flight computation of a key, or starts a new one.
+
+        Args:
+            key (str): The key of the computation.
+            member (str): The joining member.
+
+        Returns:
+            tuple: The flight and whether the caller leads it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.members.append(member)
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key, member)
+            return flight, True
+
+    def land(self, flight: Flight) -> list:
+        """
+        Closes a flight to new members. Members joining afterwards start a new flight.
+
+        Args:
+            flight (Flight): The flight led by the caller.
+
+        Returns:
+            list: Every member of the flight, leader first.
+        """
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            return list(flight.members)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of flights in progress and of members that joined one.
+        """
+        with self._lock:
+            return {"in_flight": len(self._flights), "coalesced": self.coalesced}
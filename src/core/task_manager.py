@@ -1,34 +1,358 @@
-from src.core.image_processor import process_image
-from src.core.kindwise_wrapper import KindwiseClient
+import asyncio
+from src.config import settings
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.kindwise_wrapper import AsyncKindwiseClient, KindwiseClient, IDENTIFICATION_DETAILS
+from src.core.notification_hub import notification_hub
+from src.core.phash_index import perceptual_hash_index
+from src.core.preprocess_pool import preprocess_pool
+from src.core.result_cache import build_cache_key, identification_cache
+from src.core.single_flight import Flight, FlightAbortedError, SingleFlight, upload_key, upload_key_async
+from src.core.tracing import tracer
+from src.core.webhooks import WebhookOutbox, build_webhook_payload
 from src.db.db_service import DatabaseService
 
+# Maximum number of near-duplicate candidates fetched from the database per task.
+MAX_NEAR_DUPLICATE_CANDIDATES = 3
 
-def identify_plant_task(file_contents: bytes, api_key: str, identification_id: str):
+# Identifications in progress in this process, keyed by the hash of the upload.
+identification_flights = SingleFlight()
+
+
+def identify_plant_task(file_contents: bytes, api_key: str, identification_id: str, callback_url: str = None):
     """
     Background task to process the image and identify the plant.
 
+    Results are looked up in the identification cache first and then among
+    perceptually similar completed identifications, so re-uploads and re-shot
+    photos of the same plant are completed without calling the Kindwise API.
+    Tasks for an upload that is already being identified in this process wait
+    for that identification instead of repeating it.
+
+    Args:
+        file_contents (bytes | SpooledUpload): The uploaded image data.
+        api_key (str): The API key to use for Kindwise.
+        identification_id (str): The identification ID in the database.
+        callback_url (str): URL notified through the webhook outbox when the task finishes.
+
+    Raises:
+        CircuitOpenError: If Kindwise is unavailable; the identification is left
+            processing so the job can be retried later.
+    """
+    db_service = DatabaseService()
+
+    with tracer.start_span("identify_plant_task", attributes={"identification.id": identification_id}) as span:
+        try:
+            while True:
+                flight, leader = identification_flights.join(upload_key(file_contents), identification_id)
+                span.set_attribute("identification.leader", leader)
+                if leader:
+                    outcome = lead_identification(flight, file_contents, api_key, identification_id, db_service)
+                    break
+                try:
+                    outcome = flight.wait()
+                    break
+                except FlightAbortedError:
+                    continue
+        finally:
+            # Wake up requests of this process waiting for the result
+            notification_hub.publish(identification_id)
+
+        queue_webhook(callback_url, build_webhook_payload(identification_id, **outcome), db_service)
+
+
+async def identify_plant_task_async(
+    file_contents: bytes, api_key: str, identification_id: str, callback_url: str = None
+):
+    """
+    Coroutine version of `identify_plant_task`.
+
+    The Kindwise round trip is awaited on the event loop instead of blocking a
+    thread; preprocessing and database work still run in the default executor.
+
     Args:
-        file_contents (bytes): The uploaded image data.
+        file_contents (bytes | SpooledUpload): The uploaded image data.
         api_key (str): The API key to use for Kindwise.
         identification_id (str): The identification ID in the database.
+        callback_url (str): URL notified through the webhook outbox when the task finishes.
+
+    Raises:
+        CircuitOpenError: If Kindwise is unavailable.
     """
     db_service = DatabaseService()
 
+    with tracer.start_span("identify_plant_task", attributes={"identification.id": identification_id}) as span:
+        try:
+            key = await upload_key_async(file_contents)
+            while True:
+                flight, leader = identification_flights.join(key, identification_id)
+                span.set_attribute("identification.leader", leader)
+                if leader:
+                    outcome = await lead_identification_async(
+                        flight, file_contents, api_key, identification_id, db_service
+                    )
+                    break
+                try:
+                    outcome = await flight.wait_async()
+                    break
+                except FlightAbortedError:
+                    continue
+        finally:
+            notification_hub.publish(identification_id)
+
+        payload = build_webhook_payload(identification_id, **outcome)
+        await asyncio.to_thread(queue_webhook, callback_url, payload, db_service)
+
+
+def lead_identification(
+    flight: Flight, file_contents: bytes, api_key: str, identification_id: str, db_service: DatabaseService
+) -> dict:
+    """
+    Identifies an upload and records the outcome for every identification of the flight.
+
+    Args:
+        flight (Flight): The flight led by the caller.
+        file_contents (bytes | SpooledUpload): The uploaded image data.
+        api_key (str): The API key to use for Kindwise.
+        identification_id (str): The identification ID of the leader.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        dict: The outcome, i.e. the `result` or the `error_message`.
+    """
+    try:
+        try:
+            processed_image, perceptual_hash, cache_key, identification_result = prepare_identification(
+                file_contents, identification_id, db_service
+            )
+
+            if identification_result is None:
+                # Initialize Kindwise client
+                kindwise_client = KindwiseClient(api_key=api_key)
+
+                # Identify the plant
+                identification_result = kindwise_client.identify_plant(
+                    processed_image, details=IDENTIFICATION_DETAILS
+                )
+            else:
+                cache_key = None
+
+            outcome = record_identification(
+                identification_flights.land(flight), identification_result, perceptual_hash, cache_key, db_service
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            outcome = record_identification_error(identification_flights.land(flight), e, db_service)
+    except BaseException as e:
+        abort_flight(flight, e)
+        raise
+
+    flight.resolve(outcome)
+    return outcome
+
+
+async def lead_identification_async(
+    flight: Flight, file_contents: bytes, api_key: str, identification_id: str, db_service: DatabaseService
+) -> dict:
+    """
+    Coroutine version of `lead_identification`.
+
+    Args:
+        flight (Flight): The flight led by the caller.
+        file_contents (bytes | SpooledUpload): The uploaded image data.
+        api_key (str): The API key to use for Kindwise.
+        identification_id (str): The identification ID of the leader.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        dict: The outcome, i.e. the `result` or the `error_message`.
+    """
     try:
-        # Process the image
-        processed_image = process_image(file_contents)
+        try:
+            processed_image, perceptual_hash, cache_key, identification_result = await asyncio.to_thread(
+                prepare_identification, file_contents, identification_id, db_service
+            )
 
-        # Initialize Kindwise client
-        kindwise_client = KindwiseClient(api_key=api_key)
+            if identification_result is None:
+                identification_result = await AsyncKindwiseClient(api_key=api_key).identify_plant(
+                    processed_image, details=IDENTIFICATION_DETAILS
+                )
+            else:
+                cache_key = None
 
-        # Identify the plant
-        identification_result = kindwise_client.identify_plant(processed_image)
+            outcome = await asyncio.to_thread(
+                record_identification,
+                identification_flights.land(flight),
+                identification_result,
+                perceptual_hash,
+                cache_key,
+                db_service,
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            outcome = await asyncio.to_thread(
+                record_identification_error, identification_flights.land(flight), e, db_service
+            )
+    except BaseException as e:
+        abort_flight(flight, e)
+        raise
 
-        # Update the identification record in the database
-        db_service.update_identification(identification_id, identification_result)
+    flight.resolve(outcome)
+    return outcome
 
-        print("Plant identification task completed.")
+
+def abort_flight(flight: Flight, error: BaseException):
+    """
+    Releases the followers of a flight whose leader did not finish.
+
+    Followers re-raise CircuitOpenError so their jobs are deferred as well; on any
+    other error (e.g. the leader was cancelled) they identify the upload themselves.
+
+    Args:
+        flight (Flight): The flight led by the caller.
+        error (BaseException): The error that stopped the leader.
+    """
+    identification_flights.land(flight)
+    if isinstance(error, CircuitOpenError):
+        flight.resolve(error=error)
+    else:
+        flight.resolve(error=FlightAbortedError(str(error)))
+
+
+def prepare_identification(file_contents: bytes, identification_id: str, db_service: DatabaseService):
+    """
+    Preprocesses an upload and looks for a known result of the same image.
+
+    Args:
+        file_contents (bytes | SpooledUpload): The uploaded image data.
+        identification_id (str): The identification ID in the database.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        tuple: The processed image, its perceptual hash (or None), its result cache key
+            (or None) and the known identification result (or None).
+    """
+    # Process the image in the preprocessing pool
+    processed_image, perceptual_hash = preprocess_pool.run(
+        file_contents, with_perceptual_hash=settings.phash_enabled
+    )
+
+    cache_key = None
+    identification_result = None
+    if settings.result_cache_enabled:
+        cache_key = build_cache_key(processed_image, IDENTIFICATION_DETAILS)
+        identification_result = identification_cache.get(cache_key, db_service)
+        if identification_result is not None:
+            print("Identification result served from cache.")
+
+    if identification_result is None and perceptual_hash is not None:
+        identification_result = find_near_duplicate_result(
+            perceptual_hash, identification_id, db_service
+        )
+        if identification_result is not None:
+            print("Identification result served from a near-duplicate image.")
+
+    return processed_image, perceptual_hash, cache_key, identification_result
+
+
+def record_identification(
+    identification_ids: list, identification_result: dict, perceptual_hash: str, cache_key: str, db_service: DatabaseService
+) -> dict:
+    """
+    Stores a finished identification for every upload that joined it.
+
+    Args:
+        identification_ids (list): The identification IDs in the database, leader first.
+        identification_result (dict): The identification result.
+        perceptual_hash (str): The perceptual hash of the processed image, if computed.
+        cache_key (str): The result cache key to store a fresh Kindwise result under, if any.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        dict: The outcome reporting the result.
+    """
+    if cache_key is not None:
+        identification_cache.set(cache_key, identification_result, db_service)
+
+    # Update the identification records in the database
+    if len(identification_ids) == 1:
+        db_service.update_identification(
+            identification_ids[0], identification_result, perceptual_hash=perceptual_hash
+        )
+    else:
+        db_service.update_identifications(
+            identification_ids, identification_result, perceptual_hash=perceptual_hash
+        )
+    if perceptual_hash is not None:
+        # Duplicates share the hash, so indexing the leader is enough to find them
+        perceptual_hash_index.add(perceptual_hash, identification_ids[0])
+
+    print("Plant identification task completed.")
+    return {"result": identification_result}
+
+
+def record_identification_error(identification_ids: list, error: Exception, db_service: DatabaseService) -> dict:
+    """
+    Stores the error of a failed identification for every upload that joined it.
+
+    Args:
+        identification_ids (list): The identification IDs in the database, leader first.
+        error (Exception): The error that ended the task.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        dict: The outcome reporting the error.
+    """
+    print(f"Error in plant identification task: {error}")
+    # Update the identification records with error status
+    if len(identification_ids) == 1:
+        db_service.update_identification_error(identification_ids[0], str(error))
+    else:
+        db_service.update_identifications_error(identification_ids, str(error))
+    return {"error_message": str(error)}
+
+
+def queue_webhook(callback_url: str, payload: dict, db_service: DatabaseService):
+    """
+    Writes a webhook delivery to the outbox when the client supplied a callback URL.
+
+    Args:
+        callback_url (str): The callback URL, if any.
+        payload (dict): The webhook payload.
+        db_service (DatabaseService): The database service.
+    """
+    if callback_url is None:
+        return
+    try:
+        WebhookOutbox(db_service).add(callback_url, payload)
     except Exception as e:
-        print(f"Error in plant identification task: {e}")
-        # Update the identification record with error status
-        db_service.update_identification_error(identification_id, str(e))
+        print(f"Error queueing webhook delivery: {e}")
+
+
+def find_near_duplicate_result(perceptual_hash: str, identification_id: str, db_service: DatabaseService):
+    """
+    Finds a confident prior identification of a perceptually similar image.
+
+    Args:
+        perceptual_hash (str): The perceptual hash of the processed image.
+        identification_id (str): The identification being processed, excluded from matches.
+        db_service (DatabaseService): The database service.
+
+    Returns:
+        dict: The prior identification result, or None if no confident match exists.
+    """
+    matches = perceptual_hash_index.find_matches(
+        perceptual_hash, settings.phash_max_distance, db_service
+    )
+    candidates = [match_id for match_id, _ in matches if match_id != identification_id]
+
+    for match_id in candidates[:MAX_NEAR_DUPLICATE_CANDIDATES]:
+        record = db_service.get_identification_by_id(match_id)
+        if not record or record.get("status") != "Completed":
+            continue
+        result = record.get("result") or {}
+        probability = result.get("probability") or 0.0
+        if result.get("is_plant") and probability >= settings.phash_min_probability:
+            return result
+    return None
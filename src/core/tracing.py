@@ -0,0 +1,374 @@
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+from src.config import settings
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id", "sampled")
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool):
+        """
+        Initializes the identity of a span, as propagated in a W3C `traceparent`.
+
+        Args:
+            trace_id (str): The 32-character hex trace ID.
+            span_id (str): The 16-character hex span ID.
+            sampled (bool): Whether the trace is recorded.
+        """
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """
+    Parses a W3C `traceparent` header.
+
+    Args:
+        header (str): The header value, e.g. from a request or a job document.
+
+    Returns:
+        SpanContext: The remote parent, or None if the header is missing or invalid.
+    """
+    if not header:
+        return None
+    match = TRACEPARENT_PATTERN.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+
+class Span:
+    def __init__(self, tracer: "Tracer", name: str, context: SpanContext, parent_span_id: str = None,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: dict = None, start_ns: int = None):
+        """
+        Initializes a span; use it as a context manager to make it the current span.
+
+        Spans of unsampled traces keep their context, so the trace ID still
+        propagates, but record nothing.
+
+        Args:
+            tracer (Tracer): The tracer exporting the span when it ends.
+            name (str): The span name.
+            context (SpanContext): The identity of the span.
+            parent_span_id (str): The span ID of the parent, if any.
+            kind (int): The OTLP span kind.
+            attributes (dict): Initial attributes.
+            start_ns (int): Start time in nanoseconds since the epoch. Defaults to now.
+        """
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes) if attributes and context.sampled else {}
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.context.trace_id
+
+    def set_attribute(self, key: str, value):
+        if self.context.sampled:
+            self.attributes[key] = value
+
+    def record_error(self, error: BaseException):
+        if self.context.sampled:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, end_ns: int = None):
+        """
+        Ends the span and hands it to the exporter if its trace is sampled.
+        """
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.context.sampled:
+            self.tracer.export(self)
+
+    def to_otlp(self) -> dict:
+        """
+        Returns the span in the OTLP/JSON encoding.
+        """
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": encode_attributes(self.attributes),
+        }
+        if self.parent_span_id is not None:
+            span["parentSpanId"] = self.parent_span_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+
+
+class NoopSpan:
+    """
+    Span returned while tracing is disabled; it has no context and records nothing.
+    """
+    context = None
+    trace_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def end(self, end_ns: int = None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+def encode_attributes(attributes: dict) -> list:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": typed})
+    return encoded
+
+
+class JsonlSpanExporter:
+    def __init__(self, path: str, service_name: str, max_queue: int = 10_000, batch_size: int = 512):
+        """
+        Initializes an exporter appending finished spans to a file as OTLP/JSON lines.
+
+        Each line is an `ExportTraceServiceRequest`, the format read by the
+        OpenTelemetry Collector `otlpjsonfile` receiver. Spans are queued and
+        written by a background thread; when the queue is full they are dropped
+        instead of slowing down requests.
+
+        Args:
+            path (str): The file path; `{pid}` is replaced by the process ID.
+            service_name (str): The `service.name` resource attribute.
+            max_queue (int): Maximum number of spans waiting to be written.
+            batch_size (int): Maximum number of spans per line.
+        """
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+
+    def flush(self):
+        """
+        Writes every queued span.
+        """
+        spans = []
+        while True:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(spans) == self.batch_size:
+                self._write(spans)
+                spans = []
+        if spans:
+            self._write(spans)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "exported": self.exported, "dropped": self.dropped, "queued": self._queue.qsize()}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            spans = [self._queue.get()]
+            while len(spans) < self.batch_size:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(spans)
+
+    def _write(self, spans: list):
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": encode_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": "zelara"}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        }
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+            self.exported += len(spans)
+        except OSError as e:
+            self.dropped += len(spans)
+            print(f"Error exporting spans: {e}")
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, exporter: JsonlSpanExporter = None):
+        """
+        Initializes the tracer of this process.
+
+        New traces are sampled with probability `sample_rate`; traces continued
+        from a `traceparent` keep the decision of their parent. With a rate of 0,
+        tracing is disabled and spans cost a function call.
+
+        Args:
+            sample_rate (float): Fraction of new traces that are recorded.
+            exporter (JsonlSpanExporter): Receives the finished spans of sampled traces.
+        """
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start_span(self, name: str, parent: SpanContext = None, kind: int = SPAN_KIND_INTERNAL,
+                   attributes: dict = None, start_ns: int = None):
+        """
+        Starts a span, a child of `parent` or of the current span, or a new trace.
+
+        Args:
+            name (str): The span name.
+            parent (SpanContext): An explicit parent, e.g. parsed from a `traceparent`.
+            kind (int): The OTLP span kind.
+            attributes (dict): Initial attributes.
+            start_ns (int): Start time in nanoseconds since the epoch. Defaults to now.
+
+        Returns:
+            Span | NoopSpan: The span; use it as a context manager.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        span_id = f"{random.getrandbits(64):016x}"
+        if parent is None:
+            context = SpanContext(f"{random.getrandbits(128):032x}", span_id, random.random() < self.sample_rate)
+            return Span(self, name, context, kind=kind, attributes=attributes, start_ns=start_ns)
+        context = SpanContext(parent.trace_id, span_id, parent.sampled)
+        return Span(self, name, context, parent.span_id, kind, attributes, start_ns)
+
+    def export(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def stats(self) -> dict:
+        """
+        Returns the sampling rate and the counters of the exporter.
+        """
+        stats = {"enabled": self.enabled, "sample_rate": self.sample_rate}
+        if self.exporter is not None:
+            stats.update(self.exporter.stats())
+        return stats
+
+    def shutdown(self):
+        """
+        Writes the spans still queued for export, e.g. before the process exits.
+        """
+        if self.exporter is not None:
+            self.exporter.flush()
+
+
+def current_span():
+    """
+    Returns the current span, or None outside of any span.
+    """
+    return _current_span.get()
+
+
+def current_traceparent() -> Optional[str]:
+    """
+    Returns the `traceparent` of the current span, to continue its trace in another process.
+    """
+    span = _current_span.get()
+    return span.context.traceparent() if span is not None else None
+
+
+def current_trace_id() -> Optional[str]:
+    """
+    Returns the trace ID of the current span if its trace is sampled.
+    """
+    span = _current_span.get()
+    return span.context.trace_id if span is not None and span.context.sampled else None
+
+
+def create_tracer() -> Tracer:
+    """
+    Creates the tracer configured in the settings.
+    """
+    exporter = None
+    if settings.tracing_sample_rate > 0 and settings.tracing_export_path:
+        exporter = JsonlSpanExporter(
+            settings.tracing_export_path, settings.tracing_service_name, max_queue=settings.tracing_export_queue_size
+        )
+    return Tracer(settings.tracing_sample_rate, exporter)
+
+
+tracer = create_tracer()
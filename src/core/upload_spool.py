@@ -0,0 +1,279 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Callable, Iterable, Optional
+from src.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+PART_SUFFIX = ".part"
+
+
+class SpoolFullError(Exception):
+    """
+    Raised when spooling an upload would exceed the disk quota of the spool.
+    """
+
+
+class SpooledUpload:
+    def __init__(self, path: str, size: int, content_hash: str):
+        """
+        Initializes a reference to an upload written to the spool directory.
+
+        It is small and picklable, so jobs and preprocessing processes receive the
+        path instead of the image data, and path-like, so Pillow opens it directly.
+
+        Args:
+            path (str): The absolute path of the spooled file.
+            size (int): The size of the upload in bytes.
+            content_hash (str): The SHA-256 digest of the upload.
+        """
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, SpooledUpload) and (self.path, self.size, self.content_hash) == (
+            other.path, other.size, other.content_hash
+        )
+
+    def __repr__(self) -> str:
+        return f"SpooledUpload({self.path!r}, size={self.size})"
+
+    def to_document(self) -> dict:
+        """
+        Returns the job document field referencing the upload.
+        """
+        return {"path": self.path, "size": self.size, "sha256": self.content_hash}
+
+    @classmethod
+    def from_document(cls, document: dict) -> "SpooledUpload":
+        """
+        Creates a reference from the job document field written by `to_document`.
+        """
+        return cls(document["path"], document["size"], document["sha256"])
+
+
+class UploadSpool:
+    def __init__(
+        self,
+        directory: Optional[str],
+        threshold_bytes: int,
+        quota_bytes: int,
+        max_age_seconds: int = 24 * 3600,
+        in_use: Callable = None,
+    ):
+        """
+        Initializes the spool writing large uploads to disk instead of keeping them in memory.
+
+        Uploads are written under a temporary name and renamed once complete. The
+        quota counts the complete files in the directory, so it holds across every
+        process sharing it, plus the uploads this process is still writing.
+
+        Args:
+            directory (str): The spool directory, shared by API and workers. None disables spooling.
+            threshold_bytes (int): Uploads of at least this size are spooled.
+            quota_bytes (int): Maximum total size of the spooled uploads.
+            max_age_seconds (int): Age after which `sweep` removes files left behind.
+            in_use (callable): Called by `sweep` with the paths of old files, returns
+                those still referenced by a job, which are kept. Set once the job
+                queue is available, see `JobQueue.spooled_paths`.
+        """
+        self.directory = os.path.abspath(directory) if directory else None
+        self.threshold_bytes = threshold_bytes
+        self.quota_bytes = quota_bytes
+        self.max_age_seconds = max_age_seconds
+        self.in_use = in_use
+        self._lock = threading.Lock()
+        self._reserved = 0
+        self.spooled = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def should_spool(self, size: int) -> bool:
+        """
+        Checks whether an upload of `size` bytes should be spooled.
+        """
+        return self.enabled and size >= self.threshold_bytes
+
+    def write_stream(self, stream: BinaryIO) -> SpooledUpload:
+        """
+        Copies a file-like upload to the spool, e.g. the temporary file of an UploadFile.
+
+        Blocks on disk I/O; run it in a thread from the event loop.
+
+        Args:
+            stream (BinaryIO): A seekable binary stream holding the upload.
+
+        Returns:
+            SpooledUpload: The spooled upload.
+
+        Raises:
+            SpoolFullError: If the upload does not fit in the quota.
+        """
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        return self._write(iter(lambda: stream.read(CHUNK_SIZE), b""), size)
+
+    def write_buffer(self, image_data) -> SpooledUpload:
+        """
+        Writes an upload held in memory to the spool, so the buffer can be released.
+
+        Blocks on disk I/O; run it in a thread from the event loop.
+
+        Args:
+            image_data (bytes | memoryview): The upload.
+
+        Returns:
+            SpooledUpload: The spooled upload.
+
+        Raises:
+            SpoolFullError: If the upload does not fit in the quota.
+        """
+        view = memoryview(image_data)
+        return self._write((view[start:start + CHUNK_SIZE] for start in range(0, len(view), CHUNK_SIZE)), len(view))
+
+    def remove(self, upload):
+        """
+        Deletes a spooled upload, ignoring files that are already gone.
+
+        Args:
+            upload (SpooledUpload | str): The upload or its path.
+        """
+        try:
+            os.remove(os.fspath(upload))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing spooled upload {os.fspath(upload)}: {e}")
+
+    def usage(self) -> int:
+        """
+        Returns the total size of the complete files in the spool directory.
+        """
+        used = 0
+        for entry in self._entries():
+            if not entry.name.endswith(PART_SUFFIX):
+                try:
+                    used += entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return used
+
+    def sweep(self, max_age_seconds: int = None) -> int:
+        """
+        Removes spooled files older than `max_age_seconds`, left behind by crashed
+        processes or by requests that failed before their job was queued.
+
+        Files still referenced by a job according to `in_use`, e.g. of jobs deferred
+        by the circuit breaker or waiting in a batch, are kept whatever their age.
+
+        Args:
+            max_age_seconds (int): Minimum age of the removed files. Defaults to the spool setting.
+
+        Returns:
+            int: The number of files removed.
+        """
+        cutoff = time.time() - (self.max_age_seconds if max_age_seconds is None else max_age_seconds)
+        stale = []
+        for entry in self._entries():
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    stale.append(entry.path)
+            except FileNotFoundError:
+                pass
+        if stale and self.in_use is not None:
+            try:
+                referenced = self.in_use(stale)
+            except Exception as e:
+                print(f"Error looking up spooled uploads of queued jobs, keeping them: {e}")
+                return 0
+            stale = [path for path in stale if path not in referenced]
+
+        removed = 0
+        for path in stale:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Error removing stale spooled upload {path}: {e}")
+        if removed:
+            print(f"Removed {removed} stale spooled uploads.")
+        return removed
+
+    def stats(self) -> dict:
+        """
+        Returns the spool configuration, its disk usage and the upload counters of this process.
+        """
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "threshold_bytes": self.threshold_bytes,
+            "quota_bytes": self.quota_bytes,
+            "used_bytes": self.usage() if self.enabled else 0,
+            "spooled": self.spooled,
+            "rejected": self.rejected,
+        }
+
+    def _entries(self) -> list:
+        if not self.enabled:
+            return []
+        try:
+            with os.scandir(self.directory) as entries:
+                return [entry for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def _reserve(self, size: int):
+        with self._lock:
+            if self.usage() + self._reserved + size > self.quota_bytes:
+                # Files of crashed jobs may be taking up the quota
+                self.sweep()
+                if self.usage() + self._reserved + size > self.quota_bytes:
+                    self.rejected += 1
+                    raise SpoolFullError("Upload spool is full. Please retry later.")
+            self._reserved += size
+
+    def _write(self, chunks: Iterable, size: int) -> SpooledUpload:
+        self._reserve(size)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, part_path = tempfile.mkstemp(prefix="upload-", suffix=PART_SUFFIX, dir=self.directory)
+            try:
+                digest = hashlib.sha256()
+                with os.fdopen(fd, "wb") as file:
+                    for chunk in chunks:
+                        digest.update(chunk)
+                        file.write(chunk)
+                path = part_path[: -len(PART_SUFFIX)]
+                os.replace(part_path, path)
+            except BaseException:
+                self.remove(part_path)
+                raise
+        finally:
+            with self._lock:
+                self._reserved -= size
+        with self._lock:
+            self.spooled += 1
+        return SpooledUpload(path, size, digest.hexdigest())
+
+
+upload_spool = UploadSpool(
+    settings.upload_spool_dir,
+    threshold_bytes=settings.upload_spool_threshold_bytes,
+    quota_bytes=settings.upload_spool_quota_bytes,
+    max_age_seconds=settings.upload_spool_max_age_seconds,
+)
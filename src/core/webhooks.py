@@ -0,0 +1,415 @@
+import asyncio
+import ipaddress
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+from src.config import settings
+from src.core.rate_limit import KeyedRateLimiter
+from src.db.db_service import DatabaseService
+
+DELIVERY_PENDING = "pending"
+DELIVERY_FAILED = "failed"
+
+
+def is_valid_callback_url(url: str) -> bool:
+    """
+    Checks that a callback URL is an absolute http(s) URL.
+
+    Args:
+        url (str): The callback URL.
+
+    Returns:
+        bool: Whether webhooks can be delivered to the URL.
+    """
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and bool(parts.hostname)
+
+
+class UnsafeCallbackError(ValueError):
+    """
+    Raised when a callback URL points at a host webhooks must not be sent to.
+    """
+
+
+def is_public_address(address: str) -> bool:
+    """
+    Checks that an IP address is globally routable, i.e. not loopback, private,
+    link-local (e.g. cloud metadata endpoints), reserved or multicast.
+    """
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def resolve_callback_url(url: str) -> Optional[str]:
+    """
+    Resolves the host of a callback URL and checks that webhooks may be sent to it.
+
+    Hosts listed in `webhook_allowed_hosts` are always accepted; when the list is
+    set, every other host is refused. Otherwise every address the host resolves to
+    must be public, so clients cannot make the API POST to internal services. DNS
+    answers can change, so the check is repeated before every delivery.
+
+    Blocks on DNS; run it in a thread from the event loop.
+
+    Args:
+        url (str): An absolute http(s) callback URL.
+
+    Returns:
+        str: The checked address to connect to, or None for an allowed host.
+
+    Raises:
+        UnsafeCallbackError: If the host is not allowed or resolves to a non-public address.
+        OSError: If the host cannot be resolved.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    allowed_hosts = [allowed.lower() for allowed in settings.webhook_allowed_hosts]
+    if host in allowed_hosts:
+        return None
+    if allowed_hosts:
+        raise UnsafeCallbackError(f"Callback host {host} is not allowed.")
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    if not addresses or not all(is_public_address(address) for address in addresses):
+        raise UnsafeCallbackError(f"Callback host {host} does not resolve to a public address.")
+    return addresses[0]
+
+
+def pin_callback_url(url: str, address: str) -> tuple:
+    """
+    Returns the request URL, headers and extensions sending a webhook to a checked address.
+
+    Plain http requests connect to the address itself, so a DNS answer changing
+    after the check cannot redirect them. https requests keep the host name: the
+    certificate must match it, which an internal service cannot present.
+
+    Args:
+        url (str): The callback URL.
+        address (str): The address returned by `resolve_callback_url`, or None.
+
+    Returns:
+        tuple: The URL to request and the headers to add.
+    """
+    parts = urlsplit(url)
+    if address is None or parts.scheme != "http":
+        return url, {}
+    netloc = f"[{address}]" if ":" in address else address
+    if parts.port is not None:
+        netloc = f"{netloc}:{parts.port}"
+    return parts._replace(netloc=netloc).geturl(), {"Host": parts.netloc.rsplit("@", 1)[-1]}
+
+
+def build_webhook_payload(identification_id: str, result: dict = None, error_message: str = None) -> dict:
+    """
+    Builds the payload reporting a finished identification.
+
+    Args:
+        identification_id (str): The ID of the identification.
+        result (dict): The identification result, when it completed.
+        error_message (str): The error message, when it failed.
+
+    Returns:
+        dict: The webhook payload.
+    """
+    if error_message is not None:
+        return {"identification_id": identification_id, "status": "Error", "error_message": error_message}
+    return {"identification_id": identification_id, "status": "Completed", "result": result}
+
+
+def build_delivery(callback_url: str, payload: dict) -> dict:
+    """
+    Builds a new outbox document.
+
+    Deliveries become due `webhook_coalesce_seconds` after they are written, so
+    completions arriving shortly after each other are sent in the same POST.
+
+    Args:
+        callback_url (str): The URL to POST the payload to.
+        payload (dict): The webhook payload.
+
+    Returns:
+        dict: The outbox document.
+    """
+    now = datetime.now(timezone.utc)
+    return {
+        "url": callback_url,
+        "payload": payload,
+        "status": DELIVERY_PENDING,
+        "attempts": 0,
+        "available_at": now + timedelta(seconds=settings.webhook_coalesce_seconds),
+        "created_at": now,
+    }
+
+
+def backoff_seconds(attempts: int) -> float:
+    """
+    Returns the delay before retrying a delivery after `attempts` failed attempts.
+
+    The delay doubles with every attempt up to `webhook_backoff_max_seconds`, with
+    jitter so deliveries failing together do not retry together.
+    """
+    delay = min(settings.webhook_backoff_max_seconds, settings.webhook_backoff_base_seconds * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookOutbox:
+    def __init__(self, db_service: DatabaseService = None):
+        """
+        Initializes the producer side of the persistent webhook outbox.
+
+        Deliveries live in the Mongo `webhook_outbox` collection until they are
+        acknowledged by their endpoint or run out of attempts.
+
+        Args:
+            db_service (DatabaseService): The database service owning the connection.
+        """
+        db_service = db_service or DatabaseService()
+        self.collection = db_service.db.webhook_outbox
+
+    def ensure_indexes(self):
+        """
+        Creates the indexes used to claim due deliveries grouped by endpoint.
+        """
+        self.collection.create_index([("status", ASCENDING), ("available_at", ASCENDING)])
+        self.collection.create_index([("url", ASCENDING), ("status", ASCENDING), ("available_at", ASCENDING)])
+        self.collection.create_index([("lease", ASCENDING)], sparse=True)
+
+    def add(self, callback_url: str, payload: dict) -> str:
+        """
+        Persists a webhook delivery.
+
+        Args:
+            callback_url (str): The URL to POST the payload to.
+            payload (dict): The webhook payload.
+
+        Returns:
+            str: The ID of the new delivery.
+        """
+        result = self.collection.insert_one(build_delivery(callback_url, payload))
+        return str(result.inserted_id)
+
+
+class AsyncWebhookOutbox:
+    def __init__(self, db_service):
+        """
+        Initializes the consumer side of the webhook outbox for the async dispatcher.
+
+        Args:
+            db_service (AsyncDatabaseService): The async database service owning the connection.
+        """
+        self.collection = db_service.db.webhook_outbox
+
+    async def claim_batch(self, max_batch: int, lease_seconds: float):
+        """
+        Leases the oldest due deliveries of one endpoint.
+
+        Leased deliveries are hidden from other dispatchers until the lease expires,
+        after which they are handed out again.
+
+        Args:
+            max_batch (int): Maximum number of deliveries to lease.
+            lease_seconds (float): Seconds before the lease expires.
+
+        Returns:
+            tuple: The endpoint URL and the leased delivery documents, or None if no
+                delivery is due.
+        """
+        now = datetime.now(timezone.utc)
+        due = {"status": DELIVERY_PENDING, "available_at": {"$lte": now}}
+        first = await self.collection.find_one(due, {"url": 1}, sort=[("available_at", ASCENDING)])
+        if first is None:
+            return None
+
+        url = first["url"]
+        cursor = self.collection.find({**due, "url": url}, {"_id": 1}).sort("available_at", ASCENDING).limit(max_batch)
+        ids = [delivery["_id"] async for delivery in cursor]
+
+        # Only deliveries still due are leased, so concurrent dispatchers never share one
+        lease = ObjectId()
+        await self.collection.update_many(
+            {**due, "_id": {"$in": ids}},
+            {"$set": {"lease": lease, "available_at": now + timedelta(seconds=lease_seconds)}},
+        )
+        deliveries = [delivery async for delivery in self.collection.find({"lease": lease})]
+        return (url, deliveries) if deliveries else None
+
+    async def ack(self, delivery_ids: list):
+        """
+        Removes delivered webhooks from the outbox.
+
+        Args:
+            delivery_ids (list): The IDs of the delivered webhooks.
+        """
+        await self.collection.delete_many({"_id": {"$in": delivery_ids}})
+
+    async def fail(self, deliveries: list):
+        """
+        Marks deliveries as failed without further attempts, keeping them for inspection.
+
+        Args:
+            deliveries (list): The delivery documents that cannot be delivered.
+        """
+        await self.collection.update_many(
+            {"_id": {"$in": [delivery["_id"] for delivery in deliveries]}},
+            {"$set": {"status": DELIVERY_FAILED}, "$inc": {"attempts": 1}, "$unset": {"lease": ""}},
+        )
+
+    async def retry(self, deliveries: list):
+        """
+        Schedules failed deliveries for another attempt with exponential backoff.
+
+        Deliveries that reached `webhook_max_attempts` are marked as failed and kept
+        for inspection.
+
+        Args:
+            deliveries (list): The delivery documents that failed.
+        """
+        delivery_ids = [delivery["_id"] for delivery in deliveries]
+        attempts = max(delivery["attempts"] for delivery in deliveries) + 1
+        await self.collection.update_many(
+            {"_id": {"$in": delivery_ids}},
+            {
+                "$set": {"available_at": datetime.now(timezone.utc) + timedelta(seconds=backoff_seconds(attempts))},
+                "$inc": {"attempts": 1},
+                "$unset": {"lease": ""},
+            },
+        )
+        await self.collection.update_many(
+            {"_id": {"$in": delivery_ids}, "attempts": {"$gte": settings.webhook_max_attempts}},
+            {"$set": {"status": DELIVERY_FAILED}},
+        )
+
+
+class WebhookSender:
+    def __init__(self, client: httpx.AsyncClient = None, concurrency: int = None):
+        """
+        Initializes the pooled HTTP sender of webhook batches.
+
+        Args:
+            client (httpx.AsyncClient): Optional client to use instead of a new pooled one.
+            concurrency (int): Maximum number of requests in flight.
+        """
+        self.concurrency = concurrency or settings.webhook_concurrency
+        self.client = client or httpx.AsyncClient(
+            timeout=settings.webhook_timeout_seconds,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self.rate_limiter = KeyedRateLimiter(
+            settings.webhook_host_rate_per_second, settings.webhook_host_burst, settings.webhook_rate_limited_hosts
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def send(self, url: str, payloads: list) -> bool:
+        """
+        POSTs a batch of payloads to an endpoint as `{"deliveries": [...]}`.
+
+        Args:
+            url (str): The endpoint URL.
+            payloads (list): The webhook payloads.
+
+        Returns:
+            bool: Whether the endpoint acknowledged the batch with a 2xx response.
+
+        Raises:
+            UnsafeCallbackError: If the host now resolves to a non-public address.
+        """
+        try:
+            address = await asyncio.to_thread(resolve_callback_url, url)
+        except UnsafeCallbackError:
+            raise
+        except OSError as e:
+            print(f"Error resolving webhook host of {url}: {e}")
+            return False
+        request_url, headers = pin_callback_url(url, address)
+
+        await self.rate_limiter.acquire(urlsplit(url).hostname)
+        async with self._slots:
+            try:
+                response = await self.client.post(request_url, json={"deliveries": payloads}, headers=headers)
+            except httpx.HTTPError as e:
+                print(f"Error delivering webhook to {url}: {e}")
+                return False
+        if response.is_success:
+            return True
+        print(f"Webhook delivery to {url} failed with status {response.status_code}.")
+        return False
+
+    async def aclose(self):
+        """
+        Closes the pooled connections.
+        """
+        await self.client.aclose()
+
+
+class WebhookDispatcher:
+    def __init__(self, outbox: AsyncWebhookOutbox, sender: WebhookSender, poll_interval: float = None):
+        """
+        Initializes the dispatcher draining the webhook outbox.
+
+        Args:
+            outbox (AsyncWebhookOutbox): The outbox to drain.
+            sender (WebhookSender): The sender delivering the batches.
+            poll_interval (float): Seconds to wait before polling an empty outbox again.
+        """
+        self.outbox = outbox
+        self.sender = sender
+        self.poll_interval = poll_interval if poll_interval is not None else settings.webhook_poll_interval_seconds
+
+    async def run(self):
+        """
+        Delivers due webhooks until cancelled, one batch per endpoint at a time.
+        """
+        in_flight = set()
+        try:
+            while True:
+                while len(in_flight) >= self.sender.concurrency:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                try:
+                    claimed = await self.outbox.claim_batch(settings.webhook_batch_max, settings.webhook_lease_seconds)
+                except PyMongoError as e:
+                    print(f"Error claiming webhook deliveries: {e}")
+                    claimed = None
+
+                if claimed is None:
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+
+                task = asyncio.create_task(self.deliver(*claimed))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            # Unfinished deliveries are handed out again once their lease expires
+            for task in in_flight:
+                task.cancel()
+
+    async def deliver(self, url: str, deliveries: list):
+        """
+        Sends one batch of deliveries and records the outcome in the outbox.
+
+        Args:
+            url (str): The endpoint URL.
+            deliveries (list): The leased delivery documents.
+        """
+        try:
+            try:
+                delivered = await self.sender.send(url, [delivery["payload"] for delivery in deliveries])
+            except UnsafeCallbackError as e:
+                print(f"Refusing webhook delivery to {url}: {e}")
+                await self.outbox.fail(deliveries)
+                return
+            if delivered:
+                await self.outbox.ack([delivery["_id"] for delivery in deliveries])
+            else:
+                await self.outbox.retry(deliveries)
+        except PyMongoError as e:
+            print(f"Error recording webhook delivery: {e}")
@@ -0,0 +1,388 @@
+from datetime import datetime
+from pymongo import AsyncMongoClient, ASCENDING, DESCENDING
+from src.config import settings
+from src.core.record_cache import cache_updates_async, invalidate_updates
+from src.db.db_service import (
+    PoolStatsListener, build_identification_record, mongo_client_options, taxon_cache, timed_write
+)
+from src.db.result_codec import decode_identification, encode_result, referenced_taxa, storage_projection
+from src.db.write_buffer import identification_update
+from bson.objectid import ObjectId
+
+
+_async_client = None
+_async_pool_stats_listener = PoolStatsListener()
+
+
+def get_async_mongo_client() -> AsyncMongoClient:
+    """
+    Returns the process-wide AsyncMongoClient, creating it on first use.
+
+    The client must only be used from the event loop serving the API.
+
+    Returns:
+        AsyncMongoClient: The shared async client.
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(
+            settings.mongo_url,
+            event_listeners=[_async_pool_stats_listener],
+            **mongo_client_options(),
+        )
+    return _async_client
+
+
+async def close_async_mongo_client():
+    """
+    Closes the process-wide AsyncMongoClient. A new one is created on the next use.
+    """
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
+    _async_pool_stats_listener.reset()
+
+
+def build_identification_query(
+    after: str = None,
+    status: str = None,
+    created_after: datetime = None,
+    created_before: datetime = None,
+    plant_name: str = None,
+    content_hash: str = None,
+) -> dict:
+    """
+    Builds the filter of the identification listing.
+
+    Pages are keyed on `_id`, which embeds the creation time, so the created-time
+    range is applied to `_id` as well and every filter is served by an index ending
+    in `_id` (see `src.db.indexes`).
+
+    Args:
+        after (str): Cursor; only identifications older than this ID match.
+        status (str): Only match identifications with this status.
+        created_after (datetime): Only match identifications created at or after this time.
+        created_before (datetime): Only match identifications created before this time.
+        plant_name (str): Only match identifications of this plant.
+        content_hash (str): Only match identifications of this upload (see `upload_key`).
+
+    Returns:
+        dict: The MongoDB filter.
+    """
+    query = {}
+    id_range = {}
+    if after is not None:
+        id_range["$lt"] = ObjectId(after)
+    if created_before is not None:
+        before_id = ObjectId.from_datetime(created_before)
+        id_range["$lt"] = min(id_range.get("$lt", before_id), before_id)
+    if created_after is not None:
+        id_range["$gte"] = ObjectId.from_datetime(created_after)
+    if id_range:
+        query["_id"] = id_range
+    if status is not None:
+        query["status"] = status
+    if plant_name is not None:
+        query["r.n"] = plant_name
+    if content_hash is not None:
+        query["content_hash"] = content_hash
+    return query
+
+
+def get_async_pool_stats() -> dict:
+    """
+    Returns connection pool statistics of the process-wide AsyncMongoClient.
+
+    Returns:
+        dict: Pool configuration and connection counters.
+    """
+    stats = _async_pool_stats_listener.snapshot()
+    stats.update({
+        "max_pool_size": settings.mongo_max_pool_size,
+        "min_pool_size": settings.mongo_min_pool_size,
+    })
+    return stats
+
+
+class AsyncDatabaseService:
+    def __init__(self, client: AsyncMongoClient = None):
+        """
+        Initializes the async database connection used by the API routes.
+
+        - Uses the shared AsyncMongoClient unless a client is given, so route
+          handlers never block the event loop on MongoDB.
+
+        Args:
+            client (AsyncMongoClient): Optional client to use instead of the shared one.
+        """
+        self.client = client or get_async_mongo_client()
+        self.db = self.client.zelara_db
+        self.collection = self.db.identifications
+        self.taxa = self.db.taxa
+
+    async def create_identification_record(self, status: str = "Processing", content_hash: str = None):
+        """
+        Creates a new identification record in the database.
+
+        Args:
+            status (str): The initial status of the identification.
+            content_hash (str): The hash of the uploaded image.
+
+        Returns:
+            str: The ID of the new identification record.
+        """
+        identification = build_identification_record(status, content_hash=content_hash)
+        with timed_write("create_identification_record"):
+            result = await self.collection.insert_one(identification)
+        return str(result.inserted_id)
+
+    async def create_identification_records(
+        self, count: int, batch_id: str, status: str = "Processing", content_hashes: list = None
+    ):
+        """
+        Creates the identification records of a batch with a single `insert_many`.
+
+        Args:
+            count (int): The number of records to create.
+            batch_id (str): The ID of the batch the records belong to.
+            status (str): The initial status of the identifications.
+            content_hashes (list): The hashes of the uploaded images, in order.
+
+        Returns:
+            list: The IDs of the new identification records, in order.
+        """
+        content_hashes = content_hashes or [None] * count
+        identifications = [
+            build_identification_record(status, content_hash=content_hash, batch_id=batch_id)
+            for content_hash in content_hashes
+        ]
+        with timed_write("create_identification_records"):
+            result = await self.collection.insert_many(identifications)
+        return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    async def update_identification(self, identification_id: str, data: dict, perceptual_hash: str = None):
+        """
+        Updates an existing identification record with the result data.
+
+        Args:
+            identification_id (str): The ID of the identification record.
+            data (dict): The identification result data.
+            perceptual_hash (str): Optional perceptual hash of the processed image.
+        """
+        compact, taxon = encode_result(data)
+        if taxon is not None and not await self.store_taxon(taxon):
+            compact.update({key: value for key, value in taxon.items() if key in ("cn", "tx")})
+        update = {"status": "Completed", "r": compact}
+        if perceptual_hash is not None:
+            update["phash"] = perceptual_hash
+        try:
+            await self.collection.update_one(
+                {"_id": ObjectId(identification_id)},
+                identification_update(update),
+            )
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            invalidate_updates([identification_id])
+            return
+        result = decode_identification({"r": compact}, taxon_cache)["result"]
+        await cache_updates_async([{"_id": identification_id, "status": "Completed", "result": result}])
+
+    async def update_identification_error(self, identification_id: str, error_message: str):
+        """
+        Updates an existing identification record with an error status.
+
+        Args:
+            identification_id (str): The ID of the identification record.
+            error_message (str): The error message.
+        """
+        try:
+            await self.collection.update_one(
+                {"_id": ObjectId(identification_id)},
+                {"$set": {"status": "Error", "error_message": error_message}},
+            )
+        except Exception as e:
+            print(f"Error updating database with error: {e}")
+            invalidate_updates([identification_id])
+            return
+        await cache_updates_async([{"_id": identification_id, "status": "Error", "error_message": error_message}])
+
+    async def get_identifications(
+        self,
+        limit: int = 100,
+        after: str = None,
+        status: str = None,
+        created_after: datetime = None,
+        created_before: datetime = None,
+        fields: list = None,
+        plant_name: str = None,
+        content_hash: str = None,
+    ):
+        """
+        Retrieves one page of plant identifications, newest first.
+
+        Pages are keyed on `_id`, which embeds the creation time, so the created-time
+        range is applied to `_id` as well and every page is an index range scan.
+
+        Args:
+            limit (int): Maximum number of identifications to return.
+            after (str): Cursor; only identifications older than this ID are returned.
+            status (str): Only return identifications with this status.
+            created_after (datetime): Only return identifications created at or after this time.
+            created_before (datetime): Only return identifications created before this time.
+            plant_name (str): Only return identifications of this plant.
+            content_hash (str): Only return identifications of this upload.
+            fields (list): Fields to return besides `_id` and `status`, e.g. `result.plant_name`.
+                All fields are returned when omitted.
+
+        Returns:
+            list: A list of identification documents.
+        """
+        query = build_identification_query(
+            after=after,
+            status=status,
+            created_after=created_after,
+            created_before=created_before,
+            plant_name=plant_name,
+            content_hash=content_hash,
+        )
+
+        projection = None
+        if fields:
+            projection = {field: 1 for field in storage_projection(fields)}
+            projection["status"] = 1
+
+        try:
+            cursor = self.collection.find(query, projection).sort("_id", DESCENDING).limit(limit)
+            identifications = [ident async for ident in cursor]
+            await self._load_taxa(identifications)
+            return [self._serialize_identification(ident) for ident in identifications]
+        except Exception as e:
+            print(f"Error fetching identifications: {e}")
+            return []
+
+    async def iter_identifications(self, after: str = None, status: str = None, batch_size: int = 1000):
+        """
+        Iterates over all plant identifications, oldest first, without loading them into memory.
+
+        Documents are expanded one cursor batch at a time, so the taxa of a batch are
+        fetched in a single query.
+
+        Args:
+            after (str): Only identifications newer than this ID are returned, to resume an export.
+            status (str): Only return identifications with this status.
+            batch_size (int): Number of documents fetched from MongoDB per round trip.
+
+        Yields:
+            dict: The next serialized identification document.
+        """
+        query = {}
+        if after is not None:
+            query["_id"] = {"$gt": ObjectId(after)}
+        if status is not None:
+            query["status"] = status
+
+        cursor = self.collection.find(query, batch_size=batch_size).sort("_id", ASCENDING)
+        chunk = []
+        async for identification in cursor:
+            chunk.append(identification)
+            if len(chunk) < batch_size:
+                continue
+            await self._load_taxa(chunk)
+            for document in chunk:
+                yield self._serialize_identification(document)
+            chunk = []
+        if chunk:
+            await self._load_taxa(chunk)
+            for document in chunk:
+                yield self._serialize_identification(document)
+
+    async def get_batch_identifications(self, batch_id: str):
+        """
+        Retrieves all identifications of a batch in upload order.
+
+        Args:
+            batch_id (str): The ID of the batch.
+
+        Returns:
+            list: A list of identification documents.
+        """
+        try:
+            cursor = self.collection.find(
+                {"batch_id": batch_id}, {"status": 1, "r": 1, "result": 1, "error_message": 1}
+            ).sort("_id", ASCENDING)
+            identifications = [ident async for ident in cursor]
+            await self._load_taxa(identifications)
+            return [self._serialize_identification(ident) for ident in identifications]
+        except Exception as e:
+            print(f"Error fetching batch identifications: {e}")
+            return []
+
+    async def get_identification_by_id(self, id: str):
+        """
+        Retrieves a specific plant identification by ID.
+
+        Args:
+            id (str): The identification ID.
+
+        Returns:
+            dict: The identification document.
+        """
+        try:
+            identification = await self.collection.find_one({"_id": ObjectId(id)})
+            if identification:
+                await self._load_taxa([identification])
+                return self._serialize_identification(identification)
+            else:
+                return None
+        except Exception as e:
+            print(f"Error fetching identification by ID: {e}")
+            return None
+
+    async def store_taxon(self, taxon: dict) -> bool:
+        """
+        Stores the common names and taxonomy of a species, replacing outdated ones.
+
+        Args:
+            taxon (dict): The taxon document built by `encode_result`.
+
+        Returns:
+            bool: Whether the taxon is stored.
+        """
+        if taxon_cache.contains(taxon):
+            return True
+        fields = {key: value for key, value in taxon.items() if key != "_id"}
+        try:
+            await self.taxa.update_one({"_id": taxon["_id"]}, {"$set": fields}, upsert=True)
+        except Exception as e:
+            print(f"Error storing taxon: {e}")
+            return False
+        taxon_cache.put(taxon)
+        return True
+
+    async def _load_taxa(self, identifications: list):
+        """
+        Expands the compact results of identification documents, fetching uncached taxa in one query.
+
+        Args:
+            identifications (list): The identification documents, modified in place.
+        """
+        missing = taxon_cache.missing(referenced_taxa(identifications))
+        if missing:
+            async for taxon in self.taxa.find({"_id": {"$in": missing}}):
+                taxon_cache.put(taxon)
+        for identification in identifications:
+            decode_identification(identification, taxon_cache)
+
+    def _serialize_identification(self, identification):
+        """
+        Serializes the identification document for JSON response.
+
+        Args:
+            identification (dict): The identification document.
+
+        Returns:
+            dict: The serialized identification.
+        """
+        identification["_id"] = str(identification["_id"])
+        return identification
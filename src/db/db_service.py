@@ -1,49 +1,353 @@
-from pymongo import MongoClient
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pymongo import MongoClient, monitoring
 from src.config import settings
+from src.core.metrics import db_write_seconds
+from src.core.record_cache import cache_updates, invalidate_updates
+from src.core.tracing import current_trace_id, tracer
+from src.db.indexes import ensure_indexes, identification_indexes
+from src.db.result_codec import TaxonCache, decode_identification, encode_result, referenced_taxa
+from src.db.write_buffer import StatusWriteBuffer, identification_update
 from bson.objectid import ObjectId
 
 
-class DatabaseService:
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener keeping counters for `get_pool_stats`.
+    """
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.checked_out = 0
+            self.checked_in = 0
+            self.checkout_failed = 0
+            self.pool_cleared = 0
+
+    def _increment(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pool_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failed")
+
+    def connection_checked_out(self, event):
+        self._increment("checked_out")
+
+    def connection_checked_in(self, event):
+        self._increment("checked_in")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connections_created": self.created,
+                "connections_closed": self.closed,
+                "connections_open": self.created - self.closed,
+                "connections_in_use": self.checked_out - self.checked_in,
+                "checkouts": self.checked_out,
+                "checkout_failures": self.checkout_failed,
+                "pool_clears": self.pool_cleared,
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+_pool_stats_listener = PoolStatsListener()
+_status_write_buffer = None
+taxon_cache = TaxonCache(settings.taxon_cache_max_entries)
+
+
+def mongo_client_options() -> dict:
+    """
+    Returns the connection pool options shared by the sync and async clients.
+
+    Returns:
+        dict: Keyword arguments for MongoClient / AsyncMongoClient.
+    """
+    return {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    }
+
+
+def get_mongo_client() -> MongoClient:
+    """
+    Returns the process-wide MongoClient, creating it on first use.
+
+    MongoClient is thread-safe and maintains its own connection pool, so a single
+    instance is shared by every DatabaseService in the process.
+
+    Returns:
+        MongoClient: The shared client.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                settings.mongo_url,
+                event_listeners=[_pool_stats_listener],
+                **mongo_client_options(),
+            )
+        return _client
+
+
+def close_mongo_client():
+    """
+    Closes the process-wide MongoClient. A new one is created on the next use.
+    """
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+    _pool_stats_listener.reset()
+
+
+def get_pool_stats() -> dict:
+    """
+    Returns connection pool statistics of the process-wide MongoClient.
+
+    Returns:
+        dict: Pool configuration and connection counters.
+    """
+    stats = _pool_stats_listener.snapshot()
+    stats.update({
+        "max_pool_size": settings.mongo_max_pool_size,
+        "min_pool_size": settings.mongo_min_pool_size,
+    })
+    return stats
+
+
+@contextmanager
+def timed_write(operation: str):
+    """
+    Records the duration of an identification write in the metrics and as a span of the current trace.
+
+    Args:
+        operation (str): The `operation` label and span name suffix, e.g. "update_identification".
+    """
+    with db_write_seconds.time(operation), tracer.start_span(f"db.{operation}", attributes={"db.system": "mongodb"}):
+        yield
+
+
+def build_identification_record(status: str, content_hash: str = None, batch_id: str = None) -> dict:
+    """
+    Builds a new identification record.
+
+    The record keeps the trace ID of the current request when it is sampled,
+    to find its spans.
+
+    Args:
+        status (str): The initial status of the identification.
+        content_hash (str): The hash of the uploaded image, if known.
+        batch_id (str): The ID of the batch the record belongs to, if any.
+
+    Returns:
+        dict: The identification document.
+    """
+    identification = {"status": status, "created_at": datetime.now(timezone.utc)}
+    if content_hash is not None:
+        identification["content_hash"] = content_hash
+    if batch_id is not None:
+        identification["batch_id"] = batch_id
+    trace_id = current_trace_id()
+    if trace_id is not None:
+        identification["trace_id"] = trace_id
+    return identification
+
+
+def start_status_write_buffer(on_flush=None) -> StatusWriteBuffer:
+    """
+    Starts buffering identification status updates and job completions of this process.
+
+    Args:
+        on_flush (callable): Called with the IDs of the records written by each flush.
+
+    Returns:
+        StatusWriteBuffer: The started buffer.
+    """
+    global _status_write_buffer
+    if _status_write_buffer is None:
+        _status_write_buffer = StatusWriteBuffer(
+            get_mongo_client().zelara_db,
+            max_batch=settings.status_write_batch_size,
+            flush_interval=settings.status_write_flush_interval_seconds,
+            on_flush=on_flush,
+        )
+        _status_write_buffer.start()
+    return _status_write_buffer
+
+
+def stop_status_write_buffer():
+    """
+    Writes the buffered updates and returns to writing every update immediately.
+    """
+    global _status_write_buffer
+    buffer, _status_write_buffer = _status_write_buffer, None
+    if buffer is not None:
+        buffer.close()
+
+
+def get_status_write_buffer():
+    """
+    Returns the running status write buffer, or None while updates are written immediately.
+    """
+    return _status_write_buffer
+
+
+class DatabaseService:
+    def __init__(self, client: MongoClient = None):
         """
         Initializes the database connection.
 
-        - Connects to MongoDB based on environment settings.
+        - Uses the shared, pooled MongoClient unless a client is given.
+
+        Args:
+            client (MongoClient): Optional client to use instead of the shared one.
         """
-        self.client = MongoClient(settings.mongo_url)
+        self.client = client or get_mongo_client()
         self.db = self.client.zelara_db
         self.collection = self.db.identifications
+        self.result_cache = self.db.identification_cache
+        self.taxa = self.db.taxa
 
-    def create_identification_record(self, status: str = "Processing"):
+    def create_identification_record(self, status: str = "Processing", content_hash: str = None):
         """
         Creates a new identification record in the database.
 
         Args:
             status (str): The initial status of the identification.
+            content_hash (str): The hash of the uploaded image.
 
         Returns:
             str: The ID of the new identification record.
         """
-        identification = {"status": status}
+        identification = build_identification_record(status, content_hash=content_hash)
         result = self.collection.insert_one(identification)
         return str(result.inserted_id)
 
-    def update_identification(self, identification_id: str, data: dict):
+    def update_identification(self, identification_id: str, data: dict, perceptual_hash: str = None):
         """
         Updates an existing identification record with the result data.
 
+        While a status write buffer is running (`status_write_mode="buffered"`), the
+        update is buffered and written with the next bulk flush instead.
+
         Args:
             identification_id (str): The ID of the identification record.
             data (dict): The identification result data.
+            perceptual_hash (str): Optional perceptual hash of the processed image.
         """
+        update = self._completed_update(data, perceptual_hash)
+        if _status_write_buffer is not None:
+            invalidate_updates([identification_id])
+            _status_write_buffer.update_identification(identification_id, update)
+            return
         try:
-            self.collection.update_one(
-                {"_id": ObjectId(identification_id)},
-                {"$set": {"status": "Completed", "result": data}},
-            )
+            with timed_write("update_identification"):
+                self.collection.update_one(
+                    {"_id": ObjectId(identification_id)},
+                    identification_update(update),
+                )
             print("Identification updated in database.")
         except Exception as e:
             print(f"Error updating database: {e}")
+            invalidate_updates([identification_id])
+            return
+        self._cache_completed([identification_id], update)
+
+    def update_identifications(self, identification_ids: list, data: dict, perceptual_hash: str = None):
+        """
+        Completes several identification records with the same result in a single `update_many`.
+
+        Args:
+            identification_ids (list): The IDs of the identification records.
+            data (dict): The identification result data.
+            perceptual_hash (str): Optional perceptual hash of the processed image.
+        """
+        update = self._completed_update(data, perceptual_hash)
+        if _status_write_buffer is not None:
+            invalidate_updates(identification_ids)
+            for identification_id in identification_ids:
+                _status_write_buffer.update_identification(identification_id, update)
+            return
+        try:
+            with timed_write("update_identifications"):
+                self.collection.update_many(
+                    {"_id": {"$in": [ObjectId(identification_id) for identification_id in identification_ids]}},
+                    identification_update(update),
+                )
+            print(f"{len(identification_ids)} identifications updated in database.")
+        except Exception as e:
+            print(f"Error updating database: {e}")
+            invalidate_updates(identification_ids)
+            return
+        self._cache_completed(identification_ids, update)
+
+    def update_identifications_error(self, identification_ids: list, error_message: str):
+        """
+        Marks several identification records as failed in a single `update_many`.
+
+        Args:
+            identification_ids (list): The IDs of the identification records.
+            error_message (str): The error message.
+        """
+        if _status_write_buffer is not None:
+            invalidate_updates(identification_ids)
+            for identification_id in identification_ids:
+                _status_write_buffer.update_identification(
+                    identification_id, {"status": "Error", "error_message": error_message}
+                )
+            return
+        try:
+            with timed_write("update_identifications_error"):
+                self.collection.update_many(
+                    {"_id": {"$in": [ObjectId(identification_id) for identification_id in identification_ids]}},
+                    {"$set": {"status": "Error", "error_message": error_message}},
+                )
+            print(f"{len(identification_ids)} identification errors updated in database.")
+        except Exception as e:
+            print(f"Error updating database with error: {e}")
+            invalidate_updates(identification_ids)
+            return
+        cache_updates([
+            {"_id": identification_id, "status": "Error", "error_message": error_message}
+            for identification_id in identification_ids
+        ])
 
     def update_identification_error(self, identification_id: str, error_message: str):
         """
@@ -53,14 +357,24 @@ class DatabaseService:
             identification_id (str): The ID of the identification record.
             error_message (str): The error message.
         """
-        try:
-            self.collection.update_one(
-                {"_id": ObjectId(identification_id)},
-                {"$set": {"status": "Error", "error_message": error_message}},
+        if _status_write_buffer is not None:
+            invalidate_updates([identification_id])
+            _status_write_buffer.update_identification(
+                identification_id, {"status": "Error", "error_message": error_message}
             )
+            return
+        try:
+            with timed_write("update_identification_error"):
+                self.collection.update_one(
+                    {"_id": ObjectId(identification_id)},
+                    {"$set": {"status": "Error", "error_message": error_message}},
+                )
             print("Identification error updated in database.")
         except Exception as e:
             print(f"Error updating database with error: {e}")
+            invalidate_updates([identification_id])
+            return
+        cache_updates([{"_id": identification_id, "status": "Error", "error_message": error_message}])
 
     def get_identifications(self):
         """
@@ -70,7 +384,8 @@ class DatabaseService:
             list: A list of identification documents.
         """
         try:
-            identifications = self.collection.find()
+            identifications = list(self.collection.find())
+            self._load_taxa(identifications)
             return [self._serialize_identification(ident) for ident in identifications]
         except Exception as e:
             print(f"Error fetching identifications: {e}")
@@ -89,6 +404,7 @@ class DatabaseService:
         try:
             identification = self.collection.find_one({"_id": ObjectId(id)})
             if identification:
+                self._load_taxa([identification])
                 return self._serialize_identification(identification)
             else:
                 return None
@@ -96,6 +412,152 @@ class DatabaseService:
             print(f"Error fetching identification by ID: {e}")
             return None
 
+    def get_perceptual_hashes(self, hashed_since: datetime = None, limit: int = 100_000):
+        """
+        Retrieves perceptual hashes of completed identifications.
+
+        Args:
+            hashed_since (datetime): Only return hashes written at or after this server
+                time (`phash_at`), oldest first. When omitted, the hashes of the most
+                recently created `limit` records are returned.
+            limit (int): Maximum number of records to return.
+
+        Returns:
+            list: `(identification_id, perceptual_hash, phash_at)` tuples. `phash_at` is
+                None for records hashed before it was stored.
+        """
+        projection = {"phash": 1, "phash_at": 1}
+        if hashed_since is not None:
+            query = {"status": "Completed", "phash_at": {"$gte": hashed_since}}
+            cursor = self.collection.find(query, projection).sort("phash_at", 1).limit(limit)
+            records = list(cursor)
+        else:
+            query = {"status": "Completed", "phash": {"$exists": True}}
+            cursor = self.collection.find(query, projection).sort("_id", -1).limit(limit)
+            records = list(cursor)[::-1]
+        return [(str(record["_id"]), record["phash"], record.get("phash_at")) for record in records]
+
+    def ensure_identification_indexes(self):
+        """
+        Creates the indexes declared in `identification_indexes`.
+        """
+        ensure_indexes(self.collection, identification_indexes())
+
+    def ensure_result_cache_index(self, ttl_seconds: int):
+        """
+        Creates the TTL index that expires cached identification results.
+
+        Args:
+            ttl_seconds (int): Lifetime of a cached result in seconds.
+        """
+        self.result_cache.create_index("created_at", expireAfterSeconds=ttl_seconds)
+
+    def get_cached_result(self, cache_key: str, ttl_seconds: int):
+        """
+        Retrieves a cached identification result by its content hash.
+
+        Args:
+            cache_key (str): The content-addressed cache key.
+            ttl_seconds (int): Maximum age of the entry. Mongo only purges expired
+                documents periodically, so the age is checked here as well.
+
+        Returns:
+            dict: The cached identification result, or None if absent or expired.
+        """
+        try:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+            entry = self.result_cache.find_one(
+                {"_id": cache_key, "created_at": {"$gte": cutoff}}
+            )
+            return entry["result"] if entry else None
+        except Exception as e:
+            print(f"Error fetching cached result: {e}")
+            return None
+
+    def store_cached_result(self, cache_key: str, data: dict):
+        """
+        Stores an identification result under its content hash.
+
+        Args:
+            cache_key (str): The content-addressed cache key.
+            data (dict): The identification result data.
+        """
+        try:
+            self.result_cache.update_one(
+                {"_id": cache_key},
+                {"$set": {"result": data, "created_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Error storing cached result: {e}")
+
+    def store_taxon(self, taxon: dict) -> bool:
+        """
+        Stores the common names and taxonomy of a species, replacing outdated ones.
+
+        Args:
+            taxon (dict): The taxon document built by `encode_result`.
+
+        Returns:
+            bool: Whether the taxon is stored.
+        """
+        if taxon_cache.contains(taxon):
+            return True
+        fields = {key: value for key, value in taxon.items() if key != "_id"}
+        try:
+            self.taxa.update_one({"_id": taxon["_id"]}, {"$set": fields}, upsert=True)
+        except Exception as e:
+            print(f"Error storing taxon: {e}")
+            return False
+        taxon_cache.put(taxon)
+        return True
+
+    def _completed_update(self, data: dict, perceptual_hash: str = None) -> dict:
+        """
+        Builds the `$set` completing an identification, storing the taxon of the result first.
+
+        Args:
+            data (dict): The identification result data.
+            perceptual_hash (str): Optional perceptual hash of the processed image.
+
+        Returns:
+            dict: The fields to set.
+        """
+        compact, taxon = encode_result(data)
+        if taxon is not None and not self.store_taxon(taxon):
+            compact.update({key: value for key, value in taxon.items() if key in ("cn", "tx")})
+        update = {"status": "Completed", "r": compact}
+        if perceptual_hash is not None:
+            update["phash"] = perceptual_hash
+        return update
+
+    def _cache_completed(self, identification_ids: list, update: dict):
+        """
+        Populates the record cache with identifications just completed, as a read would return them.
+
+        Args:
+            identification_ids (list): The IDs of the identification records.
+            update (dict): The fields set by `_completed_update`.
+        """
+        result = decode_identification({"r": update["r"]}, taxon_cache)["result"]
+        cache_updates([
+            {"_id": identification_id, "status": "Completed", "result": result} for identification_id in identification_ids
+        ])
+
+    def _load_taxa(self, identifications: list):
+        """
+        Expands the compact results of identification documents, fetching uncached taxa in one query.
+
+        Args:
+            identifications (list): The identification documents, modified in place.
+        """
+        missing = taxon_cache.missing(referenced_taxa(identifications))
+        if missing:
+            for taxon in self.taxa.find({"_id": {"$in": missing}}):
+                taxon_cache.put(taxon)
+        for identification in identifications:
+            decode_identification(identification, taxon_cache)
+
     def _serialize_identification(self, identification):
         """
         Serializes the identification document for JSON response.
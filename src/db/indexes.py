@@ -0,0 +1,74 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from src.config import settings
+
+# Error code returned when an index exists with the same keys but other options.
+INDEX_OPTIONS_CONFLICT = 85
+
+
+def identification_indexes() -> list:
+    """
+    Returns the indexes of the `identifications` collection.
+
+    Every query the services issue on the collection must be served by one of these
+    (or by `_id`); `python -m src.db.query_plans` checks this against a live server.
+
+    Returns:
+        list: The IndexModel of each index.
+    """
+    return [
+        # Listing filtered by status, newest first; perceptual hash loading
+        IndexModel([("status", ASCENDING), ("_id", DESCENDING)]),
+        # Batch status lookups
+        IndexModel(
+            [("batch_id", ASCENDING), ("_id", ASCENDING)],
+            partialFilterExpression={"batch_id": {"$exists": True}},
+        ),
+        # Listing the identifications of an upload
+        IndexModel(
+            [("content_hash", ASCENDING), ("_id", DESCENDING)],
+            partialFilterExpression={"content_hash": {"$exists": True}},
+        ),
+        # Incremental perceptual hash loading, in the order hashes were written
+        IndexModel(
+            [("phash_at", ASCENDING)],
+            partialFilterExpression={"phash_at": {"$exists": True}},
+        ),
+        # Listing filtered by plant name, newest first
+        IndexModel(
+            [("r.n", ASCENDING), ("_id", DESCENDING)],
+            partialFilterExpression={"r.n": {"$exists": True}},
+        ),
+        # Removes records stuck in Processing, e.g. when their job was lost; the
+        # partial filter keeps finished records out of the index, so they never expire
+        IndexModel(
+            [("created_at", ASCENDING)],
+            expireAfterSeconds=settings.identification_processing_ttl_seconds,
+            partialFilterExpression={"status": "Processing"},
+        ),
+    ]
+
+
+def ensure_indexes(collection, indexes: list):
+    """
+    Creates missing indexes of a collection.
+
+    Existing indexes are left alone, except that the lifetime of a TTL index is
+    updated in place when its setting changed.
+
+    Args:
+        collection (Collection): The collection to index.
+        indexes (list): The IndexModel of each index.
+    """
+    for index in indexes:
+        try:
+            collection.create_indexes([index])
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT or "expireAfterSeconds" not in index.document:
+                raise
+            collection.database.command(
+                "collMod",
+                collection.name,
+                index={"name": index.document["name"], "expireAfterSeconds": index.document["expireAfterSeconds"]},
+            )
+            print(f"Updated TTL of index {index.document['name']} on {collection.name}.")
@@ -0,0 +1,91 @@
+"""
+Converts identification results stored in the full `result` shape to the compact
+representation of `src.db.result_codec`, in batches.
+
+Safe to interrupt and run again: only documents still holding a `result` are
+converted, and each is converted with a conditional update.
+
+Usage:
+    python -m src.db.migrate_results --batch-size 1000
+"""
+import argparse
+import sys
+from pymongo import ASCENDING, UpdateOne
+from src.db.db_service import DatabaseService, close_mongo_client
+from src.db.result_codec import encode_result
+
+
+def migrate_batch(db, documents: list) -> int:
+    """
+    Converts a batch of identification documents.
+
+    Args:
+        db (Database): The database holding the `identifications` and `taxa` collections.
+        documents (list): The documents, with their `_id` and `result`.
+
+    Returns:
+        int: The number of documents converted.
+    """
+    taxa = {}
+    operations = []
+    for document in documents:
+        compact, taxon = encode_result(document["result"])
+        if taxon is not None:
+            taxa.setdefault(taxon["_id"], taxon)
+        operations.append(UpdateOne(
+            {"_id": document["_id"], "result": {"$exists": True}, "r": {"$exists": False}},
+            {"$set": {"r": compact}, "$unset": {"result": ""}},
+        ))
+
+    # Taxa first, so that no converted record references a missing taxon
+    if taxa:
+        db.taxa.bulk_write(
+            [UpdateOne({"_id": key}, {"$setOnInsert": taxon}, upsert=True) for key, taxon in taxa.items()],
+            ordered=False,
+        )
+    if not operations:
+        return 0
+    return db.identifications.bulk_write(operations, ordered=False).modified_count
+
+
+def migrate_results(db, batch_size: int = 1000) -> int:
+    """
+    Converts every identification document still holding a full `result`.
+
+    Args:
+        db (Database): The database holding the `identifications` and `taxa` collections.
+        batch_size (int): Number of documents converted per bulk write.
+
+    Returns:
+        int: The number of documents converted.
+    """
+    migrated = 0
+    query = {"result": {"$type": "object"}}
+    while True:
+        documents = list(
+            db.identifications.find(query, {"result": 1}).sort("_id", ASCENDING).limit(batch_size)
+        )
+        if not documents:
+            return migrated
+        migrated += migrate_batch(db, documents)
+        # Documents that could not be converted are skipped instead of being read again
+        query = {"result": {"$type": "object"}, "_id": {"$gt": documents[-1]["_id"]}}
+        print(f"Converted {migrated} identifications.")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db_service = DatabaseService()
+    try:
+        migrated = migrate_results(db_service.db, args.batch_size)
+    finally:
+        close_mongo_client()
+    print(f"Done, {migrated} identifications converted.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Checks that every query the services issue is served by an index.
+
+Creates the declared indexes, runs `explain()` on each query shape against the
+configured MongoDB and exits with status 1 if any winning plan is a COLLSCAN.
+
+Usage:
+    python -m src.db.query_plans
+"""
+import sys
+from datetime import datetime, timedelta, timezone
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from src.config import settings
+from src.core.job_queue import JOB_WAITING, JobQueue
+from src.core.webhooks import DELIVERY_PENDING, WebhookOutbox
+from src.db.async_db_service import build_identification_query
+from src.db.db_service import DatabaseService, close_mongo_client
+
+
+def query_shapes() -> list:
+    """
+    Returns a representative instance of every query shape issued on MongoDB.
+
+    Shapes are built with the same helpers as the services where one exists, so
+    a new filter added there is checked here too. Not included: the full-collection
+    `$group` of the queue statistics, which scans the bounded `jobs` collection by design.
+
+    Returns:
+        list: Dicts with the `name`, `collection`, `filter` and optional `sort` and `limit`.
+    """
+    now = datetime.now(timezone.utc)
+    some_id = ObjectId()
+    newest_first = [("_id", DESCENDING)]
+    oldest_first = [("_id", ASCENDING)]
+    return [
+        # AsyncDatabaseService.get_identifications
+        {"name": "list identifications", "collection": "identifications", "filter": {},
+         "sort": newest_first, "limit": 100},
+        {"name": "list next page", "collection": "identifications",
+         "filter": build_identification_query(after=str(some_id)), "sort": newest_first, "limit": 100},
+        {"name": "list by status", "collection": "identifications",
+         "filter": build_identification_query(after=str(some_id), status="Completed"), "sort": newest_first, "limit": 100},
+        {"name": "list by creation time", "collection": "identifications",
+         "filter": build_identification_query(created_after=now - timedelta(days=1), created_before=now),
+         "sort": newest_first, "limit": 100},
+        {"name": "list by plant name", "collection": "identifications",
+         "filter": build_identification_query(plant_name="Ficus lyrata"), "sort": newest_first, "limit": 100},
+        {"name": "list by content hash", "collection": "identifications",
+         "filter": build_identification_query(content_hash="0" * 64), "sort": newest_first, "limit": 100},
+        # AsyncDatabaseService.iter_identifications
+        {"name": "export", "collection": "identifications", "filter": {"_id": {"$gt": some_id}}, "sort": oldest_first},
+        {"name": "export by status", "collection": "identifications",
+         "filter": {"_id": {"$gt": some_id}, "status": "Completed"}, "sort": oldest_first},
+        # AsyncDatabaseService.get_batch_identifications
+        {"name": "batch status", "collection": "identifications", "filter": {"batch_id": str(some_id)}, "sort": oldest_first},
+        # get_identification_by_id, update_identification(s)
+        {"name": "identification by id", "collection": "identifications", "filter": {"_id": some_id}},
+        {"name": "identifications by ids", "collection": "identifications", "filter": {"_id": {"$in": [some_id, ObjectId()]}}},
+        # DatabaseService.get_perceptual_hashes
+        {"name": "perceptual hashes", "collection": "identifications",
+         "filter": {"status": "Completed", "phash": {"$exists": True}}, "sort": newest_first, "limit": 100_000},
+        {"name": "perceptual hashes refresh", "collection": "identifications",
+         "filter": {"status": "Completed", "phash_at": {"$gte": now}},
+         "sort": [("phash_at", ASCENDING)], "limit": 100_000},
+        # DatabaseService._load_taxa
+        {"name": "taxa by keys", "collection": "taxa", "filter": {"_id": {"$in": ["5e9b0d8c", "name:Ficus lyrata"]}}},
+        # migrate_results
+        {"name": "results to convert", "collection": "identifications",
+         "filter": {"result": {"$type": "object"}, "_id": {"$gt": some_id}}, "sort": oldest_first, "limit": 1000},
+        # DatabaseService.get_cached_result
+        {"name": "cached result", "collection": "identification_cache",
+         "filter": {"_id": "0" * 64, "created_at": {"$gte": now}}},
+        # JobQueue
+        {"name": "claim job", "collection": "jobs", "filter": {"available_at": {"$lte": now}},
+         "sort": [("available_at", ASCENDING)], "limit": 1},
+        {"name": "promote waiting job", "collection": "jobs",
+         "filter": {"batch_id": str(some_id), "status": JOB_WAITING}, "sort": oldest_first, "limit": 1},
+        {"name": "job by id", "collection": "jobs", "filter": {"_id": some_id}},
+        {"name": "jobs of spooled uploads", "collection": "jobs",
+         "filter": {"image_file": {"$exists": True}, "image_file.path": {"$in": ["/spool/upload-a", "/spool/upload-b"]}}},
+        # AsyncWebhookOutbox
+        {"name": "next due webhook", "collection": "webhook_outbox",
+         "filter": {"status": DELIVERY_PENDING, "available_at": {"$lte": now}},
+         "sort": [("available_at", ASCENDING)], "limit": 1},
+        {"name": "due webhooks of endpoint", "collection": "webhook_outbox",
+         "filter": {"status": DELIVERY_PENDING, "available_at": {"$lte": now}, "url": "https://example.com/hook"},
+         "sort": [("available_at", ASCENDING)], "limit": 100},
+        {"name": "leased webhooks", "collection": "webhook_outbox", "filter": {"lease": some_id}},
+        {"name": "webhooks by ids", "collection": "webhook_outbox", "filter": {"_id": {"$in": [some_id, ObjectId()]}}},
+    ]
+
+
+def plan_stages(plan: dict) -> list:
+    """
+    Lists the stages of a query plan, outermost first.
+
+    Args:
+        plan (dict): A winning plan from `explain()` output.
+
+    Returns:
+        list: The stage names.
+    """
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            pending.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            pending.extend(node)
+    return stages
+
+
+def explain_shape(db, shape: dict) -> list:
+    """
+    Runs `explain()` on a query shape.
+
+    Args:
+        db (Database): The database to run the query against.
+        shape (dict): The query shape.
+
+    Returns:
+        list: The stages of the winning plan.
+    """
+    cursor = db[shape["collection"]].find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    if shape.get("limit"):
+        cursor = cursor.limit(shape["limit"])
+    return plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+
+
+def check_query_plans(db) -> list:
+    """
+    Explains every query shape.
+
+    Args:
+        db (Database): The database to run the queries against.
+
+    Returns:
+        list: `(name, stages)` tuples of the shapes whose winning plan contains a COLLSCAN.
+    """
+    collection_scans = []
+    for shape in query_shapes():
+        stages = explain_shape(db, shape)
+        print(f"{'COLLSCAN' if 'COLLSCAN' in stages else 'ok':<10}{shape['name']:<30}{' > '.join(stages)}")
+        if "COLLSCAN" in stages:
+            collection_scans.append((shape["name"], stages))
+    return collection_scans
+
+
+def main() -> int:
+    db_service = DatabaseService()
+    try:
+        db_service.ensure_identification_indexes()
+        db_service.ensure_result_cache_index(settings.result_cache_ttl_seconds)
+        JobQueue(db_service).ensure_indexes()
+        WebhookOutbox(db_service).ensure_indexes()
+        collection_scans = check_query_plans(db_service.db)
+    finally:
+        close_mongo_client()
+
+    if collection_scans:
+        print(f"{len(collection_scans)} queries scan a whole collection.")
+        return 1
+    print("Every query is served by an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Result field of the API shape -> field of the compact representation
+RESULT_FIELDS = {
+    "plant_name": "n",
+    "probability": "p",
+    "identification_id": "k",
+    "is_plant": "ip",
+    "created": "c",
+}
+# Result field of the API shape -> field of the taxon document
+TAXON_FIELDS = {
+    "common_names": "cn",
+    "taxonomy": "tx",
+}
+# Prefix of the taxon keys of results stored before species IDs were kept
+NAME_TAXON_PREFIX = "name:"
+
+
+def taxon_key(data: dict):
+    """
+    Returns the key of the taxon of a result.
+
+    Args:
+        data (dict): The simplified identification result.
+
+    Returns:
+        str: The Kindwise species ID, the plant name prefixed with `name:` for results
+            without one, or None if the result has no suggestion.
+    """
+    if data.get("species_id"):
+        return data["species_id"]
+    if data.get("plant_name"):
+        return NAME_TAXON_PREFIX + data["plant_name"]
+    return None
+
+
+def encode_result(data: dict):
+    """
+    Converts a simplified identification result to its compact representation.
+
+    The result fields are stored under the short names of RESULT_FIELDS. Common
+    names and taxonomy are the same for every identification of a species, so they
+    go to a taxon document (`{_id, n, cn, tx}`) referenced under `t`; results
+    without a taxon key keep them inline under `cn`/`tx`.
+
+    Args:
+        data (dict): The simplified identification result.
+
+    Returns:
+        tuple: The compact result and the taxon document to store, or None.
+    """
+    compact = {
+        short: data[name]
+        for name, short in RESULT_FIELDS.items()
+        if data.get(name) is not None
+    }
+    if isinstance(compact.get("c"), str):
+        try:
+            compact["c"] = parse_created(compact["c"])
+        except ValueError:
+            pass
+
+    key = taxon_key(data)
+    if key is None:
+        compact.update({short: data.get(name) or _empty_taxon_field(name) for name, short in TAXON_FIELDS.items()})
+        return compact, None
+    compact["t"] = key
+    taxon = {"_id": key, "n": data.get("plant_name")}
+    taxon.update({short: data.get(name) or _empty_taxon_field(name) for name, short in TAXON_FIELDS.items()})
+    return compact, taxon
+
+
+def decode_result(compact: dict, taxon: dict = None) -> dict:
+    """
+    Expands a compact result back to the `PlantResult` API shape.
+
+    Only the fields present in `compact` are returned, so projected documents stay projected.
+
+    Args:
+        compact (dict): The compact result.
+        taxon (dict): The taxon document referenced by `compact["t"]`, if any.
+
+    Returns:
+        dict: The identification result.
+    """
+    data = {name: compact[short] for name, short in RESULT_FIELDS.items() if short in compact}
+    if isinstance(data.get("created"), datetime):
+        data["created"] = format_created(data["created"])
+
+    key = compact.get("t")
+    if key is not None and not key.startswith(NAME_TAXON_PREFIX):
+        data["species_id"] = key
+    for name, short in TAXON_FIELDS.items():
+        if taxon and short in taxon:
+            data[name] = taxon[short]
+        elif short in compact:
+            # Kept inline when the result has no taxon or storing the taxon failed
+            data[name] = compact[short]
+        elif key is not None:
+            data[name] = _empty_taxon_field(name)
+    return data
+
+
+def referenced_taxa(identifications: list) -> list:
+    """
+    Returns the taxon keys referenced by compact identification documents.
+    """
+    return [
+        identification["r"]["t"]
+        for identification in identifications
+        if isinstance(identification.get("r"), dict) and "t" in identification["r"]
+    ]
+
+
+def decode_identification(identification: dict, taxa) -> dict:
+    """
+    Replaces the compact result of an identification document by the API shape, in place.
+
+    Documents stored before the compact representation keep their `result` as is.
+
+    Args:
+        identification (dict): The identification document.
+        taxa (TaxonCache): The cache holding the referenced taxa.
+
+    Returns:
+        dict: The identification document.
+    """
+    compact = identification.pop("r", None)
+    if isinstance(compact, dict):
+        taxon = taxa.get(compact["t"]) if "t" in compact else None
+        identification["result"] = decode_result(compact, taxon)
+    return identification
+
+
+def storage_projection(fields: list) -> list:
+    """
+    Maps the fields of a listing projection to the fields of the compact representation.
+
+    Args:
+        fields (list): Fields in the API shape, e.g. `result.plant_name`.
+
+    Returns:
+        list: The fields to project from MongoDB.
+    """
+    projection = []
+    for field in fields:
+        if field == "result":
+            projection.append("r")
+        elif field.startswith("result."):
+            name = field[len("result."):]
+            if name in RESULT_FIELDS:
+                projection.append(f"r.{RESULT_FIELDS[name]}")
+            elif name in TAXON_FIELDS:
+                projection.extend(["r.t", f"r.{TAXON_FIELDS[name]}"])
+            elif name == "species_id":
+                projection.append("r.t")
+        else:
+            projection.append(field)
+    return list(dict.fromkeys(projection))
+
+
+def parse_created(created: str) -> datetime:
+    """
+    Parses the ISO creation time of a Kindwise identification, assuming UTC when it has no offset.
+    """
+    parsed = datetime.fromisoformat(created.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    # BSON datetimes have millisecond precision; truncate here so cached and stored results agree
+    return parsed.replace(microsecond=parsed.microsecond // 1000 * 1000)
+
+
+def format_created(created: datetime) -> str:
+    """
+    Formats a stored creation time. MongoDB returns naive UTC datetimes with millisecond precision.
+    """
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created.isoformat()
+
+
+def _empty_taxon_field(name: str):
+    return [] if name == "common_names" else {}
+
+
+class TaxonCache:
+    def __init__(self, max_entries: int):
+        """
+        Initializes the process-wide cache of taxon documents.
+
+        Entries are evicted for space, least recently used first, and replaced when
+        this process stores a newer version of a taxon. Shared by the sync and async
+        database services.
+
+        Args:
+            max_entries (int): Maximum number of cached taxa.
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._taxa = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            taxon = self._taxa.get(key)
+            if taxon is None:
+                self.misses += 1
+                return None
+            self._taxa.move_to_end(key)
+            self.hits += 1
+            return taxon
+
+    def put(self, taxon: dict):
+        with self._lock:
+            self._taxa[taxon["_id"]] = taxon
+            self._taxa.move_to_end(taxon["_id"])
+            while len(self._taxa) > self.max_entries:
+                self._taxa.popitem(last=False)
+
+    def contains(self, taxon: dict) -> bool:
+        """
+        Returns whether `taxon` is cached with the same content, without counting a lookup.
+        """
+        with self._lock:
+            return self._taxa.get(taxon["_id"]) == taxon
+
+    def missing(self, keys) -> list:
+        """
+        Returns the keys that are not cached, without counting lookups.
+        """
+        with self._lock:
+            return [key for key in dict.fromkeys(keys) if key not in self._taxa]
+
+    def clear(self):
+        with self._lock:
+            self._taxa.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._taxa), "hits": self.hits, "misses": self.misses}
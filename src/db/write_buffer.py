@@ -0,0 +1,195 @@
+import threading
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from src.core.metrics import db_write_seconds
+
+
+def identification_update(fields: dict) -> dict:
+    """
+    Builds the update document setting fields of an identification record.
+
+    A perceptual hash is stamped with the server time of the write in `phash_at`,
+    so the near-duplicate index can page on the order hashes reached MongoDB
+    rather than on record creation.
+
+    Args:
+        fields (dict): The fields to set.
+
+    Returns:
+        dict: The update document.
+    """
+    update = {"$set": fields}
+    if "phash" in fields:
+        update["$currentDate"] = {"phash_at": True}
+    return update
+
+
+class StatusWriteBuffer:
+    def __init__(self, db, max_batch: int, flush_interval: float, on_flush=None):
+        """
+        Initializes the write-behind buffer of identification status updates.
+
+        Updates are collected in memory and written as one unordered `bulk_write`
+        once `max_batch` records are pending or `flush_interval` seconds passed.
+        Several updates of the same record within one batch are merged into one.
+
+        Completed jobs are removed from the `jobs` collection only after the updates
+        buffered before them were written, so a crash before a flush leaves the job
+        in the queue to be retried instead of losing its result. Callbacks given with
+        a job run only once its removal was written.
+
+        Args:
+            db (Database): The database holding the `identifications` and `jobs` collections.
+            max_batch (int): Number of pending records that triggers a flush.
+            flush_interval (float): Maximum seconds an update stays in the buffer.
+            on_flush (callable): Called with the IDs of the records written by each flush.
+        """
+        self.identifications = db.identifications
+        self.jobs = db.jobs
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        # Serializes flushes, so batches reach MongoDB in the order they were buffered
+        self._flush_lock = threading.Lock()
+        self._updates = {}
+        self._jobs = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.records_written = 0
+        self.jobs_completed = 0
+        self.updates_merged = 0
+        self.write_errors = 0
+
+    def start(self):
+        """
+        Starts the background thread flushing the buffer every `flush_interval` seconds.
+        """
+        self._thread = threading.Thread(target=self._run, name="status-write-buffer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """
+        Stops the background thread and writes everything still buffered.
+        """
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def update_identification(self, identification_id: str, fields: dict):
+        """
+        Buffers a `$set` of fields of an identification record.
+
+        Args:
+            identification_id (str): The ID of the identification record.
+            fields (dict): The fields to set.
+        """
+        with self._lock:
+            pending = self._updates.setdefault(ObjectId(identification_id), {})
+            if pending:
+                self.updates_merged += 1
+            pending.update(fields)
+            full = len(self._updates) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def complete_job(self, job_id, on_removed=None):
+        """
+        Buffers the removal of a finished job.
+
+        Args:
+            job_id (ObjectId | str): The ID of the job.
+            on_removed (callable): Called without arguments once the removal was written,
+                e.g. to delete files the job still needs if it is handed out again.
+        """
+        with self._lock:
+            self._jobs.append((ObjectId(job_id), on_removed))
+
+    def flush(self) -> int:
+        """
+        Writes the buffered updates, then removes the buffered jobs.
+
+        Updates that failed because MongoDB was unreachable are buffered again
+        (unless a newer update of the same record arrived meanwhile) and their jobs
+        are kept. Updates rejected by the server are dropped.
+
+        Returns:
+            int: The number of identification records written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                updates, self._updates = self._updates, {}
+                jobs, self._jobs = self._jobs, []
+            if not updates and not jobs:
+                return 0
+
+            if updates:
+                operations = [UpdateOne({"_id": _id}, identification_update(fields)) for _id, fields in updates.items()]
+                try:
+                    with db_write_seconds.time("status_flush"):
+                        self.identifications.bulk_write(operations, ordered=False)
+                except BulkWriteError as e:
+                    self.write_errors += len(e.details.get("writeErrors", []))
+                    print(f"Error writing identification updates: {e.details.get('writeErrors', [])[:1]}")
+                except PyMongoError as e:
+                    print(f"Error writing identification updates, retrying on the next flush: {e}")
+                    self._requeue(updates, jobs)
+                    return 0
+
+            removed = []
+            if jobs:
+                try:
+                    self.jobs.delete_many({"_id": {"$in": [job_id for job_id, _ in jobs]}})
+                    removed = [on_removed for _, on_removed in jobs if on_removed is not None]
+                except PyMongoError as e:
+                    # The jobs are handed out again after their visibility timeout
+                    print(f"Error removing completed jobs: {e}")
+
+            self.flushes += 1
+            self.records_written += len(updates)
+            self.jobs_completed += len(jobs)
+
+        for on_removed in removed:
+            try:
+                on_removed()
+            except Exception as e:
+                print(f"Error running completed job callback: {e}")
+        if self.on_flush is not None and updates:
+            self.on_flush([str(_id) for _id in updates])
+        return len(updates)
+
+    def stats(self) -> dict:
+        """
+        Returns the number of pending writes and the flush counters.
+        """
+        with self._lock:
+            return {
+                "pending_records": len(self._updates),
+                "pending_jobs": len(self._jobs),
+                "flushes": self.flushes,
+                "records_written": self.records_written,
+                "jobs_completed": self.jobs_completed,
+                "updates_merged": self.updates_merged,
+                "write_errors": self.write_errors,
+            }
+
+    def _requeue(self, updates: dict, jobs: list):
+        with self._lock:
+            for _id, fields in updates.items():
+                newer = self._updates.get(_id)
+                self._updates[_id] = {**fields, **newer} if newer else fields
+            self._jobs[:0] = jobs
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing status updates: {e}")
@@ -1,22 +1,144 @@
-from fastapi import FastAPI, Request, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from src.config import settings, get_api_key_from_headers
 from src.api.routes import router
+from src.core.job_keys import ensure_key_sealing
+from src.core.job_queue import JobQueue
+from src.core.kindwise_session import kindwise_sessions
+from src.core.metrics import http_request_seconds, http_requests_in_flight
+from src.core.notification_hub import notification_hub
+from src.core.record_cache import record_cache
+from src.core.tracing import SPAN_KIND_SERVER, parse_traceparent, tracer
+from src.core.upload_spool import upload_spool
+from src.core.webhooks import AsyncWebhookOutbox, WebhookDispatcher, WebhookOutbox, WebhookSender
+from src.db.async_db_service import AsyncDatabaseService, get_async_mongo_client, close_async_mongo_client
+from src.db.db_service import DatabaseService, get_mongo_client, close_mongo_client
+from src.worker import create_worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application lifespan hook checking that caller API keys can be queued, opening
+    the shared MongoClients, preparing database indexes, removing stale spooled
+    uploads, watching identification updates, delivering webhooks and running
+    embedded queue workers when configured. Spans still queued for export are
+    written on shutdown.
+    """
+    ensure_key_sealing()
+    get_async_mongo_client()
+    # Embedded workers complete records into the cache read by this process
+    record_cache.serves_reads = True
+    try:
+        db_service = DatabaseService(get_mongo_client())
+        db_service.ensure_identification_indexes()
+        JobQueue(db_service).ensure_indexes()
+        WebhookOutbox(db_service).ensure_indexes()
+        if settings.result_cache_enabled:
+            db_service.ensure_result_cache_index(settings.result_cache_ttl_seconds)
+    except Exception as e:
+        print(f"Error creating indexes: {e}")
+    # Uploads of jobs still in the queue are kept however long they wait
+    upload_spool.in_use = JobQueue().spooled_paths
+    await asyncio.to_thread(upload_spool.sweep)
+
+    background_tasks = []
+    if settings.notify_change_streams:
+        background_tasks.append(asyncio.create_task(notification_hub.watch(AsyncDatabaseService().collection)))
+
+    webhook_sender = None
+    if settings.webhook_enabled:
+        webhook_sender = WebhookSender()
+        dispatcher = WebhookDispatcher(AsyncWebhookOutbox(AsyncDatabaseService()), webhook_sender)
+        background_tasks.append(asyncio.create_task(dispatcher.run()))
+
+    worker = None
+    if settings.queue_embedded_workers > 0:
+        worker = create_worker(concurrency=settings.queue_embedded_workers)
+        await asyncio.to_thread(worker.start)
+
+    yield
+
+    if worker is not None:
+        await asyncio.to_thread(worker.stop)
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if webhook_sender is not None:
+        await webhook_sender.aclose()
+    kindwise_sessions.close()
+    tracer.shutdown()
+    await close_async_mongo_client()
+    close_mongo_client()
+
 
 app = FastAPI(
     title="Zelara Plant Worker",
     version="1.0.0",
-    description="API for plant identification using Kindwise SDK."
+    description="API for plant identification using Kindwise SDK.",
+    lifespan=lifespan,
 )
 
 @app.middleware("http")
 async def api_key_middleware(request: Request, call_next):
     if settings.environment == "PRODUCTION":
         try:
-            api_key = get_api_key_from_headers(request.headers)
+            get_api_key_from_headers(request.headers)
         except ValueError as e:
-            raise HTTPException(status_code=401, detail=str(e))
+            # Exceptions raised in a middleware bypass the HTTPException handler
+            return JSONResponse(status_code=401, content={"detail": str(e)})
     return await call_next(request)
 
+@app.middleware("http")
+async def tracing_middleware(request: Request, call_next):
+    """
+    Opens the root span of every request, around the API key check.
+
+    An incoming `traceparent` header is continued, so callers can join their own
+    traces; otherwise the request starts a new trace, sampled at `tracing_sample_rate`.
+    """
+    if not tracer.enabled:
+        return await call_next(request)
+    span = tracer.start_span(
+        request.method,
+        parent=parse_traceparent(request.headers.get("traceparent")),
+        kind=SPAN_KIND_SERVER,
+        attributes={"http.request.method": request.method, "url.path": request.url.path},
+    )
+    with span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            span.name = f"{request.method} {route.path}"
+            span.set_attribute("http.route", route.path)
+        span.set_attribute("http.response.status_code", response.status_code)
+        return response
+
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    """
+    Records the latency of every request by method, route template and status.
+
+    For streamed responses (server-sent events, exports) the latency ends when
+    the response headers are ready.
+    """
+    started = time.perf_counter()
+    status = 500
+    http_requests_in_flight.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_requests_in_flight.dec()
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started, request.method, route.path if route else "unmatched", str(status)
+        )
+
 app.include_router(router)
 
 @app.get("/")
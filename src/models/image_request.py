@@ -1,4 +1,9 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
 class ImageUploadRequest(BaseModel):
     image_base64: str
+    callback_url: Optional[str] = None
+
+class BatchImageUploadRequest(BaseModel):
+    images_base64: List[str]
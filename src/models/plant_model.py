@@ -32,14 +32,47 @@ class PlantIdentificationResult(BaseModel):
     error_message: Optional[str] = None
 
 
+class BatchIdentificationResponse(BaseModel):
+    """
+    Model for the batch identification response.
+
+    Attributes:
+        message (str): Response message.
+        batch_id (str): The ID of the batch.
+        identification_ids (List[str]): The IDs of the identification tasks, in upload order.
+    """
+
+    message: str
+    batch_id: str
+    identification_ids: List[str]
+
+
+class BatchStatusResult(BaseModel):
+    """
+    Model for the status of a batch identification.
+
+    Attributes:
+        batch_id (str): The ID of the batch.
+        total (int): The number of images in the batch.
+        status_counts (Dict[str, int]): The number of identifications per status.
+        identifications (List[PlantIdentificationResult]): The identifications, in upload order.
+    """
+
+    batch_id: str
+    total: int
+    status_counts: Dict[str, int]
+    identifications: List[PlantIdentificationResult]
+
+
 class PlantResult(BaseModel):
-    plant_name: Optional[str]
-    common_names: Optional[List[str]]
-    probability: Optional[float]
-    taxonomy: Optional[Dict[str, str]]
-    identification_id: Optional[str]
-    is_plant: Optional[bool]
-    created: Optional[str]
+    plant_name: Optional[str] = None
+    common_names: Optional[List[str]] = None
+    probability: Optional[float] = None
+    taxonomy: Optional[Dict[str, str]] = None
+    identification_id: Optional[str] = None
+    species_id: Optional[str] = None
+    is_plant: Optional[bool] = None
+    created: Optional[str] = None
 
 
 PlantIdentificationResult.update_forward_refs()
@@ -0,0 +1,396 @@
+import asyncio
+import functools
+import random
+import signal
+import socket
+import threading
+import uuid
+from datetime import timezone
+from src.config import settings
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.job_keys import ensure_key_sealing
+from src.core.job_queue import JobQueue, job_api_key, job_image
+from src.core.kindwise_session import async_kindwise_sessions, kindwise_breaker, kindwise_sessions
+from src.core.metrics import identifications_in_flight, observe_queue_depth, start_metrics_server
+from src.core.notification_hub import notification_hub
+from src.core.preprocess_pool import preprocess_pool
+from src.core.task_manager import identify_plant_task, identify_plant_task_async
+from src.core.tracing import parse_traceparent, tracer
+from src.core.upload_spool import upload_spool
+from src.core.webhooks import WebhookOutbox, build_webhook_payload
+from src.db.db_service import DatabaseService, close_mongo_client, start_status_write_buffer, stop_status_write_buffer
+
+
+class Worker:
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        """
+        Initializes a queue worker running identification jobs on a pool of threads.
+
+        Args:
+            concurrency (int): Number of jobs processed concurrently.
+            poll_interval (float): Seconds to wait before polling an empty queue again.
+        """
+        self.concurrency = concurrency or settings.worker_concurrency
+        self.poll_interval = poll_interval if poll_interval is not None else settings.worker_poll_interval_seconds
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def start(self):
+        """
+        Warms the preprocessing pool and starts the worker threads.
+        """
+        preprocess_pool.start()
+        start_status_writes()
+        for index in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._run, name=f"identification-worker-{index}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        print(f"Worker {self.worker_id} started with {self.concurrency} threads.")
+
+    def stop(self, timeout: float = None):
+        """
+        Stops claiming new jobs and waits for in-flight jobs to finish.
+
+        Args:
+            timeout (float): Maximum seconds to wait for each thread.
+        """
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        preprocess_pool.shutdown()
+        stop_status_write_buffer()
+        print(f"Worker {self.worker_id} stopped.")
+
+    def _run(self):
+        job_queue = JobQueue()
+        while not self.stop_event.is_set():
+            paused = kindwise_pause_seconds()
+            if paused:
+                self.stop_event.wait(min(paused, self.poll_interval))
+                continue
+
+            try:
+                job = job_queue.claim(self.worker_id)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+
+            try:
+                process_job(job_queue, job)
+            except Exception as e:
+                # Keep the thread alive; the job is handed out again after its visibility timeout
+                print(f"Error processing job {job['_id']}: {e}")
+
+
+class AsyncWorker:
+    def __init__(self, concurrency: int = None, poll_interval: float = None):
+        """
+        Initializes a queue worker running identification jobs as coroutines.
+
+        Jobs wait on Kindwise without holding a thread, so a single event loop
+        thread (plus the default executor for preprocessing and database work)
+        keeps hundreds of identifications in flight.
+
+        Args:
+            concurrency (int): Number of jobs processed concurrently.
+            poll_interval (float): Seconds to wait before polling an empty queue again.
+        """
+        self.concurrency = concurrency or settings.worker_async_concurrency
+        self.poll_interval = poll_interval if poll_interval is not None else settings.worker_poll_interval_seconds
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """
+        Warms the preprocessing pool and starts the event loop thread.
+        """
+        preprocess_pool.start()
+        start_status_writes()
+        self.thread = threading.Thread(
+            target=asyncio.run, args=(self._run(),), name="identification-worker-async", daemon=True
+        )
+        self.thread.start()
+        print(f"Worker {self.worker_id} started with up to {self.concurrency} concurrent jobs.")
+
+    def stop(self, timeout: float = None):
+        """
+        Stops claiming new jobs and waits for in-flight jobs to finish.
+
+        Args:
+            timeout (float): Maximum seconds to wait for the event loop thread.
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        preprocess_pool.shutdown()
+        stop_status_write_buffer()
+        print(f"Worker {self.worker_id} stopped.")
+
+    async def _run(self):
+        job_queue = JobQueue()
+        in_flight = set()
+        while not self.stop_event.is_set():
+            if len(in_flight) >= self.concurrency:
+                await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            paused = kindwise_pause_seconds()
+            if paused:
+                await asyncio.sleep(min(paused, self.poll_interval))
+                continue
+
+            try:
+                job = await asyncio.to_thread(job_queue.claim, self.worker_id)
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            task = asyncio.create_task(process_job_async(job_queue, job))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            task.add_done_callback(log_job_error)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+        await async_kindwise_sessions.aclose()
+
+
+def log_job_error(task: asyncio.Task):
+    """
+    Logs the error of a finished `process_job_async` task, which is otherwise never retrieved.
+
+    The job is handed out again after its visibility timeout.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error processing job: {task.exception()}")
+
+
+def process_job(job_queue: JobQueue, job: dict):
+    """
+    Runs a claimed identification job and removes it from the queue.
+
+    Jobs that were already attempted `queue_max_attempts` times (for example because
+    their workers crashed) are marked as failed instead of being retried again. When
+    the job belongs to a batch, the next waiting job of the batch is queued. Jobs
+    that hit an open Kindwise circuit breaker are deferred instead.
+
+    Args:
+        job_queue (JobQueue): The queue the job was claimed from.
+        job (dict): The claimed job document.
+    """
+    with job_span(job):
+        if job["attempts"] > settings.queue_max_attempts:
+            abandon_job(job)
+        else:
+            try:
+                with identifications_in_flight.track():
+                    identify_plant_task(
+                        job_image(job), job_api_key(job), job["identification_id"], callback_url=job.get("callback_url")
+                    )
+            except CircuitOpenError as e:
+                defer_job(job_queue, job, e.retry_after)
+                return
+        finish_job(job_queue, job)
+
+
+async def process_job_async(job_queue: JobQueue, job: dict):
+    """
+    Coroutine version of `process_job` used by the AsyncWorker.
+
+    Args:
+        job_queue (JobQueue): The queue the job was claimed from.
+        job (dict): The claimed job document.
+    """
+    with job_span(job):
+        if job["attempts"] > settings.queue_max_attempts:
+            await asyncio.to_thread(abandon_job, job)
+        else:
+            try:
+                with identifications_in_flight.track():
+                    await identify_plant_task_async(
+                        job_image(job), job_api_key(job), job["identification_id"], callback_url=job.get("callback_url")
+                    )
+            except CircuitOpenError as e:
+                await asyncio.to_thread(defer_job, job_queue, job, e.retry_after)
+                return
+        await asyncio.to_thread(finish_job, job_queue, job)
+
+
+def job_span(job: dict):
+    """
+    Starts the span of a claimed job, continuing the trace of the request that queued it.
+
+    The time the job spent in the queue, from its creation until now, is recorded
+    as a `queued` span before it.
+
+    Args:
+        job (dict): The claimed job document.
+
+    Returns:
+        Span | NoopSpan: The span; use it as a context manager.
+    """
+    if not tracer.enabled:
+        return tracer.start_span("process_job")
+    parent = parse_traceparent(job.get("traceparent"))
+    attributes = {
+        "job.id": str(job["_id"]), "identification.id": job["identification_id"], "job.attempt": job["attempts"]
+    }
+    created_at = job.get("created_at")
+    if created_at is not None:
+        # PyMongo returns naive datetimes in UTC
+        created_ns = int(created_at.replace(tzinfo=created_at.tzinfo or timezone.utc).timestamp() * 1_000_000_000)
+        queued = tracer.start_span("queued", parent=parent, attributes=attributes, start_ns=created_ns)
+        queued.end()
+        # Jobs queued without a trace start one with their `queued` span
+        parent = parent or queued.context
+    return tracer.start_span("process_job", parent=parent, attributes=attributes)
+
+
+def abandon_job(job: dict):
+    """
+    Marks the identification of a job that ran out of attempts as failed.
+
+    Args:
+        job (dict): The claimed job document.
+    """
+    identification_id = job["identification_id"]
+    error_message = "Identification abandoned after too many attempts."
+    db_service = DatabaseService()
+    db_service.update_identification_error(identification_id, error_message)
+    if job.get("callback_url") is not None:
+        WebhookOutbox(db_service).add(
+            job["callback_url"], build_webhook_payload(identification_id, error_message=error_message)
+        )
+    notification_hub.publish(identification_id)
+
+
+def defer_job(job_queue: JobQueue, job: dict, retry_after: float):
+    """
+    Returns a job to the queue while the Kindwise circuit breaker is open.
+
+    The attempt is refunded, since the job did not fail, and the delay is spread
+    over another `kindwise_breaker_open_seconds` so deferred jobs do not all hit
+    Kindwise again the moment it recovers.
+
+    Args:
+        job_queue (JobQueue): The queue the job was claimed from.
+        job (dict): The claimed job document.
+        retry_after (float): Seconds until the breaker lets probe requests through.
+    """
+    delay = retry_after + random.uniform(0, settings.kindwise_breaker_open_seconds)
+    print(f"Kindwise is unavailable, deferring job {job['_id']} by {delay:.0f} seconds.")
+    job_queue.release(job["_id"], delay_seconds=delay, refund_attempt=True)
+
+
+def start_status_writes():
+    """
+    Starts the status write buffer when `status_write_mode` is "buffered".
+
+    Requests waiting for a result are woken up again once its update was flushed,
+    since the task's own notification may arrive before the record is written.
+    """
+    if settings.status_write_mode == "buffered":
+        start_status_write_buffer(on_flush=publish_identifications)
+
+
+def publish_identifications(identification_ids: list):
+    """
+    Wakes up the requests of this process waiting for the given identifications.
+
+    Args:
+        identification_ids (list): The IDs of the updated identifications.
+    """
+    for identification_id in identification_ids:
+        notification_hub.publish(identification_id)
+
+
+def kindwise_pause_seconds() -> float:
+    """
+    Returns how long workers should stop claiming jobs because the Kindwise circuit
+    breaker of this process is open, or 0 if they can claim jobs.
+    """
+    if not settings.kindwise_breaker_enabled:
+        return 0.0
+    return kindwise_breaker.retry_after()
+
+
+def finish_job(job_queue: JobQueue, job: dict):
+    """
+    Removes a processed job from the queue and queues the next waiting job of its batch.
+
+    A spooled upload is deleted only once the job's removal was written, which the
+    status write buffer may delay, so a job handed out again after a crash still
+    finds its image.
+
+    Args:
+        job_queue (JobQueue): The queue the job was claimed from.
+        job (dict): The claimed job document.
+    """
+    on_removed = None
+    if "image_file" in job:
+        on_removed = functools.partial(upload_spool.remove, job["image_file"]["path"])
+    job_queue.complete(job["_id"], on_removed)
+    if job.get("batch_id") is not None:
+        job_queue.promote_waiting(job["batch_id"])
+
+
+def create_worker(concurrency: int = None):
+    """
+    Creates the worker configured by `worker_mode`.
+
+    Args:
+        concurrency (int): Number of jobs processed concurrently. Defaults to the
+            setting of the selected worker.
+
+    Returns:
+        Worker | AsyncWorker: The worker, not yet started.
+    """
+    if settings.worker_mode == "async":
+        return AsyncWorker(concurrency=concurrency)
+    return Worker(concurrency=concurrency)
+
+
+def main():
+    """
+    Entry point of the standalone identification worker process.
+    """
+    ensure_key_sealing()
+    DatabaseService().ensure_identification_indexes()
+    JobQueue().ensure_indexes()
+    WebhookOutbox().ensure_indexes()
+    # Uploads of jobs still in the queue are kept however long they wait
+    upload_spool.in_use = JobQueue().spooled_paths
+    upload_spool.sweep()
+    if settings.worker_metrics_port:
+        start_metrics_server(settings.worker_metrics_port, on_scrape=lambda: observe_queue_depth(JobQueue().stats()))
+    worker = create_worker()
+    stopped = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.start()
+    stopped.wait()
+    worker.stop()
+    kindwise_sessions.close()
+    tracer.shutdown()
+    close_mongo_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+import base64
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+from io import BytesIO
+from PIL import Image
+import json
 import sys
 
 # Mock external dependencies
@@ -9,19 +13,39 @@ sys.modules['kindwise.plant'] = MagicMock()
 
 from src.main import app
 from src.config import settings
+from src.core.job_queue import QueueFullError
+from src.core.record_cache import record_cache
+from src.core.single_flight import upload_key
+from src.core.tracing import tracer
+from src.core.upload_spool import SpooledUpload, UploadSpool
 
 client = TestClient(app)
 
+def load_square_ficus():
+    # The sample photo is 3:4, outside the accepted aspect ratio range, so crop it to a square
+    img = Image.open('tests/ficus_lyrata_1152x1536.jpg')
+    img = img.crop((0, 192, 1152, 1344))
+    buf = BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+SQUARE_FICUS = load_square_ficus()
+
 @pytest.fixture
 def mock_db_service():
-    with patch('src.api.routes.DatabaseService') as MockDBService:
-        mock_db = MockDBService.return_value
+    with patch('src.api.routes.AsyncDatabaseService') as MockDBService:
+        record_cache.clear()
+        mock_db = AsyncMock()
+        MockDBService.return_value = mock_db
         yield mock_db
+        record_cache.clear()
 
 @pytest.fixture
-def mock_identify_plant_task():
-    with patch('src.api.routes.identify_plant_task') as mock_task:
-        yield mock_task
+def mock_job_queue():
+    with patch('src.api.routes.AsyncJobQueue') as MockJobQueue:
+        mock_queue = AsyncMock()
+        MockJobQueue.return_value = mock_queue
+        yield mock_queue
 
 @pytest.fixture
 def mock_get_api_key_from_headers():
@@ -29,11 +53,11 @@ def mock_get_api_key_from_headers():
         mock_get_api_key.return_value = 'mock-api-key'
         yield mock_get_api_key
 
-def test_identify_plant_valid_image(mock_db_service, mock_identify_plant_task, mock_get_api_key_from_headers):
+def test_identify_plant_valid_image(mock_db_service, mock_job_queue, mock_get_api_key_from_headers):
     mock_db_service.create_identification_record.return_value = '12345'
 
     # Simulate uploading a valid image
-    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
+    with BytesIO(SQUARE_FICUS) as img_file:
         response = client.post(
             '/identify',
             files={'file': ('ficus.jpg', img_file, 'image/jpeg')}
@@ -44,9 +68,11 @@ def test_identify_plant_valid_image(mock_db_service, mock_identify_plant_task, m
     assert data['message'] == 'Plant identification is in progress.'
     assert data['identification_id'] == '12345'
 
-    # Ensure the background task was added
-    mock_identify_plant_task.assert_called_once()
-    mock_db_service.create_identification_record.assert_called_once_with(status='Processing')
+    # Ensure the identification job was queued
+    mock_job_queue.enqueue.assert_called_once()
+    mock_db_service.create_identification_record.assert_called_once_with(
+        status='Processing', content_hash=upload_key(SQUARE_FICUS)
+    )
 
 def test_identify_plant_invalid_file_type():
     # Attempt to upload a non-image file
@@ -68,12 +94,11 @@ def test_identify_plant_empty_file():
     data = response.json()
     assert data['detail'] == 'Empty file.'
 
-def test_identify_plant_base64_valid(mock_db_service, mock_identify_plant_task, mock_get_api_key_from_headers):
+def test_identify_plant_base64_valid(mock_db_service, mock_job_queue, mock_get_api_key_from_headers):
     mock_db_service.create_identification_record.return_value = '12345'
     # Base64-encoded image data
-    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
-        import base64
-        image_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+    import base64
+    image_base64 = base64.b64encode(SQUARE_FICUS).decode('utf-8')
 
     response = client.post(
         '/identify_base64',
@@ -85,8 +110,65 @@ def test_identify_plant_base64_valid(mock_db_service, mock_identify_plant_task,
     assert data['message'] == 'Plant identification is in progress.'
     assert data['identification_id'] == '12345'
 
-    mock_identify_plant_task.assert_called_once()
-    mock_db_service.create_identification_record.assert_called_once_with(status='Processing')
+    mock_job_queue.enqueue.assert_called_once()
+    mock_db_service.create_identification_record.assert_called_once_with(
+        status='Processing', content_hash=upload_key(SQUARE_FICUS)
+    )
+
+def test_identify_plant_with_callback_url(mock_db_service, mock_job_queue):
+    mock_db_service.create_identification_record.return_value = '12345'
+
+    with patch('src.core.webhooks.socket.getaddrinfo', return_value=[(2, 1, 6, '', ('93.184.215.14', 443))]):
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')},
+            data={'callback_url': 'https://example.com/hooks/plants'},
+        )
+
+    assert response.status_code == 200
+    assert mock_job_queue.enqueue.call_args.kwargs['callback_url'] == 'https://example.com/hooks/plants'
+
+def test_identify_plant_internal_callback_url(mock_db_service, mock_job_queue):
+    with patch('src.core.webhooks.socket.getaddrinfo', return_value=[(2, 1, 6, '', ('169.254.169.254', 80))]):
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')},
+            data={'callback_url': 'http://metadata.example.com/latest'},
+        )
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid callback URL.'
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_base64_invalid_callback_url(mock_db_service, mock_job_queue):
+    import base64
+    image_base64 = base64.b64encode(SQUARE_FICUS).decode('utf-8')
+
+    response = client.post('/identify_base64', json={'image_base64': image_base64, 'callback_url': 'ftp://example.com'})
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Invalid callback URL.'
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_base64_too_large(mock_db_service, mock_job_queue):
+    image_base64 = base64.b64encode(SQUARE_FICUS).decode('utf-8')
+
+    with patch('src.api.routes.settings.upload_max_bytes', 1000):
+        response = client.post('/identify_base64', json={'image_base64': image_base64})
+
+    assert response.status_code == 413
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_base64_missing_image(mock_db_service, mock_job_queue):
+    response = client.post('/identify_base64', json={'callback_url': 'https://example.com/hook'})
+
+    assert response.status_code == 422
+
+def test_identify_plant_base64_empty_image(mock_db_service, mock_job_queue):
+    response = client.post('/identify_base64', json={'image_base64': ''})
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Empty image data.'
 
 def test_identify_plant_base64_invalid():
     # Attempt to upload invalid base64 data
@@ -127,6 +209,83 @@ def test_get_all_identifications(mock_db_service):
     assert data[0]['_id'] == '12345'
     assert data[0]['status'] == 'Completed'
 
+def test_get_identifications_pagination(mock_db_service):
+    mock_db_service.get_identifications.return_value = [
+        {'_id': '507f1f77bcf86cd799439012', 'status': 'Completed'},
+        {'_id': '507f1f77bcf86cd799439011', 'status': 'Completed'},
+    ]
+
+    response = client.get(
+        '/identifications',
+        params={
+            'limit': 2,
+            'after': '507f1f77bcf86cd799439013',
+            'status': 'Completed',
+            'created_after': '2024-09-01T00:00:00Z',
+            'fields': 'result.plant_name,error_message',
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers['X-Next-Cursor'] == '507f1f77bcf86cd799439011'
+    kwargs = mock_db_service.get_identifications.call_args.kwargs
+    assert kwargs['limit'] == 2
+    assert kwargs['after'] == '507f1f77bcf86cd799439013'
+    assert kwargs['status'] == 'Completed'
+    assert kwargs['created_after'].year == 2024
+    assert kwargs['created_before'] is None
+    assert kwargs['fields'] == ['result.plant_name', 'error_message']
+
+def test_get_identifications_filters_by_plant_name_and_upload(mock_db_service):
+    mock_db_service.get_identifications.return_value = []
+
+    response = client.get('/identifications', params={'plant_name': 'Ficus lyrata', 'content_hash': 'abc'})
+
+    assert response.status_code == 200
+    kwargs = mock_db_service.get_identifications.call_args.kwargs
+    assert kwargs['plant_name'] == 'Ficus lyrata'
+    assert kwargs['content_hash'] == 'abc'
+
+def test_get_identifications_last_page_has_no_cursor(mock_db_service):
+    mock_db_service.get_identifications.return_value = [{'_id': '507f1f77bcf86cd799439011', 'status': 'Completed'}]
+
+    response = client.get('/identifications', params={'limit': 2})
+
+    assert response.status_code == 200
+    assert 'X-Next-Cursor' not in response.headers
+
+def test_get_identifications_invalid_parameters(mock_db_service):
+    assert client.get('/identifications', params={'after': 'not-an-id'}).status_code == 400
+    assert client.get('/identifications', params={'fields': 'image'}).status_code == 400
+    assert client.get('/identifications', params={'limit': 0}).status_code == 422
+    mock_db_service.get_identifications.assert_not_called()
+
+async def export_documents():
+    yield {'_id': '507f1f77bcf86cd799439011', 'status': 'Completed'}
+    yield {'_id': '507f1f77bcf86cd799439012', 'status': 'Error', 'error_message': 'An error occurred'}
+
+def test_export_identifications(mock_db_service):
+    mock_db_service.iter_identifications = MagicMock(return_value=export_documents())
+
+    response = client.get('/identifications/export', params={'after': '507f1f77bcf86cd799439010'})
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert [json.loads(line)['_id'] for line in lines] == ['507f1f77bcf86cd799439011', '507f1f77bcf86cd799439012']
+    mock_db_service.iter_identifications.assert_called_once_with(
+        after='507f1f77bcf86cd799439010', status=None, batch_size=settings.export_batch_size
+    )
+
+def test_export_identifications_gzip(mock_db_service):
+    mock_db_service.iter_identifications = MagicMock(return_value=export_documents())
+
+    response = client.get('/identifications/export', params={'gzip': 'true'})
+
+    assert response.status_code == 200
+    assert response.headers['content-encoding'] == 'gzip'
+    assert len(response.text.splitlines()) == 2
+
 def test_get_identification_by_id_found(mock_db_service):
     mock_db_service.get_identification_by_id.return_value = {
         '_id': '12345',
@@ -161,14 +320,367 @@ def test_get_identification_by_id_not_found(mock_db_service):
     data = response.json()
     assert data['detail'] == 'Identification not found.'
 
+def test_get_identification_by_id_is_cached_with_etag(mock_db_service):
+    mock_db_service.get_identification_by_id.return_value = {
+        '_id': '507f1f77bcf86cd799439011', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'},
+    }
+
+    first = client.get('/identifications/507f1f77bcf86cd799439011')
+    second = client.get('/identifications/507f1f77bcf86cd799439011')
+    not_modified = client.get(
+        '/identifications/507f1f77bcf86cd799439011', headers={'If-None-Match': first.headers['ETag']}
+    )
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert first.json()['result']['plant_name'] == 'Ficus lyrata'
+    assert not_modified.status_code == 304
+    assert not_modified.headers['ETag'] == first.headers['ETag']
+    assert mock_db_service.get_identification_by_id.await_count == 1
+
+def test_get_identification_by_id_etag_mismatch_returns_body(mock_db_service):
+    mock_db_service.get_identification_by_id.return_value = {
+        '_id': '507f1f77bcf86cd799439011', 'status': 'Error', 'error_message': 'Failed',
+    }
+
+    response = client.get('/identifications/507f1f77bcf86cd799439011', headers={'If-None-Match': '"stale"'})
+
+    assert response.status_code == 200
+    assert response.json()['error_message'] == 'Failed'
+
+def test_get_identification_by_id_processing_is_not_cached(mock_db_service):
+    mock_db_service.get_identification_by_id.return_value = {'_id': '507f1f77bcf86cd799439011', 'status': 'Processing'}
+
+    client.get('/identifications/507f1f77bcf86cd799439011')
+    response = client.get('/identifications/507f1f77bcf86cd799439011')
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert mock_db_service.get_identification_by_id.await_count == 2
+
+def test_identify_plant_invalid_aspect_ratio(mock_db_service, mock_job_queue):
+    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', img_file, 'image/jpeg')}
+        )
+
+    assert response.status_code == 400
+    assert 'Invalid aspect ratio' in response.json()['detail']
+    mock_db_service.create_identification_record.assert_not_called()
+    mock_job_queue.enqueue.assert_not_called()
+
+def test_identify_plant_corrupted_image(mock_db_service, mock_job_queue):
+    response = client.post(
+        '/identify',
+        files={'file': ('broken.jpg', b'Not an image', 'image/jpeg')}
+    )
+
+    assert response.status_code == 400
+    assert 'not a valid image' in response.json()['detail']
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_decompression_bomb(mock_db_service, mock_job_queue):
+    buf = BytesIO()
+    Image.new('1', (10000, 10000)).save(buf, format='PNG')
+
+    with patch('src.core.image_processor.settings.image_max_pixels', 50_000_000):
+        response = client.post(
+            '/identify',
+            files={'file': ('bomb.png', buf.getvalue(), 'image/png')}
+        )
+
+    assert response.status_code == 400
+    assert 'Image is too large' in response.json()['detail']
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_base64_invalid_aspect_ratio(mock_db_service, mock_job_queue):
+    import base64
+    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
+        image_base64 = base64.b64encode(img_file.read()).decode('utf-8')
+
+    response = client.post('/identify_base64', json={'image_base64': image_base64})
+
+    assert response.status_code == 400
+    assert 'Invalid aspect ratio' in response.json()['detail']
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_queue_full(mock_db_service, mock_job_queue):
+    mock_job_queue.check_capacity.side_effect = QueueFullError('Identification queue is full. Please retry later.')
+
+    with BytesIO(SQUARE_FICUS) as img_file:
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', img_file, 'image/jpeg')}
+        )
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(settings.queue_retry_after_seconds)
+    mock_db_service.create_identification_record.assert_not_called()
+    mock_job_queue.enqueue.assert_not_called()
+
+@pytest.fixture
+def upload_spool(tmp_path):
+    spool = UploadSpool(str(tmp_path / 'spool'), threshold_bytes=1024, quota_bytes=10 * 1024 * 1024)
+    with patch('src.api.routes.upload_spool', spool):
+        yield spool
+
+def test_identify_plant_spools_large_upload(mock_db_service, mock_job_queue, upload_spool):
+    mock_db_service.create_identification_record.return_value = '12345'
+
+    response = client.post('/identify', files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')})
+
+    assert response.status_code == 200
+    mock_db_service.create_identification_record.assert_called_once_with(
+        status='Processing', content_hash=upload_key(SQUARE_FICUS)
+    )
+    identification_id, image_data, api_key = mock_job_queue.enqueue.call_args[0]
+    assert isinstance(image_data, SpooledUpload)
+    with open(image_data.path, 'rb') as file:
+        assert file.read() == SQUARE_FICUS
+
+def test_identify_plant_base64_spools_large_upload(mock_db_service, mock_job_queue, upload_spool):
+    mock_db_service.create_identification_record.return_value = '12345'
+
+    response = client.post('/identify_base64', json={'image_base64': base64.b64encode(SQUARE_FICUS).decode()})
+
+    assert response.status_code == 200
+    image_data = mock_job_queue.enqueue.call_args[0][1]
+    assert isinstance(image_data, SpooledUpload)
+    assert image_data.content_hash == upload_key(SQUARE_FICUS)
+
+def test_identify_plant_queue_full_removes_spooled_upload(mock_db_service, mock_job_queue, upload_spool):
+    mock_job_queue.check_capacity.side_effect = QueueFullError('Identification queue is full. Please retry later.')
+
+    response = client.post('/identify', files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')})
+
+    assert response.status_code == 503
+    assert upload_spool.usage() == 0
+
+def test_identify_plant_spool_full(mock_db_service, mock_job_queue, upload_spool):
+    upload_spool.quota_bytes = 1024
+
+    response = client.post('/identify', files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')})
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(settings.queue_retry_after_seconds)
+    mock_db_service.create_identification_record.assert_not_called()
+
+def test_identify_plant_batch_removes_spooled_uploads_on_invalid_image(mock_db_service, mock_job_queue, upload_spool):
+    response = client.post(
+        '/identify_batch',
+        files=[
+            ('files', ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')),
+            ('files', ('broken.jpg', b'Not an image', 'image/jpeg')),
+        ],
+    )
+
+    assert response.status_code == 400
+    assert upload_spool.usage() == 0
+
+def test_identify_plant_batch(mock_db_service, mock_job_queue):
+    mock_db_service.create_identification_records.return_value = ['id-0', 'id-1', 'id-2']
+
+    response = client.post(
+        '/identify_batch',
+        files=[('files', (f'ficus-{index}.jpg', SQUARE_FICUS, 'image/jpeg')) for index in range(3)],
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data['identification_ids'] == ['id-0', 'id-1', 'id-2']
+    mock_job_queue.check_capacity.assert_awaited_once_with(3)
+    mock_db_service.create_identification_records.assert_awaited_once_with(
+        3, data['batch_id'], status='Processing', content_hashes=[upload_key(SQUARE_FICUS)] * 3
+    )
+    batch_id, identification_ids, images, api_key, parallelism = mock_job_queue.enqueue_batch.call_args[0]
+    assert batch_id == data['batch_id']
+    assert identification_ids == ['id-0', 'id-1', 'id-2']
+    assert images == [SQUARE_FICUS] * 3
+    assert parallelism == settings.batch_max_parallelism
+
+def test_identify_plant_batch_rejects_whole_batch_on_invalid_image(mock_db_service, mock_job_queue):
+    response = client.post(
+        '/identify_batch',
+        files=[
+            ('files', ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')),
+            ('files', ('broken.jpg', b'Not an image', 'image/jpeg')),
+        ],
+    )
+
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Image 1: ')
+    mock_db_service.create_identification_records.assert_not_called()
+    mock_job_queue.enqueue_batch.assert_not_called()
+
+def test_identify_plant_batch_base64(mock_db_service, mock_job_queue):
+    import base64
+    mock_db_service.create_identification_records.return_value = ['id-0', 'id-1']
+    image_base64 = base64.b64encode(SQUARE_FICUS).decode('utf-8')
+
+    response = client.post('/identify_batch_base64', json={'images_base64': [image_base64, image_base64]})
+
+    assert response.status_code == 200
+    assert response.json()['identification_ids'] == ['id-0', 'id-1']
+    assert mock_job_queue.enqueue_batch.call_args[0][2] == [SQUARE_FICUS, SQUARE_FICUS]
+
+def test_identify_plant_batch_base64_mime_wrapped(mock_db_service, mock_job_queue):
+    mock_db_service.create_identification_records.return_value = ['id-0']
+    image_base64 = base64.encodebytes(SQUARE_FICUS).decode('ascii')
+
+    response = client.post('/identify_batch_base64', json={'images_base64': [image_base64]})
+
+    assert response.status_code == 200
+    assert mock_job_queue.enqueue_batch.call_args[0][2] == [SQUARE_FICUS]
+
+def test_identify_plant_batch_base64_invalid(mock_db_service, mock_job_queue):
+    response = client.post('/identify_batch_base64', json={'images_base64': ['not base64!']})
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Image 0: Invalid base64-encoded image.'
+
+def test_identify_plant_batch_size_limits(mock_db_service, mock_job_queue):
+    assert client.post('/identify_batch_base64', json={'images_base64': []}).status_code == 400
+    with patch('src.api.routes.settings.batch_max_images', 1):
+        response = client.post('/identify_batch_base64', json={'images_base64': ['a', 'b']})
+    assert response.status_code == 400
+    mock_db_service.create_identification_records.assert_not_called()
+
+def test_get_batch_status(mock_db_service):
+    mock_db_service.get_batch_identifications.return_value = [
+        {'_id': 'id-0', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'}},
+        {'_id': 'id-1', 'status': 'Processing'},
+        {'_id': 'id-2', 'status': 'Completed', 'result': {'plant_name': 'Monstera deliciosa'}},
+    ]
+
+    response = client.get('/batches/507f1f77bcf86cd799439011')
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data['total'] == 3
+    assert data['status_counts'] == {'Completed': 2, 'Processing': 1}
+    assert [item['_id'] for item in data['identifications']] == ['id-0', 'id-1', 'id-2']
+    mock_db_service.get_batch_identifications.assert_awaited_once_with('507f1f77bcf86cd799439011')
+    mock_db_service.get_identification_by_id.assert_not_called()
+
+def test_get_batch_status_not_found(mock_db_service):
+    mock_db_service.get_batch_identifications.return_value = []
+
+    response = client.get('/batches/507f1f77bcf86cd799439011')
+
+    assert response.status_code == 404
+
+def test_get_identification_long_poll(mock_db_service):
+    mock_db_service.get_identification_by_id.side_effect = [
+        {'_id': '12345', 'status': 'Processing'},
+        {'_id': '12345', 'status': 'Processing'},
+        {'_id': '12345', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'}},
+    ]
+
+    with patch('src.core.notification_hub.settings.notify_poll_interval_seconds', 0.01):
+        response = client.get('/identifications/12345', params={'wait': 5})
+
+    assert response.status_code == 200
+    assert response.json()['status'] == 'Completed'
+    assert mock_db_service.get_identification_by_id.await_count == 3
+
+def test_get_identification_long_poll_times_out(mock_db_service):
+    mock_db_service.get_identification_by_id.return_value = {'_id': '12345', 'status': 'Processing'}
+
+    with patch('src.core.notification_hub.settings.notify_poll_interval_seconds', 0.01):
+        response = client.get('/identifications/12345', params={'wait': 0.05})
+
+    assert response.status_code == 200
+    assert response.json()['status'] == 'Processing'
+
+def test_get_identification_wait_is_bounded(mock_db_service):
+    response = client.get('/identifications/12345', params={'wait': settings.notify_max_wait_seconds + 1})
+
+    assert response.status_code == 422
+
+def test_identification_events(mock_db_service):
+    mock_db_service.get_identification_by_id.side_effect = [
+        {'_id': '12345', 'status': 'Processing'},
+        {'_id': '12345', 'status': 'Processing'},
+        {'_id': '12345', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'}},
+    ]
+
+    with patch('src.core.notification_hub.settings.notify_poll_interval_seconds', 0.01):
+        response = client.get('/identifications/12345/events')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [
+        json.loads(block.split('data: ', 1)[1])
+        for block in response.text.split('\n\n') if block.startswith('event: status')
+    ]
+    assert [event['status'] for event in events] == ['Processing', 'Completed']
+    assert events[1]['result']['plant_name'] == 'Ficus lyrata'
+
+def test_identification_events_not_found(mock_db_service):
+    mock_db_service.get_identification_by_id.return_value = None
+
+    response = client.get('/identifications/99999/events')
+
+    assert response.status_code == 404
+
+def test_stats_endpoints(mock_db_service, mock_job_queue):
+    mock_job_queue.stats.return_value = {'depth': 0, 'queued': 0, 'running': 0}
+
+    assert client.get('/stats/cache').status_code == 200
+    assert client.get('/stats/queue').json()['depth'] == 0
+    assert set(client.get('/stats/db').json()) == {'sync', 'async'}
+    assert client.get('/stats/db/writes').json() == {'mode': 'sync'}
+    assert client.get('/stats/kindwise/circuit').json()['breaker']['state'] == 'closed'
+
+def test_metrics_endpoint(mock_db_service, mock_job_queue):
+    mock_job_queue.stats.return_value = {'depth': 3, 'waiting': 0, 'queued': 2, 'running': 1}
+    mock_db_service.create_identification_record.return_value = '12345'
+    client.post('/identify', files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')})
+    client.get('/identifications/12345/events/missing')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    assert 'zelara_queue_jobs{status="queued"} 2' in response.text
+    assert 'zelara_upload_read_seconds_count{format="multipart"}' in response.text
+    assert 'zelara_http_request_duration_seconds_count{method="POST",route="/identify",status="200"}' in response.text
+    assert 'route="unmatched",status="404"' in response.text
+
+def test_request_trace_continues_traceparent(mock_db_service, mock_job_queue):
+    mock_db_service.create_identification_record.return_value = '12345'
+    spans = []
+    exporter = MagicMock()
+    exporter.export.side_effect = spans.append
+    traceparent = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+    with patch.object(tracer, 'sample_rate', 1.0), patch.object(tracer, 'exporter', exporter):
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')},
+            headers={'traceparent': traceparent},
+        )
+        stats = client.get('/stats/tracing').json()
+
+    assert response.status_code == 200
+    task_span, server_span = [span for span in spans if span.name != 'GET /stats/tracing']
+    assert server_span.name == 'POST /identify'
+    assert server_span.parent_span_id == 'b7ad6b7169203331'
+    assert server_span.attributes['http.response.status_code'] == 200
+    assert task_span.name == 'start_identification_task'
+    assert task_span.parent_span_id == server_span.context.span_id
+    assert task_span.attributes['identification.id'] == '12345'
+    assert stats['sample_rate'] == 1.0
+
 # New Tests for Authentication Handling
 
-def test_identify_plant_missing_api_key(mock_db_service, mock_identify_plant_task):
+def test_identify_plant_missing_api_key(mock_db_service, mock_job_queue):
     mock_db_service.create_identification_record.return_value = '12345'
 
     # Simulate uploading a valid image without API key in PRODUCTION
     settings.environment = "PRODUCTION"
-    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
+    with BytesIO(SQUARE_FICUS) as img_file:
         response = client.post(
             '/identify',
             files={'file': ('ficus.jpg', img_file, 'image/jpeg')}
@@ -179,27 +691,40 @@ def test_identify_plant_missing_api_key(mock_db_service, mock_identify_plant_tas
     data = response.json()
     assert data['detail'] == 'API key not found in headers. Please provide the key in Authorization header.'
 
-def test_identify_plant_invalid_api_key(mock_db_service, mock_identify_plant_task, mock_get_api_key_from_headers):
+def test_identify_plant_invalid_api_key(mock_db_service, mock_job_queue, mock_get_api_key_from_headers):
     mock_get_api_key_from_headers.return_value = 'invalid-api-key'
     mock_db_service.create_identification_record.return_value = '12345'
 
     # Simulate uploading a valid image with an invalid API key in PRODUCTION
     settings.environment = "PRODUCTION"
-    with open('tests/ficus_lyrata_1152x1536.jpg', 'rb') as img_file:
-        # Assuming that identify_plant_task raises an exception for invalid API keys
-        mock_identify_plant_task.side_effect = Exception("Invalid API key")
-
+    with BytesIO(SQUARE_FICUS) as img_file, patch('src.api.routes.check_api_key'):
+        # The API key is only checked by the worker once the job is processed
         response = client.post(
             '/identify',
             files={'file': ('ficus.jpg', img_file, 'image/jpeg')},
             headers={'Authorization': 'Bearer invalid-api-key'}
         )
 
-    assert response.status_code == 200  # The endpoint itself accepts the request and processes in background
+    assert response.status_code == 200  # The endpoint itself accepts the request and queues the job
     data = response.json()
     assert data['message'] == 'Plant identification is in progress.'
     assert data['identification_id'] == '12345'
 
-    # Ensure the background task was added
-    mock_identify_plant_task.assert_called_once()
-    mock_db_service.create_identification_record.assert_called_once_with(status='Processing')
+    # Ensure the identification job was queued
+    mock_job_queue.enqueue.assert_called_once()
+    mock_db_service.create_identification_record.assert_called_once_with(
+        status='Processing', content_hash=upload_key(SQUARE_FICUS)
+    )
+
+def test_caller_api_key_requires_job_key_secret(mock_db_service, mock_job_queue):
+    settings.environment = "PRODUCTION"
+    with patch('src.core.job_keys._fernet', return_value=None):
+        response = client.post(
+            '/identify',
+            files={'file': ('ficus.jpg', SQUARE_FICUS, 'image/jpeg')},
+            headers={'Authorization': 'Bearer caller-api-key'}
+        )
+
+    assert response.status_code == 500
+    mock_db_service.create_identification_record.assert_not_called()
+    mock_job_queue.enqueue.assert_not_called()
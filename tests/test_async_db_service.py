@@ -0,0 +1,234 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock, AsyncMock
+from bson.objectid import ObjectId
+from src.db.async_db_service import AsyncDatabaseService, build_identification_query, close_async_mongo_client
+from src.db.db_service import taxon_cache
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = list(documents)
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.documents:
+            raise StopAsyncIteration
+        return self.documents.pop(0)
+
+@pytest.fixture
+def mock_collection():
+    with patch('src.db.async_db_service.AsyncMongoClient') as MockMongoClient:
+        asyncio.run(close_async_mongo_client())
+        mock_client = MockMongoClient.return_value
+        mock_client.close = AsyncMock()
+        collection = mock_client.zelara_db.identifications
+        collection.insert_one = AsyncMock()
+        collection.update_one = AsyncMock()
+        collection.find_one = AsyncMock()
+        taxa = mock_client.zelara_db.taxa
+        taxa.update_one = AsyncMock()
+        taxa.find = MagicMock(return_value=AsyncCursor([]))
+        taxon_cache.clear()
+        yield collection
+        asyncio.run(close_async_mongo_client())
+
+def test_create_identification_record(mock_collection):
+    mock_collection.insert_one.return_value.inserted_id = ObjectId('507f1f77bcf86cd799439011')
+
+    identification_id = asyncio.run(AsyncDatabaseService().create_identification_record(status='Processing'))
+
+    assert identification_id == '507f1f77bcf86cd799439011'
+    document = mock_collection.insert_one.await_args.args[0]
+    assert document['status'] == 'Processing'
+    assert isinstance(document['created_at'], datetime)
+    assert 'content_hash' not in document
+
+def test_create_identification_record_with_content_hash(mock_collection):
+    mock_collection.insert_one.return_value.inserted_id = ObjectId('507f1f77bcf86cd799439011')
+
+    asyncio.run(AsyncDatabaseService().create_identification_record(status='Processing', content_hash='abc'))
+
+    assert mock_collection.insert_one.await_args.args[0]['content_hash'] == 'abc'
+
+def test_create_identification_records(mock_collection):
+    mock_collection.insert_many = AsyncMock()
+    mock_collection.insert_many.return_value.inserted_ids = [
+        ObjectId('507f1f77bcf86cd799439011'), ObjectId('507f1f77bcf86cd799439012')
+    ]
+
+    identification_ids = asyncio.run(AsyncDatabaseService().create_identification_records(2, 'batch-1'))
+
+    assert identification_ids == ['507f1f77bcf86cd799439011', '507f1f77bcf86cd799439012']
+    documents = mock_collection.insert_many.await_args.args[0]
+    assert [(document['status'], document['batch_id']) for document in documents] == [
+        ('Processing', 'batch-1'),
+        ('Processing', 'batch-1'),
+    ]
+    assert all(isinstance(document['created_at'], datetime) for document in documents)
+
+def test_create_identification_records_with_content_hashes(mock_collection):
+    mock_collection.insert_many = AsyncMock()
+    mock_collection.insert_many.return_value.inserted_ids = [ObjectId(), ObjectId()]
+
+    asyncio.run(AsyncDatabaseService().create_identification_records(2, 'batch-1', content_hashes=['a', 'b']))
+
+    documents = mock_collection.insert_many.await_args.args[0]
+    assert [document['content_hash'] for document in documents] == ['a', 'b']
+
+def test_get_batch_identifications(mock_collection):
+    mock_collection.find = MagicMock(return_value=AsyncCursor([
+        {'_id': ObjectId('507f1f77bcf86cd799439011'), 'status': 'Completed'}
+    ]))
+
+    identifications = asyncio.run(AsyncDatabaseService().get_batch_identifications('batch-1'))
+
+    assert identifications == [{'_id': '507f1f77bcf86cd799439011', 'status': 'Completed'}]
+    assert mock_collection.find.call_args[0][0] == {'batch_id': 'batch-1'}
+
+def test_update_identification(mock_collection):
+    identification_id = '507f1f77bcf86cd799439011'
+    data = {'plant_name': 'Ficus lyrata'}
+
+    asyncio.run(AsyncDatabaseService().update_identification(identification_id, data))
+
+    mock_collection.update_one.assert_awaited_once_with(
+        {'_id': ObjectId(identification_id)},
+        {'$set': {'status': 'Completed', 'r': {'n': 'Ficus lyrata', 't': 'name:Ficus lyrata'}}}
+    )
+
+def test_update_identification_error(mock_collection):
+    identification_id = '507f1f77bcf86cd799439011'
+
+    asyncio.run(AsyncDatabaseService().update_identification_error(identification_id, 'An error occurred'))
+
+    mock_collection.update_one.assert_awaited_once_with(
+        {'_id': ObjectId(identification_id)},
+        {'$set': {'status': 'Error', 'error_message': 'An error occurred'}}
+    )
+
+def test_get_identifications(mock_collection):
+    mock_collection.find = MagicMock(return_value=AsyncCursor([
+        {'_id': ObjectId('507f1f77bcf86cd799439011'), 'status': 'Completed', 'result': {}}
+    ]))
+
+    identifications = asyncio.run(AsyncDatabaseService().get_identifications())
+
+    assert len(identifications) == 1
+    assert identifications[0]['_id'] == '507f1f77bcf86cd799439011'
+    mock_collection.find.assert_called_once_with({}, None)
+
+def test_get_identifications_page_query(mock_collection):
+    cursor = AsyncCursor([])
+    cursor.sort = MagicMock(return_value=cursor)
+    cursor.limit = MagicMock(return_value=cursor)
+    mock_collection.find = MagicMock(return_value=cursor)
+    created_after = datetime(2024, 9, 1, tzinfo=timezone.utc)
+    created_before = datetime(2024, 10, 1, tzinfo=timezone.utc)
+
+    asyncio.run(AsyncDatabaseService().get_identifications(
+        limit=50,
+        after='507f1f77bcf86cd799439011',
+        status='Completed',
+        created_after=created_after,
+        created_before=created_before,
+        fields=['result.plant_name'],
+    ))
+
+    mock_collection.find.assert_called_once_with(
+        {
+            '_id': {
+                '$lt': min(ObjectId('507f1f77bcf86cd799439011'), ObjectId.from_datetime(created_before)),
+                '$gte': ObjectId.from_datetime(created_after),
+            },
+            'status': 'Completed',
+        },
+        {'r.n': 1, 'status': 1},
+    )
+    cursor.sort.assert_called_once_with('_id', -1)
+    cursor.limit.assert_called_once_with(50)
+
+def test_build_identification_query_plant_name_and_content_hash():
+    query = build_identification_query(plant_name='Ficus lyrata', content_hash='abc')
+
+    assert query == {'r.n': 'Ficus lyrata', 'content_hash': 'abc'}
+
+def test_get_identifications_expands_compact_results(mock_collection):
+    mock_collection.find = MagicMock(return_value=AsyncCursor([
+        {'_id': ObjectId('507f1f77bcf86cd799439012'), 'status': 'Completed', 'r': {'n': 'Ficus lyrata', 't': '5e9b0d8c'}},
+        {'_id': ObjectId('507f1f77bcf86cd799439011'), 'status': 'Completed', 'r': {'n': 'Ficus lyrata', 't': '5e9b0d8c'}},
+        {'_id': ObjectId('507f1f77bcf86cd799439010'), 'status': 'Completed', 'result': {'plant_name': 'Monstera'}},
+    ]))
+    db_service = AsyncDatabaseService()
+    db_service.taxa.find = MagicMock(return_value=AsyncCursor([
+        {'_id': '5e9b0d8c', 'cn': ['Fiddle Leaf Fig'], 'tx': {'genus': 'Ficus'}},
+    ]))
+
+    identifications = asyncio.run(db_service.get_identifications())
+
+    assert identifications[0]['result']['common_names'] == ['Fiddle Leaf Fig']
+    assert identifications[1]['result']['taxonomy'] == {'genus': 'Ficus'}
+    assert identifications[2]['result'] == {'plant_name': 'Monstera'}
+
+def test_iter_identifications(mock_collection):
+    cursor = AsyncCursor([
+        {'_id': ObjectId('507f1f77bcf86cd799439012'), 'status': 'Completed'},
+        {'_id': ObjectId('507f1f77bcf86cd799439013'), 'status': 'Completed'},
+    ])
+    cursor.sort = MagicMock(return_value=cursor)
+    mock_collection.find = MagicMock(return_value=cursor)
+
+    async def collect():
+        service = AsyncDatabaseService()
+        return [doc async for doc in service.iter_identifications(after='507f1f77bcf86cd799439011', batch_size=500)]
+
+    identifications = asyncio.run(collect())
+
+    assert [doc['_id'] for doc in identifications] == ['507f1f77bcf86cd799439012', '507f1f77bcf86cd799439013']
+    mock_collection.find.assert_called_once_with(
+        {'_id': {'$gt': ObjectId('507f1f77bcf86cd799439011')}}, batch_size=500
+    )
+    cursor.sort.assert_called_once_with('_id', 1)
+
+def test_iter_identifications_loads_taxa_per_batch(mock_collection):
+    documents = [
+        {'_id': ObjectId(), 'status': 'Completed', 'r': {'n': f'Plant {index}', 't': f'taxon-{index}'}}
+        for index in range(5)
+    ]
+    cursor = AsyncCursor(documents)
+    mock_collection.find = MagicMock(return_value=cursor)
+
+    async def collect():
+        service = AsyncDatabaseService()
+        service.taxa.find = MagicMock(side_effect=lambda query: AsyncCursor([]))
+        identifications = [doc async for doc in service.iter_identifications(batch_size=2)]
+        return identifications, service.taxa.find
+
+    identifications, find_taxa = asyncio.run(collect())
+
+    assert [doc['result']['plant_name'] for doc in identifications] == [f'Plant {index}' for index in range(5)]
+    assert [call.args[0]['_id']['$in'] for call in find_taxa.call_args_list] == [
+        ['taxon-0', 'taxon-1'], ['taxon-2', 'taxon-3'], ['taxon-4'],
+    ]
+
+def test_get_identification_by_id_found(mock_collection):
+    mock_collection.find_one.return_value = {'_id': ObjectId('507f1f77bcf86cd799439011'), 'status': 'Completed'}
+
+    identification = asyncio.run(AsyncDatabaseService().get_identification_by_id('507f1f77bcf86cd799439011'))
+
+    assert identification['_id'] == '507f1f77bcf86cd799439011'
+
+def test_get_identification_by_id_not_found(mock_collection):
+    mock_collection.find_one.return_value = None
+
+    identification = asyncio.run(AsyncDatabaseService().get_identification_by_id('nonexistent_id'))
+
+    assert identification is None
@@ -0,0 +1,96 @@
+import asyncio
+import base64
+import json
+import os
+import pytest
+from src.core.base64_ingest import INITIAL_CAPACITY, Base64Decoder, ImageTooLargeError, read_base64_json
+
+IMAGE = os.urandom(100_000)
+
+
+async def chunked(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def read(body: bytes, chunk_size: int = 1000, max_bytes: int = 1_000_000, content_length: int = None):
+    return asyncio.run(read_base64_json(chunked(body, chunk_size), 'image_base64', max_bytes, content_length))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 4096])
+def test_decodes_field_across_chunk_boundaries(chunk_size):
+    body = json.dumps({
+        'callback_url': 'https://example.com/hook',
+        'image_base64': base64.b64encode(IMAGE[:3000]).decode(),
+        'nested': {'image_base64': 'ignored'},
+    }).encode()
+
+    fields, image = read(body, chunk_size)
+
+    assert bytes(image) == IMAGE[:3000]
+    assert fields == {'callback_url': 'https://example.com/hook', 'image_base64': '', 'nested': {'image_base64': 'ignored'}}
+
+
+def test_buffer_is_allocated_once_from_content_length():
+    body = json.dumps({'image_base64': base64.b64encode(IMAGE).decode()}).encode()
+
+    fields, image = read(body, 65536, content_length=len(body))
+
+    assert bytes(image) == IMAGE
+    assert isinstance(image, memoryview)
+    assert len(image.obj) <= len(body) * 3 // 4 + 3
+
+
+def test_decodes_escaped_slashes_and_line_breaks():
+    encoded = base64.encodebytes(IMAGE[:2000]).decode()
+    body = json.dumps({'image_base64': encoded}).replace('/', '\\/').encode()
+
+    _, image = read(body, 100)
+
+    assert bytes(image) == IMAGE[:2000]
+
+
+def test_missing_field():
+    fields, image = read(b'{"callback_url": null}')
+
+    assert fields == {'callback_url': None}
+    assert image is None
+
+
+@pytest.mark.parametrize('body', [
+    b'{"image_base64": "not base64!"}',
+    b'{"image_base64": "QUJD"',
+    b'{"image_base64": "QUI="}trailing',
+    b'{"image_base64": "QUI=QUJD"}',
+    b'{"image_base64": "QUJDR"}',
+    b'["image_base64"]',
+])
+def test_invalid_bodies(body):
+    with pytest.raises(ValueError):
+        read(body)
+
+
+def test_decoded_size_is_bounded():
+    body = json.dumps({'image_base64': base64.b64encode(IMAGE).decode()}).encode()
+
+    with pytest.raises(ImageTooLargeError):
+        read(body, max_bytes=50_000)
+    with pytest.raises(ImageTooLargeError):
+        read(body, max_bytes=50_000, content_length=len(body))
+
+
+def test_decoder_grows_without_size_hint():
+    decoder = Base64Decoder(max_bytes=10_000_000)
+    encoded = base64.b64encode(IMAGE * 15)
+    for start in range(0, len(encoded), 65536):
+        decoder.feed(encoded[start:start + 65536])
+
+    assert bytes(decoder.finish()) == IMAGE * 15
+
+def test_decoder_does_not_allocate_from_announced_size():
+    decoder = Base64Decoder(max_bytes=20_000_000, size_hint=26_000_000)
+    assert len(decoder.buffer) <= INITIAL_CAPACITY
+
+    decoder.feed(base64.b64encode(b'x' * 3000))
+    assert bytes(decoder.finish()) == b'x' * 3000
+    assert len(decoder.buffer) <= INITIAL_CAPACITY
@@ -0,0 +1,101 @@
+import time
+import pytest
+from src.core.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget, retry_backoff_seconds
+
+def make_breaker(**overrides):
+    options = dict(
+        window_seconds=60, min_calls=4, failure_rate=0.5, slow_call_seconds=1,
+        slow_call_rate=0.8, open_seconds=0.05, half_open_probes=1,
+    )
+    options.update(overrides)
+    return CircuitBreaker('Kindwise', **options)
+
+def test_breaker_needs_min_calls_before_opening():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record(0.01, failed=True)
+    assert breaker.state == 'closed'
+
+    breaker.record(0.01, failed=False)
+    assert breaker.state == 'open'
+
+def test_breaker_stays_closed_below_failure_rate():
+    breaker = make_breaker()
+    for failed in (True, False, False, False, True, False):
+        breaker.record(0.01, failed=failed)
+
+    assert breaker.state == 'closed'
+    assert breaker.snapshot()['failure_rate'] == pytest.approx(1 / 3)
+
+def test_breaker_forgets_calls_outside_window():
+    breaker = make_breaker(window_seconds=0.05)
+    for _ in range(3):
+        breaker.record(0.01, failed=True)
+    time.sleep(0.06)
+    breaker.record(0.01, failed=True)
+
+    assert breaker.state == 'closed'
+    assert breaker.snapshot()['window_calls'] == 1
+
+def test_breaker_rejects_calls_while_open():
+    breaker = make_breaker(open_seconds=10)
+    for _ in range(4):
+        breaker.record(0.01, failed=True)
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert str(error.value) == 'Kindwise is unavailable, retry in 10 seconds.'
+    assert 9 < breaker.retry_after() <= 10
+
+def test_half_open_breaker_admits_limited_probes():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, failed=True)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed probe opens the breaker again
+    breaker.record(0.01, failed=True)
+    assert breaker.state == 'open'
+
+def test_cancelled_probe_frees_its_slot():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, failed=True)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    breaker.record(0.01, failed=False)
+
+    assert breaker.state == 'closed'
+    assert breaker.snapshot()['window_calls'] == 0
+
+def test_slow_probe_reopens_breaker():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(0.01, failed=True)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    breaker.record(2.0, failed=False)
+    assert breaker.state == 'open'
+
+def test_retry_budget_limits_retries_to_ratio():
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+    assert budget.snapshot() == {'tokens': 0, 'retries': 2, 'exhausted': 2}
+
+def test_retry_backoff_is_bounded():
+    for attempt in range(1, 10):
+        assert 0 <= retry_backoff_seconds(attempt, base=0.5, maximum=4) <= min(4, 0.5 * 2 ** (attempt - 1))
@@ -1,13 +1,28 @@
 import pytest
+from datetime import datetime
 from unittest.mock import patch, MagicMock
 from bson.objectid import ObjectId
-from src.db.db_service import DatabaseService
+from pymongo.errors import OperationFailure
+from src.core.record_cache import record_cache
+from src.db.db_service import (
+    DatabaseService,
+    close_mongo_client,
+    get_mongo_client,
+    get_pool_stats,
+    start_status_write_buffer,
+    stop_status_write_buffer,
+    taxon_cache,
+    _pool_stats_listener,
+)
 
 @pytest.fixture
 def mock_mongo_client():
     with patch('src.db.db_service.MongoClient') as MockMongoClient:
+        close_mongo_client()
+        taxon_cache.clear()
         mock_client = MockMongoClient.return_value
         yield mock_client
+        close_mongo_client()
 
 def test_create_identification_record(mock_mongo_client):
     mock_collection = mock_mongo_client.zelara_db.identifications
@@ -17,7 +32,9 @@ def test_create_identification_record(mock_mongo_client):
     identification_id = db_service.create_identification_record(status='Processing')
 
     assert identification_id == '507f1f77bcf86cd799439011'
-    mock_collection.insert_one.assert_called_once_with({'status': 'Processing'})
+    document = mock_collection.insert_one.call_args.args[0]
+    assert document['status'] == 'Processing'
+    assert isinstance(document['created_at'], datetime)
 
 def test_update_identification(mock_mongo_client):
     mock_collection = mock_mongo_client.zelara_db.identifications
@@ -29,7 +46,7 @@ def test_update_identification(mock_mongo_client):
     db_service.update_identification(identification_id, data)
     mock_collection.update_one.assert_called_once_with(
         {'_id': ObjectId(identification_id)},
-        {'$set': {'status': 'Completed', 'result': data}}
+        {'$set': {'status': 'Completed', 'r': {'n': 'Ficus lyrata', 't': 'name:Ficus lyrata'}}}
     )
 
 def test_update_identification_error(mock_mongo_client):
@@ -45,6 +62,49 @@ def test_update_identification_error(mock_mongo_client):
         {'$set': {'status': 'Error', 'error_message': error_message}}
     )
 
+def test_update_identifications_in_bulk(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    db_service = DatabaseService()
+
+    identification_ids = ['507f1f77bcf86cd799439011', '507f1f77bcf86cd799439012']
+    data = {'plant_name': 'Ficus lyrata'}
+
+    db_service.update_identifications(identification_ids, data, perceptual_hash='00ff')
+    mock_collection.update_many.assert_called_once_with(
+        {'_id': {'$in': [ObjectId(identification_id) for identification_id in identification_ids]}},
+        {
+            '$set': {'status': 'Completed', 'r': {'n': 'Ficus lyrata', 't': 'name:Ficus lyrata'}, 'phash': '00ff'},
+            '$currentDate': {'phash_at': True},
+        }
+    )
+
+def test_update_identifications_error_in_bulk(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    db_service = DatabaseService()
+
+    identification_ids = ['507f1f77bcf86cd799439011', '507f1f77bcf86cd799439012']
+
+    db_service.update_identifications_error(identification_ids, 'An error occurred')
+    mock_collection.update_many.assert_called_once_with(
+        {'_id': {'$in': [ObjectId(identification_id) for identification_id in identification_ids]}},
+        {'$set': {'status': 'Error', 'error_message': 'An error occurred'}}
+    )
+
+def test_update_identification_is_buffered_in_buffered_mode(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    db_service = DatabaseService()
+
+    start_status_write_buffer()
+    try:
+        db_service.update_identification('507f1f77bcf86cd799439011', {'plant_name': 'Ficus lyrata'})
+        db_service.update_identification_error('507f1f77bcf86cd799439012', 'An error occurred')
+        mock_collection.update_one.assert_not_called()
+    finally:
+        stop_status_write_buffer()
+
+    mock_collection.bulk_write.assert_called_once()
+    assert len(mock_collection.bulk_write.call_args[0][0]) == 2
+
 def test_get_identifications(mock_mongo_client):
     mock_collection = mock_mongo_client.zelara_db.identifications
     mock_collection.find.return_value = [
@@ -74,3 +134,201 @@ def test_get_identification_by_id_not_found(mock_mongo_client):
     identification = db_service.get_identification_by_id('nonexistent_id')
 
     assert identification is None
+
+def test_mongo_client_is_shared():
+    with patch('src.db.db_service.MongoClient') as MockMongoClient:
+        close_mongo_client()
+        first = DatabaseService()
+        second = DatabaseService()
+
+        assert first.client is second.client
+        MockMongoClient.assert_called_once()
+        kwargs = MockMongoClient.call_args[1]
+        assert kwargs['maxPoolSize'] == 100
+        assert kwargs['event_listeners'] == [_pool_stats_listener]
+        close_mongo_client()
+
+def test_close_mongo_client_recreates_client():
+    with patch('src.db.db_service.MongoClient') as MockMongoClient:
+        MockMongoClient.side_effect = lambda *args, **kwargs: MagicMock()
+        close_mongo_client()
+        first = get_mongo_client()
+        close_mongo_client()
+        second = get_mongo_client()
+        close_mongo_client()
+
+    first.close.assert_called_once()
+    assert first is not second
+
+def test_pool_stats_counts_connections():
+    close_mongo_client()
+    _pool_stats_listener.connection_created(None)
+    _pool_stats_listener.connection_created(None)
+    _pool_stats_listener.connection_checked_out(None)
+    _pool_stats_listener.connection_closed(None)
+
+    stats = get_pool_stats()
+
+    assert stats['connections_open'] == 1
+    assert stats['connections_in_use'] == 1
+    assert stats['checkouts'] == 1
+    close_mongo_client()
+
+def test_ensure_identification_indexes(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+
+    DatabaseService().ensure_identification_indexes()
+
+    documents = [call.args[0][0].document for call in mock_collection.create_indexes.call_args_list]
+    keys = [list(document['key'].items()) for document in documents]
+    assert [('status', 1), ('_id', -1)] in keys
+    assert [('content_hash', 1), ('_id', -1)] in keys
+    assert [('r.n', 1), ('_id', -1)] in keys
+    ttl = next(document for document in documents if 'expireAfterSeconds' in document)
+    assert ttl['partialFilterExpression'] == {'status': 'Processing'}
+
+def test_ensure_identification_indexes_updates_changed_ttl(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    mock_collection.name = 'identifications'
+
+    def create_indexes(indexes):
+        if 'expireAfterSeconds' in indexes[0].document:
+            raise OperationFailure('Index already exists with different options', code=85)
+
+    mock_collection.create_indexes.side_effect = create_indexes
+
+    DatabaseService().ensure_identification_indexes()
+
+    command = mock_collection.database.command
+    command.assert_called_once()
+    assert command.call_args.args == ('collMod', 'identifications')
+    assert command.call_args.kwargs['index']['name'] == 'created_at_1'
+
+def test_ensure_identification_indexes_reraises_other_failures(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    mock_collection.create_indexes.side_effect = OperationFailure('not authorized', code=13)
+
+    with pytest.raises(OperationFailure):
+        DatabaseService().ensure_identification_indexes()
+
+def test_update_identification_stores_taxon_once(mock_mongo_client):
+    mock_taxa = mock_mongo_client.zelara_db.taxa
+    db_service = DatabaseService()
+    data = {
+        'plant_name': 'Ficus lyrata',
+        'species_id': '5e9b0d8c',
+        'common_names': ['Fiddle Leaf Fig'],
+        'taxonomy': {'genus': 'Ficus'},
+    }
+
+    db_service.update_identification('507f1f77bcf86cd799439011', data)
+    db_service.update_identification('507f1f77bcf86cd799439012', data)
+
+    mock_taxa.update_one.assert_called_once_with(
+        {'_id': '5e9b0d8c'},
+        {'$set': {'n': 'Ficus lyrata', 'cn': ['Fiddle Leaf Fig'], 'tx': {'genus': 'Ficus'}}},
+        upsert=True,
+    )
+    update = mock_mongo_client.zelara_db.identifications.update_one.call_args.args[1]['$set']
+    assert update['r'] == {'n': 'Ficus lyrata', 't': '5e9b0d8c'}
+
+def test_update_identification_replaces_changed_taxon(mock_mongo_client):
+    mock_taxa = mock_mongo_client.zelara_db.taxa
+    db_service = DatabaseService()
+    data = {'plant_name': 'Ficus lyrata', 'species_id': '5e9b0d8c', 'common_names': ['Fiddle Leaf Fig']}
+
+    db_service.update_identification('507f1f77bcf86cd799439011', data)
+    db_service.update_identification(
+        '507f1f77bcf86cd799439012', dict(data, common_names=['Fiddle Leaf Fig', 'Banjo Fig'])
+    )
+
+    assert mock_taxa.update_one.call_count == 2
+    assert mock_taxa.update_one.call_args.args[1]['$set']['cn'] == ['Fiddle Leaf Fig', 'Banjo Fig']
+
+def test_update_identification_inlines_taxon_when_storing_it_fails(mock_mongo_client):
+    mock_mongo_client.zelara_db.taxa.update_one.side_effect = Exception('Database error')
+    db_service = DatabaseService()
+
+    db_service.update_identification(
+        '507f1f77bcf86cd799439011', {'plant_name': 'Ficus lyrata', 'common_names': ['Fiddle Leaf Fig']}
+    )
+
+    update = mock_mongo_client.zelara_db.identifications.update_one.call_args.args[1]['$set']
+    assert update['r']['cn'] == ['Fiddle Leaf Fig']
+
+def test_get_identification_by_id_expands_compact_result(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    mock_collection.find_one.return_value = {
+        '_id': ObjectId('507f1f77bcf86cd799439011'),
+        'status': 'Completed',
+        'r': {'n': 'Ficus lyrata', 'p': 0.95, 't': '5e9b0d8c', 'c': datetime(2024, 9, 15, 12, 0)},
+    }
+    mock_mongo_client.zelara_db.taxa.find.return_value = [
+        {'_id': '5e9b0d8c', 'n': 'Ficus lyrata', 'cn': ['Fiddle Leaf Fig'], 'tx': {'genus': 'Ficus'}},
+    ]
+    db_service = DatabaseService()
+
+    identification = db_service.get_identification_by_id('507f1f77bcf86cd799439011')
+    db_service.get_identification_by_id('507f1f77bcf86cd799439011')
+
+    assert identification['result'] == {
+        'plant_name': 'Ficus lyrata',
+        'probability': 0.95,
+        'created': '2024-09-15T12:00:00+00:00',
+        'species_id': '5e9b0d8c',
+        'common_names': ['Fiddle Leaf Fig'],
+        'taxonomy': {'genus': 'Ficus'},
+    }
+    assert 'r' not in identification
+    mock_mongo_client.zelara_db.taxa.find.assert_called_once_with({'_id': {'$in': ['5e9b0d8c']}})
+
+@pytest.fixture
+def serving_record_cache():
+    record_cache.clear()
+    with patch.object(record_cache, 'serves_reads', True):
+        yield record_cache
+    record_cache.clear()
+
+def test_update_identification_populates_record_cache(mock_mongo_client, serving_record_cache):
+    db_service = DatabaseService()
+
+    db_service.update_identification('507f1f77bcf86cd799439011', {'plant_name': 'Ficus lyrata', 'probability': 0.9})
+    db_service.update_identification_error('507f1f77bcf86cd799439012', 'Failed')
+
+    body, _ = record_cache.get('507f1f77bcf86cd799439011')
+    assert b'"plant_name":"Ficus lyrata"' in body
+    assert b'"status":"Error"' in record_cache.get('507f1f77bcf86cd799439012')[0]
+    record_cache.clear()
+
+def test_worker_without_shared_tier_leaves_record_cache_alone(mock_mongo_client):
+    record_cache.clear()
+
+    with patch.object(record_cache, 'put') as put, patch.object(record_cache, 'invalidate') as invalidate:
+        DatabaseService().update_identification('507f1f77bcf86cd799439011', {'plant_name': 'Ficus lyrata'})
+        mock_mongo_client.zelara_db.identifications.update_one.side_effect = Exception('Database error')
+        DatabaseService().update_identification_error('507f1f77bcf86cd799439012', 'Failed')
+
+    put.assert_not_called()
+    invalidate.assert_not_called()
+
+def test_update_identification_failure_invalidates_record_cache(mock_mongo_client, serving_record_cache):
+    record_cache.put({'_id': '507f1f77bcf86cd799439011', 'status': 'Error', 'error_message': 'Failed'})
+    mock_mongo_client.zelara_db.identifications.update_one.side_effect = Exception('Database error')
+
+    DatabaseService().update_identification('507f1f77bcf86cd799439011', {'plant_name': 'Ficus lyrata'})
+
+    assert record_cache.get('507f1f77bcf86cd799439011') is None
+
+def test_get_perceptual_hashes_pages_on_hash_write_time(mock_mongo_client):
+    mock_collection = mock_mongo_client.zelara_db.identifications
+    hashed_at = datetime(2024, 5, 1, 10, 0, 0)
+    cursor = mock_collection.find.return_value.sort.return_value.limit.return_value
+    cursor.__iter__.return_value = iter([{'_id': ObjectId('507f1f77bcf86cd799439011'), 'phash': '00ff', 'phash_at': hashed_at}])
+
+    records = DatabaseService().get_perceptual_hashes(hashed_since=hashed_at, limit=10)
+
+    assert records == [('507f1f77bcf86cd799439011', '00ff', hashed_at)]
+    mock_collection.find.assert_called_once_with(
+        {'status': 'Completed', 'phash_at': {'$gte': hashed_at}}, {'phash': 1, 'phash_at': 1}
+    )
+    mock_collection.find.return_value.sort.assert_called_once_with('phash_at', 1)
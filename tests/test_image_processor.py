@@ -1,7 +1,16 @@
 import pytest
 from io import BytesIO
-from src.core.image_processor import process_image
+from unittest.mock import patch
+from src.core.image_processor import (
+    process_image,
+    compute_perceptual_hash,
+    encode_upload,
+    validate_image_header,
+    validate_base64_image_header,
+)
+import base64
 from PIL import Image
+from PIL.JpegImagePlugin import JpegImageFile
 
 def create_test_image(format='JPEG', size=(100, 100), color='red'):
     img = Image.new('RGB', size, color)
@@ -76,3 +85,129 @@ def test_process_image_large_size():
     img = Image.open(BytesIO(processed_image))
     assert img.size[0] <= 1500 and img.size[1] <= 1500
     assert img.format == 'PNG'
+
+def test_process_image_defaults_keep_legacy_encoding():
+    # Result cache keys hash the processed image, so the defaults must not change its bytes
+    file_contents = create_test_image(format='JPEG', size=(3200, 3200))
+    image = Image.open(BytesIO(file_contents)).convert('RGB')
+    image.thumbnail((1500, 1500), Image.LANCZOS)
+    legacy = BytesIO()
+    image.save(legacy, format='PNG', optimize=True)
+
+    assert process_image(file_contents) == legacy.getvalue()
+
+@pytest.mark.parametrize('output_format', ['JPEG', 'WEBP', 'PNG'])
+def test_process_image_output_formats(output_format):
+    file_contents = create_test_image(format='PNG')
+    processed_image = process_image(file_contents, output_format=output_format)
+    img = Image.open(BytesIO(processed_image))
+    assert img.format == output_format
+
+def test_process_image_default_output_format_from_settings():
+    file_contents = create_test_image(format='JPEG')
+    with patch('src.core.image_processor.settings.image_output_format', 'WEBP'):
+        processed_image = process_image(file_contents)
+    assert Image.open(BytesIO(processed_image)).format == 'WEBP'
+
+def test_process_image_unsupported_output_format():
+    with pytest.raises(ValueError) as exc_info:
+        process_image(create_test_image(), output_format='TIFF')
+    assert 'Unsupported output format' in str(exc_info.value)
+
+def test_process_image_passthrough_small_jpeg():
+    file_contents = create_test_image(format='JPEG')
+    with patch('src.core.image_processor.settings.image_passthrough', True):
+        assert process_image(file_contents) == file_contents
+
+def test_process_image_passthrough_resizes_large_jpeg():
+    file_contents = create_test_image(format='JPEG', size=(3200, 3200))
+    with patch('src.core.image_processor.settings.image_passthrough', True):
+        processed_image = process_image(file_contents)
+    assert Image.open(BytesIO(processed_image)).size == (1500, 1500)
+
+def test_process_image_passthrough_reencodes_gif():
+    file_contents = create_test_image(format='GIF')
+    with patch('src.core.image_processor.settings.image_passthrough', True):
+        processed_image = process_image(file_contents)
+    assert Image.open(BytesIO(processed_image)).format == 'PNG'
+
+def test_process_image_jpeg_draft_mode():
+    file_contents = create_test_image(format='JPEG', size=(3200, 3200))
+    draft_calls = []
+    original_draft = JpegImageFile.draft
+
+    def recording_draft(self, mode, size):
+        draft_calls.append((mode, size))
+        return original_draft(self, mode, size)
+
+    with patch.object(JpegImageFile, 'draft', recording_draft), \
+            patch('src.core.image_processor.settings.image_jpeg_draft', True):
+        processed_image = process_image(file_contents)
+    assert draft_calls[0] == ('RGB', (1500, 1500))
+    assert Image.open(BytesIO(processed_image)).size == (1500, 1500)
+
+def test_compute_perceptual_hash_stable_across_encodings():
+    img = Image.open('tests/ficus_lyrata_1152x1536.jpg')
+    png, jpeg = BytesIO(), BytesIO()
+    img.save(png, format='PNG')
+    img.save(jpeg, format='JPEG', quality=40)
+
+    png_hash = compute_perceptual_hash(png.getvalue())
+    jpeg_hash = compute_perceptual_hash(jpeg.getvalue())
+    assert len(png_hash) == 16
+    assert bin(int(png_hash, 16) ^ int(jpeg_hash, 16)).count('1') <= 4
+
+def test_encode_upload_sends_jpeg_within_max_size():
+    png = create_test_image(format='PNG', size=(2000, 1800))
+
+    upload = Image.open(BytesIO(encode_upload(png)))
+    assert upload.format == 'JPEG'
+    assert max(upload.size) == 1500
+
+def test_encode_upload_keeps_small_jpeg():
+    jpeg = create_test_image(format='JPEG')
+    assert encode_upload(jpeg) == jpeg
+
+def test_encode_upload_invalid_data():
+    with pytest.raises(ValueError):
+        encode_upload(b'Not an image')
+
+def test_compute_perceptual_hash_invalid_data():
+    with pytest.raises(ValueError):
+        compute_perceptual_hash(b'Not an image')
+
+def test_validate_image_header_reads_only_header():
+    file_contents = create_test_image(format='JPEG', size=(1000, 1000))
+    stream = BytesIO(file_contents)
+    assert validate_image_header(stream) == ('JPEG', (1000, 1000))
+    assert stream.tell() < len(file_contents)
+
+def test_validate_image_header_pixel_limit():
+    file_contents = create_test_image(format='PNG', size=(2000, 2000))
+    with patch('src.core.image_processor.settings.image_max_pixels', 1_000_000):
+        with pytest.raises(ValueError) as exc_info:
+            validate_image_header(BytesIO(file_contents))
+    assert 'Image is too large' in str(exc_info.value)
+
+def test_validate_base64_image_header_large_metadata():
+    # A 200 KB ICC profile pushes the frame header past the first probe
+    img = Image.new('RGB', (800, 800), 'red')
+    buf = BytesIO()
+    img.save(buf, format='JPEG', icc_profile=b'\0' * 200_000)
+    image_base64 = base64.b64encode(buf.getvalue()).decode('ascii')
+    assert validate_base64_image_header(image_base64) == ('JPEG', (800, 800))
+
+def test_validate_base64_image_header_mime_wrapped():
+    img = Image.new('RGB', (800, 800), 'red')
+    buf = BytesIO()
+    img.save(buf, format='JPEG', icc_profile=b'\0' * 200_000)
+    # 76 characters per line, as produced by MIME encoders
+    image_base64 = base64.encodebytes(buf.getvalue()).decode('ascii')
+    assert validate_base64_image_header(image_base64) == ('JPEG', (800, 800))
+    assert validate_base64_image_header(image_base64.replace('\n', '\r\n')) == ('JPEG', (800, 800))
+
+def test_validate_base64_image_header_invalid_aspect_ratio():
+    image_base64 = base64.b64encode(create_test_image(size=(500, 1000))).decode('ascii')
+    with pytest.raises(ValueError) as exc_info:
+        validate_base64_image_header(image_base64)
+    assert 'Invalid aspect ratio' in str(exc_info.value)
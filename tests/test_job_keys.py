@@ -0,0 +1,69 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from src.config import settings
+from src.core.job_keys import KeySealError, _fernet, check_api_key, ensure_key_sealing, open_api_key, seal_api_key
+from src.core.job_queue import build_job, job_api_key
+
+@pytest.fixture
+def fernet():
+    cipher = MagicMock()
+    cipher.encrypt.side_effect = lambda data: b'sealed:' + data[::-1]
+    cipher.decrypt.side_effect = lambda token: token[len(b'sealed:'):][::-1]
+    with patch('src.core.job_keys._fernet', return_value=cipher):
+        yield cipher
+
+def test_configured_key_is_stored_as_a_reference():
+    job = build_job('id-1', b'image', settings.kindwise_api_key)
+
+    assert job['api_key_ref'] == {'kind': 'default'}
+    assert settings.kindwise_api_key not in str(job)
+    assert job_api_key(job) == settings.kindwise_api_key
+
+def test_caller_key_is_encrypted(fernet):
+    job = build_job('id-1', b'image', 'caller-api-key')
+
+    assert job['api_key_ref']['kind'] == 'sealed'
+    assert 'caller-api-key' not in str(job)
+    assert job_api_key(job) == 'caller-api-key'
+
+def test_caller_key_without_secret_is_rejected():
+    with patch('src.core.job_keys._fernet', return_value=None):
+        with pytest.raises(KeySealError):
+            check_api_key('caller-api-key')
+        with pytest.raises(KeySealError):
+            seal_api_key('caller-api-key')
+        with pytest.raises(KeySealError):
+            open_api_key({'kind': 'sealed', 'token': 'token'})
+        check_api_key(settings.kindwise_api_key)
+
+def test_jobs_queued_with_plaintext_keys_still_resolve():
+    assert job_api_key({'api_key': 'legacy-key'}) == 'legacy-key'
+
+def test_fernet_round_trip():
+    fernet_module = pytest.importorskip('cryptography.fernet')
+    _fernet.cache_clear()
+    try:
+        with patch('src.core.job_keys.settings.job_key_secret', fernet_module.Fernet.generate_key().decode()):
+            assert open_api_key(seal_api_key('caller-api-key')) == 'caller-api-key'
+    finally:
+        _fernet.cache_clear()
+
+def test_production_without_secret_fails_at_startup():
+    with patch('src.core.job_keys.settings.environment', 'PRODUCTION'):
+        with patch('src.core.job_keys._fernet', return_value=None), pytest.raises(KeySealError):
+            ensure_key_sealing()
+        with patch('src.core.job_keys._fernet', return_value=MagicMock()):
+            ensure_key_sealing()
+    with patch('src.core.job_keys.settings.environment', 'LOCAL'), \
+            patch('src.core.job_keys._fernet', return_value=None):
+        ensure_key_sealing()
+
+def test_invalid_secret_is_unusable():
+    pytest.importorskip('cryptography.fernet')
+    _fernet.cache_clear()
+    try:
+        with patch('src.core.job_keys.settings.job_key_secret', 'not-a-fernet-key'):
+            assert _fernet() is None
+    finally:
+        _fernet.cache_clear()
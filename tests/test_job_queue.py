@@ -0,0 +1,224 @@
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+import sys
+from bson.objectid import ObjectId
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from pymongo import ReturnDocument
+from src.config import settings
+from src.core.job_queue import JobQueue, QueueFullError, build_batch_jobs
+from src.core.circuit_breaker import CircuitOpenError
+from src.worker import AsyncWorker, Worker, create_worker, process_job, process_job_async
+
+@pytest.fixture
+def mock_jobs_collection():
+    db_service = MagicMock()
+    yield JobQueue(db_service), db_service.db.jobs
+
+def test_enqueue_persists_job(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    collection.insert_one.return_value.inserted_id = ObjectId('507f1f77bcf86cd799439011')
+
+    job_id = job_queue.enqueue('id-1', b'image', settings.kindwise_api_key)
+
+    assert job_id == '507f1f77bcf86cd799439011'
+    job = collection.insert_one.call_args[0][0]
+    assert job['identification_id'] == 'id-1'
+    assert bytes(job['image']) == b'image'
+    assert job['api_key_ref'] == {'kind': 'default'}
+    assert 'api_key' not in job
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 0
+
+def test_check_capacity_raises_when_full(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    collection.estimated_document_count.return_value = 10
+
+    with patch('src.core.job_queue.settings.queue_max_depth', 10):
+        with pytest.raises(QueueFullError):
+            job_queue.check_capacity()
+    with patch('src.core.job_queue.settings.queue_max_depth', 11):
+        job_queue.check_capacity()
+
+def test_claim_sets_visibility_timeout(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+
+    job_queue.claim('worker-1')
+
+    query, update = collection.find_one_and_update.call_args[0]
+    kwargs = collection.find_one_and_update.call_args[1]
+    assert '$lte' in query['available_at']
+    assert update['$set']['status'] == 'running'
+    assert update['$set']['worker_id'] == 'worker-1'
+    assert update['$set']['available_at'] > query['available_at']['$lte']
+    assert update['$inc'] == {'attempts': 1}
+    assert kwargs['return_document'] == ReturnDocument.AFTER
+
+def test_stats_reports_depth(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    collection.aggregate.return_value = [{'_id': 'queued', 'count': 3}, {'_id': 'running', 'count': 2}]
+
+    stats = job_queue.stats()
+
+    assert stats['depth'] == 5
+    assert stats['queued'] == 3
+    assert stats['running'] == 2
+
+def test_build_batch_jobs_limits_parallelism():
+    jobs = build_batch_jobs('batch-1', ['id-0', 'id-1', 'id-2'], [b'a', b'b', b'c'], settings.kindwise_api_key, parallelism=2)
+
+    assert [job['status'] for job in jobs] == ['queued', 'queued', 'waiting']
+    assert all(job['batch_id'] == 'batch-1' for job in jobs)
+    assert 'available_at' in jobs[1]
+    assert 'available_at' not in jobs[2]
+
+def test_promote_waiting_queues_oldest_job_of_batch(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+
+    job_queue.promote_waiting('batch-1')
+
+    query, update = collection.find_one_and_update.call_args[0]
+    kwargs = collection.find_one_and_update.call_args[1]
+    assert query == {'batch_id': 'batch-1', 'status': 'waiting'}
+    assert update['$set']['status'] == 'queued'
+    assert 'available_at' in update['$set']
+    assert kwargs['sort'] == [('_id', 1)]
+
+def test_stats_counts_waiting_jobs(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    collection.aggregate.return_value = [{'_id': 'waiting', 'count': 4}, {'_id': 'queued', 'count': 1}]
+
+    stats = job_queue.stats()
+
+    assert stats['depth'] == 5
+    assert stats['waiting'] == 4
+
+def test_process_job_promotes_next_job_of_batch():
+    job_queue = MagicMock()
+    job = {
+        '_id': ObjectId(), 'identification_id': 'id-1', 'image': b'image', 'api_key': 'key',
+        'attempts': 1, 'batch_id': 'batch-1',
+    }
+
+    with patch('src.worker.identify_plant_task'):
+        process_job(job_queue, job)
+
+    job_queue.complete.assert_called_once_with(job['_id'], None)
+    job_queue.promote_waiting.assert_called_once_with('batch-1')
+
+def test_process_job_runs_task_and_completes():
+    job_queue = MagicMock()
+    job = {'_id': ObjectId(), 'identification_id': 'id-1', 'image': b'image', 'api_key': 'key', 'attempts': 1}
+
+    with patch('src.worker.identify_plant_task') as mock_task:
+        process_job(job_queue, job)
+
+    mock_task.assert_called_once_with(b'image', 'key', 'id-1', callback_url=None)
+    job_queue.complete.assert_called_once_with(job['_id'], None)
+
+def test_process_job_abandons_after_max_attempts():
+    job_queue = MagicMock()
+    job = {'_id': ObjectId(), 'identification_id': 'id-1', 'image': b'image', 'api_key': 'key', 'attempts': 4}
+
+    with patch('src.worker.identify_plant_task') as mock_task, \
+            patch('src.worker.DatabaseService') as MockDBService, \
+            patch('src.worker.settings.queue_max_attempts', 3):
+        process_job(job_queue, job)
+
+    mock_task.assert_not_called()
+    MockDBService.return_value.update_identification_error.assert_called_once()
+    job_queue.complete.assert_called_once_with(job['_id'], None)
+
+def test_process_job_async_runs_task_and_completes():
+    job_queue = MagicMock()
+    job = {'_id': ObjectId(), 'identification_id': 'id-1', 'image': b'image', 'api_key': 'key', 'attempts': 1}
+
+    with patch('src.worker.identify_plant_task_async', new_callable=AsyncMock) as mock_task:
+        asyncio.run(process_job_async(job_queue, job))
+
+    mock_task.assert_awaited_once_with(b'image', 'key', 'id-1', callback_url=None)
+    job_queue.complete.assert_called_once_with(job['_id'], None)
+
+def test_worker_thread_survives_job_errors():
+    worker = Worker(concurrency=1, poll_interval=0)
+    jobs = [{'_id': ObjectId()}, {'_id': ObjectId()}]
+    job_queue = MagicMock()
+    job_queue.claim.side_effect = lambda worker_id: jobs.pop(0) if jobs else worker.stop_event.set()
+
+    with patch('src.worker.JobQueue', return_value=job_queue), \
+            patch('src.worker.kindwise_pause_seconds', return_value=0), \
+            patch('src.worker.process_job', side_effect=Exception('connection reset')) as mock_process:
+        worker._run()
+
+    assert mock_process.call_count == 2
+
+def test_async_worker_logs_job_errors(capsys):
+    worker = AsyncWorker(concurrency=1, poll_interval=0)
+    jobs = [{'_id': ObjectId()}]
+    job_queue = MagicMock()
+    job_queue.claim.side_effect = lambda worker_id: jobs.pop(0) if jobs else worker.stop_event.set()
+
+    with patch('src.worker.JobQueue', return_value=job_queue), \
+            patch('src.worker.kindwise_pause_seconds', return_value=0), \
+            patch('src.worker.process_job_async', new_callable=AsyncMock, side_effect=Exception('connection reset')):
+        asyncio.run(worker._run())
+
+    assert 'Error processing job: connection reset' in capsys.readouterr().out
+
+def test_create_worker_follows_worker_mode():
+    with patch('src.worker.settings.worker_mode', 'async'):
+        assert isinstance(create_worker(concurrency=2), AsyncWorker)
+    with patch('src.worker.settings.worker_mode', 'threads'):
+        assert isinstance(create_worker(concurrency=2), Worker)
+
+def test_process_job_defers_while_kindwise_is_unavailable():
+    job_queue = MagicMock()
+    job = {'_id': ObjectId(), 'identification_id': 'id-1', 'image': b'image', 'api_key': 'key', 'attempts': 1}
+
+    with patch('src.worker.identify_plant_task', side_effect=CircuitOpenError('Kindwise', 10)), \
+            patch('src.worker.settings.kindwise_breaker_open_seconds', 30):
+        process_job(job_queue, job)
+
+    job_queue.complete.assert_not_called()
+    job_queue.release.assert_called_once()
+    assert 10 <= job_queue.release.call_args.kwargs['delay_seconds'] <= 40
+    assert job_queue.release.call_args.kwargs['refund_attempt'] is True
+
+def test_release_refunds_attempt(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+
+    job_queue.release(ObjectId(), delay_seconds=5, refund_attempt=True)
+
+    update = collection.update_one.call_args[0][1]
+    assert update['$inc'] == {'attempts': -1}
+    assert update['$set']['status'] == 'queued'
+
+def test_complete_is_buffered_in_buffered_mode(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    buffer = MagicMock()
+
+    with patch('src.core.job_queue.get_status_write_buffer', return_value=buffer):
+        job_queue.complete(ObjectId('507f1f77bcf86cd799439011'))
+
+    collection.delete_one.assert_not_called()
+    buffer.complete_job.assert_called_once_with(ObjectId('507f1f77bcf86cd799439011'), None)
+
+def test_complete_runs_callback_after_delete(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    on_removed = MagicMock(side_effect=lambda: collection.delete_one.assert_called_once())
+
+    with patch('src.core.job_queue.get_status_write_buffer', return_value=None):
+        job_queue.complete(ObjectId('507f1f77bcf86cd799439011'), on_removed)
+
+    on_removed.assert_called_once_with()
+
+def test_spooled_paths_returns_paths_of_queued_jobs(mock_jobs_collection):
+    job_queue, collection = mock_jobs_collection
+    collection.find.return_value = [{'image_file': {'path': '/spool/upload-a'}}]
+
+    assert job_queue.spooled_paths(['/spool/upload-a', '/spool/upload-b']) == {'/spool/upload-a'}
+    assert collection.find.call_args[0][0]['image_file.path'] == {'$in': ['/spool/upload-a', '/spool/upload-b']}
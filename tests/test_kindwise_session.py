@@ -0,0 +1,359 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.core.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+from src.core.kindwise_session import (
+    AsyncKindwiseSession,
+    AsyncKindwiseSessionRegistry,
+    KindwiseSession,
+    KindwiseSessionRegistry,
+    describe_api_key,
+)
+
+class FakeKindwiseServer:
+    """
+    Local keep-alive HTTP server answering like the Kindwise identification endpoint.
+    """
+
+    def __init__(self, delay: float = 0):
+        self.requests = []
+        self.status_codes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                fake.requests.append((self.path, self.headers['Api-Key']))
+                with fake.lock:
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                time.sleep(delay)
+                with fake.lock:
+                    fake.in_flight -= 1
+                body = json.dumps({'access_token': 'abc123', 'status': 'COMPLETED'}).encode('utf-8')
+                self.send_response(fake.status_codes.pop(0) if fake.status_codes else 201)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v3/identification'
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def make_breaker(**overrides):
+    options = dict(
+        window_seconds=60, min_calls=3, failure_rate=0.5, slow_call_seconds=10,
+        slow_call_rate=0.8, open_seconds=0.2, half_open_probes=1,
+    )
+    options.update(overrides)
+    return CircuitBreaker('Kindwise', **options)
+
+@pytest.fixture(autouse=True)
+def kindwise_resilience():
+    """
+    Gives every test its own circuit breaker and retry budget, and retries without waiting.
+    """
+    breaker = make_breaker()
+    budget = RetryBudget(ratio=0.2, max_tokens=10)
+    with patch('src.core.kindwise_session.kindwise_breaker', breaker), \
+            patch('src.core.kindwise_session.kindwise_retry_budget', budget), \
+            patch('src.core.kindwise_session.settings.kindwise_retry_backoff_base_seconds', 0):
+        yield breaker, budget
+
+@pytest.fixture
+def kindwise_server():
+    server = FakeKindwiseServer()
+    yield server
+    server.close()
+
+def test_session_reuses_connection(kindwise_server):
+    session = KindwiseSession()
+    try:
+        for _ in range(5):
+            response = session.request('POST', kindwise_server.url, json={'images': []}, headers={'Api-Key': 'key-1'})
+            assert response.json()['access_token'] == 'abc123'
+    finally:
+        session.close()
+
+    stats = session.stats.snapshot()
+    assert stats['requests'] == 5
+    assert stats['handshakes'] == 1
+    assert stats['reuse_ratio'] == pytest.approx(0.8)
+    assert sum(stats['latency_ms'].values()) == 5
+    assert kindwise_server.requests == [('/api/v3/identification', 'key-1')] * 5
+
+def test_session_counts_errors(kindwise_server):
+    kindwise_server.status_codes = [500]
+    session = KindwiseSession()
+    try:
+        with patch('src.core.kindwise_session.settings.kindwise_retry_max_attempts', 1):
+            assert session.request('POST', kindwise_server.url, json={}).status_code == 500
+    finally:
+        session.close()
+
+    assert session.stats.snapshot()['errors'] == 1
+
+def test_session_retries_transient_errors(kindwise_server, kindwise_resilience):
+    _, budget = kindwise_resilience
+    kindwise_server.status_codes = [503, 429]
+    session = KindwiseSession()
+    try:
+        assert session.request('POST', kindwise_server.url, json={}).status_code == 201
+    finally:
+        session.close()
+
+    assert len(kindwise_server.requests) == 3
+    assert budget.snapshot()['retries'] == 2
+    assert session.stats.snapshot()['errors'] == 2
+
+def test_session_does_not_retry_client_errors(kindwise_server):
+    kindwise_server.status_codes = [401]
+    session = KindwiseSession()
+    try:
+        assert session.request('POST', kindwise_server.url, json={}).status_code == 401
+    finally:
+        session.close()
+
+    assert len(kindwise_server.requests) == 1
+
+def test_session_gives_up_when_retry_budget_is_spent(kindwise_server):
+    kindwise_server.status_codes = [503, 503]
+    session = KindwiseSession()
+    try:
+        with patch('src.core.kindwise_session.kindwise_retry_budget', RetryBudget(ratio=0, max_tokens=1)):
+            assert session.request('POST', kindwise_server.url, json={}).status_code == 503
+    finally:
+        session.close()
+
+    assert len(kindwise_server.requests) == 2
+
+def test_session_retries_transport_errors(kindwise_resilience):
+    breaker, _ = kindwise_resilience
+    # Nothing listens on the port of a closed server
+    server = FakeKindwiseServer()
+    server.close()
+    session = KindwiseSession()
+    try:
+        with pytest.raises(httpx.ConnectError):
+            session.request('POST', server.url, json={})
+    finally:
+        session.close()
+
+    assert session.stats.snapshot()['requests'] == 3
+    assert breaker.snapshot()['window_failures'] == 3
+
+def test_breaker_fails_fast_and_recovers(kindwise_server, kindwise_resilience):
+    breaker, _ = kindwise_resilience
+    kindwise_server.status_codes = [500] * 3
+    session = KindwiseSession()
+    try:
+        with patch('src.core.kindwise_session.settings.kindwise_retry_max_attempts', 1):
+            for _ in range(3):
+                assert session.request('POST', kindwise_server.url, json={}).status_code == 500
+            assert breaker.state == 'open'
+
+            with pytest.raises(CircuitOpenError) as error:
+                session.request('POST', kindwise_server.url, json={})
+            assert 0 < error.value.retry_after <= 0.2
+            assert len(kindwise_server.requests) == 3
+
+            time.sleep(0.25)
+            assert breaker.state == 'half_open'
+            assert session.request('POST', kindwise_server.url, json={}).status_code == 201
+    finally:
+        session.close()
+
+    snapshot = breaker.snapshot()
+    assert snapshot['state'] == 'closed'
+    assert snapshot['rejected'] == 1
+    assert snapshot['transitions'] == {'open': 1, 'half_open': 1, 'closed': 1}
+
+def test_breaker_opens_on_slow_calls(kindwise_resilience):
+    server = FakeKindwiseServer(delay=0.05)
+    breaker = make_breaker(slow_call_seconds=0.03, min_calls=2)
+    session = KindwiseSession()
+    try:
+        with patch('src.core.kindwise_session.kindwise_breaker', breaker):
+            for _ in range(2):
+                assert session.request('POST', server.url, json={}).status_code == 201
+    finally:
+        session.close()
+        server.close()
+
+    assert breaker.state == 'open'
+
+def test_breaker_does_not_retry_once_open(kindwise_server, kindwise_resilience):
+    breaker, _ = kindwise_resilience
+    kindwise_server.status_codes = [503] * 5
+    session = KindwiseSession()
+    try:
+        with patch('src.core.kindwise_session.settings.kindwise_retry_max_attempts', 5):
+            assert session.request('POST', kindwise_server.url, json={}).status_code == 503
+    finally:
+        session.close()
+
+    # The third failure opens the breaker, which stops the retries
+    assert len(kindwise_server.requests) == 3
+    assert breaker.state == 'open'
+
+def test_registry_lru_eviction():
+    registry = KindwiseSessionRegistry(max_size=2)
+    try:
+        with registry.lease('a') as session_a:
+            pass
+        with registry.lease('b') as session_b:
+            pass
+        with registry.lease('a') as session:
+            assert session is session_a
+        with registry.lease('c'):
+            pass
+
+        assert session_b.client.is_closed
+        assert not session_a.client.is_closed
+        assert set(registry.stats()) == {describe_api_key('a'), describe_api_key('c')}
+    finally:
+        registry.close()
+    assert session_a.client.is_closed
+
+def test_registry_closes_evicted_session_once_released(kindwise_server):
+    registry = KindwiseSessionRegistry(max_size=1)
+    try:
+        with registry.lease('a') as session_a:
+            with registry.lease('b'):
+                pass
+            assert not session_a.client.is_closed
+            response = session_a.request('POST', kindwise_server.url, json={}, headers={'Api-Key': 'a'})
+            assert response.status_code == 201
+        assert session_a.client.is_closed
+        assert list(registry.stats()) == [describe_api_key('b')]
+    finally:
+        registry.close()
+
+def test_describe_api_key_hides_key():
+    label = describe_api_key('secret-api-key')
+    assert 'secret' not in label
+    assert label == describe_api_key('secret-api-key')
+
+def test_async_session_limits_concurrency_per_key():
+    server = FakeKindwiseServer(delay=0.05)
+
+    async def scenario():
+        session = AsyncKindwiseSession()
+        try:
+            responses = await asyncio.gather(*[
+                session.request('POST', server.url, json={'images': []}, headers={'Api-Key': 'key-1'})
+                for _ in range(6)
+            ])
+        finally:
+            await session.aclose()
+        return responses, session.stats.snapshot()
+
+    try:
+        with patch('src.core.kindwise_session.settings.kindwise_max_concurrency_per_key', 2):
+            responses, stats = asyncio.run(scenario())
+    finally:
+        server.close()
+
+    assert [response.status_code for response in responses] == [201] * 6
+    assert server.max_in_flight == 2
+    assert stats['requests'] == 6
+    assert stats['handshakes'] == 2
+
+def test_async_session_rate_limit():
+    server = FakeKindwiseServer()
+
+    async def scenario():
+        session = AsyncKindwiseSession()
+        started = time.monotonic()
+        try:
+            for _ in range(3):
+                await session.request('POST', server.url, json={})
+        finally:
+            await session.aclose()
+        return time.monotonic() - started
+
+    try:
+        with patch('src.core.kindwise_session.settings.kindwise_rate_per_second', 20.0), \
+                patch('src.core.kindwise_session.settings.kindwise_rate_burst', 1):
+            elapsed = asyncio.run(scenario())
+    finally:
+        server.close()
+
+    assert elapsed >= 0.09
+
+def test_async_registry_lru_eviction():
+    async def scenario():
+        registry = AsyncKindwiseSessionRegistry(max_size=1)
+        async with registry.lease('a') as session_a:
+            pass
+        async with registry.lease('a') as session:
+            assert session is session_a
+        async with registry.lease('b') as session_b:
+            assert session_a.client.is_closed
+        assert list(registry.stats()) == [describe_api_key('b')]
+        await registry.aclose()
+        assert session_b.client.is_closed
+
+    asyncio.run(scenario())
+
+def test_async_registry_closes_evicted_session_once_released():
+    async def scenario():
+        registry = AsyncKindwiseSessionRegistry(max_size=1)
+        async with registry.lease('a') as session_a:
+            async with registry.lease('b'):
+                pass
+            assert not session_a.client.is_closed
+        assert session_a.client.is_closed
+        await registry.aclose()
+
+    asyncio.run(scenario())
+
+def test_async_session_fails_fast_when_breaker_is_open(kindwise_server, kindwise_resilience):
+    breaker, _ = kindwise_resilience
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record(0.01, failed=True)
+
+    async def scenario():
+        session = AsyncKindwiseSession()
+        try:
+            await session.request('POST', kindwise_server.url, json={})
+        finally:
+            await session.aclose()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(scenario())
+    assert kindwise_server.requests == []
+
+def test_async_session_retries_transient_errors(kindwise_server):
+    kindwise_server.status_codes = [502]
+
+    async def scenario():
+        session = AsyncKindwiseSession()
+        try:
+            return await session.request('POST', kindwise_server.url, json={})
+        finally:
+            await session.aclose()
+
+    assert asyncio.run(scenario()).status_code == 201
+    assert len(kindwise_server.requests) == 2
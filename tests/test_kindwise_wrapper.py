@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import sys
+from contextlib import asynccontextmanager, contextmanager
+import httpx
+import pytest
+from io import BytesIO
+from PIL import Image
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.core.kindwise_wrapper import (
+    IDENTIFICATION_DETAILS,
+    AsyncKindwiseClient,
+    KindwiseClient,
+    identification_request,
+)
+from src.core.image_processor import encode_upload
+
+# Response of POST /api/v3/identification as documented by Kindwise
+IDENTIFICATION_RESPONSE = {
+    'access_token': 'abc123',
+    'model_version': 'plant_id:4.0.0',
+    'custom_id': None,
+    'input': {
+        'latitude': None,
+        'longitude': None,
+        'similar_images': True,
+        'images': ['https://plant.id/media/imgs/abc123.jpg'],
+        'datetime': '2024-05-01T10:00:00.000000+00:00',
+    },
+    'result': {
+        'is_plant': {'probability': 0.99, 'binary': True, 'threshold': 0.5},
+        'classification': {
+            'suggestions': [
+                {
+                    'id': 'f1c2',
+                    'name': 'Ficus lyrata',
+                    'probability': 0.93,
+                    'similar_images': [],
+                    'details': {
+                        'common_names': ['fiddle-leaf fig'],
+                        'taxonomy': {'genus': 'Ficus', 'family': 'Moraceae'},
+                        'language': 'en',
+                        'entity_id': 'f1c2',
+                    },
+                },
+            ],
+        },
+    },
+    'status': 'COMPLETED',
+    'sla_compliant_client': True,
+    'sla_compliant_system': True,
+    'created': 1714557600.0,
+    'completed': 1714557601.2,
+}
+
+def png_image():
+    buffer = BytesIO()
+    Image.new('RGB', (100, 100), 'green').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+@pytest.fixture
+def kindwise_models():
+    """
+    Parses responses with the installed SDK, which other test modules replace with a mock.
+    """
+    with patch.dict(sys.modules):
+        for name in [name for name in sys.modules if name.split('.')[0] == 'kindwise']:
+            del sys.modules[name]
+        plant = pytest.importorskip('kindwise.plant')
+    with patch('src.core.kindwise_wrapper.PlantIdentification', plant.PlantIdentification):
+        yield
+
+def lending(session):
+    registry = MagicMock()
+
+    @contextmanager
+    def lease(api_key):
+        yield session
+
+    registry.lease.side_effect = lease
+    return registry
+
+def lending_async(session):
+    registry = MagicMock()
+
+    @asynccontextmanager
+    async def lease(api_key):
+        yield session
+
+    registry.lease.side_effect = lease
+    return registry
+
+def test_identification_request_follows_documented_endpoint():
+    with patch('src.core.kindwise_wrapper.settings.kindwise_host', None):
+        request = identification_request('key-1', b'png-bytes', IDENTIFICATION_DETAILS)
+
+    assert request == {
+        'method': 'POST',
+        'url': 'https://plant.id/api/v3/identification?details=common_names,taxonomy,classification',
+        'json': {'images': [base64.b64encode(b'png-bytes').decode('ascii')], 'similar_images': True},
+        'headers': {'Content-Type': 'application/json', 'Api-Key': 'key-1'},
+    }
+
+def test_client_identifies_over_pooled_session(kindwise_models):
+    session = MagicMock()
+    session.request.return_value = httpx.Response(201, json=IDENTIFICATION_RESPONSE)
+
+    with patch('src.core.kindwise_wrapper.kindwise_sessions', lending(session)) as registry, \
+            patch('src.core.kindwise_wrapper.settings.kindwise_host', 'http://kindwise.test'):
+        result = KindwiseClient(api_key='key-1').identify_plant(png_image())
+
+    registry.lease.assert_called_once_with('key-1')
+    assert session.request.call_args.kwargs['url'].startswith('http://kindwise.test/api/v3/identification?')
+    # Uploaded as JPEG, like the Kindwise SDK did
+    upload = base64.b64decode(session.request.call_args.kwargs['json']['images'][0])
+    assert Image.open(BytesIO(upload)).format == 'JPEG'
+    assert result['plant_name'] == 'Ficus lyrata'
+    assert result['common_names'] == ['fiddle-leaf fig']
+    assert result['taxonomy'] == {'genus': 'Ficus', 'family': 'Moraceae'}
+    assert result['identification_id'] == 'abc123'
+    assert result['is_plant'] is True
+
+def test_client_raises_on_error_response():
+    session = MagicMock()
+    session.request.return_value = httpx.Response(401, json={'error': 'invalid api key'})
+
+    with patch('src.core.kindwise_wrapper.kindwise_sessions', lending(session)), \
+            pytest.raises(ValueError, match='status_code=401'):
+        KindwiseClient(api_key='key-1').identify_plant(png_image())
+
+def test_async_client_sends_the_same_request(kindwise_models):
+    session = MagicMock()
+    session.request = AsyncMock(return_value=httpx.Response(201, json=IDENTIFICATION_RESPONSE))
+
+    with patch('src.core.kindwise_wrapper.async_kindwise_sessions', lending_async(session)) as registry:
+        result = asyncio.run(AsyncKindwiseClient(api_key='key-1').identify_plant(png_image()))
+
+    registry.lease.assert_called_once_with('key-1')
+    assert session.request.call_args.kwargs == identification_request(
+        'key-1', encode_upload(png_image()), IDENTIFICATION_DETAILS
+    )
+    assert result['plant_name'] == 'Ficus lyrata'
@@ -0,0 +1,109 @@
+import threading
+import urllib.request
+import pytest
+from io import BytesIO
+from PIL import Image
+from src.core.metrics import Counter, Gauge, Histogram, MetricsRegistry, image_processing_seconds, start_metrics_server
+from src.core.preprocess_pool import PreprocessPool
+
+def create_test_image(format='JPEG', size=(2000, 2000), color='red'):
+    img = Image.new('RGB', size, color)
+    buf = BytesIO()
+    img.save(buf, format=format)
+    return buf.getvalue()
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency_seconds', 'Latency.', ('stage',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'decode')
+    histogram.observe(0.1, 'decode')
+    histogram.observe(0.5, 'decode')
+    histogram.observe(5, 'decode')
+
+    assert histogram.render() == [
+        '# HELP latency_seconds Latency.',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{stage="decode",le="0.1"} 2',
+        'latency_seconds_bucket{stage="decode",le="1"} 3',
+        'latency_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'latency_seconds_sum{stage="decode"} 5.65',
+        'latency_seconds_count{stage="decode"} 4',
+    ]
+    assert histogram.snapshot('decode') == {'count': 4, 'sum': 5.65}
+
+def test_histogram_timer_observes_failed_blocks():
+    histogram = Histogram('latency_seconds', 'Latency.')
+
+    with pytest.raises(ValueError):
+        with histogram.time():
+            raise ValueError('failed')
+
+    assert histogram.snapshot()['count'] == 1
+    assert 'latency_seconds_bucket{le="+Inf"} 1' in histogram.render()
+
+def test_label_values_are_escaped():
+    counter = Counter('requests_total', 'Requests.', ('route',))
+    counter.inc('/a"b\\c\n')
+
+    assert counter.render()[-1] == 'requests_total{route="/a\\"b\\\\c\\n"} 1'
+
+def test_gauge_tracks_in_flight_blocks():
+    gauge = Gauge('in_flight', 'In flight.')
+    with gauge.track():
+        with gauge.track():
+            assert gauge.render()[-1] == 'in_flight 2'
+    assert gauge.render()[-1] == 'in_flight 0'
+
+def test_concurrent_observations_are_counted():
+    histogram = Histogram('latency_seconds', 'Latency.')
+
+    def observe():
+        for _ in range(1000):
+            histogram.observe(0.01, 'route')
+
+    threads = [threading.Thread(target=observe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert histogram.snapshot('route')['count'] == 8000
+
+def test_registry_renders_every_metric():
+    registry = MetricsRegistry()
+    registry.register(Counter('a_total', 'A.')).inc()
+    registry.register(Gauge('b', 'B.')).set(3)
+
+    assert registry.render() == '# HELP a_total A.\n# TYPE a_total counter\na_total 1\n# HELP b B.\n# TYPE b gauge\nb 3\n'
+
+def test_preprocess_pool_records_stage_latencies():
+    image_processing_seconds.clear()
+
+    PreprocessPool(max_workers=0).run(create_test_image())
+
+    for stage in ('decode', 'resize', 'encode', 'perceptual_hash'):
+        assert image_processing_seconds.snapshot(stage)['count'] == 1
+
+def test_preprocess_pool_records_latencies_of_worker_processes():
+    image_processing_seconds.clear()
+    pool = PreprocessPool(max_workers=1)
+    try:
+        pool.run(create_test_image(), with_perceptual_hash=False)
+    finally:
+        pool.shutdown()
+
+    assert image_processing_seconds.snapshot('resize')['count'] == 1
+    assert image_processing_seconds.snapshot('perceptual_hash')['count'] == 0
+
+def test_metrics_server_serves_registry():
+    scrapes = []
+    server = start_metrics_server(0, on_scrape=lambda: scrapes.append(1))
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert '# TYPE zelara_image_processing_seconds histogram' in body
+    assert scrapes == [1]
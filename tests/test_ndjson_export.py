@@ -0,0 +1,34 @@
+import asyncio
+import gzip
+import json
+from src.core.ndjson_export import encode_document, stream_ndjson
+
+async def documents(count):
+    for index in range(count):
+        yield {'_id': f'id-{index}', 'status': 'Completed'}
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+def test_encode_document():
+    assert encode_document({'_id': '1', 'result': {'plant_name': 'Ficus lyrata'}}) == \
+        b'{"_id":"1","result":{"plant_name":"Ficus lyrata"}}\n'
+
+def test_stream_ndjson_chunks():
+    chunks = asyncio.run(collect(stream_ndjson(documents(100), chunk_size=256)))
+
+    assert len(chunks) > 1
+    assert all(len(chunk) < 256 + 64 for chunk in chunks)
+    lines = b''.join(chunks).splitlines()
+    assert [json.loads(line)['_id'] for line in lines] == [f'id-{index}' for index in range(100)]
+
+def test_stream_ndjson_gzip():
+    chunks = asyncio.run(collect(stream_ndjson(documents(100), compress=True, chunk_size=256)))
+
+    lines = gzip.decompress(b''.join(chunks)).splitlines()
+    assert len(lines) == 100
+    assert json.loads(lines[-1])['_id'] == 'id-99'
+
+def test_stream_ndjson_empty():
+    assert asyncio.run(collect(stream_ndjson(documents(0)))) == []
+    assert gzip.decompress(b''.join(asyncio.run(collect(stream_ndjson(documents(0), compress=True))))) == b''
@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from pymongo.errors import OperationFailure
+from src.core.notification_hub import NotificationHub
+
+class ChangeStream:
+    def __init__(self, changes):
+        self.changes = list(changes)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.changes:
+            # Keep the stream open like a real change stream
+            await asyncio.Event().wait()
+        return self.changes.pop(0)
+
+def test_publish_wakes_subscriber():
+    hub = NotificationHub()
+
+    async def scenario():
+        with hub.subscribe('id-1') as updated:
+            hub.publish('id-2')
+            await asyncio.sleep(0)
+            assert not updated.is_set()
+            hub.publish('id-1')
+            await asyncio.wait_for(updated.wait(), 1)
+        assert hub._subscribers == {}
+
+    asyncio.run(scenario())
+
+def test_publish_from_worker_thread():
+    hub = NotificationHub()
+
+    async def scenario():
+        with hub.subscribe('id-1') as updated:
+            threading.Thread(target=hub.publish, args=('id-1',)).start()
+            await asyncio.wait_for(updated.wait(), 1)
+
+    asyncio.run(scenario())
+
+def test_watch_publishes_status_changes():
+    hub = NotificationHub()
+    collection = MagicMock()
+    collection.watch = AsyncMock(return_value=ChangeStream([{'documentKey': {'_id': 'id-1'}}]))
+
+    async def scenario():
+        with hub.subscribe('id-1') as updated:
+            watcher = asyncio.create_task(hub.watch(collection))
+            await asyncio.wait_for(updated.wait(), 1)
+            assert hub.watching
+            assert hub.poll_interval is None
+            watcher.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await watcher
+        assert not hub.watching
+
+    asyncio.run(scenario())
+
+def test_watch_falls_back_to_polling_without_change_streams():
+    hub = NotificationHub()
+    collection = MagicMock()
+    collection.watch = AsyncMock(side_effect=OperationFailure('not a replica set', code=40573))
+
+    with patch('src.core.notification_hub.settings.notify_poll_interval_seconds', 2.0):
+        asyncio.run(hub.watch(collection))
+        assert not hub.watching
+        assert hub.poll_interval == 2.0
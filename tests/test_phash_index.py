@@ -0,0 +1,104 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch, MagicMock
+import sys
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from src.core.phash_index import REFRESH_OVERLAP, BKTree, PerceptualHashIndex
+from src.core import task_manager
+
+def test_bk_tree_search_within_distance():
+    tree = BKTree()
+    tree.add(0b0000, 'a')
+    tree.add(0b0001, 'b')
+    tree.add(0b0111, 'c')
+    tree.add(0b1111, 'd')
+
+    assert tree.search(0b0000, 1) == [(0, 'a'), (1, 'b')]
+    assert sorted(ident for _, ident in tree.search(0b0011, 1)) == ['b', 'c']
+    assert tree.search(0b1111, 0) == [(0, 'd')]
+
+def test_bk_tree_duplicate_hash_keeps_all_ids():
+    tree = BKTree()
+    tree.add(42, 'a')
+    tree.add(42, 'b')
+    assert sorted(tree.search(42, 0)) == [(0, 'a'), (0, 'b')]
+
+def test_index_loads_and_refreshes_from_db():
+    hashed_at = datetime(2024, 5, 1, 10, 0, 0)
+    db_service = MagicMock()
+    db_service.get_perceptual_hashes.side_effect = [
+        [('id-0', '00000000ffffffff', None), ('id-1', 'ffffffffffffffff', hashed_at)],
+        # A record created before id-1 but completed after the first load
+        [('id-1', 'ffffffffffffffff', hashed_at), ('id-00', '0000000000000000', hashed_at + timedelta(seconds=30))],
+    ]
+    index = PerceptualHashIndex(max_entries=10, refresh_seconds=60)
+
+    with patch('src.core.phash_index.time.monotonic', return_value=1000.0):
+        assert index.find_matches('fffffffffffffffe', 2, db_service) == [('id-1', 1)]
+        index.find_matches('0000000000000000', 2, db_service)
+    db_service.get_perceptual_hashes.assert_called_once_with(hashed_since=None, limit=10)
+
+    with patch('src.core.phash_index.time.monotonic', return_value=1061.0):
+        assert index.find_matches('0000000000000000', 2, db_service) == [('id-00', 0)]
+    db_service.get_perceptual_hashes.assert_called_with(hashed_since=hashed_at - REFRESH_OVERLAP, limit=10)
+
+def test_index_refresh_without_stamped_hashes_starts_at_the_epoch():
+    db_service = MagicMock()
+    db_service.get_perceptual_hashes.side_effect = [[('id-0', '00000000ffffffff', None)], []]
+    index = PerceptualHashIndex(max_entries=10, refresh_seconds=0)
+
+    index.find_matches('0000000000000000', 2, db_service)
+    index.find_matches('0000000000000000', 2, db_service)
+
+    db_service.get_perceptual_hashes.assert_called_with(hashed_since=datetime.fromtimestamp(0, timezone.utc), limit=10)
+
+def test_index_evicts_oldest_entries():
+    index = PerceptualHashIndex(max_entries=4, refresh_seconds=60)
+    for i in range(5):
+        index.add(f'{i:016x}', f'id-{i}')
+    assert index.find_matches('0000000000000000', 0) == []
+    assert index.find_matches('0000000000000004', 0) == [('id-4', 0)]
+
+@pytest.fixture
+def task_mocks():
+    index = PerceptualHashIndex(max_entries=10, refresh_seconds=60)
+    with patch('src.core.task_manager.DatabaseService') as MockDBService, \
+            patch('src.core.task_manager.preprocess_pool') as mock_pool, \
+            patch('src.core.task_manager.KindwiseClient') as MockKindwiseClient, \
+            patch('src.core.task_manager.settings.result_cache_enabled', False), \
+            patch('src.core.task_manager.perceptual_hash_index', index):
+        mock_pool.run.return_value = (b'processed', '00000000000000ff')
+        mock_db = MockDBService.return_value
+        mock_db.get_perceptual_hashes.return_value = []
+        yield mock_db, MockKindwiseClient.return_value, index
+
+def test_identify_plant_task_near_duplicate_skips_kindwise(task_mocks):
+    mock_db, mock_client, index = task_mocks
+    prior_result = {'plant_name': 'Ficus lyrata', 'probability': 0.95, 'is_plant': True}
+    index.add('00000000000000fe', 'prior-id')
+    mock_db.get_identification_by_id.return_value = {'_id': 'prior-id', 'status': 'Completed', 'result': prior_result}
+
+    task_manager.identify_plant_task(b'raw', 'key', 'new-id')
+
+    mock_client.identify_plant.assert_not_called()
+    mock_db.update_identification.assert_called_once_with('new-id', prior_result, perceptual_hash='00000000000000ff')
+    assert ('new-id', 0) in index.find_matches('00000000000000ff', 0)
+
+def test_identify_plant_task_low_confidence_match_calls_kindwise(task_mocks):
+    mock_db, mock_client, index = task_mocks
+    index.add('00000000000000fe', 'prior-id')
+    mock_db.get_identification_by_id.return_value = {
+        '_id': 'prior-id', 'status': 'Completed', 'result': {'is_plant': True, 'probability': 0.3}
+    }
+    mock_client.identify_plant.return_value = {'plant_name': 'Ficus lyrata'}
+
+    task_manager.identify_plant_task(b'raw', 'key', 'new-id')
+
+    mock_client.identify_plant.assert_called_once()
+    mock_db.update_identification.assert_called_once_with(
+        'new-id', {'plant_name': 'Ficus lyrata'}, perceptual_hash='00000000000000ff'
+    )
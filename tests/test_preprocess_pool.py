@@ -0,0 +1,38 @@
+import pytest
+from io import BytesIO
+from PIL import Image
+from src.core.image_processor import preprocess_image
+from src.core.preprocess_pool import PreprocessPool
+
+def create_test_image(format='JPEG', size=(100, 100), color='red'):
+    img = Image.new('RGB', size, color)
+    buf = BytesIO()
+    img.save(buf, format=format)
+    return buf.getvalue()
+
+def test_inline_pool_matches_preprocess_image():
+    file_contents = create_test_image()
+    pool = PreprocessPool(max_workers=0)
+    assert pool.run(file_contents) == preprocess_image(file_contents)
+
+def test_process_pool_preprocesses_image():
+    file_contents = create_test_image(size=(2000, 2000))
+    pool = PreprocessPool(max_workers=1, max_in_flight=1)
+    try:
+        pool.start()
+        processed_image, perceptual_hash = pool.run(file_contents)
+    finally:
+        pool.shutdown()
+
+    img = Image.open(BytesIO(processed_image))
+    assert img.size == (1500, 1500)
+    assert len(perceptual_hash) == 16
+
+def test_process_pool_propagates_validation_errors():
+    pool = PreprocessPool(max_workers=1)
+    try:
+        with pytest.raises(ValueError) as exc_info:
+            pool.run(b'Not an image', with_perceptual_hash=False)
+    finally:
+        pool.shutdown()
+    assert 'Uploaded file is not a valid image' in str(exc_info.value)
@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+from src.db.query_plans import check_query_plans, plan_stages, query_shapes
+
+
+def explained(plan):
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.explain.return_value = {'queryPlanner': {'winningPlan': plan}}
+    return cursor
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {
+        'stage': 'LIMIT',
+        'inputStage': {
+            'stage': 'OR',
+            'inputStages': [
+                {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'status_1__id_-1'}},
+                {'stage': 'COLLSCAN'},
+            ],
+        },
+    }
+
+    assert plan_stages(plan) == ['LIMIT', 'OR', 'FETCH', 'COLLSCAN', 'IXSCAN']
+
+
+def test_check_query_plans_reports_collection_scans():
+    index_plan = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}
+    db = MagicMock()
+
+    def find(query):
+        if query == {}:
+            return explained({'stage': 'COLLSCAN'})
+        return explained(index_plan)
+
+    db.__getitem__.return_value.find.side_effect = find
+
+    collection_scans = check_query_plans(db)
+
+    assert [name for name, _ in collection_scans] == ['list identifications']
+    assert collection_scans[0][1] == ['COLLSCAN']
+
+
+def test_query_shapes_cover_every_collection():
+    collections = {shape['collection'] for shape in query_shapes()}
+
+    assert collections == {'identifications', 'identification_cache', 'taxa', 'jobs', 'webhook_outbox'}
@@ -0,0 +1,75 @@
+import asyncio
+from unittest.mock import MagicMock
+from src.core.record_cache import RecordCache, SharedRecordTier, serialize_identification
+
+COMPLETED = {'_id': '507f1f77bcf86cd799439011', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'}}
+
+
+class DictStore:
+    """
+    In-memory stand-in for a Redis server.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_only_terminal_records_are_cached():
+    cache = RecordCache(10)
+
+    assert cache.put({'_id': '1', 'status': 'Processing'}) is None
+    assert cache.put(COMPLETED) == serialize_identification(COMPLETED)
+    assert cache.get('1') is None
+    assert cache.get(COMPLETED['_id'])[0] == serialize_identification(COMPLETED)[0]
+
+
+def test_least_recently_used_record_is_evicted():
+    cache = RecordCache(2)
+    for identification_id in ('1', '2', '3'):
+        cache.put({'_id': identification_id, 'status': 'Error', 'error_message': 'Failed'})
+
+    assert cache.get('1') is None
+    assert cache.get('3') is not None
+    assert cache.stats()['entries'] == 2
+
+
+def test_shared_tier_serves_other_processes():
+    store = DictStore()
+    writer = RecordCache(10, SharedRecordTier(store, ttl_seconds=60))
+    reader = RecordCache(10, SharedRecordTier(store, ttl_seconds=60))
+
+    entry = writer.put(COMPLETED)
+
+    assert asyncio.run(reader.get_async(COMPLETED['_id'])) == entry
+    assert reader.get(COMPLETED['_id']) == entry
+    assert reader.stats()['shared_hits'] == 1
+    assert reader.stats()['memory_hits'] == 1
+
+
+def test_invalidate_removes_both_tiers():
+    store = DictStore()
+    cache = RecordCache(10, SharedRecordTier(store, ttl_seconds=60))
+    cache.put(COMPLETED)
+
+    cache.invalidate(COMPLETED['_id'])
+
+    assert cache.get(COMPLETED['_id']) is None
+    assert store.values == {}
+
+
+def test_unavailable_shared_tier_is_a_miss():
+    client = MagicMock()
+    client.get.side_effect = ConnectionError('unreachable')
+    cache = RecordCache(10, SharedRecordTier(client, ttl_seconds=60))
+
+    assert cache.get(COMPLETED['_id']) is None
+    assert cache.stats()['misses'] == 1
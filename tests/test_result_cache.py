@@ -0,0 +1,225 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+import sys
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from src.core.result_cache import ResultCache, build_cache_key
+from src.core import task_manager
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.single_flight import SingleFlight
+
+RESULT = {'plant_name': 'Ficus lyrata', 'probability': 0.95}
+
+def test_build_cache_key_depends_on_image_and_details():
+    key = build_cache_key(b'image', ['taxonomy', 'common_names'])
+    assert key == build_cache_key(b'image', ['common_names', 'taxonomy'])
+    assert key != build_cache_key(b'other', ['taxonomy', 'common_names'])
+    assert key != build_cache_key(b'image', ['taxonomy'])
+
+def test_memory_hit_and_miss_counters():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+    assert cache.get('a') is None
+    cache.set('a', RESULT)
+    assert cache.get('a') == RESULT
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['memory_hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['hit_ratio'] == 0.5
+
+def test_lru_size_eviction():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+    cache.set('a', RESULT)
+    cache.set('b', RESULT)
+    cache.get('a')
+    cache.set('c', RESULT)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == RESULT
+    assert cache.get('c') == RESULT
+
+def test_age_eviction():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+    with patch('src.core.result_cache.time.monotonic', return_value=100.0):
+        cache.set('a', RESULT)
+    with patch('src.core.result_cache.time.monotonic', return_value=161.0):
+        assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+def test_db_tier_fallback_populates_memory():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+    db_service = MagicMock()
+    db_service.get_cached_result.return_value = RESULT
+
+    assert cache.get('a', db_service) == RESULT
+    assert cache.get('a', db_service) == RESULT
+
+    db_service.get_cached_result.assert_called_once_with('a', 60)
+    assert cache.stats()['db_hits'] == 1
+    assert cache.stats()['memory_hits'] == 1
+
+def test_set_writes_through_to_db():
+    cache = ResultCache(max_size=2, ttl_seconds=60)
+    db_service = MagicMock()
+    cache.set('a', RESULT, db_service)
+    db_service.store_cached_result.assert_called_once_with('a', RESULT)
+
+@pytest.fixture
+def task_mocks():
+    with patch('src.core.task_manager.DatabaseService') as MockDBService, \
+            patch('src.core.task_manager.preprocess_pool') as mock_pool, \
+            patch('src.core.task_manager.settings.phash_enabled', False), \
+            patch('src.core.task_manager.KindwiseClient') as MockKindwiseClient, \
+            patch('src.core.task_manager.identification_cache', ResultCache(max_size=8, ttl_seconds=60)), \
+            patch('src.core.task_manager.identification_flights', SingleFlight()):
+        mock_pool.run.return_value = (b'processed', None)
+        mock_db = MockDBService.return_value
+        mock_db.get_cached_result.return_value = None
+        mock_client = MockKindwiseClient.return_value
+        mock_client.identify_plant.return_value = RESULT
+        yield mock_db, mock_client
+
+def test_identify_plant_task_cache_hit_skips_kindwise(task_mocks):
+    mock_db, mock_client = task_mocks
+
+    task_manager.identify_plant_task(b'raw', 'key', 'id-1')
+    task_manager.identify_plant_task(b'raw', 'key', 'id-2')
+
+    mock_client.identify_plant.assert_called_once()
+    mock_db.update_identification.assert_any_call('id-1', RESULT, perceptual_hash=None)
+    mock_db.update_identification.assert_any_call('id-2', RESULT, perceptual_hash=None)
+
+def test_identify_plant_task_async(task_mocks):
+    mock_db, mock_client = task_mocks
+
+    with patch('src.core.task_manager.AsyncKindwiseClient') as MockAsyncClient:
+        MockAsyncClient.return_value.identify_plant = AsyncMock(return_value=RESULT)
+        asyncio.run(task_manager.identify_plant_task_async(b'raw', 'key', 'id-1'))
+        asyncio.run(task_manager.identify_plant_task_async(b'raw', 'key', 'id-2'))
+
+    MockAsyncClient.assert_called_once_with(api_key='key')
+    mock_client.identify_plant.assert_not_called()
+    mock_db.update_identification.assert_any_call('id-1', RESULT, perceptual_hash=None)
+    mock_db.update_identification.assert_any_call('id-2', RESULT, perceptual_hash=None)
+
+def test_identify_plant_task_async_records_errors(task_mocks):
+    mock_db, _ = task_mocks
+
+    with patch('src.core.task_manager.AsyncKindwiseClient') as MockAsyncClient:
+        MockAsyncClient.return_value.identify_plant = AsyncMock(side_effect=ValueError('quota exceeded'))
+        asyncio.run(task_manager.identify_plant_task_async(b'raw', 'key', 'id-1'))
+
+    mock_db.update_identification_error.assert_called_once_with('id-1', 'quota exceeded')
+
+def test_identify_plant_task_leaves_record_processing_when_circuit_is_open(task_mocks):
+    mock_db, mock_client = task_mocks
+    mock_client.identify_plant.side_effect = CircuitOpenError('Kindwise', 30)
+
+    with pytest.raises(CircuitOpenError):
+        task_manager.identify_plant_task(b'raw', 'key', 'id-1')
+
+    mock_db.update_identification.assert_not_called()
+    mock_db.update_identification_error.assert_not_called()
+
+def run_duplicate_uploads(mock_client, identification_ids, run_task):
+    """
+    Runs tasks for the same upload concurrently, holding Kindwise until all of them joined.
+    """
+    joined = threading.Event()
+
+    def identify_plant(*args, **kwargs):
+        assert joined.wait(5)
+        return RESULT
+
+    mock_client.identify_plant.side_effect = identify_plant
+    threads = [threading.Thread(target=run_task, args=(identification_id,)) for identification_id in identification_ids]
+    for thread in threads:
+        thread.start()
+    while task_manager.identification_flights.stats()['coalesced'] < len(identification_ids) - 1:
+        threading.Event().wait(0.01)
+    joined.set()
+    for thread in threads:
+        thread.join(5)
+
+def test_identify_plant_task_coalesces_duplicate_uploads(task_mocks):
+    mock_db, mock_client = task_mocks
+
+    with patch('src.core.task_manager.WebhookOutbox') as MockOutbox:
+        run_duplicate_uploads(
+            mock_client,
+            ['id-1', 'id-2', 'id-3'],
+            lambda identification_id: task_manager.identify_plant_task(
+                b'raw', 'key', identification_id, callback_url=f'https://example.com/{identification_id}'
+            ),
+        )
+
+    mock_client.identify_plant.assert_called_once()
+    mock_db.update_identification.assert_not_called()
+    mock_db.update_identifications.assert_called_once()
+    assert sorted(mock_db.update_identifications.call_args[0][0]) == ['id-1', 'id-2', 'id-3']
+    assert MockOutbox.return_value.add.call_count == 3
+    assert task_manager.identification_flights.stats()['in_flight'] == 0
+
+def test_identify_plant_task_coalesces_errors(task_mocks):
+    mock_db, mock_client = task_mocks
+    mock_client.identify_plant.side_effect = ValueError('quota exceeded')
+
+    flight, _ = task_manager.identification_flights.join(task_manager.upload_key(b'raw'), 'id-1')
+    task_manager.identification_flights.join(task_manager.upload_key(b'raw'), 'id-2')
+    task_manager.lead_identification(flight, b'raw', 'key', 'id-1', mock_db)
+
+    mock_db.update_identifications_error.assert_called_once_with(['id-1', 'id-2'], 'quota exceeded')
+    assert flight.wait() == {'error_message': 'quota exceeded'}
+
+def test_identify_plant_task_async_coalesces_duplicate_uploads(task_mocks):
+    mock_db, _ = task_mocks
+    released = None
+
+    async def identify_plant(*args, **kwargs):
+        await released.wait()
+        return RESULT
+
+    async def scenario():
+        nonlocal released
+        released = asyncio.Event()
+        tasks = [
+            asyncio.create_task(task_manager.identify_plant_task_async(b'raw', 'key', identification_id))
+            for identification_id in ('id-1', 'id-2')
+        ]
+        while task_manager.identification_flights.stats()['coalesced'] < 1:
+            await asyncio.sleep(0.01)
+        released.set()
+        await asyncio.gather(*tasks)
+
+    with patch('src.core.task_manager.AsyncKindwiseClient') as MockAsyncClient:
+        MockAsyncClient.return_value.identify_plant = AsyncMock(side_effect=identify_plant)
+        asyncio.run(scenario())
+
+    MockAsyncClient.return_value.identify_plant.assert_awaited_once()
+    mock_db.update_identifications.assert_called_once_with(['id-1', 'id-2'], RESULT, perceptual_hash=None)
+
+def test_followers_identify_upload_when_leader_aborts(task_mocks):
+    mock_db, mock_client = task_mocks
+    flight, _ = task_manager.identification_flights.join(task_manager.upload_key(b'raw'), 'id-1')
+    follower = threading.Thread(target=task_manager.identify_plant_task, args=(b'raw', 'key', 'id-2'))
+    follower.start()
+    while not task_manager.identification_flights.stats()['coalesced']:
+        threading.Event().wait(0.01)
+
+    task_manager.abort_flight(flight, KeyboardInterrupt())
+    follower.join(5)
+
+    mock_client.identify_plant.assert_called_once()
+    mock_db.update_identification.assert_called_once_with('id-2', RESULT, perceptual_hash=None)
+
+def test_identify_plant_task_notifies_waiters(task_mocks):
+    with patch('src.core.task_manager.notification_hub') as mock_hub:
+        task_manager.identify_plant_task(b'raw', 'key', 'id-1')
+
+    mock_hub.publish.assert_called_once_with('id-1')
@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from bson import encode
+from src.db.migrate_results import migrate_results
+from src.db.result_codec import (
+    TaxonCache,
+    decode_identification,
+    decode_result,
+    encode_result,
+    storage_projection,
+)
+
+RESULT = {
+    'plant_name': 'Ficus lyrata',
+    'common_names': ['Fiddle Leaf Fig', 'Banjo Fig'],
+    'probability': 0.95,
+    'taxonomy': {
+        'class': 'Magnoliopsida',
+        'genus': 'Ficus',
+        'order': 'Rosales',
+        'family': 'Moraceae',
+        'phylum': 'Tracheophyta',
+        'kingdom': 'Plantae',
+    },
+    'identification_id': 'Kfr5VqG2c8Y1Zzq',
+    'species_id': '5e9b0d8c',
+    'is_plant': True,
+    'created': '2024-09-15T12:00:00.123000+00:00',
+}
+
+
+def test_encode_result_round_trip():
+    compact, taxon = encode_result(RESULT)
+
+    assert compact == {
+        'n': 'Ficus lyrata',
+        'p': 0.95,
+        'k': 'Kfr5VqG2c8Y1Zzq',
+        'ip': True,
+        'c': datetime(2024, 9, 15, 12, 0, 0, 123000, tzinfo=timezone.utc),
+        't': '5e9b0d8c',
+    }
+    assert taxon['_id'] == '5e9b0d8c'
+    assert decode_result(compact, taxon) == RESULT
+
+
+def test_compact_result_is_smaller():
+    compact, _ = encode_result(RESULT)
+
+    assert len(encode({'r': compact})) < len(encode({'result': RESULT})) / 2
+
+
+def test_result_without_species_id_uses_plant_name_as_taxon_key():
+    legacy = {key: value for key, value in RESULT.items() if key != 'species_id'}
+
+    compact, taxon = encode_result(legacy)
+
+    assert compact['t'] == taxon['_id'] == 'name:Ficus lyrata'
+    assert 'species_id' not in decode_result(compact, taxon)
+
+
+def test_result_without_suggestion_keeps_taxon_fields_inline():
+    compact, taxon = encode_result({'plant_name': None, 'common_names': [], 'taxonomy': {}, 'is_plant': False})
+
+    assert taxon is None
+    assert decode_result(compact) == {'is_plant': False, 'common_names': [], 'taxonomy': {}}
+
+
+def test_decode_projected_result():
+    assert decode_result({'n': 'Ficus lyrata'}) == {'plant_name': 'Ficus lyrata'}
+
+
+def test_decode_identification_leaves_legacy_documents():
+    taxa = TaxonCache(10)
+    legacy = {'_id': 1, 'status': 'Completed', 'result': dict(RESULT)}
+
+    assert decode_identification(legacy, taxa)['result'] == RESULT
+
+
+def test_storage_projection():
+    assert storage_projection(['result.plant_name', 'result.common_names', 'result.taxonomy', 'error_message']) == [
+        'r.n', 'r.t', 'r.cn', 'r.tx', 'error_message'
+    ]
+
+
+def test_taxon_cache_evicts_least_recently_used():
+    taxa = TaxonCache(2)
+    taxa.put({'_id': 'a'})
+    taxa.put({'_id': 'b'})
+    taxa.get('a')
+    taxa.put({'_id': 'c'})
+
+    assert taxa.missing(['a', 'b', 'c']) == ['b']
+
+
+def test_migrate_results_converts_in_batches():
+    db = MagicMock()
+    first = [{'_id': 1, 'result': dict(RESULT)}, {'_id': 2, 'result': dict(RESULT)}]
+    second = [{'_id': 3, 'result': {'plant_name': None, 'is_plant': False}}]
+    cursors = iter([first, second, []])
+    db.identifications.find.return_value.sort.return_value.limit.side_effect = lambda _: next(cursors)
+    db.identifications.bulk_write.side_effect = lambda operations, ordered: MagicMock(modified_count=len(operations))
+
+    migrated = migrate_results(db, batch_size=2)
+
+    assert migrated == 3
+    taxa_writes = db.taxa.bulk_write.call_args_list
+    assert len(taxa_writes) == 1
+    assert len(taxa_writes[0].args[0]) == 1
+    last_query = db.identifications.find.call_args.args[0]
+    assert last_query['_id'] == {'$gt': 3}
+    first_update = db.identifications.bulk_write.call_args_list[0].args[0][0]
+    assert first_update._doc['$unset'] == {'result': ''}
+    assert first_update._doc['$set']['r']['t'] == '5e9b0d8c'
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from src.core.single_flight import FlightAbortedError, SingleFlight, upload_key, upload_key_async
+from src.core.upload_spool import SpooledUpload
+
+def test_upload_key_depends_on_content():
+    assert upload_key(b'image') == upload_key(b'image')
+    assert upload_key(b'image') != upload_key(b'other image')
+
+def test_upload_key_async_hashes_off_the_event_loop():
+    async def scenario():
+        loop_thread = threading.get_ident()
+        hashing_threads = []
+
+        def recording_upload_key(file_contents):
+            hashing_threads.append(threading.get_ident())
+            return upload_key(file_contents)
+
+        with patch('src.core.single_flight.upload_key', recording_upload_key):
+            key = await upload_key_async(b'image')
+        return key, loop_thread, hashing_threads
+
+    key, loop_thread, hashing_threads = asyncio.run(scenario())
+
+    assert key == upload_key(b'image')
+    assert len(hashing_threads) == 1 and hashing_threads[0] != loop_thread
+
+def test_upload_key_async_reuses_spool_hash():
+    spooled = MagicMock(spec=SpooledUpload)
+    spooled.content_hash = 'abc'
+
+    assert asyncio.run(upload_key_async(spooled)) == 'abc'
+
+def test_concurrent_members_join_one_flight():
+    flights = SingleFlight()
+    leader_flight, leader = flights.join('key', 'id-1')
+    follower_flight, follower_leads = flights.join('key', 'id-2')
+
+    assert leader and not follower_leads
+    assert follower_flight is leader_flight
+    assert flights.land(leader_flight) == ['id-1', 'id-2']
+    assert flights.stats() == {'in_flight': 0, 'coalesced': 1}
+
+def test_members_joining_after_landing_start_a_new_flight():
+    flights = SingleFlight()
+    flight, _ = flights.join('key', 'id-1')
+    flights.land(flight)
+
+    new_flight, leader = flights.join('key', 'id-2')
+
+    assert leader and new_flight is not flight
+    # Landing the old flight again does not remove the new one
+    flights.land(flight)
+    assert flights.stats()['in_flight'] == 1
+
+def test_followers_receive_the_outcome():
+    flights = SingleFlight()
+    flight, _ = flights.join('key', 'id-1')
+    outcomes = []
+    follower = threading.Thread(target=lambda: outcomes.append(flight.wait()))
+    follower.start()
+
+    flight.resolve({'result': 'ficus'})
+    follower.join(1)
+
+    assert outcomes == [{'result': 'ficus'}]
+
+def test_async_followers_receive_errors():
+    flights = SingleFlight()
+    flight, _ = flights.join('key', 'id-1')
+
+    async def scenario():
+        waiter = asyncio.create_task(flight.wait_async())
+        await asyncio.sleep(0)
+        threading.Thread(target=flight.resolve, kwargs={'error': FlightAbortedError('stopped')}).start()
+        await waiter
+
+    with pytest.raises(FlightAbortedError):
+        asyncio.run(scenario())
+
+def test_wait_returns_immediately_once_resolved():
+    flights = SingleFlight()
+    flight, _ = flights.join('key', 'id-1')
+    flight.resolve({'result': 'ficus'})
+
+    assert flight.done
+    assert flight.wait() == {'result': 'ficus'}
+    assert asyncio.run(flight.wait_async()) == {'result': 'ficus'}
@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from bson.objectid import ObjectId
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from src.config import settings
+from src.core.job_queue import build_job
+from src.core.tracing import (
+    NOOP_SPAN, JsonlSpanExporter, Tracer, current_trace_id, current_traceparent, parse_traceparent,
+    tracer,
+)
+from src.db.db_service import build_identification_record
+from src.worker import job_span
+
+TRACEPARENT = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+@pytest.fixture
+def exported():
+    """
+    Enables the tracer singleton and collects the spans it exports.
+    """
+    spans = []
+    exporter = MagicMock()
+    exporter.export.side_effect = spans.append
+    with patch.object(tracer, 'sample_rate', 1.0), patch.object(tracer, 'exporter', exporter):
+        yield spans
+
+def test_parse_traceparent():
+    context = parse_traceparent(TRACEPARENT)
+
+    assert context.trace_id == '0af7651916cd43dd8448eb211c80319c'
+    assert context.span_id == 'b7ad6b7169203331'
+    assert context.sampled
+    assert context.traceparent() == TRACEPARENT
+    assert not parse_traceparent(TRACEPARENT[:-1] + '0').sampled
+
+@pytest.mark.parametrize('header', [
+    None, '', 'garbage', '01-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01',
+    '00-00000000000000000000000000000000-b7ad6b7169203331-01',
+])
+def test_parse_traceparent_rejects_invalid_headers(header):
+    assert parse_traceparent(header) is None
+
+def test_disabled_tracer_returns_noop_span():
+    with Tracer(0.0).start_span('work') as span:
+        span.set_attribute('key', 'value')
+        assert current_traceparent() is None
+
+    assert span is NOOP_SPAN
+
+def test_child_spans_join_the_current_trace(exported):
+    with tracer.start_span('parent') as parent:
+        with tracer.start_span('child', attributes={'n': 1}):
+            assert current_trace_id() == parent.trace_id
+        assert current_traceparent() == parent.context.traceparent()
+
+    child, root = exported
+    assert child.context.trace_id == root.context.trace_id
+    assert child.parent_span_id == root.context.span_id
+    assert root.parent_span_id is None
+    assert child.to_otlp()['attributes'] == [{'key': 'n', 'value': {'intValue': '1'}}]
+
+def test_unsampled_traces_propagate_without_recording():
+    exporter = MagicMock()
+    sampler = Tracer(1.0, exporter)
+
+    with sampler.start_span('request', parent=parse_traceparent(TRACEPARENT[:-1] + '0')) as span:
+        span.set_attribute('key', 'value')
+        with sampler.start_span('child') as child:
+            assert current_trace_id() is None
+
+    assert child.context.trace_id == '0af7651916cd43dd8448eb211c80319c'
+    assert not child.context.sampled
+    assert span.attributes == {}
+    exporter.export.assert_not_called()
+
+def test_sample_rate_applies_to_new_traces():
+    with patch('src.core.tracing.random.random', return_value=0.5):
+        assert Tracer(0.25).start_span('request').context.sampled is False
+        assert Tracer(0.75).start_span('request').context.sampled is True
+
+def test_span_records_errors(exported):
+    with pytest.raises(ValueError):
+        with tracer.start_span('work'):
+            raise ValueError('broken')
+
+    assert exported[0].to_otlp()['status'] == {'code': 2, 'message': 'ValueError: broken'}
+
+def test_exporter_writes_otlp_json_lines(tmp_path):
+    exporter = JsonlSpanExporter(str(tmp_path / 'traces-{pid}.jsonl'), 'zelara-test')
+    exporter._start = MagicMock()
+    sampler = Tracer(1.0, exporter)
+
+    with sampler.start_span('parent', attributes={'route': '/identify'}):
+        with sampler.start_span('child', start_ns=1_000):
+            pass
+    sampler.shutdown()
+
+    assert exporter.path == str(tmp_path / f'traces-{os.getpid()}.jsonl')
+    with open(exporter.path) as file:
+        request = json.loads(file.readline())
+    resource_spans = request['resourceSpans'][0]
+    assert resource_spans['resource']['attributes'] == [
+        {'key': 'service.name', 'value': {'stringValue': 'zelara-test'}}
+    ]
+    child, parent = resource_spans['scopeSpans'][0]['spans']
+    assert child['startTimeUnixNano'] == '1000'
+    assert child['parentSpanId'] == parent['spanId']
+    assert parent['attributes'] == [{'key': 'route', 'value': {'stringValue': '/identify'}}]
+    assert exporter.stats()['exported'] == 2
+
+def test_exporter_drops_spans_when_queue_is_full(tmp_path):
+    exporter = JsonlSpanExporter(str(tmp_path / 'traces.jsonl'), 'zelara-test', max_queue=1)
+    exporter._start = MagicMock()
+    sampler = Tracer(1.0, exporter)
+
+    for _ in range(3):
+        sampler.start_span('work').end()
+
+    assert exporter.stats()['dropped'] == 2
+    assert exporter.stats()['queued'] == 1
+
+def test_identification_record_and_job_carry_the_trace(exported):
+    assert 'trace_id' not in build_identification_record('Processing')
+    assert 'traceparent' not in build_job('id-1', b'image', settings.kindwise_api_key)
+
+    with tracer.start_span('request') as span:
+        record = build_identification_record('Processing')
+        job = build_job('id-1', b'image', settings.kindwise_api_key)
+
+    assert record['trace_id'] == span.trace_id
+    assert parse_traceparent(job['traceparent']).span_id == span.context.span_id
+
+def test_job_span_continues_trace_and_records_queue_time(exported):
+    created_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=2)
+    job = {
+        '_id': ObjectId(), 'identification_id': 'id-1', 'attempts': 1,
+        'created_at': created_at, 'traceparent': TRACEPARENT,
+    }
+
+    with job_span(job):
+        pass
+
+    queued, processed = exported
+    assert queued.name == 'queued'
+    assert queued.parent_span_id == processed.parent_span_id == 'b7ad6b7169203331'
+    assert queued.trace_id == processed.trace_id == '0af7651916cd43dd8448eb211c80319c'
+    assert (queued.end_ns - queued.start_ns) / 1e9 == pytest.approx(2, abs=0.5)
+
+def test_job_span_without_traceparent_starts_a_trace(exported):
+    job = {'_id': ObjectId(), 'identification_id': 'id-1', 'attempts': 1, 'created_at': datetime.now(timezone.utc)}
+
+    with job_span(job):
+        pass
+
+    queued, processed = exported
+    assert queued.parent_span_id is None
+    assert processed.parent_span_id == queued.context.span_id
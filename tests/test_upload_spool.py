@@ -0,0 +1,188 @@
+import os
+import pickle
+import time
+import pytest
+import sys
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect
+from PIL import Image
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from src.config import settings
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.image_processor import preprocess_image, process_image
+from src.core.job_queue import build_job, job_image
+from src.core.single_flight import upload_key
+from src.core.upload_spool import SpoolFullError, UploadSpool
+from src.worker import process_job
+
+def create_test_image(format='JPEG', size=(100, 100), color='red'):
+    img = Image.new('RGB', size, color)
+    buf = BytesIO()
+    img.save(buf, format=format)
+    return buf.getvalue()
+
+@pytest.fixture
+def spool(tmp_path):
+    return UploadSpool(str(tmp_path / 'spool'), threshold_bytes=10, quota_bytes=1000)
+
+def test_should_spool_only_when_enabled_and_large():
+    assert not UploadSpool(None, threshold_bytes=10, quota_bytes=1000).should_spool(100)
+    spool = UploadSpool('/tmp/spool', threshold_bytes=10, quota_bytes=1000)
+    assert spool.should_spool(10)
+    assert not spool.should_spool(9)
+
+def test_write_stream_copies_upload_and_hashes_it(spool):
+    data = os.urandom(300)
+
+    upload = spool.write_stream(BytesIO(data))
+
+    with open(upload.path, 'rb') as file:
+        assert file.read() == data
+    assert upload.size == 300
+    assert upload.content_hash == upload_key(data)
+    assert upload_key(upload) == upload_key(data)
+    assert os.path.dirname(upload.path) == spool.directory
+    assert spool.usage() == 300
+
+def test_write_buffer_accepts_memoryview(spool):
+    data = bytearray(os.urandom(200))
+
+    upload = spool.write_buffer(memoryview(data))
+
+    with open(upload.path, 'rb') as file:
+        assert file.read() == bytes(data)
+    assert upload.content_hash == upload_key(data)
+
+def test_write_rejects_uploads_over_quota(spool):
+    spool.write_buffer(b'x' * 800)
+
+    with pytest.raises(SpoolFullError):
+        spool.write_buffer(b'y' * 300)
+
+    assert spool.stats()['rejected'] == 1
+    assert spool.usage() == 800
+
+def test_write_sweeps_stale_files_before_rejecting(spool):
+    stale = spool.write_buffer(b'x' * 800)
+    old = time.time() - 2 * spool.max_age_seconds
+    os.utime(stale.path, (old, old))
+
+    upload = spool.write_buffer(b'y' * 300)
+
+    assert not os.path.exists(stale.path)
+    assert os.path.exists(upload.path)
+
+def test_failed_write_leaves_no_file(spool):
+    stream = MagicMock()
+    stream.tell.return_value = 100
+    stream.read.side_effect = OSError('connection reset')
+
+    with pytest.raises(OSError):
+        spool.write_stream(stream)
+
+    assert os.listdir(spool.directory) == []
+    assert spool._reserved == 0
+
+def test_remove_ignores_missing_files(spool):
+    upload = spool.write_buffer(b'x' * 100)
+
+    spool.remove(upload)
+    spool.remove(upload)
+
+    assert spool.usage() == 0
+
+def test_spooled_upload_round_trips_through_job_document(spool):
+    upload = spool.write_buffer(b'x' * 100)
+
+    job = build_job('id-1', upload, settings.kindwise_api_key)
+
+    assert 'image' not in job
+    assert job['image_file'] == {'path': upload.path, 'size': 100, 'sha256': upload.content_hash}
+    assert job_image(job) == upload
+    assert pickle.loads(pickle.dumps(upload)) == upload
+
+def test_process_image_opens_spooled_file(spool):
+    spool.quota_bytes = 1024 * 1024
+    upload = spool.write_buffer(create_test_image(size=(200, 200)))
+
+    processed_image, perceptual_hash = preprocess_image(upload)
+
+    assert Image.open(BytesIO(processed_image)).size == (200, 200)
+    assert perceptual_hash == preprocess_image(create_test_image(size=(200, 200)))[1]
+
+def test_process_image_passes_spooled_file_through(spool):
+    spool.quota_bytes = 1024 * 1024
+    file_contents = create_test_image(size=(200, 200))
+    upload = spool.write_buffer(file_contents)
+
+    with patch('src.core.image_processor.settings.image_passthrough', True):
+        assert process_image(upload) == file_contents
+
+def test_process_image_rejects_removed_spooled_file(spool):
+    upload = spool.write_buffer(create_test_image())
+    spool.remove(upload)
+
+    with pytest.raises(ValueError, match='no longer available'):
+        process_image(upload)
+
+def test_process_job_passes_spooled_upload_and_removes_it(spool):
+    upload = spool.write_buffer(b'x' * 100)
+    job_queue = MagicMock()
+    job = {
+        '_id': ObjectId(), 'identification_id': 'id-1', 'image_file': upload.to_document(),
+        'api_key': 'key', 'attempts': 1,
+    }
+
+    with patch('src.worker.identify_plant_task') as mock_task, patch('src.worker.upload_spool', spool):
+        process_job(job_queue, job)
+
+    mock_task.assert_called_once_with(upload, 'key', 'id-1', callback_url=None)
+    job_id, on_removed = job_queue.complete.call_args[0]
+    assert job_id == job['_id']
+    # The upload is kept until the job's removal was written
+    assert os.path.exists(upload.path)
+    on_removed()
+    assert not os.path.exists(upload.path)
+
+def test_deferred_job_keeps_spooled_upload(spool):
+    upload = spool.write_buffer(b'x' * 100)
+    job_queue = MagicMock()
+    job = {
+        '_id': ObjectId(), 'identification_id': 'id-1', 'image_file': upload.to_document(),
+        'api_key': 'key', 'attempts': 1,
+    }
+
+    with patch('src.worker.identify_plant_task', side_effect=CircuitOpenError('Kindwise', 30)), \
+            patch('src.worker.upload_spool', spool):
+        process_job(job_queue, job)
+
+    job_queue.complete.assert_not_called()
+    assert os.path.exists(upload.path)
+
+def test_sweep_keeps_files_of_queued_jobs(spool):
+    queued, orphaned = spool.write_buffer(b'x' * 100), spool.write_buffer(b'y' * 100)
+    old = time.time() - 2 * spool.max_age_seconds
+    for upload in (queued, orphaned):
+        os.utime(upload.path, (old, old))
+    spool.in_use = MagicMock(return_value={queued.path})
+
+    assert spool.sweep() == 1
+
+    assert sorted(spool.in_use.call_args[0][0]) == sorted([queued.path, orphaned.path])
+    assert os.path.exists(queued.path)
+    assert not os.path.exists(orphaned.path)
+
+def test_sweep_keeps_files_when_jobs_cannot_be_checked(spool):
+    upload = spool.write_buffer(b'x' * 100)
+    old = time.time() - 2 * spool.max_age_seconds
+    os.utime(upload.path, (old, old))
+    spool.in_use = MagicMock(side_effect=AutoReconnect('connection refused'))
+
+    assert spool.sweep() == 0
+    assert os.path.exists(upload.path)
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock, AsyncMock
+import sys
+
+# Mock external dependencies
+sys.modules.setdefault('kindwise', MagicMock())
+sys.modules.setdefault('kindwise.plant', MagicMock())
+
+from src.core import task_manager
+from src.core.rate_limit import KeyedRateLimiter
+from src.core.webhooks import (
+    AsyncWebhookOutbox,
+    WebhookDispatcher,
+    UnsafeCallbackError,
+    WebhookSender,
+    build_delivery,
+    build_webhook_payload,
+    is_valid_callback_url,
+    pin_callback_url,
+    resolve_callback_url,
+)
+
+class StubWebhookServer:
+    """
+    Local HTTP server recording the webhook batches it receives.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.status_codes = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                stub.requests.append((self.path, json.loads(body)))
+                self.send_response(stub.status_codes.pop(0) if stub.status_codes else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stub_server():
+    server = StubWebhookServer()
+    with patch('src.core.webhooks.settings.webhook_allowed_hosts', ['127.0.0.1']):
+        yield server
+    server.close()
+
+def resolving_to(*addresses):
+    return patch(
+        'src.core.webhooks.socket.getaddrinfo',
+        return_value=[(2, 1, 6, '', (address, 443)) for address in addresses],
+    )
+
+def delivery(index, url):
+    document = build_delivery(url, build_webhook_payload(f'id-{index}', result={'plant_name': 'Ficus lyrata'}))
+    document['_id'] = index
+    return document
+
+def test_is_valid_callback_url():
+    assert is_valid_callback_url('https://example.com/hooks/plants')
+    assert is_valid_callback_url('http://127.0.0.1:8080/')
+    assert not is_valid_callback_url('ftp://example.com/hook')
+    assert not is_valid_callback_url('/relative/path')
+
+@pytest.mark.parametrize('address', ['127.0.0.1', '10.0.0.5', '192.168.1.1', '169.254.169.254', '::1', '::ffff:127.0.0.1', '0.0.0.0'])
+def test_resolve_callback_url_rejects_internal_addresses(address):
+    with resolving_to(address), pytest.raises(UnsafeCallbackError):
+        resolve_callback_url('https://hooks.example.com/plants')
+
+def test_resolve_callback_url_rejects_any_internal_address():
+    with resolving_to('93.184.215.14', '10.0.0.5'), pytest.raises(UnsafeCallbackError):
+        resolve_callback_url('https://hooks.example.com/plants')
+
+def test_resolve_callback_url_returns_public_address():
+    with resolving_to('93.184.215.14') as getaddrinfo:
+        assert resolve_callback_url('http://hooks.example.com:8080/plants') == '93.184.215.14'
+    assert getaddrinfo.call_args.args[:2] == ('hooks.example.com', 8080)
+
+def test_resolve_callback_url_allowlist():
+    with patch('src.core.webhooks.settings.webhook_allowed_hosts', ['Hooks.Internal']), resolving_to('93.184.215.14'):
+        assert resolve_callback_url('http://hooks.internal/plants') is None
+        with pytest.raises(UnsafeCallbackError):
+            resolve_callback_url('https://hooks.example.com/plants')
+
+def test_pin_callback_url():
+    assert pin_callback_url('http://hooks.example.com:8080/plants?a=1', '93.184.215.14') == (
+        'http://93.184.215.14:8080/plants?a=1', {'Host': 'hooks.example.com:8080'}
+    )
+    assert pin_callback_url('http://hooks.example.com/plants', '2606:2800::1') == (
+        'http://[2606:2800::1]/plants', {'Host': 'hooks.example.com'}
+    )
+    assert pin_callback_url('https://hooks.example.com/plants', '93.184.215.14') == ('https://hooks.example.com/plants', {})
+    assert pin_callback_url('http://hooks.internal/plants', None) == ('http://hooks.internal/plants', {})
+
+def test_sender_posts_batch(stub_server):
+    payloads = [build_webhook_payload('id-1', result={}), build_webhook_payload('id-2', error_message='boom')]
+
+    async def scenario():
+        sender = WebhookSender()
+        try:
+            return await sender.send(f'{stub_server.url}/hook', payloads)
+        finally:
+            await sender.aclose()
+
+    assert asyncio.run(scenario()) is True
+    assert stub_server.requests == [('/hook', {'deliveries': payloads})]
+
+def test_sender_reports_failures(stub_server):
+    stub_server.status_codes = [503]
+
+    async def scenario():
+        sender = WebhookSender()
+        try:
+            server_error = await sender.send(stub_server.url, [{}])
+            stub_server.close()
+            connection_error = await sender.send(stub_server.url, [{}])
+            return server_error, connection_error
+        finally:
+            await sender.aclose()
+
+    assert asyncio.run(scenario()) == (False, False)
+
+def test_host_rate_limiter():
+    limiter = KeyedRateLimiter(rate=20, burst=1)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire('example.com')
+        await limiter.acquire('example.org')
+        return time.monotonic() - started
+
+    # Two waits of 1/20 s for example.com; example.org has its own bucket
+    assert 0.09 <= asyncio.run(scenario()) < 0.5
+
+def test_host_rate_limiter_drops_least_recently_used_hosts():
+    limiter = KeyedRateLimiter(rate=20, burst=1, max_keys=2)
+
+    async def scenario():
+        for host in ['a.example', 'b.example', 'a.example', 'c.example']:
+            await limiter.acquire(host)
+
+    asyncio.run(scenario())
+
+    assert list(limiter._buckets) == ['a.example', 'c.example']
+
+def test_dispatcher_fails_deliveries_to_internal_hosts(stub_server):
+    deliveries = [delivery(0, 'http://rebound.example.com/hook')]
+    outbox = MagicMock()
+    outbox.ack = AsyncMock()
+    outbox.retry = AsyncMock()
+    outbox.fail = AsyncMock()
+
+    async def scenario():
+        sender = WebhookSender()
+        try:
+            with patch('src.core.webhooks.settings.webhook_allowed_hosts', []), resolving_to('127.0.0.1'):
+                await WebhookDispatcher(outbox, sender).deliver('http://rebound.example.com/hook', deliveries)
+        finally:
+            await sender.aclose()
+
+    asyncio.run(scenario())
+
+    outbox.fail.assert_awaited_once_with(deliveries)
+    outbox.retry.assert_not_awaited()
+    assert stub_server.requests == []
+
+def test_dispatcher_coalesces_deliveries_into_one_post(stub_server):
+    deliveries = [delivery(index, stub_server.url) for index in range(3)]
+    outbox = MagicMock()
+    outbox.claim_batch = AsyncMock(side_effect=[(stub_server.url, deliveries)] + [None] * 1000)
+    outbox.ack = AsyncMock()
+    outbox.retry = AsyncMock()
+
+    async def scenario():
+        sender = WebhookSender()
+        dispatcher = WebhookDispatcher(outbox, sender, poll_interval=0.01)
+        task = asyncio.create_task(dispatcher.run())
+        for _ in range(200):
+            if outbox.ack.await_count:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await sender.aclose()
+
+    asyncio.run(scenario())
+
+    assert len(stub_server.requests) == 1
+    assert [payload['identification_id'] for payload in stub_server.requests[0][1]['deliveries']] == ['id-0', 'id-1', 'id-2']
+    outbox.ack.assert_awaited_once_with([0, 1, 2])
+    outbox.retry.assert_not_awaited()
+
+def test_dispatcher_retries_failed_batch(stub_server):
+    stub_server.status_codes = [500]
+    deliveries = [delivery(0, stub_server.url)]
+    outbox = MagicMock()
+    outbox.ack = AsyncMock()
+    outbox.retry = AsyncMock()
+
+    async def scenario():
+        sender = WebhookSender()
+        try:
+            await WebhookDispatcher(outbox, sender).deliver(stub_server.url, deliveries)
+        finally:
+            await sender.aclose()
+
+    asyncio.run(scenario())
+
+    outbox.retry.assert_awaited_once_with(deliveries)
+    outbox.ack.assert_not_awaited()
+
+def test_outbox_retry_backs_off_and_gives_up():
+    db_service = MagicMock()
+    collection = db_service.db.webhook_outbox
+    collection.update_many = AsyncMock()
+    deliveries = [{'_id': 1, 'attempts': 2}, {'_id': 2, 'attempts': 2}]
+
+    with patch('src.core.webhooks.settings.webhook_max_attempts', 3):
+        asyncio.run(AsyncWebhookOutbox(db_service).retry(deliveries))
+
+    (query, update), _ = collection.update_many.call_args_list[0]
+    assert query == {'_id': {'$in': [1, 2]}}
+    assert update['$inc'] == {'attempts': 1}
+    assert update['$unset'] == {'lease': ''}
+    (query, update), _ = collection.update_many.call_args_list[1]
+    assert query == {'_id': {'$in': [1, 2]}, 'attempts': {'$gte': 3}}
+    assert update == {'$set': {'status': 'failed'}}
+
+def test_identify_plant_task_queues_webhook():
+    with patch('src.core.task_manager.DatabaseService') as MockDBService, \
+            patch('src.core.task_manager.preprocess_pool') as mock_pool, \
+            patch('src.core.task_manager.settings.phash_enabled', False), \
+            patch('src.core.task_manager.settings.result_cache_enabled', False), \
+            patch('src.core.task_manager.KindwiseClient') as MockKindwiseClient, \
+            patch('src.core.task_manager.WebhookOutbox') as MockOutbox:
+        mock_pool.run.return_value = (b'processed', None)
+        MockKindwiseClient.return_value.identify_plant.return_value = {'plant_name': 'Ficus lyrata'}
+
+        task_manager.identify_plant_task(b'raw', 'key', 'id-1', callback_url='https://example.com/hook')
+
+    MockOutbox.assert_called_once_with(MockDBService.return_value)
+    MockOutbox.return_value.add.assert_called_once_with(
+        'https://example.com/hook',
+        {'identification_id': 'id-1', 'status': 'Completed', 'result': {'plant_name': 'Ficus lyrata'}},
+    )
@@ -0,0 +1,124 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+from src.db.write_buffer import StatusWriteBuffer
+
+ID_1 = '507f1f77bcf86cd799439011'
+ID_2 = '507f1f77bcf86cd799439012'
+
+@pytest.fixture
+def mock_db():
+    return MagicMock()
+
+def test_flush_writes_one_bulk_write_then_removes_jobs(mock_db):
+    flushed = []
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10, on_flush=flushed.append)
+    job_id = ObjectId()
+
+    buffer.update_identification(ID_1, {'status': 'Completed', 'result': {'plant_name': 'Ficus'}})
+    buffer.update_identification(ID_2, {'status': 'Error', 'error_message': 'quota exceeded'})
+    buffer.complete_job(job_id)
+
+    assert buffer.flush() == 2
+    mock_db.identifications.bulk_write.assert_called_once_with([
+        UpdateOne({'_id': ObjectId(ID_1)}, {'$set': {'status': 'Completed', 'result': {'plant_name': 'Ficus'}}}),
+        UpdateOne({'_id': ObjectId(ID_2)}, {'$set': {'status': 'Error', 'error_message': 'quota exceeded'}}),
+    ], ordered=False)
+    mock_db.jobs.delete_many.assert_called_once_with({'_id': {'$in': [job_id]}})
+    assert [name for name, _, _ in mock_db.mock_calls] == ['identifications.bulk_write', 'jobs.delete_many']
+    assert flushed == [[ID_1, ID_2]]
+    assert buffer.flush() == 0
+
+def test_updates_of_the_same_record_are_merged(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10)
+
+    buffer.update_identification(ID_1, {'status': 'Completed', 'result': {}})
+    buffer.update_identification(ID_1, {'phash': '00ff'})
+    buffer.flush()
+
+    operations = mock_db.identifications.bulk_write.call_args[0][0]
+    assert operations == [UpdateOne(
+        {'_id': ObjectId(ID_1)},
+        {'$set': {'status': 'Completed', 'result': {}, 'phash': '00ff'}, '$currentDate': {'phash_at': True}},
+    )]
+    assert buffer.stats()['updates_merged'] == 1
+
+def test_full_buffer_is_flushed_before_the_interval(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=2, flush_interval=10)
+    buffer.start()
+    try:
+        buffer.update_identification(ID_1, {'status': 'Completed'})
+        buffer.update_identification(ID_2, {'status': 'Completed'})
+        deadline = time.monotonic() + 2
+        while not mock_db.identifications.bulk_write.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        buffer.close()
+
+    mock_db.identifications.bulk_write.assert_called_once()
+
+def test_close_flushes_pending_writes(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10)
+    buffer.start()
+    buffer.update_identification(ID_1, {'status': 'Completed'})
+
+    buffer.close()
+
+    mock_db.identifications.bulk_write.assert_called_once()
+    assert buffer.stats()['pending_records'] == 0
+
+def test_unreachable_server_keeps_updates_and_jobs(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10)
+    job_id = ObjectId()
+    mock_db.identifications.bulk_write.side_effect = AutoReconnect('connection refused')
+
+    buffer.update_identification(ID_1, {'status': 'Completed', 'result': {'plant_name': 'Ficus'}})
+    buffer.complete_job(job_id)
+    assert buffer.flush() == 0
+    mock_db.jobs.delete_many.assert_not_called()
+
+    # A newer update of the record wins over the retried one
+    buffer.update_identification(ID_1, {'status': 'Error', 'error_message': 'late'})
+    mock_db.identifications.bulk_write.side_effect = None
+    assert buffer.flush() == 1
+
+    operations = mock_db.identifications.bulk_write.call_args[0][0]
+    assert operations == [UpdateOne(
+        {'_id': ObjectId(ID_1)}, {'$set': {'status': 'Error', 'result': {'plant_name': 'Ficus'}, 'error_message': 'late'}}
+    )]
+    mock_db.jobs.delete_many.assert_called_once_with({'_id': {'$in': [job_id]}})
+
+def test_rejected_updates_are_dropped(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10)
+    mock_db.identifications.bulk_write.side_effect = BulkWriteError({'writeErrors': [{'index': 0, 'errmsg': 'invalid'}]})
+
+    buffer.update_identification(ID_1, {'status': 'Completed'})
+    buffer.complete_job(ObjectId())
+    buffer.flush()
+
+    mock_db.jobs.delete_many.assert_called_once()
+    assert buffer.stats()['write_errors'] == 1
+    assert buffer.stats()['pending_records'] == 0
+
+def test_job_callbacks_run_after_the_removal_was_written(mock_db):
+    buffer = StatusWriteBuffer(mock_db, max_batch=100, flush_interval=10)
+    on_removed = MagicMock()
+    mock_db.identifications.bulk_write.side_effect = AutoReconnect('connection refused')
+
+    buffer.update_identification(ID_1, {'status': 'Completed'})
+    buffer.complete_job(ObjectId(), on_removed)
+    buffer.flush()
+    on_removed.assert_not_called()
+
+    mock_db.identifications.bulk_write.side_effect = None
+    mock_db.jobs.delete_many.side_effect = AutoReconnect('connection refused')
+    buffer.flush()
+    on_removed.assert_not_called()
+
+    buffer.complete_job(ObjectId(), on_removed)
+    mock_db.jobs.delete_many.side_effect = None
+    buffer.flush()
+    on_removed.assert_called_once_with()